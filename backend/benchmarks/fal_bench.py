@@ -0,0 +1,713 @@
+#!/usr/bin/env python3
+"""
+Offline throughput/latency benchmark for FalClient and fal_worker.py.
+
+Starts a local mock of the FAL APIs (mock_fal_server.py) with the given
+latency distributions, error rate and queue depth, points fal_client at
+it and measures:
+
+    - every FalClient method that talks to FAL, in-process: --iterations
+      calls at --concurrency threads (caches off, inputs unique so calls
+      never coalesce)
+    - every fal_worker.py subcommand as a fresh process (--cli_runs each),
+      with its per-process overhead over the matching in-process call
+    - serve: daemon startup, then --iterations requests over stdin with
+      --concurrency in flight
+    - batch: --iterations jobs per run at --concurrency
+
+Every entry reports p50/p95/p99/mean/min/max latency in milliseconds,
+throughput (calls per second of wall time) and the number of failed calls.
+Timings of the mock server itself are in the report's "mock" section, so
+runs with different simulated backends are never compared by accident.
+
+Notes:
+    - *_status/*_result/wait run against requests that were submitted
+      (and, for results, completed) before timing starts
+    - background_track is end-to-end: submit, then poll until the result
+    - analyze_product_image streams and stops at the closed JSON object;
+      *_blocking waits for the full completion, *_json uses the prompt
+      without the image description; analyze_products_batch analyzes
+      BATCH_IMAGES images per call
+    - pure accessors (*_stats, background_jobs) are not benchmarked
+
+Usage:
+    python benchmarks/fal_bench.py
+    python benchmarks/fal_bench.py --iterations 50 --concurrency 8 --output bench.json
+    python benchmarks/fal_bench.py --latency lognormal:1.5,0.5 --workers 4 --queue_depth 20
+    python benchmarks/fal_bench.py --error_rate 0.05 --methods any_llm_complete analyze_product_image --skip_cli
+    python benchmarks/fal_bench.py --baseline bench.json --tolerance 0.25
+
+With --baseline, exits 1 if any method's or subcommand's p50 or p95 is
+slower than the baseline's by more than --tolerance (fraction).
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARKS_DIR.parent
+SERVICES_DIR = BACKEND_DIR / "src" / "services"
+WORKER = SERVICES_DIR / "fal_worker.py"
+MOCK_HOOK_DIR = BENCHMARKS_DIR / "mock_hook"
+
+sys.path.insert(0, str(SERVICES_DIR))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+from mock_fal_server import MockFalServer, patch_fal_client  # noqa: E402
+
+
+SAMPLE_CATEGORIES = {
+    "main_product_type": "Footwear",
+    "subcategory": "Sneakers",
+    "target_audience": "Unisex",
+}
+SAMPLE_STYLES = [
+    {"name": "Studio", "description": "Clean white studio background"},
+    {"name": "Street", "description": "Outdoor urban street scene"},
+]
+# Images per analyze_products_batch call (two default-size batches)
+BATCH_IMAGES = 16
+
+
+def _unique(prefix: str) -> str:
+    return f"{prefix} {uuid.uuid4().hex[:12]}"
+
+
+class BenchContext:
+    """Mock server, FalClient and webhook receiver shared by every measurement."""
+
+    def __init__(self, server: MockFalServer, workdir: str, call_timeout: float):
+        self.server = server
+        self.workdir = workdir
+        self.call_timeout = call_timeout
+
+        # Same isolated cache dir for this process and the CLI subprocesses
+        # (the webhook store is shared through it); result caches are off
+        os.environ.update(self.cache_env())
+        os.environ.setdefault("FAL_KEY", "benchmark-dummy-key")
+        patch_fal_client(server.url)
+
+        from fal_service import FalClient
+        from fal_webhook import WebhookReceiver, WebhookStore
+
+        store = WebhookStore()
+        self.client = FalClient(webhook_store=store)
+        self.receiver = WebhookReceiver(store, port=0).start()
+
+    def cache_env(self) -> Dict[str, str]:
+        return {
+            "FAL_CACHE_DIR": os.path.join(self.workdir, "cache"),
+            "FAL_UPLOAD_CACHE": "0",
+            "FAL_ANALYSIS_CACHE": "0",
+            "FAL_IMAGE_HASH_CACHE": "0",
+        }
+
+    def subprocess_env(self) -> dict:
+        """Environment for worker processes: mock hook, dummy key, shared cache dir."""
+        env = dict(os.environ)
+        env.update(self.cache_env())
+        env.pop("FAL_WORKER_DRY_RUN", None)
+        env["FAL_MOCK_URL"] = self.server.url
+        env["PYTHONPATH"] = os.pathsep.join(
+            [str(MOCK_HOOK_DIR)] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+        )
+        return env
+
+    def image_url(self) -> str:
+        """A distinct image on the mock CDN (distinct URLs never coalesce)."""
+        return f"{self.server.url}/cdn/files/{uuid.uuid4().hex}.png"
+
+    def sample_file(self, size: int = 64 * 1024) -> str:
+        path = os.path.join(self.workdir, f"upload-{uuid.uuid4().hex}.jpg")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        return path
+
+    def close(self) -> None:
+        self.receiver.stop()
+
+
+# Preparation (untimed): one input per timed call
+
+def _prompts(ctx: BenchContext, count: int) -> List[str]:
+    return [_unique("Write a one-line product pitch for item") for _ in range(count)]
+
+
+def _cached_prompt_variants(ctx: BenchContext, count: int) -> List[str]:
+    """Prompts whose near-duplicate (other case and whitespace) is in the prompt cache."""
+    prompts = _prompts(ctx, count)
+    for prompt in prompts:
+        ctx.client.any_llm_complete(prompt, cache_namespace="bench")
+    return [f"  {prompt.upper()}\n" for prompt in prompts]
+
+
+def _image_urls(ctx: BenchContext, count: int) -> List[str]:
+    return [ctx.image_url() for _ in range(count)]
+
+
+def _image_url_batches(ctx: BenchContext, count: int) -> List[List[str]]:
+    """Catalog-import style inputs: BATCH_IMAGES unique image URLs per call."""
+    return [_image_urls(ctx, BATCH_IMAGES) for _ in range(count)]
+
+
+def _files(ctx: BenchContext, count: int) -> List[str]:
+    return [ctx.sample_file() for _ in range(count)]
+
+
+def _submitted_llm(ctx: BenchContext, count: int) -> List[str]:
+    return [ctx.client.any_llm_submit(prompt) for prompt in _prompts(ctx, count)]
+
+
+def _completed_llm(ctx: BenchContext, count: int) -> List[str]:
+    request_ids = _submitted_llm(ctx, count)
+    for request_id in request_ids:
+        ctx.client.any_llm_result(request_id)
+    return request_ids
+
+
+def _submitted_background(ctx: BenchContext, count: int) -> List[str]:
+    return [ctx.client.background_submit(url) for url in _image_urls(ctx, count)]
+
+
+def _completed_background(ctx: BenchContext, count: int) -> List[str]:
+    request_ids = _submitted_background(ctx, count)
+    for request_id in request_ids:
+        ctx.client.background_result(request_id)
+    return request_ids
+
+
+def _webhook_completed(ctx: BenchContext, count: int) -> List[str]:
+    request_ids = [
+        ctx.client.any_llm_submit(prompt, webhook_url=ctx.receiver.url)
+        for prompt in _prompts(ctx, count)
+    ]
+    for request_id in request_ids:
+        ctx.client.wait_for_result(request_id, timeout=ctx.call_timeout)
+    return request_ids
+
+
+# method -> (prepare(ctx, count) -> inputs, call(ctx, input) -> result)
+METHODS: Dict[str, Tuple[Callable[[BenchContext, int], List[Any]], Callable[[BenchContext, Any], Any]]] = {
+    "any_llm_complete": (
+        _prompts, lambda ctx, prompt: ctx.client.any_llm_complete(prompt)
+    ),
+    "any_llm_complete_prompt_cache": (
+        _cached_prompt_variants, lambda ctx, prompt: ctx.client.any_llm_complete(prompt, cache_namespace="bench")
+    ),
+    "any_llm_complete_hedged": (
+        _prompts, lambda ctx, prompt: ctx.client.any_llm_complete(prompt, hedge=True)
+    ),
+    "any_llm_enterprise": (
+        _prompts, lambda ctx, prompt: ctx.client.any_llm_enterprise(prompt)
+    ),
+    "any_llm_stream": (
+        _prompts, lambda ctx, prompt: list(ctx.client.any_llm_stream(prompt))[-1]
+    ),
+    "any_llm_submit": (
+        _prompts, lambda ctx, prompt: ctx.client.any_llm_submit(prompt)
+    ),
+    "any_llm_status": (
+        _submitted_llm, lambda ctx, request_id: ctx.client.any_llm_status(request_id)
+    ),
+    "any_llm_result": (
+        _completed_llm, lambda ctx, request_id: ctx.client.any_llm_result(request_id)
+    ),
+    "wait_for_result": (
+        _webhook_completed, lambda ctx, request_id: ctx.client.wait_for_result(request_id, timeout=ctx.call_timeout)
+    ),
+    "upload_file": (
+        _files, lambda ctx, path: ctx.client.upload_file(path)
+    ),
+    "download_images": (
+        _image_urls, lambda ctx, url: ctx.client.download_images([url])
+    ),
+    "background_replace": (
+        _image_urls, lambda ctx, url: ctx.client.background_replace(url)
+    ),
+    "background_submit": (
+        _image_urls, lambda ctx, url: ctx.client.background_submit(url)
+    ),
+    "background_status": (
+        _submitted_background, lambda ctx, request_id: ctx.client.background_status(request_id)
+    ),
+    "background_result": (
+        _completed_background, lambda ctx, request_id: ctx.client.background_result(request_id)
+    ),
+    "background_track": (
+        _image_urls,
+        lambda ctx, url: ctx.client.background_track(
+            ctx.client.background_submit(url), timeout=ctx.call_timeout
+        ).result()
+    ),
+    "analyze_product_image": (
+        _image_urls, lambda ctx, url: ctx.client.analyze_product_image(url, use_cache=False)
+    ),
+    "analyze_product_image_blocking": (
+        _image_urls, lambda ctx, url: ctx.client.analyze_product_image(url, use_cache=False, stream=False)
+    ),
+    "analyze_product_image_json": (
+        _image_urls,
+        lambda ctx, url: ctx.client.analyze_product_image(url, use_cache=False, preamble=False)
+    ),
+    "analyze_products_batch": (
+        _image_url_batches, lambda ctx, urls: ctx.client.analyze_products_batch(urls, use_cache=False)
+    ),
+    "analyze_and_prompt": (
+        _image_urls,
+        lambda ctx, url: ctx.client.analyze_and_prompt(url, SAMPLE_STYLES, use_cache=False)
+    ),
+    "generate_background_prompt": (
+        lambda ctx, count: [_unique("Clean studio") for _ in range(count)],
+        lambda ctx, style: ctx.client.generate_background_prompt(SAMPLE_CATEGORIES, style)
+    ),
+    "generate_multiple_backgrounds": (
+        _image_urls,
+        lambda ctx, url: ctx.client.generate_multiple_backgrounds(url, SAMPLE_CATEGORIES, styles=SAMPLE_STYLES)
+    ),
+}
+
+
+# subcommand -> (in-process method for the overhead, inputs, argv after the subcommand)
+COMMANDS: Dict[str, Tuple[Optional[str], Callable[[BenchContext, int], List[Any]], Callable[[Any], List[str]]]] = {
+    "any-llm-complete": ("any_llm_complete", _prompts, lambda prompt: ["--prompt", prompt]),
+    "any-llm-enterprise": ("any_llm_enterprise", _prompts, lambda prompt: ["--prompt", prompt]),
+    "any-llm-stream": ("any_llm_stream", _prompts, lambda prompt: ["--prompt", prompt]),
+    "any-llm-submit": ("any_llm_submit", _prompts, lambda prompt: ["--prompt", prompt]),
+    "any-llm-status": ("any_llm_status", _submitted_llm, lambda request_id: ["--request_id", request_id]),
+    "any-llm-result": ("any_llm_result", _completed_llm, lambda request_id: ["--request_id", request_id]),
+    "wait": (
+        "wait_for_result", _webhook_completed,
+        lambda request_id: ["--request_id", request_id, "--timeout", "30"]
+    ),
+    "background": ("background_replace", _image_urls, lambda url: ["--image_url", url]),
+    "background-submit": ("background_submit", _image_urls, lambda url: ["--image_url", url]),
+    "background-status": ("background_status", _submitted_background, lambda request_id: ["--request_id", request_id]),
+    "background-result": ("background_result", _completed_background, lambda request_id: ["--request_id", request_id]),
+    "analyze-product": ("analyze_product_image", _image_urls, lambda url: ["--image_url", url, "--no_cache"]),
+    "analyze-product-batch": (
+        "analyze_products_batch", _image_url_batches, lambda urls: ["--image_urls", *urls, "--no_cache"]
+    ),
+    "analyze-and-prompt": (
+        "analyze_and_prompt", _image_urls,
+        lambda url: ["--image_url", url, "--styles", json.dumps(SAMPLE_STYLES), "--no_cache"]
+    ),
+    "analysis-cache": (None, lambda ctx, count: [None] * count, lambda _: ["stats"]),
+    "phash-index": (None, lambda ctx, count: [None] * count, lambda _: ["stats"]),
+    "prompt-cache": (None, lambda ctx, count: [None] * count, lambda _: ["stats"]),
+    "admission": (None, lambda ctx, count: [None] * count, lambda _: ["stats"]),
+    "generate-bg-prompt": (
+        "generate_background_prompt",
+        lambda ctx, count: [_unique("Clean studio") for _ in range(count)],
+        lambda style: ["--categories", json.dumps(SAMPLE_CATEGORIES), "--style_type", style]
+    ),
+    "generate-multiple-bg": (
+        "generate_multiple_backgrounds", _image_urls,
+        lambda url: [
+            "--image_url", url,
+            "--categories", json.dumps(SAMPLE_CATEGORIES),
+            "--styles", json.dumps(SAMPLE_STYLES)
+        ]
+    ),
+    "upload-file": ("upload_file", _files, lambda path: ["--file_path", path]),
+    "download": ("download_images", _image_urls, lambda url: ["--urls", url]),
+    "image-store": (None, lambda ctx, count: [None] * count, lambda _: ["stats"]),
+    "usage-report": (None, lambda ctx, count: [None] * count, lambda _: ["--by", "command,model,hour"]),
+}
+
+# Long-running subcommands, measured by their own drivers below
+SERVER_COMMANDS = ["serve", "batch", "webhook-serve"]
+
+
+def latency_stats(samples: List[float], wall: float, errors: int) -> Dict[str, Any]:
+    """p50/p95/p99/mean/min/max of `samples` (seconds) in ms, plus throughput."""
+    ms = sorted(sample * 1000 for sample in samples)
+    if len(ms) >= 2:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0] if ms else 0.0
+    return {
+        "calls": len(ms),
+        "errors": errors,
+        "throughput_per_s": round(len(ms) / wall, 3) if wall > 0 else None,
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "mean_ms": round(statistics.fmean(ms), 2) if ms else 0.0,
+        "min_ms": round(ms[0], 2) if ms else 0.0,
+        "max_ms": round(ms[-1], 2) if ms else 0.0,
+    }
+
+
+def _failed(result: Any) -> bool:
+    return isinstance(result, dict) and bool(result.get("error"))
+
+
+def bench_method(ctx: BenchContext, name: str, iterations: int, concurrency: int) -> Dict[str, Any]:
+    """Time `iterations` calls of one FalClient method at `concurrency` threads."""
+    prepare, call = METHODS[name]
+    inputs = prepare(ctx, iterations)
+    samples: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(item: Any) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            failed = _failed(call(ctx, item))
+        except Exception as e:
+            print(f"[bench] {name}: {e}", file=sys.stderr)
+            failed = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.append(elapsed)
+            errors += failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(timed, inputs))
+    return latency_stats(samples, time.perf_counter() - start, errors)
+
+
+def _run_worker(ctx: BenchContext, argv: List[str]) -> Tuple[float, bool]:
+    """Wall time of one fresh worker process and whether it failed."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, str(WORKER)] + argv,
+        cwd=BACKEND_DIR,
+        env=ctx.subprocess_env(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=ctx.call_timeout
+    )
+    elapsed = time.perf_counter() - start
+    failed = completed.returncode != 0
+    if not failed:
+        # Single-result commands print one JSON document; streams print NDJSON
+        last = completed.stdout.decode(errors="replace").strip().splitlines()[-1:]
+        try:
+            failed = _failed(json.loads(last[0])) if last and last[0].startswith("{") else False
+        except ValueError:
+            pass
+    if failed:
+        print(
+            f"[bench] {argv[0]} failed: {completed.stderr.decode(errors='replace')[-300:]}",
+            file=sys.stderr
+        )
+    return elapsed, failed
+
+
+def bench_command(ctx: BenchContext, command: str, runs: int) -> Dict[str, Any]:
+    """Time `runs` fresh worker processes of one subcommand, one at a time."""
+    _, prepare, build_argv = COMMANDS[command]
+    samples = []
+    errors = 0
+    start = time.perf_counter()
+    for item in prepare(ctx, runs):
+        elapsed, failed = _run_worker(ctx, [command] + build_argv(item))
+        samples.append(elapsed)
+        errors += failed
+    return latency_stats(samples, time.perf_counter() - start, errors)
+
+
+def bench_serve(ctx: BenchContext, iterations: int, concurrency: int) -> Dict[str, Any]:
+    """Daemon startup (until the first ping answers), then request latency/throughput."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, str(WORKER), "serve", "--max_workers", str(max(1, concurrency))],
+        cwd=BACKEND_DIR,
+        env=ctx.subprocess_env(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        bufsize=1
+    )
+    sent: Dict[str, float] = {}
+    samples: List[float] = []
+    errors = 0
+    slots = threading.Semaphore(max(1, concurrency))
+    try:
+        process.stdin.write(json.dumps({"id": "ping", "command": "ping"}) + "\n")
+        process.stdin.flush()
+        process.stdout.readline()
+        startup = time.perf_counter() - start
+
+        def read_responses() -> None:
+            nonlocal errors
+            for _ in range(iterations):
+                response = json.loads(process.stdout.readline())
+                samples.append(time.perf_counter() - sent.pop(response["id"]))
+                errors += bool(response.get("error")) or _failed(response.get("result"))
+                slots.release()
+
+        reader = threading.Thread(target=read_responses, daemon=True)
+        reader.start()
+        start = time.perf_counter()
+        for index, prompt in enumerate(_prompts(ctx, iterations)):
+            slots.acquire()
+            request_id = str(index)
+            sent[request_id] = time.perf_counter()
+            process.stdin.write(json.dumps({
+                "id": request_id,
+                "command": "any-llm-complete",
+                "args": {"prompt": prompt}
+            }) + "\n")
+            process.stdin.flush()
+        reader.join(ctx.call_timeout)
+        wall = time.perf_counter() - start
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=ctx.call_timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    stats = latency_stats(samples, wall, errors + iterations - len(samples))
+    return {"startup_ms": round(startup * 1000, 2), **stats}
+
+
+def bench_batch(ctx: BenchContext, iterations: int, concurrency: int, runs: int) -> Dict[str, Any]:
+    """Wall time of `runs` batch processes of `iterations` jobs each."""
+    samples = []
+    errors = 0
+    for run in range(runs):
+        input_path = os.path.join(ctx.workdir, f"batch-{run}.jsonl")
+        output_path = os.path.join(ctx.workdir, f"batch-{run}.out.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for index, prompt in enumerate(_prompts(ctx, iterations)):
+                f.write(json.dumps({
+                    "id": str(index),
+                    "command": "any-llm-complete",
+                    "args": {"prompt": prompt}
+                }) + "\n")
+        elapsed, failed = _run_worker(ctx, [
+            "batch", "--input", input_path, "--output", output_path,
+            "--concurrency", str(max(1, concurrency))
+        ])
+        samples.append(elapsed)
+        with open(output_path, encoding="utf-8") as f:
+            errors += sum(bool(json.loads(line).get("error")) for line in f if line.strip())
+        errors += failed
+    stats = latency_stats(samples, sum(samples), errors)
+    # Per-run throughput is jobs, not processes
+    stats["jobs_per_run"] = iterations
+    stats["throughput_per_s"] = round(iterations / statistics.median(samples), 3) if samples else None
+    return stats
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_webhook_serve(ctx: BenchContext, runs: int) -> Dict[str, Any]:
+    """Time from spawning webhook-serve until its /health endpoint answers."""
+    samples = []
+    errors = 0
+    for _ in range(runs):
+        port = _free_port()
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, str(WORKER), "webhook-serve", "--port", str(port)],
+            cwd=BACKEND_DIR,
+            env=ctx.subprocess_env(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            deadline = start + ctx.call_timeout
+            while True:
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).close()
+                    samples.append(time.perf_counter() - start)
+                    break
+                except OSError:
+                    if time.perf_counter() > deadline or process.poll() is not None:
+                        errors += 1
+                        break
+                    time.sleep(0.005)
+        finally:
+            process.terminate()
+            process.wait()
+    return latency_stats(samples, sum(samples), errors)
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """Start the mock, run every requested measurement and return the report dict."""
+    import fal_client
+
+    server = MockFalServer(
+        latency=args.latency,
+        queue_wait=args.queue_wait,
+        queue_depth=args.queue_depth,
+        workers=args.workers,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        upload_latency=args.upload_latency,
+        stream_events=args.stream_events,
+        seed=args.seed
+    ).start()
+    workdir = tempfile.mkdtemp(prefix="fal-bench-")
+    ctx = BenchContext(server, workdir, args.call_timeout)
+    report = {
+        "python": sys.version.split()[0],
+        "fal_client": getattr(fal_client, "__version__", None),
+        "mock": server.config(),
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "cli_runs": args.cli_runs,
+        "methods": {},
+        "commands": {},
+    }
+
+    try:
+        # Warm up fal_client's HTTP client and CDN token outside the timings
+        ctx.client.any_llm_complete(_unique("warm-up"))
+
+        for name in args.methods:
+            stats = bench_method(ctx, name, args.iterations, args.concurrency)
+            report["methods"][name] = stats
+            print(
+                f"{name:<30} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  "
+                f"{stats['throughput_per_s']:7.2f}/s  errors {stats['errors']}",
+                file=sys.stderr
+            )
+
+        for command in ([] if args.skip_cli else args.commands):
+            if command == "serve":
+                stats = bench_serve(ctx, args.iterations, args.concurrency)
+            elif command == "batch":
+                stats = bench_batch(ctx, args.iterations, args.concurrency, args.cli_runs)
+            elif command == "webhook-serve":
+                stats = bench_webhook_serve(ctx, args.cli_runs)
+            else:
+                stats = bench_command(ctx, command, args.cli_runs)
+                method = COMMANDS[command][0]
+                if method in report["methods"]:
+                    stats["overhead_ms"] = round(stats["p50_ms"] - report["methods"][method]["p50_ms"], 2)
+            report["commands"][command] = stats
+            overhead = f"  (+{stats['overhead_ms']:.1f} ms per process)" if "overhead_ms" in stats else ""
+            print(f"{command:<30} p50 {stats['p50_ms']:8.1f} ms{overhead}", file=sys.stderr)
+    finally:
+        ctx.close()
+        report["mock_requests"] = server.stats()
+        server.stop()
+
+    return report
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Methods/subcommands whose p50 or p95 exceeds the baseline's by more than `tolerance`."""
+    regressions = []
+    for section in ("methods", "commands"):
+        for name, stats in report[section].items():
+            previous = baseline.get(section, {}).get(name)
+            if not previous:
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                limit = previous[key] * (1 + tolerance)
+                if stats[key] > limit:
+                    regressions.append(
+                        f"{name} {key[:3]}: {stats[key]:.1f} ms > {limit:.1f} ms "
+                        f"(baseline {previous[key]:.1f} ms)"
+                    )
+    if baseline.get("mock") and baseline["mock"] != report["mock"]:
+        print("Warning: baseline was recorded with different mock settings", file=sys.stderr)
+    return regressions
+
+
+def main():
+    all_commands = list(COMMANDS) + SERVER_COMMANDS
+    parser = argparse.ArgumentParser(
+        description="Offline FalClient/fal_worker.py benchmark against a mock FAL server",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--iterations", type=int, default=20, help="Calls per method (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Calls in flight (default: 4)")
+    parser.add_argument("--cli_runs", type=int, default=5, help="Processes per subcommand (default: 5)")
+    parser.add_argument(
+        "--methods",
+        nargs="*",
+        choices=list(METHODS),
+        default=list(METHODS),
+        help="FalClient methods to benchmark (default: all)"
+    )
+    parser.add_argument(
+        "--commands",
+        nargs="*",
+        choices=all_commands,
+        default=all_commands,
+        help="fal_worker.py subcommands to benchmark (default: all)"
+    )
+    parser.add_argument("--skip_cli", action="store_true", help="Only benchmark in-process methods")
+    parser.add_argument(
+        "--call_timeout",
+        type=float,
+        default=120,
+        help="Seconds before a single call or process is abandoned (default: 120)"
+    )
+
+    mock = parser.add_argument_group("mock server")
+    mock.add_argument("--latency", default="lognormal:0.25,0.3", help="Run time per request (default: lognormal:0.25,0.3)")
+    mock.add_argument("--queue_wait", default="fixed:0", help="Queue wait per request (default: fixed:0)")
+    mock.add_argument("--queue_depth", type=int, default=0, help="Phantom requests ahead of each request (default: 0)")
+    mock.add_argument("--workers", type=int, default=0, help="Requests running at once, 0 = unlimited (default: 0)")
+    mock.add_argument("--error_rate", type=float, default=0.0, help="Fraction of failing calls (default: 0)")
+    mock.add_argument("--error_status", type=int, default=500, help="HTTP status of injected failures (default: 500)")
+    mock.add_argument("--upload_latency", default="fixed:0.05", help="Time per upload (default: fixed:0.05)")
+    mock.add_argument("--stream_events", type=int, default=8, help="Events per streamed response (default: 8)")
+    mock.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed p50/p95 slowdown vs. baseline as a fraction (default: 0.25)"
+    )
+    args = parser.parse_args()
+
+    try:
+        report = run_benchmark(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if regressions:
+        print("Latency regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,640 @@
+#!/usr/bin/env python3
+"""
+Local mock of the FAL HTTP APIs, for offline benchmarks.
+
+Speaks the wire protocol fal_client uses, so FalClient and fal_worker.py
+run unmodified against it:
+
+    - queue: POST /queue/<app> (submit, optional ?fal_webhook=),
+      GET  /queue/<owner>/<alias>/requests/<id>/status
+      GET  /queue/<owner>/<alias>/requests/<id>        (result)
+      PUT  /queue/<owner>/<alias>/requests/<id>/cancel
+    - run:   POST /run/<app>, POST /run/<app>/stream (server-sent events)
+    - CDN:   POST /cdn/files/upload, GET /cdn/files/<name> (ETag, 304 on If-None-Match)
+    - REST:  POST /rest/storage/auth/token (CDN upload token),
+      POST /rest/storage/upload/initiate + PUT (fallback upload)
+
+Each queue request waits in the queue for a --queue_wait sample (reported
+as IN_QUEUE, with --queue_depth phantom requests ahead of it draining
+over that wait), then runs for a --latency sample (IN_PROGRESS) and is
+COMPLETED afterwards. With --workers N at most N requests run at once and
+the rest queue behind them. A --error_rate fraction of submit, run,
+stream and upload calls fail with --error_status.
+
+Latency specs (seconds):
+    fixed:0.5              always 0.5
+    uniform:0.2,1.5        uniform between 0.2 and 1.5
+    lognormal:0.8,0.4      median 0.8, log-space sigma 0.4
+    exponential:0.8        mean 0.8
+
+Outputs depend on the app: any-llm returns the 9-category analysis JSON
+when the prompt asks for it (wrapped in a description and a closing
+note for describe-first prompts, as an indexed array for batched
+requests, plus a prompt per listed style for fused analyze-and-prompt
+requests) and a background prompt otherwise;
+nano-banana returns an image hosted by the mock CDN.
+
+Pointing fal_client at the mock:
+    - in-process: patch_fal_client(server.url) after start()
+    - subprocesses: put benchmarks/mock_hook on PYTHONPATH and set
+      FAL_MOCK_URL (its sitecustomize patches fal_client on import, so
+      processes that never import fal_client pay nothing)
+
+Usage:
+    python benchmarks/mock_fal_server.py --port 8765 --latency lognormal:0.8,0.4
+    python benchmarks/mock_fal_server.py --workers 4 --queue_depth 10 --error_rate 0.02
+"""
+
+import argparse
+import base64
+import hashlib
+import heapq
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+# 1x1 transparent PNG served for generated images and unknown CDN files
+PLACEHOLDER_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+ANALYSIS_OUTPUT = {
+    "main_product_type": "Footwear",
+    "subcategory": "Low-top Sneakers",
+    "target_audience": "Unisex",
+    "price_range": "Mid-range",
+    "use_case": "Casual Lifestyle",
+    "style_design": "Minimalist",
+    "season_occasion": "All Season",
+    "industrial_type": "Footwear Manufacturing",
+    "vibe": "Urban/Street",
+}
+
+# Text around the analysis object when the prompt asks to describe the image first
+ANALYSIS_PREAMBLE = (
+    "STEP 1: The image shows a single white low-top sneaker photographed from the "
+    "side on a plain background. It has a leather upper, white laces, a rubber "
+    "cupsole and minimal branding.\n\nSTEP 2: Categorization:\n"
+)
+ANALYSIS_EPILOGUE = (
+    "\nThe classification reflects the clean silhouette and everyday styling of the "
+    "shoe; the price range assumes a branded retail product rather than a luxury "
+    "designer release, and the vibe leans towards street style over athletic use."
+)
+
+BACKGROUND_PROMPT_OUTPUT = (
+    "Change only the background to a bright, minimal studio set with soft "
+    "daylight and a subtle floor shadow. Keep the product exactly as it is "
+    "in the original image."
+)
+
+
+class Latency:
+    """Random durations drawn from a spec such as "lognormal:0.8,0.4"."""
+
+    KINDS = ("fixed", "uniform", "lognormal", "exponential")
+
+    def __init__(self, spec: str, rng: random.Random):
+        kind, _, params = spec.partition(":")
+        try:
+            values = [float(value) for value in params.split(",")] if params else []
+        except ValueError:
+            raise ValueError(f"Invalid latency spec {spec!r}") from None
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}.get(kind)
+        if expected is None or len(values) != expected or any(value < 0 for value in values):
+            raise ValueError(
+                f"Invalid latency spec {spec!r} (expected one of: fixed:S, uniform:A,B, "
+                f"lognormal:MEDIAN,SIGMA, exponential:MEAN)"
+            )
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+        self._rng = rng
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                return self.values[0]
+            if self.kind == "uniform":
+                return self._rng.uniform(*self.values)
+            if self.kind == "lognormal":
+                median, sigma = self.values
+                return median * math.exp(self._rng.gauss(0.0, sigma)) if median else 0.0
+            mean = self.values[0]
+            return self._rng.expovariate(1.0 / mean) if mean else 0.0
+
+
+class _Job:
+    """One queue request and its simulated schedule (monotonic times)."""
+
+    def __init__(self, app: str, arguments: Any, submitted: float, start: float, end: float):
+        self.request_id = str(uuid.uuid4())
+        self.app = app
+        self.arguments = arguments
+        self.submitted = submitted
+        self.start = start
+        self.end = end
+        self.cancelled = False
+
+
+def _llm_output(arguments: Any) -> str:
+    prompt = arguments.get("prompt", "") if isinstance(arguments, dict) else ""
+    if '"prompts"' in prompt:
+        # analyze-and-prompt: styles are listed as `- "<name>": <description>`
+        names = [json.loads(name) for name in re.findall(r'^- ("(?:[^"\\]|\\.)*"): ', prompt, re.M)]
+        fused = {"categories": ANALYSIS_OUTPUT, "prompts": {name: BACKGROUND_PROMPT_OUTPUT for name in names}}
+        return "```json\n" + json.dumps(fused, indent=4) + "\n```"
+    if '"index"' in prompt:
+        # Batched analysis: images are listed as `Image <n> URL: ...`
+        count = len(re.findall(r'^Image \d+ URL: ', prompt, re.M))
+        return json.dumps([{"index": index, **ANALYSIS_OUTPUT} for index in range(1, count + 1)], indent=4)
+    if "main_product_type" in prompt:
+        analysis = json.dumps(ANALYSIS_OUTPUT, indent=4)
+        if "STEP 1" not in prompt:
+            # JSON-only prompt variant
+            return analysis
+        # Describe-first prompt: free-text preamble, then the object and a closing note
+        return ANALYSIS_PREAMBLE + "```json\n" + analysis + "\n```\n" + ANALYSIS_EPILOGUE
+    return BACKGROUND_PROMPT_OUTPUT
+
+
+def _usage(output: str) -> Dict[str, int]:
+    return {"prompt_tokens": 850, "completion_tokens": max(1, len(output) // 4)}
+
+
+class MockFalServer:
+    """FAL queue/run/CDN mock served from a background thread."""
+
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "lognormal:0.8,0.4",
+        queue_wait: str = "fixed:0",
+        queue_depth: int = 0,
+        workers: int = 0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        upload_latency: str = "fixed:0.05",
+        stream_events: int = 8,
+        seed: Optional[int] = None,
+        verbose: bool = False
+    ):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            latency: Run time of each request (queue, run and stream calls)
+            queue_wait: Extra time each queue request waits before running
+            queue_depth: Phantom requests reported ahead of each new request
+            workers: Requests running at once (0: unlimited)
+            error_rate: Fraction of submit/run/stream/upload calls that fail
+            error_status: HTTP status of injected failures (fal_client
+                itself retries 408/409/429 and ingress 502-504)
+            upload_latency: Time each upload takes
+            stream_events: Events per streamed response
+            seed: Seed for reproducible latency and error draws
+            verbose: Log every HTTP request to stderr
+        """
+        rng = random.Random(seed)
+        self.latency = Latency(latency, rng)
+        self.queue_wait = Latency(queue_wait, rng)
+        self.upload_latency = Latency(upload_latency, rng)
+        self.queue_depth = max(0, queue_depth)
+        self.workers = max(0, workers)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stream_events = max(1, stream_events)
+        self.verbose = verbose
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _Job] = {}
+        self._waiting: List[_Job] = []
+        self._slots = [0.0] * self.workers
+        self._files: Dict[str, bytes] = {}
+        self._counters: Dict[str, int] = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the mock, e.g. http://127.0.0.1:8765"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config(self) -> Dict[str, Any]:
+        """Simulation parameters, for benchmark reports."""
+        return {
+            "latency": self.latency.spec,
+            "queue_wait": self.queue_wait.spec,
+            "queue_depth": self.queue_depth,
+            "workers": self.workers,
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+            "upload_latency": self.upload_latency.spec,
+            "stream_events": self.stream_events,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """Requests served per route, plus injected errors."""
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def start(self) -> "MockFalServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="mock-fal-server",
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Simulation
+
+    def _count(self, route: str) -> None:
+        with self._lock:
+            self._counters[route] = self._counters.get(route, 0) + 1
+
+    def _inject_error(self) -> bool:
+        with self._lock:
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if failed:
+                self._counters["injected_errors"] = self._counters.get("injected_errors", 0) + 1
+        return failed
+
+    def _enqueue(self, app: str, arguments: Any) -> _Job:
+        now = time.monotonic()
+        ready = now + self.queue_wait.sample()
+        duration = self.latency.sample()
+        with self._lock:
+            if self._slots:
+                # Earliest free worker slot takes the job once it is ready
+                start = max(ready, heapq.heappop(self._slots))
+                heapq.heappush(self._slots, start + duration)
+            else:
+                start = ready
+            job = _Job(app, arguments, now, start, start + duration)
+            self._jobs[job.request_id] = job
+            self._waiting.append(job)
+        return job
+
+    def _queue_position(self, job: _Job, now: float) -> int:
+        """Real requests starting before `job`, plus the draining phantom queue."""
+        with self._lock:
+            self._waiting = [other for other in self._waiting if other.start > now and not other.cancelled]
+            ahead = sum(1 for other in self._waiting if other.start < job.start)
+        span = job.start - job.submitted
+        phantom = math.ceil(self.queue_depth * (job.start - now) / span) if span > 0 else 0
+        return ahead + max(0, phantom)
+
+    def _result(self, app: str, arguments: Any, request_id: str, duration: float) -> Dict[str, Any]:
+        if "nano-banana" in app:
+            return {
+                "images": [{
+                    "url": f"{self.url}/cdn/files/generated-{request_id}.png",
+                    "content_type": "image/png",
+                    "file_name": f"generated-{request_id}.png",
+                    "width": 1024,
+                    "height": 1024,
+                }],
+                "description": "",
+                "timings": {"inference": round(duration, 4)},
+                "has_nsfw_concepts": [False],
+            }
+        output = _llm_output(arguments)
+        return {"output": output, "partial": False, "error": None, "usage": _usage(output)}
+
+    def _send_webhook(self, url: str, job: _Job) -> None:
+        import urllib.request
+
+        if job.cancelled:
+            return
+        body = {
+            "request_id": job.request_id,
+            "gateway_request_id": job.request_id,
+            "status": "OK",
+            "payload": self._result(job.app, job.arguments, job.request_id, job.end - job.start),
+        }
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+            self._count("webhook_sent")
+        except Exception as e:
+            self._count("webhook_failed")
+            print(f"[mock-fal] webhook to {url} failed: {e}", file=sys.stderr)
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real API behind fal_client's httpx pool
+            protocol_version = "HTTP/1.1"
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _json(self, code: int, body: Any) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("x-fal-request-id", str(uuid.uuid4()))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _bytes(self, data: bytes, content_type: str) -> None:
+                # Strong ETag like the real CDN, so conditional GETs get a 304
+                etag = '"%s"' % hashlib.sha256(data).hexdigest()[:32]
+                if self.headers.get("If-None-Match") == etag:
+                    mock._count("cdn_not_modified")
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _fail(self) -> None:
+                self._json(mock.error_status, {"detail": "Injected mock failure"})
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                path = url.path
+                if path.startswith("/queue/") and "/requests/" in path:
+                    self._queue_get(path, parse_qs(url.query))
+                elif path.startswith("/cdn/files/"):
+                    mock._count("cdn_get")
+                    name = path[len("/cdn/files/"):]
+                    with mock._lock:
+                        data = mock._files.get(name)
+                    self._bytes(data if data is not None else PLACEHOLDER_PNG, "image/png")
+                elif path == "/health":
+                    self._json(200, {"ok": True, "stats": mock.stats()})
+                else:
+                    self._json(404, {"detail": f"Unknown path {path}"})
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                path = url.path
+                body = self._body()
+                if path.startswith("/queue/"):
+                    self._submit(path[len("/queue/"):], body, parse_qs(url.query))
+                elif path.startswith("/run/"):
+                    app = path[len("/run/"):]
+                    if app.endswith("/stream"):
+                        self._stream(app[:-len("/stream")], body)
+                    else:
+                        self._run(app, body)
+                elif path == "/cdn/files/upload":
+                    self._upload(body, self.headers.get("X-Fal-File-Name"))
+                elif path == "/rest/storage/auth/token":
+                    mock._count("cdn_token")
+                    self._json(200, {
+                        "token": "mock-token",
+                        "token_type": "Bearer",
+                        "base_url": f"{mock.url}/cdn",
+                        "expires_at": (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat(),
+                    })
+                elif path == "/rest/storage/upload/initiate":
+                    payload = json.loads(body or b"{}")
+                    name = f"{uuid.uuid4().hex}-{payload.get('file_name', 'upload.bin')}"
+                    self._json(200, {
+                        "upload_url": f"{mock.url}/cdn/put/{name}",
+                        "file_url": f"{mock.url}/cdn/files/{name}",
+                    })
+                else:
+                    self._json(404, {"detail": f"Unknown path {path}"})
+
+            def do_PUT(self):
+                path = urlsplit(self.path).path
+                body = self._body()
+                if path.startswith("/queue/") and path.endswith("/cancel"):
+                    self._cancel(path)
+                elif path.startswith("/cdn/put/"):
+                    mock._count("upload")
+                    time.sleep(mock.upload_latency.sample())
+                    with mock._lock:
+                        mock._files[path[len("/cdn/put/"):]] = body
+                    self._json(200, {})
+                else:
+                    self._json(404, {"detail": f"Unknown path {path}"})
+
+            def _submit(self, app: str, body: bytes, query: Dict[str, List[str]]) -> None:
+                mock._count("submit")
+                if mock._inject_error():
+                    self._fail()
+                    return
+                job = mock._enqueue(app, json.loads(body or b"{}"))
+                webhook = query.get("fal_webhook", [None])[0]
+                if webhook:
+                    timer = threading.Timer(
+                        max(0.0, job.end - time.monotonic()), mock._send_webhook, args=(webhook, job)
+                    )
+                    timer.daemon = True
+                    timer.start()
+                # Status/result URLs use <owner>/<alias> only, like FAL
+                base = f"{mock.url}/queue/{'/'.join(app.split('/')[:2])}/requests/{job.request_id}"
+                self._json(200, {
+                    "request_id": job.request_id,
+                    "response_url": base,
+                    "status_url": f"{base}/status",
+                    "cancel_url": f"{base}/cancel",
+                    "queue_position": mock._queue_position(job, time.monotonic()),
+                })
+
+            def _job(self, path: str) -> Optional[_Job]:
+                request_id = path.split("/requests/", 1)[1].split("/", 1)[0]
+                with mock._lock:
+                    return mock._jobs.get(request_id)
+
+            def _queue_get(self, path: str, query: Dict[str, List[str]]) -> None:
+                job = self._job(path)
+                if job is None:
+                    self._json(404, {"detail": "Request not found"})
+                    return
+                now = time.monotonic()
+                if path.endswith("/status"):
+                    mock._count("status")
+                    with_logs = query.get("logs", ["0"])[0].lower() in ("1", "true")
+                    logs = [{"message": "mock inference step", "level": "INFO"}] if with_logs else []
+                    if not job.cancelled and now < job.start:
+                        self._json(200, {"status": "IN_QUEUE", "queue_position": mock._queue_position(job, now)})
+                    elif not job.cancelled and now < job.end:
+                        self._json(200, {"status": "IN_PROGRESS", "logs": logs})
+                    else:
+                        self._json(200, {
+                            "status": "COMPLETED",
+                            "logs": logs,
+                            "metrics": {"inference_time": round(job.end - job.start, 4)},
+                            "error": "Request cancelled" if job.cancelled else None,
+                        })
+                    return
+                mock._count("result")
+                if job.cancelled:
+                    self._json(400, {"detail": "Request was cancelled"})
+                elif now < job.end:
+                    self._json(400, {"detail": "Request is still in progress"})
+                else:
+                    self._json(200, mock._result(job.app, job.arguments, job.request_id, job.end - job.start))
+
+            def _cancel(self, path: str) -> None:
+                mock._count("cancel")
+                job = self._job(path)
+                if job is None:
+                    self._json(404, {"detail": "Request not found"})
+                elif time.monotonic() >= job.end:
+                    self._json(400, {"status": "ALREADY_COMPLETED"})
+                else:
+                    job.cancelled = True
+                    self._json(202, {"status": "CANCELLATION_REQUESTED"})
+
+            def _run(self, app: str, body: bytes) -> None:
+                mock._count("run")
+                if mock._inject_error():
+                    self._fail()
+                    return
+                duration = mock.latency.sample()
+                time.sleep(duration)
+                self._json(200, mock._result(app, json.loads(body or b"{}"), str(uuid.uuid4()), duration))
+
+            def _stream(self, app: str, body: bytes) -> None:
+                mock._count("stream")
+                if mock._inject_error():
+                    self._fail()
+                    return
+                output = _llm_output(json.loads(body or b"{}"))
+                interval = mock.latency.sample() / mock.stream_events
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                # No Content-Length: the body ends when the connection closes
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for index in range(1, mock.stream_events + 1):
+                    time.sleep(interval)
+                    final = index == mock.stream_events
+                    event = {
+                        "output": output[:len(output) * index // mock.stream_events],
+                        "partial": not final,
+                        "error": None,
+                    }
+                    if final:
+                        event["usage"] = _usage(output)
+                    try:
+                        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # Client closed the stream early (generation cancelled)
+                        mock._count("stream_cancelled")
+                        return
+
+            def _upload(self, data: bytes, file_name: Optional[str]) -> None:
+                mock._count("upload")
+                if mock._inject_error():
+                    self._fail()
+                    return
+                time.sleep(mock.upload_latency.sample())
+                name = f"{uuid.uuid4().hex}-{file_name or 'upload.bin'}"
+                with mock._lock:
+                    mock._files[name] = data
+                self._json(200, {"access_url": f"{mock.url}/cdn/files/{name}"})
+
+            def log_message(self, format, *args):
+                if mock.verbose:
+                    print(f"[mock-fal] {format % args}", file=sys.stderr)
+
+        return Handler
+
+
+def patch_fal_client(base_url: str) -> None:
+    """Point the already-importable fal_client of this process at the mock."""
+    import fal_client.client as client
+
+    base_url = base_url.rstrip("/")
+    client.RUN_URL_FORMAT = f"{base_url}/run/"
+    client.QUEUE_URL_FORMAT = f"{base_url}/queue/"
+    client.CDN_URL = f"{base_url}/cdn"
+    client.REST_URL = f"{base_url}/rest"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local mock of the FAL queue/run/CDN APIs",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind (default: 8765)")
+    parser.add_argument("--latency", default="lognormal:0.8,0.4", help="Run time per request (default: lognormal:0.8,0.4)")
+    parser.add_argument("--queue_wait", default="fixed:0", help="Queue wait per request (default: fixed:0)")
+    parser.add_argument("--queue_depth", type=int, default=0, help="Phantom requests ahead of each request (default: 0)")
+    parser.add_argument("--workers", type=int, default=0, help="Requests running at once, 0 = unlimited (default: 0)")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of failing calls (default: 0)")
+    parser.add_argument("--error_status", type=int, default=500, help="HTTP status of injected failures (default: 500)")
+    parser.add_argument("--upload_latency", default="fixed:0.05", help="Time per upload (default: fixed:0.05)")
+    parser.add_argument("--stream_events", type=int, default=8, help="Events per streamed response (default: 8)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    parser.add_argument("--verbose", action="store_true", help="Log every request to stderr")
+    args = parser.parse_args()
+
+    try:
+        server = MockFalServer(
+            host=args.host,
+            port=args.port,
+            latency=args.latency,
+            queue_wait=args.queue_wait,
+            queue_depth=args.queue_depth,
+            workers=args.workers,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            upload_latency=args.upload_latency,
+            stream_events=args.stream_events,
+            seed=args.seed,
+            verbose=args.verbose
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Mock FAL server on {server.url}", file=sys.stderr)
+    print(f"Point workers at it with: PYTHONPATH=benchmarks/mock_hook FAL_MOCK_URL={server.url}", file=sys.stderr)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
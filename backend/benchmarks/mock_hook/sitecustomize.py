@@ -0,0 +1,47 @@
+"""
+Points fal_client at a mock FAL server (see mock_fal_server.py).
+
+Put this directory on PYTHONPATH and set FAL_MOCK_URL; every Python
+process started that way patches fal_client.client's base URLs right after
+it is imported. fal_client is not imported eagerly, so processes that never
+use it keep their normal startup time. Without FAL_MOCK_URL this does
+nothing.
+"""
+
+import os
+import sys
+
+
+def _install(base_url: str) -> None:
+    import importlib.abc
+    import importlib.machinery
+
+    base_url = base_url.rstrip("/")
+
+    def patch(module) -> None:
+        module.RUN_URL_FORMAT = f"{base_url}/run/"
+        module.QUEUE_URL_FORMAT = f"{base_url}/queue/"
+        module.CDN_URL = f"{base_url}/cdn"
+        module.REST_URL = f"{base_url}/rest"
+
+    class Finder(importlib.abc.MetaPathFinder):
+        def find_spec(self, name, path, target=None):
+            if name != "fal_client.client":
+                return None
+            spec = importlib.machinery.PathFinder.find_spec(name, path)
+            if spec is None or spec.loader is None:
+                return spec
+            exec_module = spec.loader.exec_module
+
+            def exec_and_patch(module):
+                exec_module(module)
+                patch(module)
+
+            spec.loader.exec_module = exec_and_patch
+            return spec
+
+    sys.meta_path.insert(0, Finder())
+
+
+if os.environ.get("FAL_MOCK_URL"):
+    _install(os.environ["FAL_MOCK_URL"])
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for fal_worker.py.
+
+The backend runs the worker as a fresh process per API call, so
+interpreter startup, imports, argument parsing and FalClient()
+construction add directly to request latency. This benchmark runs every
+subcommand with FAL_WORKER_DRY_RUN=1 (the worker exits right before its
+first network call) and reports:
+
+    - cold-start wall time per subcommand (min/median/max over --runs)
+    - bare interpreter startup, for reference
+    - the slowest top-level imports per subcommand (`-X importtime`)
+    - the import cost of fal_client itself, paid on the first API call
+
+Usage:
+    python benchmarks/startup_bench.py
+    python benchmarks/startup_bench.py --runs 10 --output startup.json
+    python benchmarks/startup_bench.py --baseline startup.json --tolerance 0.25
+
+With --baseline, exits 1 if any subcommand's median is slower than the
+baseline median by more than --tolerance (fraction), so regressions are
+caught in CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+WORKER = BACKEND_DIR / "src" / "services" / "fal_worker.py"
+
+# Minimal valid arguments per subcommand (serve/batch/webhook-serve are long-running)
+SAMPLE_URL = "https://example.com/a.jpg"
+SAMPLE_ARGS: Dict[str, List[str]] = {
+    "any-llm-complete": ["--prompt", "hi"],
+    "any-llm-enterprise": ["--prompt", "hi"],
+    "any-llm-stream": ["--prompt", "hi"],
+    "any-llm-submit": ["--prompt", "hi"],
+    "any-llm-status": ["--request_id", "bench"],
+    "any-llm-result": ["--request_id", "bench"],
+    "background": ["--image_url", SAMPLE_URL],
+    "background-submit": ["--image_url", SAMPLE_URL],
+    "background-status": ["--request_id", "bench"],
+    "background-result": ["--request_id", "bench"],
+    "wait": ["--request_id", "bench"],
+    "analyze-product": ["--image_url", SAMPLE_URL],
+    "analyze-product-batch": ["--image_urls", SAMPLE_URL, SAMPLE_URL],
+    "analyze-and-prompt": ["--image_url", SAMPLE_URL],
+    "analysis-cache": ["stats"],
+    "prompt-cache": ["stats"],
+    "phash-index": ["stats"],
+    "generate-bg-prompt": ["--categories", "{}", "--style_type", "studio"],
+    "generate-multiple-bg": ["--image_url", SAMPLE_URL, "--categories", "{}"],
+    "upload-file": ["--file_path", str(WORKER)],
+    "download": ["--urls", SAMPLE_URL],
+    "image-store": ["stats"],
+    "usage-report": [],
+    "admission": ["stats"],
+}
+
+
+def _bench_env() -> dict:
+    """Environment for benchmark runs: dry run, dummy key, isolated cache dir."""
+    env = dict(os.environ)
+    env["FAL_WORKER_DRY_RUN"] = "1"
+    env.setdefault("FAL_KEY", "benchmark-dummy-key")
+    env.setdefault("FAL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fotoraf-bench-cache"))
+    return env
+
+
+def time_command(argv: List[str], runs: int, env: dict) -> Dict[str, float]:
+    """Wall time of `argv` in milliseconds over `runs` fresh processes."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            argv,
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        if completed.returncode != 0:
+            raise RuntimeError(
+                f"{' '.join(argv)} exited with {completed.returncode}: "
+                f"{completed.stderr.decode(errors='replace')[-500:]}"
+            )
+        samples.append(elapsed)
+    return {
+        "min_ms": round(min(samples), 2),
+        "median_ms": round(statistics.median(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def import_breakdown(argv: List[str], env: dict, top: int) -> List[dict]:
+    """
+    Slowest top-level imports of one run, from `python -X importtime`.
+
+    Only top-level entries are kept (their cumulative time already
+    includes nested imports), sorted by cumulative time.
+    """
+    completed = subprocess.run(
+        [argv[0], "-X", "importtime"] + argv[1:],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    entries = []
+    for line in completed.stderr.decode(errors="replace").splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:   self | cumulative | <indent>module"
+        self_part, cumulative_part, raw_name = line.split("|", 2)
+        self_us = int(self_part.split(":", 1)[1].strip())
+        cumulative_us = int(cumulative_part.strip())
+        if raw_name.startswith("  "):
+            # Nested import (indented under its parent)
+            continue
+        entries.append({
+            "module": raw_name.strip(),
+            "self_ms": round(self_us / 1000, 2),
+            "cumulative_ms": round(cumulative_us / 1000, 2),
+        })
+    entries.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+    return entries[:top]
+
+
+def module_import_ms(module: str, env: dict) -> Optional[float]:
+    """Cumulative import time of one module in a fresh interpreter, or None if missing."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    if completed.returncode != 0:
+        return None
+    for line in reversed(completed.stderr.decode(errors="replace").splitlines()):
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return round(int(parts[1].strip()) / 1000, 2)
+    return None
+
+
+def run_benchmark(commands: List[str], runs: int, top: int) -> dict:
+    """Benchmark every requested subcommand and return the report dict."""
+    env = _bench_env()
+    report = {
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "interpreter": time_command([sys.executable, "-c", "pass"], runs, env),
+        "fal_client_import_ms": module_import_ms("fal_client", env),
+        "commands": {},
+    }
+
+    for command in commands:
+        argv = [sys.executable, str(WORKER), command] + SAMPLE_ARGS[command]
+        timing = time_command(argv, runs, env)
+        timing["overhead_ms"] = round(timing["median_ms"] - report["interpreter"]["median_ms"], 2)
+        timing["top_imports"] = import_breakdown(argv, env, top)
+        report["commands"][command] = timing
+        print(
+            f"{command:<22} median {timing['median_ms']:8.1f} ms  "
+            f"(+{timing['overhead_ms']:.1f} ms over bare interpreter)",
+            file=sys.stderr
+        )
+
+    return report
+
+
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Subcommands whose median exceeds the baseline median by more than `tolerance`."""
+    regressions = []
+    for command, timing in report["commands"].items():
+        previous = baseline.get("commands", {}).get(command)
+        if not previous:
+            continue
+        limit = previous["median_ms"] * (1 + tolerance)
+        if timing["median_ms"] > limit:
+            regressions.append(
+                f"{command}: {timing['median_ms']:.1f} ms > {limit:.1f} ms "
+                f"(baseline {previous['median_ms']:.1f} ms)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cold-start benchmark for fal_worker.py subcommands",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Runs per subcommand (default: 5)")
+    parser.add_argument("--top", type=int, default=10, help="Top imports to report (default: 10)")
+    parser.add_argument(
+        "--commands",
+        nargs="+",
+        choices=sorted(SAMPLE_ARGS),
+        default=list(SAMPLE_ARGS),
+        help="Subcommands to benchmark (default: all)"
+    )
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed median slowdown vs. baseline as a fraction (default: 0.25)"
+    )
+    args = parser.parse_args()
+
+    report = run_benchmark(args.commands, args.runs, args.top)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if regressions:
+        print("Startup regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
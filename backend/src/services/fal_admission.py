@@ -0,0 +1,671 @@
+"""
+Client-side admission control for FAL endpoints.
+
+Under bursty traffic every worker process (the Node API spawns one per
+request) used to fire its calls at fal-ai/any-llm and
+fal-ai/nano-banana/edit at once, which ends in 429s and long FAL queues.
+An AdmissionController sits in front of every call that starts work on
+an endpoint:
+
+    - a token bucket per endpoint limits the request rate (`rate` per
+      second, up to `burst` back to back after a quiet period)
+    - `max_concurrent` limits the calls in flight to the endpoint
+    - calls that cannot start right away wait in one of two lanes,
+      "interactive" (someone is waiting for the answer) and "bulk"
+      (batch jobs, catalog backfills); waiting interactive calls always
+      go first, and each lane is first come, first served
+    - each lane has a maximum queue length and a maximum wait; calls
+      beyond either are shed with AdmissionRejected instead of being sent
+
+Buckets, slots and queues live in a SQLite database next to the caches
+and are shared by all worker processes (like the caches and the usage
+ledger), so the limits hold per machine rather than per process. Slots
+and queue entries of processes that died are reclaimed.
+
+A call's lane is the one set with admission_lane() (a context variable,
+so it follows asyncio tasks and copied contexts), else the controller's
+default lane.
+
+Configuration (environment):
+    - FAL_ADMISSION: set to "0" to admit every call immediately
+    - FAL_ADMISSION_PATH: database file
+      (default: <FAL_CACHE_DIR>/fal_admission.sqlite3)
+    - FAL_ADMISSION_LIMITS: limits per endpoint, merged over
+      DEFAULT_LIMITS, as a JSON object or the path of a JSON file:
+      {"<endpoint>": {"rate": 10, "burst": 20, "max_concurrent": 16}, ...}
+      (null drops an endpoint's limits, a null field drops that limit)
+    - FAL_ADMISSION_LANES: queue limits per lane, merged over
+      DEFAULT_LANES: {"bulk": {"max_queue": 1000, "max_wait": 600}, ...}
+    - FAL_ADMISSION_LANE: default lane of the process (default: interactive)
+
+Example:
+    >>> controller = AdmissionController(default_admission_path())
+    >>> with admission_lane("bulk"):
+    ...     with controller.admit("fal-ai/any-llm") as ticket:
+    ...         result = fal_client.subscribe("fal-ai/any-llm", ...)
+    >>> ticket.as_dict()
+    {'lane': 'bulk', 'waited': 0.0}
+"""
+
+import contextvars
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+try:
+    from .fal_cache import _env_flag, _ImmediateTransaction, default_cache_dir
+except ImportError:
+    from fal_cache import _env_flag, _ImmediateTransaction, default_cache_dir
+
+
+# Lanes in priority order
+LANES = ("interactive", "bulk")
+
+DEFAULT_LIMITS: Dict[str, Dict[str, Any]] = {
+    "fal-ai/any-llm": {"rate": 10.0, "burst": 20, "max_concurrent": 16},
+    "fal-ai/any-llm/enterprise": {"rate": 5.0, "burst": 10, "max_concurrent": 8},
+    "fal-ai/nano-banana/edit": {"rate": 2.0, "burst": 4, "max_concurrent": 4},
+}
+
+DEFAULT_LANES: Dict[str, Dict[str, float]] = {
+    "interactive": {"max_queue": 64, "max_wait": 30.0},
+    "bulk": {"max_queue": 1000, "max_wait": 600.0},
+}
+
+# Seconds between admission attempts of a waiting call
+POLL_INTERVAL = 0.05
+
+# Slots held longer than this are treated as leaked by a hung process
+LEASE_SECONDS = 900.0
+
+_lane: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("fal_admission_lane", default=None)
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised instead of calling an endpoint whose queue is full or whose wait ran out."""
+
+    def __init__(self, endpoint: str, lane: str, reason: str, detail: str):
+        super().__init__(f"Admission rejected for {endpoint} ({lane} lane): {detail}")
+        self.endpoint = endpoint
+        self.lane = lane
+        self.reason = reason
+
+
+def current_lane() -> Optional[str]:
+    """Lane set for the current context, if any."""
+    return _lane.get()
+
+
+@contextmanager
+def admission_lane(lane: Optional[str]) -> Iterator[None]:
+    """Admit the calls made inside the block in `lane` (None keeps the current lane)."""
+    if lane is None:
+        yield
+        return
+    if lane not in LANES:
+        raise ValueError(f"Unknown admission lane {lane!r} (expected one of {', '.join(LANES)})")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def default_admission_path() -> str:
+    """Path of the admission database (FAL_ADMISSION_PATH or next to the caches)."""
+    return os.environ.get("FAL_ADMISSION_PATH") or os.path.join(
+        default_cache_dir(), "fal_admission.sqlite3"
+    )
+
+
+def _load_json(spec: Optional[str], what: str) -> Dict[str, Any]:
+    """A JSON object given inline or as a file path ({} when unset)."""
+    if not spec:
+        return {}
+    if not spec.lstrip().startswith("{"):
+        with open(spec, "r", encoding="utf-8") as f:
+            spec = f.read()
+    value = json.loads(spec)
+    if not isinstance(value, dict):
+        raise ValueError(f"Admission {what} must be a JSON object")
+    return value
+
+
+def load_limits(spec: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """DEFAULT_LIMITS with `spec` (default: FAL_ADMISSION_LIMITS) merged over them."""
+    limits = {endpoint: dict(limit) for endpoint, limit in DEFAULT_LIMITS.items()}
+    overrides = _load_json(os.environ.get("FAL_ADMISSION_LIMITS") if spec is None else spec, "limits")
+    for endpoint, limit in overrides.items():
+        if limit is None:
+            limits.pop(endpoint, None)
+        else:
+            limits[endpoint] = {**limits.get(endpoint, {}), **limit}
+    return limits
+
+
+def load_lanes(spec: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """DEFAULT_LANES with `spec` (default: FAL_ADMISSION_LANES) merged over them."""
+    overrides = _load_json(os.environ.get("FAL_ADMISSION_LANES") if spec is None else spec, "lanes")
+    unknown = set(overrides) - set(LANES)
+    if unknown:
+        raise ValueError(f"Unknown admission lane(s): {', '.join(sorted(unknown))}")
+    return {lane: {**DEFAULT_LANES[lane], **(overrides.get(lane) or {})} for lane in LANES}
+
+
+class EndpointLimit:
+    """Token bucket and concurrency limit of one endpoint (None: unlimited)."""
+
+    def __init__(
+        self,
+        *,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrent: Optional[int] = None
+    ):
+        if rate is not None and rate <= 0:
+            raise ValueError("rate must be positive (or None for no rate limit)")
+        if max_concurrent is not None and max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1 (or None for no limit)")
+        self.rate = float(rate) if rate is not None else None
+        self.burst = max(1.0, float(burst if burst is not None else (rate or 1.0)))
+        self.max_concurrent = int(max_concurrent) if max_concurrent is not None else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"rate": self.rate, "burst": self.burst, "max_concurrent": self.max_concurrent}
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill(pid, 0) terminates processes on Windows; rely on lease age there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class AdmissionTicket:
+    """A granted slot; release() (or leaving admit()) frees it."""
+
+    def __init__(self, controller: "AdmissionController", endpoint: str, lane: str, slot: int, waited: float):
+        self.controller = controller
+        self.endpoint = endpoint
+        self.lane = lane
+        self.slot = slot
+        self.waited = waited
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"lane": self.lane, "waited": round(self.waited, 4)}
+
+
+class AdmissionController:
+    """
+    Per-endpoint token buckets, concurrency slots and lane queues.
+
+    Safe to share between threads (one connection per thread) and between
+    processes (SQLite WAL + locking), like SqliteCache.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        limits: Optional[Dict[str, Dict[str, Any]]] = None,
+        lanes: Optional[Dict[str, Dict[str, float]]] = None,
+        default_lane: str = "interactive",
+        metrics: Optional[Any] = None,
+        poll_interval: float = POLL_INTERVAL,
+        lease_seconds: float = LEASE_SECONDS
+    ):
+        """
+        Args:
+            path: SQLite database file (created with its directory if missing)
+            limits: {endpoint: {"rate", "burst", "max_concurrent"}}; endpoints
+                without limits are admitted immediately (default: DEFAULT_LIMITS)
+            lanes: {lane: {"max_queue", "max_wait"}} (default: DEFAULT_LANES)
+            default_lane: Lane of calls made outside admission_lane()
+            metrics: MetricsRegistry receiving wait times, outcomes and
+                queue depths
+            poll_interval: Seconds between admission attempts while waiting
+            lease_seconds: Age after which a slot is reclaimed even if its
+                process is still alive
+        """
+        if default_lane not in LANES:
+            raise ValueError(f"Unknown admission lane {default_lane!r}")
+        self.path = path
+        self.limits = {
+            endpoint: EndpointLimit(**limit)
+            for endpoint, limit in (DEFAULT_LIMITS if limits is None else limits).items()
+            if limit is not None
+        }
+        self.lanes = {lane: {**DEFAULT_LANES[lane], **((lanes or {}).get(lane) or {})} for lane in LANES}
+        self.default_lane = default_lane
+        self.metrics = metrics
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._host = socket.gethostname()
+        self._local = threading.local()
+        # Wakes this process's waiters as soon as one of its slots is freed
+        self._released = threading.Condition()
+        self._reaped_at = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._write() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS admission_buckets ("
+                "endpoint TEXT PRIMARY KEY, "
+                "tokens REAL NOT NULL, "
+                "updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS admission_slots ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "endpoint TEXT NOT NULL, "
+                "lane TEXT NOT NULL, "
+                "host TEXT NOT NULL, "
+                "pid INTEGER NOT NULL, "
+                "acquired REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS admission_slots_endpoint ON admission_slots (endpoint)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS admission_waiters ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "endpoint TEXT NOT NULL, "
+                "lane TEXT NOT NULL, "
+                "rank INTEGER NOT NULL, "
+                "host TEXT NOT NULL, "
+                "pid INTEGER NOT NULL, "
+                "enqueued REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS admission_waiters_order ON admission_waiters (endpoint, rank, id)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS admission_counters ("
+                "endpoint TEXT NOT NULL, "
+                "lane TEXT NOT NULL, "
+                "admitted INTEGER NOT NULL DEFAULT 0, "
+                "waited INTEGER NOT NULL DEFAULT 0, "
+                "queue_full INTEGER NOT NULL DEFAULT 0, "
+                "timeouts INTEGER NOT NULL DEFAULT 0, "
+                "wait_seconds REAL NOT NULL DEFAULT 0, "
+                "max_wait REAL NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (endpoint, lane))"
+            )
+
+    @classmethod
+    def from_env(cls, *, metrics: Optional[Any] = None) -> Optional["AdmissionController"]:
+        """Controller configured by FAL_ADMISSION_*, or None if FAL_ADMISSION=0."""
+        if not _env_flag("FAL_ADMISSION"):
+            return None
+        return cls(
+            default_admission_path(),
+            limits=load_limits(),
+            lanes=load_lanes(),
+            default_lane=os.environ.get("FAL_ADMISSION_LANE") or "interactive",
+            metrics=metrics
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection in WAL mode."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _ImmediateTransaction(self._connection())
+
+    def _lane_of(self, lane: Optional[str]) -> str:
+        lane = lane or current_lane() or self.default_lane
+        if lane not in LANES:
+            raise ValueError(f"Unknown admission lane {lane!r} (expected one of {', '.join(LANES)})")
+        return lane
+
+    @staticmethod
+    def _tokens(conn: sqlite3.Connection, endpoint: str, limit: EndpointLimit, now: float) -> float:
+        """Tokens in the endpoint's bucket at `now` (refilled since the last grant)."""
+        if limit.rate is None:
+            return limit.burst
+        row = conn.execute(
+            "SELECT tokens, updated FROM admission_buckets WHERE endpoint = ?", (endpoint,)
+        ).fetchone()
+        if row is None:
+            return limit.burst
+        return min(limit.burst, row[0] + max(0.0, now - row[1]) * limit.rate)
+
+    def _reap(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop slots and queue entries of dead processes (at most once a second)."""
+        if now - self._reaped_at < 1.0:
+            return
+        self._reaped_at = now
+        stale_slots = [
+            (row_id,)
+            for row_id, host, pid, acquired in conn.execute(
+                "SELECT id, host, pid, acquired FROM admission_slots"
+            ).fetchall()
+            if now - acquired > self.lease_seconds or self._dead(host, pid)
+        ]
+        stale_waiters = [
+            (row_id,)
+            for row_id, lane, host, pid, enqueued in conn.execute(
+                "SELECT id, lane, host, pid, enqueued FROM admission_waiters"
+            ).fetchall()
+            if now - enqueued > self.lanes.get(lane, DEFAULT_LANES["bulk"])["max_wait"] + 60.0
+            or self._dead(host, pid)
+        ]
+        conn.executemany("DELETE FROM admission_slots WHERE id = ?", stale_slots)
+        conn.executemany("DELETE FROM admission_waiters WHERE id = ?", stale_waiters)
+
+    def _dead(self, host: str, pid: int) -> bool:
+        """True for rows of a process on this host that no longer exists."""
+        return host == self._host and not _pid_alive(pid)
+
+    def _count(self, conn: sqlite3.Connection, endpoint: str, lane: str, column: str) -> None:
+        conn.execute(
+            "INSERT OR IGNORE INTO admission_counters (endpoint, lane) VALUES (?, ?)", (endpoint, lane)
+        )
+        conn.execute(
+            f"UPDATE admission_counters SET {column} = {column} + 1 WHERE endpoint = ? AND lane = ?",
+            (endpoint, lane)
+        )
+
+    def _try_admit(
+        self,
+        endpoint: str,
+        limit: EndpointLimit,
+        lane: str,
+        waiter: Optional[int],
+        waited: float
+    ) -> Tuple[Optional[int], Optional[int], float]:
+        """
+        One admission attempt. Returns (slot id, None, 0) when admitted,
+        else (None, waiter id, seconds until the next attempt is worth
+        making); (None, None, 0) when the lane's queue is full.
+        """
+        now = time.time()
+        rank = LANES.index(lane)
+        with self._write() as conn:
+            if waiter is None:
+                ahead = conn.execute(
+                    "SELECT COUNT(*) FROM admission_waiters WHERE endpoint = ? AND rank <= ?",
+                    (endpoint, rank)
+                ).fetchone()[0]
+            else:
+                ahead = conn.execute(
+                    "SELECT COUNT(*) FROM admission_waiters "
+                    "WHERE endpoint = ? AND (rank < ? OR (rank = ? AND id < ?))",
+                    (endpoint, rank, rank, waiter)
+                ).fetchone()[0]
+            in_flight = conn.execute(
+                "SELECT COUNT(*) FROM admission_slots WHERE endpoint = ?", (endpoint,)
+            ).fetchone()[0]
+            tokens = self._tokens(conn, endpoint, limit, now)
+            full = limit.max_concurrent is not None and in_flight >= limit.max_concurrent
+
+            if ahead or full or tokens < 1:
+                # Whoever blocks us may be a crashed process
+                self._reap(conn, now)
+                if waiter is None:
+                    depth = conn.execute(
+                        "SELECT COUNT(*) FROM admission_waiters WHERE endpoint = ? AND lane = ?",
+                        (endpoint, lane)
+                    ).fetchone()[0]
+                    if depth >= self.lanes[lane]["max_queue"]:
+                        self._count(conn, endpoint, lane, "queue_full")
+                        return None, None, 0.0
+                    waiter = conn.execute(
+                        "INSERT INTO admission_waiters (endpoint, lane, rank, host, pid, enqueued) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (endpoint, lane, rank, self._host, os.getpid(), now)
+                    ).lastrowid
+                delay = self.poll_interval
+                if not ahead and not full and limit.rate is not None:
+                    delay = max(delay, (1 - tokens) / limit.rate)
+                return None, waiter, delay
+
+            if limit.rate is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO admission_buckets (endpoint, tokens, updated) VALUES (?, ?, ?)",
+                    (endpoint, tokens - 1, now)
+                )
+            slot = conn.execute(
+                "INSERT INTO admission_slots (endpoint, lane, host, pid, acquired) VALUES (?, ?, ?, ?, ?)",
+                (endpoint, lane, self._host, os.getpid(), now)
+            ).lastrowid
+            self._count(conn, endpoint, lane, "admitted")
+            if waiter is not None:
+                conn.execute("DELETE FROM admission_waiters WHERE id = ?", (waiter,))
+                conn.execute(
+                    "UPDATE admission_counters SET waited = waited + 1, wait_seconds = wait_seconds + ?, "
+                    "max_wait = MAX(max_wait, ?) WHERE endpoint = ? AND lane = ?",
+                    (waited, waited, endpoint, lane)
+                )
+            return slot, None, 0.0
+
+    def _leave(self, endpoint: str, lane: str, waiter: int, timed_out: bool) -> None:
+        """Remove a waiter that gave up (counted as a timeout if it ran out of time)."""
+        with self._write() as conn:
+            conn.execute("DELETE FROM admission_waiters WHERE id = ?", (waiter,))
+            if timed_out:
+                self._count(conn, endpoint, lane, "timeouts")
+
+    def _release(self, ticket: AdmissionTicket) -> None:
+        with self._write() as conn:
+            conn.execute("DELETE FROM admission_slots WHERE id = ?", (ticket.slot,))
+        with self._released:
+            self._released.notify_all()
+        self._observe_depth(ticket.endpoint)
+
+    def _rejected(self, endpoint: str, lane: str, reason: str, waited: float) -> AdmissionRejected:
+        settings = self.lanes[lane]
+        if reason == "queue_full":
+            detail = f"{int(settings['max_queue'])} calls already waiting, shedding instead of queueing"
+        else:
+            detail = f"no slot within {waited:.1f}s (max_wait {settings['max_wait']:g}s)"
+        self._observe(endpoint, lane, reason, waited)
+        return AdmissionRejected(endpoint, lane, reason, detail)
+
+    def _observe(self, endpoint: str, lane: str, outcome: str, waited: float) -> None:
+        if self.metrics is None:
+            return
+        labels = {"endpoint": endpoint, "lane": lane}
+        self.metrics.inc(
+            "fal_admission_total", {**labels, "outcome": outcome},
+            help_text="Admission decisions by outcome (admitted, queue_full, timeout)"
+        )
+        if outcome == "admitted":
+            self.metrics.observe(
+                "fal_admission_wait_seconds", waited, labels,
+                help_text="Time calls waited for admission"
+            )
+        self._observe_depth(endpoint)
+
+    def _observe_depth(self, endpoint: str) -> None:
+        """Refresh the queue depth and in-flight gauges of `endpoint`."""
+        if self.metrics is None:
+            return
+        snapshot = self._snapshot(endpoint)
+        for lane in LANES:
+            self.metrics.gauge(
+                "fal_admission_queue_depth", snapshot["queued"][lane], {"endpoint": endpoint, "lane": lane},
+                help_text="Calls waiting for admission (all worker processes)"
+            )
+        self.metrics.gauge(
+            "fal_admission_in_flight", snapshot["in_flight"], {"endpoint": endpoint},
+            help_text="Admitted calls in flight (all worker processes)"
+        )
+
+    def acquire(self, endpoint: str, lane: Optional[str] = None) -> Optional[AdmissionTicket]:
+        """
+        Wait for a slot of `endpoint` in `lane` (default: the context's lane).
+
+        Returns None for endpoints without limits. Raises AdmissionRejected
+        when the lane's queue is full or max_wait passes without a slot.
+        """
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return None
+        lane = self._lane_of(lane)
+        started = time.monotonic()
+        deadline = started + self.lanes[lane]["max_wait"]
+        waiter = None
+        try:
+            while True:
+                waited = time.monotonic() - started
+                slot, waiter, delay = self._try_admit(endpoint, limit, lane, waiter, waited)
+                if slot is not None:
+                    self._observe(endpoint, lane, "admitted", waited)
+                    return AdmissionTicket(self, endpoint, lane, slot, waited)
+                if waiter is None:
+                    raise self._rejected(endpoint, lane, "queue_full", waited)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._leave(endpoint, lane, waiter, True)
+                    waiter = None
+                    raise self._rejected(endpoint, lane, "timeout", time.monotonic() - started)
+                with self._released:
+                    self._released.wait(min(delay, remaining))
+        finally:
+            if waiter is not None:
+                # Interrupted while queued
+                self._leave(endpoint, lane, waiter, False)
+
+    async def acquire_async(self, endpoint: str, lane: Optional[str] = None) -> Optional[AdmissionTicket]:
+        """Async version of acquire(); the database is only touched in worker threads."""
+        import asyncio
+
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return None
+        lane = self._lane_of(lane)
+        started = time.monotonic()
+        deadline = started + self.lanes[lane]["max_wait"]
+        waiter = None
+        try:
+            while True:
+                waited = time.monotonic() - started
+                slot, waiter, delay = await asyncio.to_thread(
+                    self._try_admit, endpoint, limit, lane, waiter, waited
+                )
+                if slot is not None:
+                    self._observe(endpoint, lane, "admitted", waited)
+                    return AdmissionTicket(self, endpoint, lane, slot, waited)
+                if waiter is None:
+                    raise self._rejected(endpoint, lane, "queue_full", waited)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    await asyncio.to_thread(self._leave, endpoint, lane, waiter, True)
+                    waiter = None
+                    raise self._rejected(endpoint, lane, "timeout", time.monotonic() - started)
+                await asyncio.sleep(min(delay, remaining))
+        finally:
+            if waiter is not None:
+                # Cancelled while queued; runs inline so a second cancellation cannot skip it
+                self._leave(endpoint, lane, waiter, False)
+
+    @contextmanager
+    def admit(self, endpoint: str, lane: Optional[str] = None) -> Iterator[Optional[AdmissionTicket]]:
+        """Hold a slot of `endpoint` for the block (see acquire)."""
+        ticket = self.acquire(endpoint, lane)
+        try:
+            yield ticket
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    @asynccontextmanager
+    async def admit_async(self, endpoint: str, lane: Optional[str] = None) -> AsyncIterator[Optional[AdmissionTicket]]:
+        """Async version of admit()."""
+        import asyncio
+
+        ticket = await self.acquire_async(endpoint, lane)
+        try:
+            yield ticket
+        finally:
+            if ticket is not None:
+                await asyncio.to_thread(ticket.release)
+
+    def _snapshot(self, endpoint: str) -> Dict[str, Any]:
+        conn = self._connection()
+        queued = dict.fromkeys(LANES, 0)
+        queued.update(conn.execute(
+            "SELECT lane, COUNT(*) FROM admission_waiters WHERE endpoint = ? GROUP BY lane", (endpoint,)
+        ).fetchall())
+        in_flight = conn.execute(
+            "SELECT COUNT(*) FROM admission_slots WHERE endpoint = ?", (endpoint,)
+        ).fetchone()[0]
+        return {"in_flight": in_flight, "queued": queued}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Limits, current bucket level, slots in flight, queue depth and
+        counters (admitted, waited, shed, wait times) per endpoint and lane,
+        across all processes sharing the database.
+        """
+        conn = self._connection()
+        now = time.time()
+        counters: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for endpoint, lane, admitted, waited, queue_full, timeouts, wait_seconds, max_wait in conn.execute(
+            "SELECT endpoint, lane, admitted, waited, queue_full, timeouts, wait_seconds, max_wait "
+            "FROM admission_counters"
+        ).fetchall():
+            counters.setdefault(endpoint, {})[lane] = {
+                "admitted": admitted,
+                "waited": waited,
+                "shed": {"queue_full": queue_full, "timeout": timeouts},
+                "mean_wait": round(wait_seconds / waited, 4) if waited else 0.0,
+                "max_wait": round(max_wait, 4)
+            }
+
+        endpoints = {}
+        for endpoint in sorted(set(self.limits) | set(counters)):
+            limit = self.limits.get(endpoint)
+            snapshot = self._snapshot(endpoint)
+            endpoints[endpoint] = {
+                "limits": limit.as_dict() if limit else None,
+                "tokens": round(self._tokens(conn, endpoint, limit, now), 3) if limit else None,
+                "in_flight": snapshot["in_flight"],
+                "queued": snapshot["queued"],
+                "lanes": counters.get(endpoint, {})
+            }
+        return {
+            "path": self.path,
+            "default_lane": self.default_lane,
+            "lanes": self.lanes,
+            "endpoints": endpoints
+        }
+
+    def reset(self) -> Dict[str, int]:
+        """Clear the counters and reclaim slots and queue entries of dead processes."""
+        with self._write() as conn:
+            cleared = conn.execute("DELETE FROM admission_counters").rowcount
+            before = sum(
+                conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("admission_slots", "admission_waiters")
+            )
+            self._reaped_at = 0.0
+            self._reap(conn, time.time())
+            after = sum(
+                conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("admission_slots", "admission_waiters")
+            )
+        return {"counters_cleared": cleared, "reclaimed": before - after}
@@ -0,0 +1,309 @@
+"""
+Persistent local caches for FAL results.
+
+A small SQLite-backed key/value store (WAL mode) that several worker
+processes can share safely: readers never block writers, writes go
+through `BEGIN IMMEDIATE` transactions, and `busy_timeout` makes
+concurrent writers wait instead of failing.
+
+Caches (see DEFAULT_CACHES):
+    - uploads: file SHA-256 -> FAL CDN URL
+    - analysis: (image SHA-256, model, temperature, prompt version) -> categories
+    - image_hashes: remote image URL -> content SHA-256 (and perceptual hash,
+      see fal_phash)
+    - backgrounds: (image SHA-256, prompt) -> background_replace result,
+      for calls made with reuse=True
+    - webhook_results: queue request id -> webhook completion (see fal_webhook)
+
+Configuration (environment), with <PREFIX> the cache's env prefix:
+    - FAL_CACHE_DIR: directory holding the cache database
+      (default: ~/.cache/fotoraf)
+    - <PREFIX>: set to "0" to disable that cache (e.g. FAL_UPLOAD_CACHE=0)
+    - <PREFIX>_TTL: TTL in seconds
+    - <PREFIX>_MAX_ENTRIES: size bound
+
+Example:
+    >>> cache = SqliteCache(default_cache_path(), "uploads", ttl_seconds=3600)
+    >>> cache.set("abc", {"url": "https://fal.media/files/..."})
+    >>> cache.get("abc")["url"]
+    >>> cache.stats()["hits"]
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+# name -> (env prefix, default TTL seconds, default max entries)
+DEFAULT_CACHES = {
+    "uploads": ("FAL_UPLOAD_CACHE", 86400, 10000),
+    "analysis": ("FAL_ANALYSIS_CACHE", 7 * 86400, 50000),
+    "image_hashes": ("FAL_IMAGE_HASH_CACHE", 30 * 86400, 100000),
+    "backgrounds": ("FAL_BACKGROUND_CACHE", 7 * 86400, 50000),
+    "webhook_results": ("FAL_WEBHOOK_STORE", 7 * 86400, 100000),
+}
+
+
+def default_cache_dir() -> str:
+    """Directory for local cache files (FAL_CACHE_DIR or ~/.cache/fotoraf)."""
+    return os.environ.get("FAL_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "fotoraf"
+    )
+
+
+def default_cache_path() -> str:
+    """Path of the shared cache database."""
+    return os.path.join(default_cache_dir(), "fal_cache.sqlite3")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def url_sha256(url: str, chunk_size: int = 1024 * 1024, timeout: float = 30) -> str:
+    """SHA-256 hex digest of a remote file, streamed without buffering it whole."""
+    import requests
+
+    digest = hashlib.sha256()
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _env_flag(name: str, default: bool = True) -> bool:
+    """Read a boolean environment flag ("0"/"false"/"no" disable)."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off", "")
+
+
+class SqliteCache:
+    """
+    JSON key/value cache stored in one SQLite table.
+
+    Entries expire `ttl_seconds` after they were written, and the table
+    is bounded to `max_entries` by evicting the least recently used rows.
+    Hit/miss counters are persisted too, so stats cover every process.
+    Safe to share between threads (one connection per thread) and between
+    processes (SQLite WAL + locking).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str,
+        *,
+        ttl_seconds: Optional[float] = 86400,
+        max_entries: Optional[int] = 10000
+    ):
+        """
+        Args:
+            path: SQLite database file (created with its directory if missing)
+            table: Table name for this cache (several caches may share one file)
+            ttl_seconds: Entry lifetime; None disables expiry
+            max_entries: Maximum rows kept; None disables eviction
+        """
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        with self._write() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at "
+                f"ON {self.table} (accessed_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_counters ("
+                "name TEXT PRIMARY KEY, "
+                "hits INTEGER NOT NULL DEFAULT 0, "
+                "misses INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_counters (name) VALUES (?)",
+                (self.table,)
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection in WAL mode."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        """Context manager for a write transaction holding the database write lock."""
+        return _ImmediateTransaction(self._connection())
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None if missing or expired."""
+        now = time.time()
+        row = self._connection().execute(
+            f"SELECT value, created_at FROM {self.table} WHERE key = ?",
+            (key,)
+        ).fetchone()
+
+        with self._write() as conn:
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._count(conn, "misses")
+                return None
+
+            conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                (now, key)
+            )
+            self._count(conn, "hits")
+
+        return json.loads(row[0])
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Like get(), but read-only: no counters, no LRU touch (for polling)."""
+        row = self._connection().execute(
+            f"SELECT value, created_at FROM {self.table} WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None or self._expired(row[1], time.time()):
+            return None
+        return json.loads(row[0])
+
+    def _count(self, conn: sqlite3.Connection, column: str) -> None:
+        conn.execute(
+            f"UPDATE cache_counters SET {column} = {column} + 1 WHERE name = ?",
+            (self.table,)
+        )
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value and evict old entries if over the bound."""
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(conn, now)
+
+    def delete(self, key: str) -> bool:
+        """Remove one entry. Returns True if it existed."""
+        with self._write() as conn:
+            cursor = conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            return cursor.rowcount > 0
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Remove every entry whose key starts with `prefix`. Returns rows deleted."""
+        with self._write() as conn:
+            return conn.execute(
+                f"DELETE FROM {self.table} WHERE substr(key, 1, ?) = ?",
+                (len(prefix), prefix)
+            ).rowcount
+
+    def clear(self) -> int:
+        """Remove every entry and reset counters. Returns the number of rows deleted."""
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE cache_counters SET hits = 0, misses = 0 WHERE name = ?",
+                (self.table,)
+            )
+            return conn.execute(f"DELETE FROM {self.table}").rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count plus hit/miss counters accumulated across processes."""
+        conn = self._connection()
+        entries = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        hits, misses = conn.execute(
+            "SELECT hits, misses FROM cache_counters WHERE name = ?",
+            (self.table,)
+        ).fetchone()
+        lookups = hits + misses
+        return {
+            "cache": self.table,
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries
+        }
+
+    def __len__(self) -> int:
+        return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then least recently used rows beyond max_entries."""
+        if self.ttl_seconds is not None:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?",
+                (now - self.ttl_seconds,)
+            )
+        if self.max_entries is not None:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+class _ImmediateTransaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK around a block."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+
+
+def open_default_cache(name: str) -> Optional[SqliteCache]:
+    """Open one of DEFAULT_CACHES configured from the environment, or None if disabled."""
+    prefix, ttl_seconds, max_entries = DEFAULT_CACHES[name]
+    if not _env_flag(prefix):
+        return None
+    return SqliteCache(
+        default_cache_path(),
+        name,
+        ttl_seconds=float(os.environ.get(f"{prefix}_TTL", ttl_seconds)),
+        max_entries=int(os.environ.get(f"{prefix}_MAX_ENTRIES", max_entries))
+    )
@@ -0,0 +1,482 @@
+"""
+Pooled downloads of generated images into a bounded local store.
+
+background_replace and generate_multiple_backgrounds return fal.media
+URLs; every consumer that needs the pixels (export, thumbnails, re-use as
+an input) would otherwise fetch them again over the internet.
+ImageDownloader fetches them once, concurrently, over one keep-alive
+connection pool, and ImageStore keeps the bytes on disk:
+
+    - content-addressed: blobs are named by their SHA-256, so the same
+      image behind several URLs is stored once
+    - bounded: the total size is capped at max_bytes by evicting the least
+      recently used blobs
+    - revalidated: entries older than revalidate_after are re-checked with
+      a conditional GET (If-None-Match / If-Modified-Since); a 304 costs no
+      body transfer
+
+Layout of the store directory:
+    <dir>/objects/ab/abcdef....jpg   blobs
+    <dir>/tmp/                       partial downloads (renamed into place)
+    <dir>/index.sqlite3              URL -> blob index, sizes, LRU order
+
+The index is SQLite in WAL mode (see fal_cache), so several worker
+processes can share one store.
+
+Configuration (environment):
+    - FAL_IMAGE_STORE_DIR: store directory (default: <FAL_CACHE_DIR>/images)
+    - FAL_IMAGE_STORE_MAX_BYTES: size bound (default: 2 GiB)
+    - FAL_IMAGE_STORE_REVALIDATE: seconds before an entry is re-checked
+      (default: 86400)
+    - FAL_DOWNLOAD_WORKERS: concurrent downloads / pooled connections
+      (default: 8)
+
+Example:
+    >>> downloader = ImageDownloader.from_env()
+    >>> files = downloader.fetch_many([img["url"] for img in result["images"]])
+    >>> files[0]["path"]
+    '/home/me/.cache/fotoraf/images/objects/3f/3fa2....png'
+"""
+
+import hashlib
+import mimetypes
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+try:
+    from .fal_cache import _ImmediateTransaction, default_cache_dir
+    from .fal_singleflight import SingleFlight
+except ImportError:
+    from fal_cache import _ImmediateTransaction, default_cache_dir
+    from fal_singleflight import SingleFlight
+
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+def default_store_dir() -> str:
+    """Directory of the image store (FAL_IMAGE_STORE_DIR or <cache dir>/images)."""
+    return os.environ.get("FAL_IMAGE_STORE_DIR") or os.path.join(default_cache_dir(), "images")
+
+
+def _extension(url: str, content_type: Optional[str]) -> str:
+    """File extension for a blob, from its content type or else its URL."""
+    if content_type:
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if extension:
+            return ".jpg" if extension == ".jpe" else extension
+    suffix = os.path.splitext(urlparse(url).path)[1].lower()
+    return suffix if 1 < len(suffix) <= 6 else ""
+
+
+class ImageStore:
+    """
+    Content-addressed files on disk with an LRU byte bound.
+
+    Safe to share between threads (one index connection per thread) and
+    between processes (SQLite WAL + locking; blobs are written to a temp
+    file and renamed into place).
+    """
+
+    def __init__(self, directory: Optional[str] = None, *, max_bytes: Optional[int] = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            directory: Store directory, created if missing (default: default_store_dir())
+            max_bytes: Total size bound; None disables eviction
+        """
+        self.directory = os.path.abspath(directory or default_store_dir())
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(self.directory, "tmp")
+        self._local = threading.local()
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        with self._write() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, "
+                "size INTEGER NOT NULL, "
+                "extension TEXT NOT NULL, "
+                "content_type TEXT, "
+                "created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_accessed_at ON blobs (accessed_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "url TEXT PRIMARY KEY, "
+                "sha256 TEXT NOT NULL, "
+                "etag TEXT, "
+                "last_modified TEXT, "
+                "validated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS urls_sha256 ON urls (sha256)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection in WAL mode."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self.directory, "index.sqlite3"), timeout=30, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        """Context manager for a write transaction holding the index write lock."""
+        return _ImmediateTransaction(self._connection())
+
+    def blob_path(self, sha256: str, extension: str = "") -> str:
+        """Path of the blob with digest `sha256`."""
+        return os.path.join(self.directory, "objects", sha256[:2], sha256 + extension)
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Stored entry of `url`, or None.
+
+        Returns:
+            {"path", "sha256", "bytes", "content_type", "etag",
+             "last_modified", "validated_at"}. Entries whose blob was removed
+            from disk are dropped and reported as missing.
+        """
+        row = self._connection().execute(
+            "SELECT u.sha256, u.etag, u.last_modified, u.validated_at, "
+            "b.size, b.extension, b.content_type "
+            "FROM urls u JOIN blobs b ON b.sha256 = u.sha256 WHERE u.url = ?",
+            (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        sha256, etag, last_modified, validated_at, size, extension, content_type = row
+        path = self.blob_path(sha256, extension)
+        if not os.path.exists(path):
+            with self._write() as conn:
+                conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+                conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            return None
+        return {
+            "path": path,
+            "sha256": sha256,
+            "bytes": size,
+            "content_type": content_type,
+            "etag": etag,
+            "last_modified": last_modified,
+            "validated_at": validated_at
+        }
+
+    def touch(self, url: str, sha256: str, *, validated: bool = False) -> None:
+        """Mark a blob as recently used (and its URL as just revalidated)."""
+        now = time.time()
+        with self._write() as conn:
+            conn.execute("UPDATE blobs SET accessed_at = ? WHERE sha256 = ?", (now, sha256))
+            if validated:
+                conn.execute("UPDATE urls SET validated_at = ? WHERE url = ?", (now, url))
+
+    def new_temp_file(self) -> tuple:
+        """(file object, path) of a new partial download inside the store."""
+        fd, path = tempfile.mkstemp(prefix="download-", dir=self.tmp_dir)
+        return os.fdopen(fd, "wb"), path
+
+    def put(
+        self,
+        url: str,
+        temp_path: str,
+        sha256: str,
+        *,
+        content_type: Optional[str] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Move a finished download into the store and index it under `url`.
+
+        Args:
+            url: URL the content was downloaded from
+            temp_path: File from new_temp_file(), consumed by this call
+            sha256: Hex digest of the file's content
+            content_type / etag / last_modified: Response headers
+
+        Returns:
+            Same dict as lookup()
+        """
+        size = os.path.getsize(temp_path)
+        extension = _extension(url, content_type)
+        path = self.blob_path(sha256, extension)
+        if os.path.exists(path):
+            # Same content under another URL (or a concurrent download)
+            os.unlink(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO blobs (sha256, size, extension, content_type, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET accessed_at = excluded.accessed_at",
+                (sha256, size, extension, content_type, now, now)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, etag, last_modified, validated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, sha256, etag, last_modified, now)
+            )
+            evicted = self._evict(conn, keep=sha256)
+        self._unlink_blobs(evicted)
+
+        return {
+            "path": path,
+            "sha256": sha256,
+            "bytes": size,
+            "content_type": content_type,
+            "etag": etag,
+            "last_modified": last_modified,
+            "validated_at": now
+        }
+
+    def _evict(self, conn: sqlite3.Connection, *, keep: Optional[str] = None) -> List[str]:
+        """Drop least recently used blobs until the store fits max_bytes; returns their paths."""
+        if self.max_bytes is None:
+            return []
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        evicted = []
+        if total <= self.max_bytes:
+            return evicted
+        for sha256, size, extension in conn.execute(
+            "SELECT sha256, size, extension FROM blobs WHERE sha256 != ? ORDER BY accessed_at",
+            (keep or "",)
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            evicted.append(self.blob_path(sha256, extension))
+            total -= size
+        return evicted
+
+    def _unlink_blobs(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> int:
+        """Remove every blob. Returns the number of blobs deleted."""
+        with self._write() as conn:
+            rows = conn.execute("SELECT sha256, extension FROM blobs").fetchall()
+            conn.execute("DELETE FROM urls")
+            conn.execute("DELETE FROM blobs")
+        self._unlink_blobs(self.blob_path(sha256, extension) for sha256, extension in rows)
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """Blob/URL counts and total size."""
+        conn = self._connection()
+        blobs, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        urls = conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+        return {
+            "directory": self.directory,
+            "blobs": blobs,
+            "urls": urls,
+            "bytes": total,
+            "max_bytes": self.max_bytes
+        }
+
+
+class ImageDownloader:
+    """
+    Fetches URLs into an ImageStore over a pooled keep-alive session.
+
+    Identical URLs requested concurrently are downloaded once. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        store: Optional[ImageStore] = None,
+        *,
+        max_workers: int = 8,
+        timeout: float = 60,
+        revalidate_after: Optional[float] = 86400,
+        chunk_size: int = 256 * 1024
+    ):
+        """
+        Args:
+            store: Where files are kept (default: ImageStore() in default_store_dir())
+            max_workers: Concurrent downloads in fetch_many, and the
+                connection pool size per host
+            timeout: Connect/read timeout per request in seconds
+            revalidate_after: Age in seconds after which a stored URL is
+                re-checked with a conditional GET; None never re-checks
+            chunk_size: Bytes read per chunk while streaming to disk
+        """
+        self.store = store or ImageStore()
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.revalidate_after = revalidate_after
+        self.chunk_size = chunk_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._counters = {"hits": 0, "revalidated": 0, "downloads": 0, "bytes_downloaded": 0, "errors": 0}
+        self._counters_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ImageDownloader":
+        """Downloader and store configured by FAL_IMAGE_STORE_* and FAL_DOWNLOAD_WORKERS."""
+        revalidate_after = float(os.environ.get("FAL_IMAGE_STORE_REVALIDATE", 86400))
+        return cls(
+            ImageStore(max_bytes=int(os.environ.get("FAL_IMAGE_STORE_MAX_BYTES", DEFAULT_MAX_BYTES))),
+            max_workers=int(os.environ.get("FAL_DOWNLOAD_WORKERS", 8)),
+            revalidate_after=revalidate_after if revalidate_after >= 0 else None
+        )
+
+    def _get_session(self):
+        """requests.Session with a connection pool sized for max_workers, created on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    from urllib3.util.retry import Retry
+
+                    retry = Retry(
+                        total=3,
+                        backoff_factor=0.3,
+                        status_forcelist=(429, 500, 502, 503, 504),
+                        allowed_methods=frozenset(["GET"])
+                    )
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers, max_retries=retry)
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._counters_lock:
+            self._counters[name] += value
+
+    def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        Local copy of `url`, downloading it unless the store has it.
+
+        Returns:
+            {"url", "path", "sha256", "bytes", "content_type",
+             "cached": bool, "revalidated": bool}
+
+        Raises:
+            requests.RequestException / OSError when the download fails
+        """
+        return self._flights.do(("download", url), lambda: self._fetch(url))
+
+    def _fetch(self, url: str) -> Dict[str, Any]:
+        """fetch without coalescing."""
+        entry = self.store.lookup(url)
+        if entry is not None and (
+            self.revalidate_after is None or time.time() - entry["validated_at"] < self.revalidate_after
+        ):
+            self.store.touch(url, entry["sha256"])
+            self._count("hits")
+            return self._result(url, entry, cached=True, revalidated=False)
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with self._get_session().get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if entry is not None and response.status_code == 304:
+                self.store.touch(url, entry["sha256"], validated=True)
+                self._count("revalidated")
+                return self._result(url, entry, cached=True, revalidated=True)
+            response.raise_for_status()
+
+            digest = hashlib.sha256()
+            f, temp_path = self.store.new_temp_file()
+            try:
+                with f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        digest.update(chunk)
+                        f.write(chunk)
+                stored = self.store.put(
+                    url,
+                    temp_path,
+                    digest.hexdigest(),
+                    content_type=response.headers.get("Content-Type"),
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified")
+                )
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+
+        self._count("downloads")
+        self._count("bytes_downloaded", stored["bytes"])
+        return self._result(url, stored, cached=False, revalidated=entry is not None)
+
+    @staticmethod
+    def _result(url: str, entry: Dict[str, Any], *, cached: bool, revalidated: bool) -> Dict[str, Any]:
+        return {
+            "url": url,
+            "path": entry["path"],
+            "sha256": entry["sha256"],
+            "bytes": entry["bytes"],
+            "content_type": entry["content_type"],
+            "cached": cached,
+            "revalidated": revalidated
+        }
+
+    def fetch_many(self, urls: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch `urls` concurrently (up to max_workers at a time).
+
+        Returns:
+            One fetch() result per URL, in order. A failed download yields
+            {"url", "path": None, "error": str} instead of raising.
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+
+        def fetch_one(url: str) -> Dict[str, Any]:
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                self._count("errors")
+                print(f"[download] {url} failed: {e}", file=sys.stderr)
+                return {"url": url, "path": None, "error": str(e)}
+
+        if len(urls) == 1:
+            return [fetch_one(urls[0])]
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            return list(executor.map(fetch_one, urls))
+
+    def stats(self) -> Dict[str, Any]:
+        """Store usage plus this downloader's hit/download counters."""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {**self.store.stats(), **counters}
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
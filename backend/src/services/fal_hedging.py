@@ -0,0 +1,162 @@
+"""
+Hedged requests for tail-latency reduction.
+
+A hedged call submits a queue request and, if it has not completed
+within a threshold, submits a duplicate. The first result wins and the
+other request is cancelled through the queue API. HedgePolicy decides
+when to hedge and keeps the statistics:
+
+    - threshold: a static delay, or the recent p95 latency once enough
+      samples have been observed (falling back to `initial_delay`)
+    - cap: at most `max_hedge_ratio` of the requests in the last `window`
+      seconds (but at least `min_hedges`) may be hedged, so a slow endpoint
+      is not flooded with duplicates
+
+Example:
+    >>> client = FalClient(hedge_policy=HedgePolicy(max_hedge_ratio=0.05))
+    >>> result = client.any_llm_complete("...", hedge=True)
+    >>> result["hedge"]
+    {'hedged': True, 'winner': 'hedge', 'threshold': 1.84, 'cancelled': ['...']}
+    >>> client.hedge_stats()["hedge_wins"]
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+
+def _quantile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank quantile of `values`, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+class HedgePolicy:
+    """When to hedge, how often, and what happened (thread-safe)."""
+
+    def __init__(
+        self,
+        *,
+        delay: Optional[float] = None,
+        quantile: float = 0.95,
+        initial_delay: float = 3.0,
+        min_delay: float = 0.5,
+        min_samples: int = 20,
+        samples: int = 200,
+        max_hedge_ratio: float = 0.1,
+        min_hedges: int = 1,
+        window: float = 60.0
+    ):
+        """
+        Args:
+            delay: Static hedge threshold in seconds; None learns it from
+                the recent `quantile` latency
+            quantile: Latency quantile used as the learned threshold
+            initial_delay: Threshold used until `min_samples` latencies are known
+            min_delay: Lower bound for the learned threshold
+            min_samples: Latencies needed before the learned threshold is used
+            samples: Number of recent latencies kept
+            max_hedge_ratio: Maximum fraction of recent requests that may be hedged
+            min_hedges: Hedges always allowed per window, so low traffic can hedge
+            window: Seconds of request history used for the hedge cap
+        """
+        self.delay = delay
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_hedges = min_hedges
+        self.window = window
+        self._latencies: deque = deque(maxlen=samples)
+        self._requests: deque = deque()
+        self._hedges: deque = deque()
+        self._counters = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "cap_denied": 0,
+            "cancelled": 0,
+            "cancel_failed": 0
+        }
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        for events in (self._requests, self._hedges):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def threshold(self) -> float:
+        """Seconds to wait for the primary request before hedging."""
+        if self.delay is not None:
+            return self.delay
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            learned = _quantile(list(self._latencies), self.quantile)
+        return max(self.min_delay, learned)
+
+    def record_request(self) -> None:
+        """Count one hedge-eligible request."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+            self._counters["requests"] += 1
+
+    def try_hedge(self) -> bool:
+        """Reserve one hedge; False when the hedge cap is reached."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = max(self.min_hedges, self.max_hedge_ratio * len(self._requests))
+            if len(self._hedges) + 1 > allowed:
+                self._counters["cap_denied"] += 1
+                return False
+            self._hedges.append(now)
+            self._counters["hedged"] += 1
+            return True
+
+    def record_latency(self, seconds: float) -> None:
+        """Observed end-to-end latency of a completed request."""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def record_winner(self, winner: str) -> None:
+        """`winner` is "primary" or "hedge"."""
+        with self._lock:
+            self._counters[f"{winner}_wins"] += 1
+
+    def record_cancel(self, ok: bool) -> None:
+        with self._lock:
+            self._counters["cancelled" if ok else "cancel_failed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, current threshold and recent latency quantiles."""
+        threshold = self.threshold()
+        with self._lock:
+            latencies = list(self._latencies)
+            counters = dict(self._counters)
+        requests = counters["requests"]
+        return {
+            **counters,
+            "hedge_rate": round(counters["hedged"] / requests, 4) if requests else None,
+            "threshold": round(threshold, 3),
+            "threshold_source": (
+                "static" if self.delay is not None
+                else "learned" if len(latencies) >= self.min_samples
+                else "initial"
+            ),
+            "latency_p50": _round(_quantile(latencies, 0.5)),
+            "latency_p95": _round(_quantile(latencies, 0.95)),
+            "samples": len(latencies)
+        }
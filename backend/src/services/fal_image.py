@@ -0,0 +1,295 @@
+"""
+Client-side image preprocessing before upload.
+
+Phone photos are often 3-10 MB and 12+ megapixels, stored sideways with
+an EXIF orientation flag and full of metadata (GPS position, device
+serials). nano-banana/edit and Gemini work on far fewer pixels than
+that, so ImagePreprocessor shrinks images before they reach the CDN:
+
+    - the EXIF orientation is applied to the pixels, so models see the
+      product upright
+    - images larger than max_edge are downscaled (aspect ratio kept)
+    - the result is re-encoded as JPEG/WebP/PNG at the given quality
+    - EXIF, XMP and comments are dropped (the ICC color profile is kept)
+
+Memory stays bounded by the output size rather than the input: JPEGs are
+decoded directly at a reduced scale (libjpeg DCT scaling), and the result
+is written to a temporary file instead of being held in memory.
+
+Pillow is optional (pip install Pillow). Without it, and for files Pillow
+cannot read (PDFs, animations), the original file is uploaded unchanged.
+
+Configuration (environment), used by clients created without an explicit
+preprocessor:
+    - FAL_PREPROCESS: set to "1" to preprocess every image upload
+    - FAL_PREPROCESS_MAX_EDGE: longest edge in pixels (default: 2048)
+    - FAL_PREPROCESS_FORMAT: jpeg, webp or png (default: jpeg)
+    - FAL_PREPROCESS_QUALITY: encoder quality 1-100 (default: 85)
+
+Example:
+    >>> preprocessor = ImagePreprocessor(max_edge=1536, quality=82)
+    >>> with preprocessor.prepared("IMG_2041.jpg") as report:
+    ...     url = fal_client.upload_file(report["path"])
+    >>> report["bytes_saved"]
+    7864123
+"""
+
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+FORMATS = {"jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp"), "png": ("PNG", ".png")}
+
+# EXIF Orientation tag and the transpose undoing each value (PIL.Image.Transpose names)
+_ORIENTATION_TAG = 0x0112
+_ORIENTATION_TRANSPOSE = {
+    2: "FLIP_LEFT_RIGHT",
+    3: "ROTATE_180",
+    4: "FLIP_TOP_BOTTOM",
+    5: "TRANSPOSE",
+    6: "ROTATE_270",
+    7: "TRANSVERSE",
+    8: "ROTATE_90",
+}
+
+# Image.info keys holding metadata that is not written back on save
+_METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop", "iptc")
+
+_warned_missing_pillow = False
+
+
+def _import_pillow():
+    """PIL.Image, or None (with a one-time warning) when Pillow is not installed."""
+    global _warned_missing_pillow
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        if not _warned_missing_pillow:
+            _warned_missing_pillow = True
+            print(
+                "Warning: Pillow not installed; images are uploaded without preprocessing "
+                "(pip install Pillow).",
+                file=sys.stderr
+            )
+        return None
+
+
+def _human_bytes(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class ImagePreprocessor:
+    """Orientation fix, downscale, re-encode and metadata stripping of local images."""
+
+    def __init__(
+        self,
+        *,
+        max_edge: int = 2048,
+        format: str = "jpeg",
+        quality: int = 85,
+        keep_icc_profile: bool = True,
+        workdir: Optional[str] = None
+    ):
+        """
+        Args:
+            max_edge: Longest edge of the output in pixels (smaller images
+                are not upscaled)
+            format: Output format: "jpeg", "webp" or "png"
+            quality: Encoder quality 1-100 (ignored for PNG)
+            keep_icc_profile: Keep the ICC profile so colors do not shift
+            workdir: Directory for processed files (default: system temp dir)
+        """
+        format = format.lower().replace("jpg", "jpeg")
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported format {format!r} (expected one of: {', '.join(FORMATS)})")
+        if max_edge < 16:
+            raise ValueError("max_edge must be at least 16 pixels")
+        if not 1 <= quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+        self.max_edge = max_edge
+        self.format = format
+        self.quality = quality
+        self.keep_icc_profile = keep_icc_profile
+        self.workdir = workdir
+
+    @classmethod
+    def from_env(cls) -> Optional["ImagePreprocessor"]:
+        """Preprocessor configured by FAL_PREPROCESS*, or None unless FAL_PREPROCESS=1."""
+        if os.environ.get("FAL_PREPROCESS", "0").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            max_edge=int(os.environ.get("FAL_PREPROCESS_MAX_EDGE", 2048)),
+            format=os.environ.get("FAL_PREPROCESS_FORMAT", "jpeg"),
+            quality=int(os.environ.get("FAL_PREPROCESS_QUALITY", 85))
+        )
+
+    @property
+    def signature(self) -> str:
+        """Identifies the output settings, e.g. for upload cache keys."""
+        icc = "" if self.keep_icc_profile else "-noicc"
+        return f"{self.format}-q{self.quality}-{self.max_edge}{icc}"
+
+    def process(self, path: str) -> Dict[str, Any]:
+        """
+        Preprocess the image at `path` into a temporary file.
+
+        Returns:
+            Report dict:
+                - path: File to upload (the temporary file, or `path` itself
+                  when preprocessing was skipped; the caller removes the
+                  temporary file, see prepared())
+                - original_bytes / processed_bytes / bytes_saved
+                - original_size / size: [width, height]
+                - format: Output format
+                - rotated: EXIF orientation was applied
+                - metadata_stripped: The input carried EXIF/XMP/comments
+                - skipped: Why the original is uploaded unchanged, or None
+        """
+        original_bytes = os.path.getsize(path)
+        report: Dict[str, Any] = {
+            "path": path,
+            "original_bytes": original_bytes,
+            "processed_bytes": original_bytes,
+            "bytes_saved": 0,
+            "original_size": None,
+            "size": None,
+            "format": None,
+            "rotated": False,
+            "metadata_stripped": False,
+            "skipped": None,
+        }
+
+        Image = _import_pillow()
+        if Image is None:
+            report["skipped"] = "Pillow not installed"
+            return report
+
+        output = None
+        try:
+            with Image.open(path) as image:
+                report["original_size"] = list(image.size)
+                report["format"] = (image.format or "").lower() or None
+                if getattr(image, "n_frames", 1) > 1:
+                    report["skipped"] = "animated image"
+                    return report
+
+                # Reading the EXIF block does not decode any pixels
+                exif = image.getexif()
+                orientation = exif.get(_ORIENTATION_TAG, 1)
+                had_metadata = bool(exif) or any(key in image.info for key in _METADATA_KEYS)
+                icc_profile = image.info.get("icc_profile") if self.keep_icc_profile else None
+
+                # thumbnail() first asks the decoder for a reduced scale (JPEG
+                # DCT scaling), so a 12 MP photo never exists at full size
+                resized = max(image.size) > self.max_edge
+                if resized:
+                    image.thumbnail((self.max_edge, self.max_edge), Image.Resampling.LANCZOS)
+                else:
+                    image.load()
+
+                transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+                processed = image.transpose(Image.Transpose[transpose]) if transpose else image
+                processed = self._convert_mode(Image, processed)
+
+                output = self._save(processed, icc_profile)
+
+            processed_bytes = os.path.getsize(output)
+            if processed_bytes >= original_bytes and not (resized or transpose or had_metadata):
+                # Re-encoding alone did not help; keep the original file
+                os.unlink(output)
+                report["size"] = report["original_size"]
+                report["skipped"] = "already optimized"
+                return report
+
+            report.update({
+                "path": output,
+                "processed_bytes": processed_bytes,
+                "bytes_saved": original_bytes - processed_bytes,
+                "size": list(processed.size),
+                "format": self.format,
+                "rotated": bool(transpose),
+                "metadata_stripped": had_metadata,
+            })
+            print(
+                f"[preprocess] {os.path.basename(path)}: {_human_bytes(original_bytes)} -> "
+                f"{_human_bytes(processed_bytes)} ({report['original_size'][0]}x{report['original_size'][1]} "
+                f"-> {report['size'][0]}x{report['size'][1]} {self.format})",
+                file=sys.stderr
+            )
+            return report
+
+        except Exception as e:
+            # Not an image (PDF, text, ...) or undecodable: upload as is
+            if output is not None and os.path.exists(output):
+                os.unlink(output)
+            report["skipped"] = f"not preprocessed: {e}"
+            return report
+
+    def _convert_mode(self, Image, image):
+        """Convert to a mode the output format can store (alpha flattened onto white for JPEG)."""
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        if self.format == "jpeg":
+            if has_alpha:
+                rgba = image.convert("RGBA")
+                flattened = Image.new("RGB", rgba.size, (255, 255, 255))
+                flattened.paste(rgba, mask=rgba.getchannel("A"))
+                return flattened
+            return image if image.mode in ("RGB", "L") else image.convert("RGB")
+        if has_alpha:
+            return image if image.mode == "RGBA" else image.convert("RGBA")
+        return image if image.mode in ("RGB", "L") else image.convert("RGB")
+
+    def _save(self, image, icc_profile: Optional[bytes]) -> str:
+        """Encode `image` into a new temporary file and return its path."""
+        pil_format, extension = FORMATS[self.format]
+        params: Dict[str, Any] = {}
+        if self.format == "jpeg":
+            params = {"quality": self.quality, "optimize": True, "progressive": True}
+        elif self.format == "webp":
+            params = {"quality": self.quality, "method": 4}
+        else:
+            params = {"optimize": True}
+        if icc_profile:
+            params["icc_profile"] = icc_profile
+
+        fd, output = tempfile.mkstemp(prefix="fal-upload-", suffix=extension, dir=self.workdir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                # No exif= argument: metadata is not carried over
+                image.save(f, pil_format, **params)
+        except BaseException:
+            os.unlink(output)
+            raise
+        return output
+
+    @contextmanager
+    def prepared(self, path: str) -> Iterator[Dict[str, Any]]:
+        """process() as a context manager that removes the temporary file afterwards."""
+        report = self.process(path)
+        try:
+            yield report
+        finally:
+            if report["path"] != path and os.path.exists(report["path"]):
+                os.unlink(report["path"])
+
+
+if __name__ == "__main__":
+    # Smoke test: python fal_image.py photo.jpg [max_edge]
+    import json
+
+    if len(sys.argv) < 2:
+        print("Usage: python fal_image.py <image> [max_edge]", file=sys.stderr)
+        sys.exit(1)
+    preprocessor = ImagePreprocessor(max_edge=int(sys.argv[2]) if len(sys.argv) > 2 else 2048)
+    with preprocessor.prepared(sys.argv[1]) as result:
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,331 @@
+"""
+Per-phase timings and Prometheus-style metrics.
+
+Every FAL call records where its time went in a PhaseTimer:
+
+    - admission: waiting for a slot of the endpoint (see fal_admission)
+    - preprocess: downscaling/re-encoding an image before upload (with
+      bytes_saved, see fal_image)
+    - upload: uploading a local file to the CDN (with upload_bytes)
+    - queue_wait: submission until the first InProgress status
+    - inference: first InProgress until the result is available (the whole
+      call when no InProgress update was observed, e.g. very short jobs)
+    - fetch: downloading the result of a completed queue request
+    - parse: turning the model output into the result dict
+    - download: fetching generated images into the local image store
+      (with download_bytes, see fal_download)
+
+The timer's phases are returned in the result's "timings" field and
+observed into a MetricsRegistry as histograms labelled by endpoint, model
+and phase. The registry renders the Prometheus text format, which
+MetricsServer exposes over HTTP (`fal_worker.py serve --metrics_port`).
+
+Example:
+    >>> timer = PhaseTimer("fal-ai/any-llm", "openai/gpt-4o-mini")
+    >>> result = fal_client.subscribe(..., on_queue_update=timer.on_queue_update)
+    >>> timer.finish_queue()
+    >>> with timer.phase("parse"):
+    ...     parsed = parse(result)
+    >>> timer.observe(registry)
+    >>> timer.as_dict()
+    {'queue_wait': 0.412, 'inference': 1.873, 'parse': 0.001, 'total': 2.288}
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Seconds; FAL calls range from sub-second uploads to two-minute generations
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Upload sizes, 16 KiB .. 64 MiB
+BYTES_BUCKETS = tuple(float(16 * 1024 * 4 ** i) for i in range(7))
+
+
+class _Histogram:
+    """Cumulative-bucket histogram of one label set."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+def _labels(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, "" if value is None else str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        f'{key}="' + value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """Labelled histograms and counters (thread-safe)."""
+
+    def __init__(self):
+        # name -> (help text, {labels: _Histogram})
+        self._histograms: Dict[str, Tuple[str, Dict[tuple, _Histogram]]] = {}
+        # name -> (help text, {labels: value})
+        self._counters: Dict[str, Tuple[str, Dict[tuple, float]]] = {}
+        # name -> (help text, {labels: value})
+        self._gauges: Dict[str, Tuple[str, Dict[tuple, float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        labels: Dict[str, Any],
+        *,
+        help_text: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        """Add one observation to histogram `name` for `labels`."""
+        key = _labels(labels)
+        with self._lock:
+            _, series = self._histograms.setdefault(name, (help_text, {}))
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: Dict[str, Any], value: float = 1.0, *, help_text: str = "") -> None:
+        """Increment counter `name` for `labels`."""
+        key = _labels(labels)
+        with self._lock:
+            _, series = self._counters.setdefault(name, (help_text, {}))
+            series[key] = series.get(key, 0.0) + value
+
+    def gauge(self, name: str, value: float, labels: Dict[str, Any], *, help_text: str = "") -> None:
+        """Set gauge `name` for `labels` to `value`."""
+        key = _labels(labels)
+        with self._lock:
+            _, series = self._gauges.setdefault(name, (help_text, {}))
+            series[key] = float(value)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                help_text, series = self._counters[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for key in sorted(series):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(series[key])}")
+            for name in sorted(self._gauges):
+                help_text, series = self._gauges[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for key in sorted(series):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(series[key])}")
+            for name in sorted(self._histograms):
+                help_text, series = self._histograms[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key in sorted(series):
+                    histogram = series[key]
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(
+                            f"{name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {count}"
+                        )
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, name: str = "fal_phase_seconds") -> Dict[str, Any]:
+        """Count and mean of each series of histogram `name` (for JSON status output)."""
+        with self._lock:
+            _, series = self._histograms.get(name, ("", {}))
+            return {
+                ",".join(f"{k}={v}" for k, v in key): {
+                    "count": histogram.count,
+                    "mean": round(histogram.sum / histogram.count, 4) if histogram.count else None
+                }
+                for key, histogram in sorted(series.items())
+            }
+
+
+class PhaseTimer:
+    """Wall-clock time of each phase of one call."""
+
+    def __init__(self, endpoint: str, model: Optional[str] = None):
+        """
+        Args:
+            endpoint: FAL endpoint the call goes to (metric label)
+            model: Model used, if any (metric label)
+        """
+        self.endpoint = endpoint
+        self.model = model
+        self.started = time.monotonic()
+        self._phases: Dict[str, float] = {}
+        self._values: Dict[str, float] = {}
+        self._queue_started = self.started
+        self._in_progress_at: Optional[float] = None
+        self._completed_at: Optional[float] = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self._phases[phase] = self._phases.get(phase, 0.0) + seconds
+
+    def set(self, name: str, value: float) -> None:
+        """Record a non-time measurement, e.g. upload_bytes."""
+        self._values[name] = value
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as phase `name`."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, time.monotonic() - started)
+
+    def start_queue(self) -> None:
+        """Mark the submission of a queue request (default: timer creation)."""
+        self._queue_started = time.monotonic()
+        self._in_progress_at = None
+        self._completed_at = None
+
+    def on_queue_update(self, status: Any) -> None:
+        """
+        Queue status callback (fal_client.Queued/InProgress/Completed): the
+        first InProgress ends the queue wait, Completed ends inference.
+        """
+        # By class name, so timing never has to import fal_client
+        kind = type(status).__name__
+        if kind in ("InProgress", "Completed"):
+            self.mark_in_progress()
+        if self._completed_at is None and kind == "Completed":
+            self._completed_at = time.monotonic()
+            self.add("inference", self._completed_at - self._in_progress_at)
+
+    def mark_in_progress(self) -> None:
+        """End the queue wait (once), e.g. on the first streamed event."""
+        if self._in_progress_at is None:
+            self._in_progress_at = time.monotonic()
+            self.add("queue_wait", self._in_progress_at - self._queue_started)
+
+    def finish_queue(self) -> None:
+        """
+        Mark the result as received: ends inference, or the result fetch
+        when Completed was already observed.
+        """
+        now = time.monotonic()
+        if self._completed_at is None:
+            self._completed_at = now
+            self.add("inference", now - (self._in_progress_at or self._queue_started))
+        else:
+            self.add("fetch", now - self._completed_at)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Phases and measurements so far, plus the total, rounded for output."""
+        timings: Dict[str, Any] = {phase: round(seconds, 4) for phase, seconds in self._phases.items()}
+        timings.update(self._values)
+        timings["total"] = round(time.monotonic() - self.started, 4)
+        return timings
+
+    def observe(self, registry: Optional["MetricsRegistry"], *, ok: bool = True) -> Dict[str, float]:
+        """Fold the phases into `registry` and return as_dict()."""
+        timings = self.as_dict()
+        if registry is None:
+            return timings
+        labels = {"endpoint": self.endpoint, "model": self.model or ""}
+        for phase, seconds in self._phases.items():
+            registry.observe(
+                "fal_phase_seconds", seconds, {**labels, "phase": phase},
+                help_text="Time spent per phase of FAL calls"
+            )
+        registry.observe(
+            "fal_call_seconds", timings["total"], labels,
+            help_text="End-to-end time of FAL calls"
+        )
+        registry.inc(
+            "fal_calls_total", {**labels, "outcome": "ok" if ok else "error"},
+            help_text="FAL calls by outcome"
+        )
+        if "upload_bytes" in self._values:
+            registry.observe(
+                "fal_upload_bytes", self._values["upload_bytes"], labels,
+                help_text="Size of files uploaded to the FAL CDN",
+                buckets=BYTES_BUCKETS
+            )
+        if "download_bytes" in self._values:
+            registry.observe(
+                "fal_download_bytes", self._values["download_bytes"], labels,
+                help_text="Bytes downloaded into the local image store per call",
+                buckets=BYTES_BUCKETS
+            )
+        if "bytes_saved" in self._values:
+            registry.inc(
+                "fal_upload_bytes_saved_total", labels, self._values["bytes_saved"],
+                help_text="Bytes not uploaded thanks to image preprocessing"
+            )
+        return timings
+
+
+class MetricsServer:
+    """Serves a MetricsRegistry as GET /metrics in a background thread."""
+
+    def __init__(self, registry: MetricsRegistry, *, host: str = "127.0.0.1", port: int = 9464):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would drown the worker's stderr
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="fal-metrics",
+            daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
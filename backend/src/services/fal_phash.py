@@ -0,0 +1,420 @@
+"""
+Perceptual-hash index of product images for near-duplicate lookups.
+
+Sellers upload the same product again and again: re-compressed, resized,
+renamed. The content SHA-256 keying the analysis cache changes with every
+byte, so each copy would be analyzed (and its background generated) from
+scratch. A perceptual hash instead summarizes what the image looks like
+in 64 bits, and copies of one photo land within a few bits of each other:
+
+    - dhash (default): sign of the brightness gradient between adjacent
+      pixels of a 9x8 grayscale thumbnail
+    - phash: signs of the 8x8 lowest frequencies of a 32x32 DCT against
+      their median; more tolerant of contrast/gamma changes, slower
+
+PerceptualIndex maps those hashes to the content digests of images that
+have results, and answers "which known images are within N bits of this
+one" with multi-index hashing: each 64-bit hash is split into 4 chunks of
+16 bits, each chunk stored in its own indexed column. By the pigeonhole
+principle a hash within distance d of the query matches it on at least
+one chunk to within d // 4 bits, so a query only looks up the chunk
+values that close (17 per chunk at the default distance) and checks the
+few rows found. Queries run against SQLite directly, so a fresh worker
+process pays no load step: about 2 ms with a million entries at the
+default distance, more at larger ones (697 lookups per chunk at 15 bits
+instead of 17).
+
+Hashes live in a SQLite table next to the caches (see fal_cache), shared
+by every worker process; rows one process adds are visible to the next
+query of any other.
+
+Pillow is optional (pip install Pillow). Without it images cannot be
+hashed, and near-duplicate lookups are skipped.
+
+Configuration (environment):
+    - FAL_PHASH_INDEX: set to "0" to disable near-duplicate lookups
+    - FAL_PHASH_MAX_DISTANCE: largest Hamming distance (0-15) at which
+      two images count as the same product photo (default: 6)
+    - FAL_PHASH_ALGORITHM: dhash or phash (default: dhash)
+
+Example:
+    >>> index = PerceptualIndex(default_cache_path(), max_distance=6)
+    >>> index.add("9f2c...", image_hash("shoe.jpg"))
+    >>> index.query(image_hash("shoe_recompressed.webp"))
+    [("9f2c...", 2)]
+"""
+
+import hashlib
+import io
+import itertools
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .fal_cache import _env_flag, _ImmediateTransaction, default_cache_path
+except ImportError:
+    from fal_cache import _env_flag, _ImmediateTransaction, default_cache_path
+
+
+ALGORITHMS = ("dhash", "phash")
+
+HASH_BITS = 64
+# Multi-index hashing: the hash is split into _CHUNKS substrings of _CHUNK_BITS
+_CHUNKS = 4
+_CHUNK_BITS = HASH_BITS // _CHUNKS
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+_HASH_MASK = (1 << HASH_BITS) - 1
+# d // _CHUNKS is the per-chunk search radius; 15 keeps it at 3 (697 probes per chunk)
+MAX_DISTANCE = 15
+
+# Side of the grayscale thumbnail the DCT of phash is computed on
+_PHASH_SIZE = 32
+_PHASH_COSINES = [
+    [
+        math.cos((2 * x + 1) * u * math.pi / (2 * _PHASH_SIZE))
+        for x in range(_PHASH_SIZE)
+    ]
+    for u in range(8)
+]
+
+_warned_missing_pillow = False
+
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(value: int) -> int:
+        return bin(value).count("1")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return _popcount(a ^ b)
+
+
+def _import_pillow():
+    """(PIL.Image, PIL.ImageOps), or None (with a one-time warning) without Pillow."""
+    global _warned_missing_pillow
+    try:
+        from PIL import Image, ImageOps
+        return Image, ImageOps
+    except ImportError:
+        if not _warned_missing_pillow:
+            _warned_missing_pillow = True
+            print(
+                "Warning: Pillow not installed; near-duplicate image lookups are disabled "
+                "(pip install Pillow).",
+                file=sys.stderr
+            )
+        return None
+
+
+def _grayscale_pixels(source: Any, width: int, height: int) -> Optional[List[int]]:
+    """
+    Pixels of `source` (path or binary file object) as a width x height
+    grayscale thumbnail, row by row, or None without Pillow.
+
+    The EXIF orientation is applied first, so a photo and its upright
+    re-encode (see fal_image) hash alike, and transparent areas are
+    flattened onto white like product cutouts are shown.
+    """
+    pillow = _import_pillow()
+    if pillow is None:
+        return None
+    Image, ImageOps = pillow
+    with Image.open(source) as image:
+        # JPEGs decode directly at a reduced scale; the thumbnail is tiny
+        image.draft("RGB", (width * 8, height * 8))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        small = image.convert("L").resize((width, height), Image.Resampling.LANCZOS)
+        return list(small.getdata())
+
+
+def dhash(source: Any) -> Optional[int]:
+    """64-bit difference hash of an image (path or binary file object)."""
+    pixels = _grayscale_pixels(source, 9, 8)
+    if pixels is None:
+        return None
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def phash(source: Any) -> Optional[int]:
+    """64-bit DCT hash of an image (path or binary file object)."""
+    pixels = _grayscale_pixels(source, _PHASH_SIZE, _PHASH_SIZE)
+    if pixels is None:
+        return None
+    size = _PHASH_SIZE
+    # Separable DCT-II, keeping only the 8 lowest frequencies on each axis
+    rows = [
+        [sum(c * p for c, p in zip(cosines, pixels[y * size:(y + 1) * size])) for cosines in _PHASH_COSINES]
+        for y in range(size)
+    ]
+    coefficients = [
+        sum(cosines[y] * rows[y][u] for y in range(size))
+        for cosines in _PHASH_COSINES
+        for u in range(8)
+    ]
+    # The DC term is the mean brightness; leave it out of the median
+    median = sorted(coefficients[1:])[len(coefficients[1:]) // 2]
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def image_hash(source: Any, algorithm: str = "dhash") -> Optional[int]:
+    """Perceptual hash of an image with `algorithm` (see ALGORITHMS), or None without Pillow."""
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown perceptual hash {algorithm!r} (expected one of: {', '.join(ALGORITHMS)})")
+    return dhash(source) if algorithm == "dhash" else phash(source)
+
+
+def url_fingerprint(url: str, algorithm: str = "dhash", timeout: float = 30) -> Tuple[str, Optional[int]]:
+    """
+    Download a remote image once for both its content SHA-256 and its
+    perceptual hash.
+
+    Returns:
+        (sha256 hex digest, perceptual hash or None without Pillow or for
+        content Pillow cannot decode)
+    """
+    import requests
+
+    with requests.get(url, timeout=timeout) as response:
+        response.raise_for_status()
+        content = response.content
+    try:
+        value = image_hash(io.BytesIO(content), algorithm)
+    except Exception:
+        value = None
+    return hashlib.sha256(content).hexdigest(), value
+
+
+def _signed(value: int) -> int:
+    """Unsigned 64-bit hash as the signed integer SQLite stores."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _chunks(value: int) -> List[int]:
+    """The _CHUNKS chunk values of an unsigned hash, lowest bits first."""
+    return [(value >> (i * _CHUNK_BITS)) & _CHUNK_MASK for i in range(_CHUNKS)]
+
+
+def _chunk_masks(radius: int) -> List[int]:
+    """Every _CHUNK_BITS-bit mask with at most `radius` bits set."""
+    masks = []
+    for bits in range(radius + 1):
+        for positions in itertools.combinations(range(_CHUNK_BITS), bits):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+
+class PerceptualIndex:
+    """
+    Perceptual hash -> content digests, with Hamming-distance queries.
+
+    Thread-safe; several processes may share the database file (SQLite
+    WAL).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_distance: int = 6,
+        algorithm: str = "dhash"
+    ):
+        """
+        Args:
+            path: SQLite database file (created with its directory if missing)
+            max_distance: Default largest Hamming distance a query matches
+                (0-15; 64-bit hashes of re-encodes of one photo are
+                typically within 0-4 bits, different photos 20+)
+            algorithm: Hash function of the stored hashes (see ALGORITHMS);
+                hashes of different algorithms are kept apart
+        """
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown perceptual hash {algorithm!r} (expected one of: {', '.join(ALGORITHMS)})")
+        self.path = path
+        self.algorithm = algorithm
+        self.max_distance = self._check_distance(max_distance)
+        self._lock = threading.Lock()
+        self._masks: Dict[int, List[int]] = {}
+        self._queries = 0
+        self._matches = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        chunks = ", ".join(f"c{i} INTEGER" for i in range(_CHUNKS))
+        with _ImmediateTransaction(self._conn) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS phash_index ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "digest TEXT NOT NULL, "
+                "algorithm TEXT NOT NULL, "
+                "hash INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, "
+                f"{chunks}, "
+                "UNIQUE (digest, algorithm))"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(phash_index)")}
+            if "c0" not in columns:
+                # Table from before the chunk columns: add and backfill them once
+                # (the mask undoes SQLite's sign extension of the shift)
+                for i in range(_CHUNKS):
+                    conn.execute(f"ALTER TABLE phash_index ADD COLUMN c{i} INTEGER")
+                conn.execute("UPDATE phash_index SET " + ", ".join(
+                    f"c{i} = (hash >> {i * _CHUNK_BITS}) & {_CHUNK_MASK}" for i in range(_CHUNKS)
+                ))
+            for i in range(_CHUNKS):
+                # Covering the hash: candidates are filtered without reading their rows
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS phash_index_c{i} ON phash_index (algorithm, c{i}, hash)"
+                )
+
+    @classmethod
+    def from_env(cls) -> Optional["PerceptualIndex"]:
+        """Index in the shared cache database configured by FAL_PHASH_*, or None if FAL_PHASH_INDEX=0."""
+        if not _env_flag("FAL_PHASH_INDEX"):
+            return None
+        return cls(
+            default_cache_path(),
+            max_distance=int(os.environ.get("FAL_PHASH_MAX_DISTANCE", 6)),
+            algorithm=os.environ.get("FAL_PHASH_ALGORITHM", "dhash").strip().lower()
+        )
+
+    @staticmethod
+    def _check_distance(max_distance: int) -> int:
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+        return max_distance
+
+    def hash_image(self, source: Any) -> Optional[int]:
+        """Hash an image (path or binary file object) with the index's algorithm."""
+        return image_hash(source, self.algorithm)
+
+    def add(self, digest: str, value: int) -> None:
+        """Remember that the image with content digest `digest` has perceptual hash `value`."""
+        with self._lock:
+            with _ImmediateTransaction(self._conn) as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO phash_index (digest, algorithm, hash, created_at, c0, c1, c2, c3) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (digest, self.algorithm, _signed(value), time.time(), *_chunks(value))
+                )
+
+    def query(
+        self,
+        value: int,
+        *,
+        max_distance: Optional[int] = None,
+        limit: Optional[int] = 10
+    ) -> List[Tuple[str, int]]:
+        """
+        Digests of indexed images within `max_distance` bits of hash `value`.
+
+        Args:
+            value: Perceptual hash of the query image
+            max_distance: Largest Hamming distance (default: the index's)
+            limit: Return at most this many matches (None for all)
+
+        Returns:
+            [(digest, distance), ...], closest first
+        """
+        distance = self.max_distance if max_distance is None else self._check_distance(max_distance)
+        radius = distance // _CHUNKS
+        masks = self._masks.get(radius)
+        if masks is None:
+            masks = self._masks[radius] = _chunk_masks(radius)
+
+        value &= _HASH_MASK
+        # One indexed lookup per chunk; the chunk values are generated ints
+        sql = " UNION ".join(
+            f"SELECT id, hash FROM phash_index WHERE algorithm = ? AND c{i} IN "
+            f"({', '.join(str(chunk ^ mask) for mask in masks)})"
+            for i, chunk in enumerate(_chunks(value))
+        )
+        with self._lock:
+            matches = []
+            for rowid, h in self._conn.execute(sql, (self.algorithm,) * _CHUNKS):
+                d = _popcount((h & _HASH_MASK) ^ value)
+                if d <= distance:
+                    matches.append((d, rowid))
+            matches.sort()
+            if limit is not None:
+                matches = matches[:limit]
+            self._queries += 1
+            if matches:
+                self._matches += 1
+                digests = dict(self._conn.execute(
+                    f"SELECT id, digest FROM phash_index WHERE id IN ({', '.join('?' * len(matches))})",
+                    [rowid for _, rowid in matches]
+                ).fetchall())
+            else:
+                digests = {}
+
+        # A row another process deleted in between is skipped
+        return [(digests[rowid], d) for d, rowid in matches if rowid in digests]
+
+    def clear(self) -> int:
+        """Remove every entry of this algorithm. Returns the number of rows deleted."""
+        with self._lock:
+            with _ImmediateTransaction(self._conn) as conn:
+                return conn.execute(
+                    "DELETE FROM phash_index WHERE algorithm = ?",
+                    (self.algorithm,)
+                ).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Entry count, bucket occupancy and this process's query counters.
+
+        Scans the table once (a maintenance command, not a hot path).
+        """
+        with self._lock:
+            entries, distinct = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT hash) FROM phash_index WHERE algorithm = ?",
+                (self.algorithm,)
+            ).fetchone()
+            largest = max(
+                self._conn.execute(
+                    f"SELECT COALESCE(MAX(n), 0) FROM (SELECT COUNT(*) AS n FROM phash_index "
+                    f"WHERE algorithm = ? GROUP BY c{i})",
+                    (self.algorithm,)
+                ).fetchone()[0]
+                for i in range(_CHUNKS)
+            )
+            return {
+                "algorithm": self.algorithm,
+                "max_distance": self.max_distance,
+                "entries": entries,
+                "distinct_hashes": distinct,
+                "largest_bucket": largest,
+                "queries": self._queries,
+                "matches": self._matches,
+                "match_rate": round(self._matches / self._queries, 4) if self._queries else None
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM phash_index WHERE algorithm = ?",
+                (self.algorithm,)
+            ).fetchone()[0]
@@ -0,0 +1,334 @@
+"""
+Multiplexed status polling for FAL queue requests.
+
+Instead of blocking one thread inside fal_client.subscribe per request,
+requests are submitted to the queue and their ids handed to a
+QueuePoller. One background thread schedules the status checks of
+every outstanding id, each on its own adaptive schedule:
+
+    - queued: every `queued_base + queued_per_position * position`
+      seconds (capped at `max_interval`), so requests far back in the
+      queue are polled rarely
+    - in progress: first after `in_progress_interval` seconds, then
+      `in_progress_backoff` times longer each poll up to
+      `in_progress_max`, so short jobs are picked up quickly and long
+      ones cost few polls
+    - a caller blocked on the result can ask for a fixed interval in
+      either state instead (track(poll_interval=...)), like
+      fal_client.subscribe
+    - status errors: exponential backoff; the request fails after
+      `max_errors` consecutive errors
+
+The status, result and cancel calls themselves run on a small pool of
+`workers` threads, so one slow call only holds up its own request.
+Completed requests have their result fetched and delivered through a
+concurrent.futures.Future (plus an optional callback). Requests still
+running at their deadline, or whose Future is cancelled, are cancelled
+through the queue API; the former fail with TimeoutError.
+
+Example:
+    >>> poller = QueuePoller()
+    >>> handle = fal_client.submit("fal-ai/nano-banana/edit", arguments=arguments)
+    >>> future = poller.track("fal-ai/nano-banana/edit", handle.request_id, timeout=110)
+    >>> future.result()["images"][0]["url"]
+"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class _Job:
+    """One tracked request."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        request_id: str,
+        future: "Future",
+        transform: Optional[Callable[[Any], Any]],
+        on_status: Optional[Callable[[Any], None]],
+        deadline: Optional[float],
+        poll_interval: Optional[float]
+    ):
+        self.endpoint = endpoint
+        self.request_id = request_id
+        self.future = future
+        self.transform = transform
+        self.on_status = on_status
+        self.deadline = deadline
+        self.poll_interval = poll_interval
+        self.status = "submitted"
+        self.queue_position: Optional[int] = None
+        self.polls = 0
+        self.running_polls = 0
+        self.errors = 0
+
+
+class QueuePoller:
+    """One thread scheduling the polls of many outstanding queue requests (thread-safe)."""
+
+    def __init__(
+        self,
+        *,
+        queued_base: float = 0.2,
+        queued_per_position: float = 0.25,
+        in_progress_interval: float = 0.1,
+        in_progress_backoff: float = 1.5,
+        in_progress_max: float = 1.0,
+        max_interval: float = 5.0,
+        max_errors: int = 5,
+        workers: int = 4
+    ):
+        """
+        Args:
+            queued_base: Poll interval of a request at queue position 0
+            queued_per_position: Extra seconds per position ahead in the queue
+            in_progress_interval: First poll interval once a request is running
+            in_progress_backoff: Factor by which that interval grows per poll
+            in_progress_max: Longest poll interval of a running request
+            max_interval: Upper bound for every poll interval
+            max_errors: Consecutive status errors before a request fails
+            workers: Threads making the status, result and cancel calls
+        """
+        self.queued_base = queued_base
+        self.queued_per_position = queued_per_position
+        self.in_progress_interval = in_progress_interval
+        self.in_progress_backoff = in_progress_backoff
+        self.in_progress_max = in_progress_max
+        self.max_interval = max_interval
+        self.max_errors = max_errors
+        self.workers = max(1, workers)
+        self._jobs: Dict[str, _Job] = {}
+        self._schedule: List[tuple] = []
+        self._sequence = itertools.count()
+        self._counters = {"tracked": 0, "completed": 0, "failed": 0, "timed_out": 0, "polls": 0}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional["ThreadPoolExecutor"] = None
+        self._closed = False
+
+    def track(
+        self,
+        endpoint: str,
+        request_id: str,
+        *,
+        callback: Optional[Callable[["Future"], None]] = None,
+        transform: Optional[Callable[[Any], Any]] = None,
+        on_status: Optional[Callable[[Any], None]] = None,
+        timeout: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ) -> "Future":
+        """
+        Start polling `request_id` and return a Future of its result.
+
+        Args:
+            endpoint: Queue endpoint the request was submitted to
+            request_id: Queue request id
+            callback: Called with the Future once it is done
+            transform: Applied to the raw result before it is delivered
+            on_status: Called (on a poller thread) with every status
+                polled, e.g. PhaseTimer.on_queue_update
+            timeout: Seconds after which the request is cancelled
+            poll_interval: Fixed poll interval, queued or running, for a
+                caller blocked on the result (default: the adaptive schedule)
+        """
+        # Imported here: only processes that track jobs pay for concurrent.futures
+        from concurrent.futures import Future, ThreadPoolExecutor
+
+        future: Future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        deadline = time.monotonic() + timeout if timeout else None
+        job = _Job(endpoint, request_id, future, transform, on_status, deadline, poll_interval)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Poller is closed")
+            self._jobs[request_id] = job
+            self._counters["tracked"] += 1
+            # First check right away: short jobs may already be done
+            self._push(job, 0.0)
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fal-queue-poll")
+                self._thread = threading.Thread(target=self._run, name="fal-queue-poller", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    def _push(self, job: _Job, delay: float) -> None:
+        heapq.heappush(self._schedule, (time.monotonic() + delay, next(self._sequence), job))
+
+    def _interval(self, job: _Job) -> float:
+        if job.errors:
+            return min(self.max_interval, self.queued_base * (2 ** job.errors))
+        if job.poll_interval is not None:
+            return min(self.max_interval, job.poll_interval)
+        if job.status == "queued":
+            position = job.queue_position or 0
+            return min(self.max_interval, self.queued_base + self.queued_per_position * position)
+        # Short jobs are picked up quickly; long ones back off to in_progress_max
+        backoff = self.in_progress_backoff ** max(0, job.running_polls - 1)
+        return min(self.max_interval, self.in_progress_max, self.in_progress_interval * backoff)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and (
+                    not self._schedule or self._schedule[0][0] > time.monotonic()
+                ):
+                    wait = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                    self._condition.wait(wait)
+                if self._closed:
+                    return
+                _, _, job = heapq.heappop(self._schedule)
+
+            # A job is only rescheduled once its poll is done, so it is never polled twice at once
+            try:
+                self._executor.submit(self._step, job)
+            except RuntimeError:
+                # Closed meanwhile
+                return
+
+    def _step(self, job: _Job) -> None:
+        """Poll one due request (on a worker thread)."""
+        if job.future.cancelled():
+            # Cancelled by the caller: stop the queue request too
+            self._cancel(job)
+            with self._condition:
+                self._jobs.pop(job.request_id, None)
+        elif not job.future.done():
+            try:
+                self._poll(job)
+            except BaseException as e:
+                # Never lose a job: an unexpected error fails it instead
+                self._finish(job, error=e)
+
+    def _poll(self, job: _Job) -> None:
+        """Check one request; reschedule it or resolve its Future."""
+        import fal_client
+
+        if job.deadline is not None and time.monotonic() >= job.deadline:
+            self._cancel(job)
+            self._finish(job, error=TimeoutError(
+                f"{job.endpoint} request {job.request_id} timed out ({job.status})"
+            ), counter="timed_out")
+            return
+
+        job.polls += 1
+        with self._condition:
+            self._counters["polls"] += 1
+        try:
+            status = fal_client.status(job.endpoint, job.request_id, with_logs=False)
+        except Exception as e:
+            job.errors += 1
+            if job.errors >= self.max_errors:
+                self._finish(job, error=e)
+                return
+            self._reschedule(job)
+            return
+
+        job.errors = 0
+        if job.on_status is not None:
+            try:
+                job.on_status(status)
+            except Exception as e:
+                print(f"[FAL Poller] status callback failed: {e}", file=sys.stderr)
+        if isinstance(status, fal_client.Queued):
+            job.status = "queued"
+            job.queue_position = status.position
+        elif isinstance(status, fal_client.InProgress):
+            job.status = "in_progress"
+            job.queue_position = None
+            job.running_polls += 1
+        else:
+            job.status = "completed"
+            try:
+                result = fal_client.result(job.endpoint, job.request_id)
+                if job.transform is not None:
+                    result = job.transform(result)
+            except Exception as e:
+                self._finish(job, error=e)
+                return
+            self._finish(job, result=result)
+            return
+        self._reschedule(job)
+
+    def _reschedule(self, job: _Job) -> None:
+        delay = self._interval(job)
+        if job.deadline is not None:
+            delay = max(0.0, min(delay, job.deadline - time.monotonic()))
+        with self._condition:
+            self._push(job, delay)
+            # Wakes the scheduler, which may be waiting on a later job (or none)
+            self._condition.notify()
+
+    def _cancel(self, job: _Job) -> None:
+        import fal_client
+
+        try:
+            fal_client.cancel(job.endpoint, job.request_id)
+        except Exception as e:
+            print(f"[FAL Poller] cancel of {job.request_id} failed: {e}", file=sys.stderr)
+
+    def _finish(
+        self,
+        job: _Job,
+        *,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+        counter: Optional[str] = None
+    ) -> None:
+        from concurrent.futures import InvalidStateError
+
+        with self._condition:
+            self._jobs.pop(job.request_id, None)
+            self._counters[counter or ("failed" if error is not None else "completed")] += 1
+        try:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        except InvalidStateError:
+            # The caller cancelled the Future meanwhile
+            pass
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Outstanding requests with their last known status."""
+        with self._condition:
+            return [
+                {
+                    "request_id": job.request_id,
+                    "endpoint": job.endpoint,
+                    "status": job.status,
+                    "queue_position": job.queue_position,
+                    "polls": job.polls
+                }
+                for job in self._jobs.values()
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus the number of outstanding requests."""
+        with self._condition:
+            return {"outstanding": len(self._jobs), **self._counters}
+
+    def close(self) -> None:
+        """Stop polling; outstanding Futures fail with RuntimeError."""
+        with self._condition:
+            self._closed = True
+            jobs = list(self._jobs.values())
+            self._jobs.clear()
+            self._schedule.clear()
+            self._condition.notify_all()
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=False)
+        for job in jobs:
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("Poller closed"))
@@ -0,0 +1,411 @@
+"""
+Near-duplicate prompt cache for any_llm_complete.
+
+Prompts built by the controllers (marketing kits, product descriptions)
+differ only in small ways between requests: whitespace, the order of a
+feature list, a tone word. An exact-match cache never hits on them, so
+PromptCache matches by similarity instead, entirely locally:
+
+    1. normalize: Unicode NFKC, case folding, list markers and
+       punctuation dropped, whitespace collapsed
+    2. shingle: word 3-grams within each line/clause, so reordering
+       lines or comma-separated features keeps the shingle set
+    3. MinHash: 128 hash permutations summarize the shingle set; the
+       fraction of equal minima estimates the Jaccard similarity
+    4. LSH: the signature is cut into 16 bands of 8 rows; prompts sharing
+       any band are candidates (~99% recall at 0.9 similarity, ~6% of
+       pairs at 0.5), found through an indexed SQLite table instead of a
+       scan
+
+Candidates are then checked against the exact Jaccard similarity of
+their shingle sets, and a completion is only reused when the similarity
+reaches the threshold and both prompts contain the same numbers (prices,
+sizes and quantities change the answer even in an otherwise identical
+prompt). Entries only match within their namespace and their exact
+(system prompt, model, temperature, max_tokens) scope.
+
+Entries live in the shared cache database (see fal_cache) and expire per
+namespace: a product description can be reused for days, a trend-based
+marketing line for hours.
+
+Configuration (environment):
+    - FAL_PROMPT_CACHE: set to "0" to disable (callers still have to opt
+      in per call with a namespace)
+    - FAL_PROMPT_CACHE_THRESHOLD: minimum similarity, 0-1 (default: 0.9;
+      below ~0.75 LSH misses a growing share of matches)
+    - FAL_PROMPT_CACHE_TTL: default entry lifetime in seconds (default: 86400)
+    - FAL_PROMPT_CACHE_TTLS: per-namespace lifetimes as a JSON object,
+      e.g. {"marketing-kit": 21600, "description": 604800}
+    - FAL_PROMPT_CACHE_MAX_ENTRIES: size bound (default: 50000)
+
+Example:
+    >>> cache = PromptCache(default_cache_path(), ttls={"description": 7 * 86400})
+    >>> scope = prompt_scope(None, "google/gemini-2.5-flash-lite", 0.7, None)
+    >>> cache.store("description", scope, "Write a description for: red, waterproof", {"output": "..."})
+    >>> cache.lookup("description", scope, "write a description  for: waterproof, red")["similarity"]
+    1.0
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+try:
+    from .fal_cache import _env_flag, _ImmediateTransaction, default_cache_path
+except ImportError:
+    from fal_cache import _env_flag, _ImmediateTransaction, default_cache_path
+
+
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_WORDS = 3
+
+# Universal hashing (a * x + b) mod p over the Mersenne prime 2^61 - 1,
+# with fixed coefficients so signatures are comparable across processes
+_MERSENNE = (1 << 61) - 1
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE - 1) + 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE
+    )
+    for i in range(NUM_PERMUTATIONS)
+]
+
+_LIST_MARKER = re.compile(r"^\s*(?:[-*+•·>]|\d{1,3}[.)])\s+")
+# Clause boundaries: shingles never span them, so reordered items keep theirs
+_CLAUSE = re.compile(r"[\n.,;:!?()\[\]{}|/]+")
+_WORD = re.compile(r"\w+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def normalize_prompt(text: str) -> str:
+    """Canonical form of a prompt: one clause per line, lowercase words separated by single spaces."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    clauses = []
+    for line in text.splitlines():
+        # Numbers first: "19.99" must not be split at the decimal point
+        line = _NUMBER.sub(lambda m: m.group(0).replace(",", "").replace(".", "_"), _LIST_MARKER.sub("", line))
+        for clause in _CLAUSE.split(line):
+            words = _WORD.findall(clause)
+            if words:
+                clauses.append(" ".join(words))
+    return "\n".join(clauses)
+
+
+def prompt_numbers(normalized: str) -> List[str]:
+    """Sorted numbers of a normalized prompt (they must match for a cache hit)."""
+    return sorted(re.findall(r"\d[\d_]*", normalized))
+
+
+def shingles(normalized: str) -> Set[str]:
+    """Word SHINGLE_WORDS-grams of each clause (short clauses count as one shingle)."""
+    result = set()
+    for clause in normalized.split("\n"):
+        words = clause.split(" ")
+        if len(words) <= SHINGLE_WORDS:
+            result.add(clause)
+            continue
+        for i in range(len(words) - SHINGLE_WORDS + 1):
+            result.add(" ".join(words[i:i + SHINGLE_WORDS]))
+    return result
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(items: Iterable[str]) -> List[int]:
+    """MinHash signature (NUM_PERMUTATIONS values) of a set of strings."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big") % _MERSENNE
+        for item in items
+    ]
+    if not hashes:
+        return [_MERSENNE] * NUM_PERMUTATIONS
+    return [min((a * x + b) % _MERSENNE for x in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: List[int], scope: str) -> List[int]:
+    """One LSH bucket per band, salted with the scope so buckets never mix scopes."""
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            f"{scope}|{band}|{','.join(map(str, rows))}".encode(), digest_size=8
+        ).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def prompt_scope(
+    system_prompt: Optional[str],
+    model: str,
+    temperature: Optional[float],
+    max_tokens: Optional[int]
+) -> str:
+    """Exact-match part of a cache key: entries only match within one scope."""
+    system = hashlib.sha256((system_prompt or "").encode("utf-8")).hexdigest()[:16]
+    return f"{model}|{temperature}|{max_tokens}|{system}"
+
+
+def load_ttls(spec: Optional[str] = None) -> Dict[str, float]:
+    """Per-namespace TTLs in seconds from `spec`, or from FAL_PROMPT_CACHE_TTLS when None."""
+    spec = os.environ.get("FAL_PROMPT_CACHE_TTLS") if spec is None else spec
+    if not spec:
+        return {}
+    ttls = json.loads(spec)
+    if not isinstance(ttls, dict):
+        raise ValueError("Prompt cache TTLs must be a JSON object keyed by namespace")
+    return {namespace: float(ttl) for namespace, ttl in ttls.items()}
+
+
+class PromptCache:
+    """
+    Completions keyed by prompt similarity, per namespace and scope.
+
+    Safe to share between threads (one connection per thread) and between
+    processes (SQLite WAL + locking), like SqliteCache.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        threshold: float = 0.9,
+        default_ttl: Optional[float] = 86400,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: Optional[int] = 50000
+    ):
+        """
+        Args:
+            path: SQLite database file (created with its directory if missing)
+            threshold: Minimum Jaccard similarity of the shingle sets for a hit
+            default_ttl: Entry lifetime of namespaces without their own
+                (None: entries never expire)
+            ttls: Entry lifetime per namespace, in seconds
+            max_entries: Maximum entries kept (least recently used evicted)
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.path = path
+        self.threshold = threshold
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._write() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "namespace TEXT NOT NULL, "
+                "scope TEXT NOT NULL, "
+                "normalized TEXT NOT NULL, "
+                "value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS prompt_cache_accessed_at ON prompt_cache (accessed_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS prompt_cache_namespace ON prompt_cache (namespace, created_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache_bands ("
+                "band INTEGER NOT NULL, "
+                "entry_id INTEGER NOT NULL REFERENCES prompt_cache (id) ON DELETE CASCADE)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS prompt_cache_bands_band ON prompt_cache_bands (band)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS prompt_cache_bands_entry ON prompt_cache_bands (entry_id)"
+            )
+            # Shared with SqliteCache (same database)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_counters ("
+                "name TEXT PRIMARY KEY, "
+                "hits INTEGER NOT NULL DEFAULT 0, "
+                "misses INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    @classmethod
+    def from_env(cls) -> Optional["PromptCache"]:
+        """Cache in the shared cache database configured by FAL_PROMPT_CACHE_*, or None if disabled."""
+        if not _env_flag("FAL_PROMPT_CACHE"):
+            return None
+        return cls(
+            default_cache_path(),
+            threshold=float(os.environ.get("FAL_PROMPT_CACHE_THRESHOLD", 0.9)),
+            default_ttl=float(os.environ.get("FAL_PROMPT_CACHE_TTL", 86400)),
+            ttls=load_ttls(),
+            max_entries=int(os.environ.get("FAL_PROMPT_CACHE_MAX_ENTRIES", 50000))
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection in WAL mode, with foreign keys (band rows cascade)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _ImmediateTransaction(self._connection())
+
+    def ttl(self, namespace: str) -> Optional[float]:
+        """Entry lifetime of `namespace` in seconds (None: no expiry)."""
+        return self.ttls.get(namespace, self.default_ttl)
+
+    def _count(self, conn: sqlite3.Connection, namespace: str, column: str) -> None:
+        name = f"prompt:{namespace}"
+        conn.execute("INSERT OR IGNORE INTO cache_counters (name) VALUES (?)", (name,))
+        conn.execute(f"UPDATE cache_counters SET {column} = {column} + 1 WHERE name = ?", (name,))
+
+    def lookup(
+        self,
+        namespace: str,
+        scope: str,
+        prompt: str,
+        *,
+        threshold: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Most similar cached completion for `prompt`, if similar enough.
+
+        Args:
+            namespace: Cache namespace (sets the TTL)
+            scope: prompt_scope() of the call
+            prompt: User prompt
+            threshold: Minimum similarity (default: the cache's)
+
+        Returns:
+            {"value": cached value, "similarity": float, "age_seconds": float}
+            or None on a miss
+        """
+        threshold = self.threshold if threshold is None else threshold
+        normalized = normalize_prompt(prompt)
+        query_shingles = shingles(normalized)
+        numbers = prompt_numbers(normalized)
+        keys = band_keys(minhash(query_shingles), scope)
+
+        now = time.time()
+        ttl = self.ttl(namespace)
+        rows = self._connection().execute(
+            "SELECT id, normalized, value, created_at FROM prompt_cache WHERE id IN ("
+            f"SELECT entry_id FROM prompt_cache_bands WHERE band IN ({', '.join('?' * len(keys))})"
+            ") AND namespace = ? AND scope = ? AND created_at >= ?",
+            (*keys, namespace, scope, now - ttl if ttl is not None else 0)
+        ).fetchall()
+
+        best = None
+        for entry_id, candidate, value, created_at in rows:
+            if candidate != normalized and prompt_numbers(candidate) != numbers:
+                continue
+            similarity = 1.0 if candidate == normalized else jaccard(query_shingles, shingles(candidate))
+            if similarity >= threshold and (best is None or similarity > best[0]):
+                best = (similarity, entry_id, value, created_at)
+
+        with self._write() as conn:
+            if best is None:
+                self._count(conn, namespace, "misses")
+                return None
+            conn.execute("UPDATE prompt_cache SET accessed_at = ? WHERE id = ?", (now, best[1]))
+            self._count(conn, namespace, "hits")
+        return {
+            "value": json.loads(best[2]),
+            "similarity": round(best[0], 4),
+            "age_seconds": round(now - best[3], 1)
+        }
+
+    def store(self, namespace: str, scope: str, prompt: str, value: Any) -> None:
+        """Cache a JSON-serializable completion for `prompt`, then evict expired/excess entries."""
+        normalized = normalize_prompt(prompt)
+        keys = band_keys(minhash(shingles(normalized)), scope)
+        now = time.time()
+        with self._write() as conn:
+            # A prompt normalizing to the same text replaces the older completion
+            conn.execute(
+                "DELETE FROM prompt_cache WHERE namespace = ? AND scope = ? AND normalized = ?",
+                (namespace, scope, normalized)
+            )
+            entry_id = conn.execute(
+                "INSERT INTO prompt_cache (namespace, scope, normalized, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, scope, normalized, json.dumps(value, ensure_ascii=False), now, now)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO prompt_cache_bands (band, entry_id) VALUES (?, ?)",
+                [(key, entry_id) for key in keys]
+            )
+            self._evict(conn, namespace, now)
+
+    def _evict(self, conn: sqlite3.Connection, namespace: str, now: float) -> None:
+        """Drop expired entries of `namespace`, then least recently used ones beyond max_entries."""
+        ttl = self.ttl(namespace)
+        if ttl is not None:
+            conn.execute(
+                "DELETE FROM prompt_cache WHERE namespace = ? AND created_at < ?",
+                (namespace, now - ttl)
+            )
+        if self.max_entries is not None:
+            conn.execute(
+                "DELETE FROM prompt_cache WHERE id IN ("
+                "SELECT id FROM prompt_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        """Remove every entry (of one namespace) and reset its counters. Returns entries deleted."""
+        with self._write() as conn:
+            if namespace is None:
+                conn.execute("DELETE FROM cache_counters WHERE name LIKE 'prompt:%'")
+                return conn.execute("DELETE FROM prompt_cache").rowcount
+            conn.execute("DELETE FROM cache_counters WHERE name = ?", (f"prompt:{namespace}",))
+            return conn.execute("DELETE FROM prompt_cache WHERE namespace = ?", (namespace,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Entries and hit/miss counters per namespace, accumulated across processes."""
+        conn = self._connection()
+        entries = dict(conn.execute(
+            "SELECT namespace, COUNT(*) FROM prompt_cache GROUP BY namespace"
+        ).fetchall())
+        counters = {
+            name[len("prompt:"):]: (hits, misses)
+            for name, hits, misses in conn.execute(
+                "SELECT name, hits, misses FROM cache_counters WHERE name LIKE 'prompt:%'"
+            )
+        }
+        namespaces = {}
+        for namespace in sorted(set(entries) | set(counters)):
+            hits, misses = counters.get(namespace, (0, 0))
+            lookups = hits + misses
+            namespaces[namespace] = {
+                "entries": entries.get(namespace, 0),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+                "ttl_seconds": self.ttl(namespace)
+            }
+        return {
+            "cache": "prompt",
+            "entries": sum(entries.values()),
+            "threshold": self.threshold,
+            "max_entries": self.max_entries,
+            "namespaces": namespaces
+        }
@@ -0,0 +1,385 @@
+"""
+Retry, backoff and circuit breaking for fal_client calls.
+
+Every FalClient call goes through a ResilienceLayer keyed by endpoint
+("fal-ai/any-llm", "fal-ai/nano-banana/edit", "upload", ...):
+
+    - errors are classified as retryable (429, 5xx, timeouts, connection
+      failures) or fatal (validation errors, auth, bad input)
+    - retryable errors are retried with exponential backoff and full jitter
+    - retries are limited by a per-endpoint retry budget (a fraction of
+      recent requests), so an outage does not multiply traffic
+    - a per-endpoint circuit breaker opens after consecutive retryable
+      failures and fails fast until a half-open probe succeeds
+
+Example:
+    >>> layer = ResilienceLayer()
+    >>> info = CallInfo("fal-ai/any-llm")
+    >>> result = layer.call("fal-ai/any-llm", lambda: fal_client.subscribe(...), info)
+    >>> info.as_dict()
+    {'endpoint': 'fal-ai/any-llm', 'attempts': 1, 'circuit': 'closed', 'retried_errors': []}
+"""
+
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Exception class names (httpx, fal_client, stdlib) that indicate transient transport problems
+RETRYABLE_ERROR_NAMES = (
+    "Timeout", "ConnectError", "ConnectionError", "NetworkError",
+    "RemoteProtocolError", "ReadError", "WriteError", "PoolTimeout"
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the endpoint while its circuit breaker is open."""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(
+            f"Circuit open for {endpoint}: endpoint unhealthy, retry in {retry_in:.1f}s"
+        )
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an exception or anything in its cause chain."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None) or getattr(exc, "status_code", None)
+        if isinstance(status, int):
+            return status
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True if `exc` looks transient (rate limit, 5xx, timeout, connection failure)."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if any(name in type(exc).__name__ for name in RETRYABLE_ERROR_NAMES):
+        return True
+
+    # fal_client sometimes only reports the status in the message
+    match = re.search(r"(?:status(?: code)?|HTTP|error)\D{0,3}([45]\d\d)\b", str(exc), re.IGNORECASE)
+    return bool(match) and int(match.group(1)) in RETRYABLE_STATUS_CODES
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: sleep U(0, min(max_delay, base * 2^n))."""
+
+    def __init__(
+        self,
+        *,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (1-based)."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class RetryBudget:
+    """
+    Limits retries to `ratio` of the requests seen in the last `window`
+    seconds, plus `min_retries` so low-traffic endpoints can still retry.
+    """
+
+    def __init__(self, *, ratio: float = 0.2, min_retries: int = 3, window: float = 60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_withdraw(self) -> bool:
+        """Reserve one retry; False when the budget is exhausted."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = self.min_retries + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {"requests": len(self._requests), "retries": len(self._retries)}
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive retryable failures;
+    open -> half_open after `reset_timeout` seconds; half_open lets one
+    probe through and closes on success or re-opens on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, endpoint: str, *, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may proceed; returns True if
+        the call is the half-open probe.
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                elapsed = time.monotonic() - self.opened_at
+                if elapsed < self.reset_timeout:
+                    raise CircuitOpenError(self.endpoint, self.reset_timeout - elapsed)
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(self.endpoint, 0.0)
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """End a half-open probe that neither succeeded nor failed the endpoint."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "open_for": (
+                    round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 2)
+                    if self.state == self.OPEN else 0.0
+                )
+            }
+
+
+class CallInfo:
+    """Attempt count and breaker state of one resilient call (returned to callers)."""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.attempts = 0
+        self.circuit = CircuitBreaker.CLOSED
+        self.retried_errors: List[str] = []
+        # Lane and wait of the call's admission slot, if it needed one (see fal_admission)
+        self.admission: Optional[Dict[str, Any]] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        info = {
+            "endpoint": self.endpoint,
+            "attempts": self.attempts,
+            "circuit": self.circuit,
+            "retried_errors": list(self.retried_errors)
+        }
+        if self.admission is not None:
+            info["admission"] = self.admission
+        return info
+
+
+class ResilienceLayer:
+    """Per-endpoint retry policy, retry budget and circuit breaker."""
+
+    def __init__(
+        self,
+        *,
+        policy: Optional[RetryPolicy] = None,
+        budget_ratio: float = 0.2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ):
+        self.policy = policy or RetryPolicy()
+        self.budget_ratio = budget_ratio
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._budgets: Dict[str, RetryBudget] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(
+                    endpoint,
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout
+                )
+            return self._breakers[endpoint]
+
+    def budget(self, endpoint: str) -> RetryBudget:
+        with self._lock:
+            if endpoint not in self._budgets:
+                self._budgets[endpoint] = RetryBudget(ratio=self.budget_ratio)
+            return self._budgets[endpoint]
+
+    def _attempt_failed(
+        self,
+        endpoint: str,
+        exc: BaseException,
+        info: CallInfo,
+        breaker: CircuitBreaker
+    ) -> Optional[float]:
+        """
+        Book-keep a failed attempt. Returns the backoff delay if the call
+        should be retried, or None if the error must be raised.
+        """
+        if isinstance(exc, CircuitOpenError):
+            info.circuit = breaker.state
+            return None
+
+        retryable = is_retryable(exc)
+        if retryable:
+            breaker.record_failure()
+        else:
+            # The endpoint answered; a bad request says nothing about its health
+            breaker.release_probe()
+        info.circuit = breaker.state
+
+        if (
+            not retryable
+            or info.attempts >= self.policy.max_attempts
+            or breaker.state == CircuitBreaker.OPEN
+            or not self.budget(endpoint).try_withdraw()
+        ):
+            return None
+
+        info.retried_errors.append(str(exc))
+        return self.policy.backoff(info.attempts)
+
+    def call(self, endpoint: str, fn: Callable[[], Any], info: Optional[CallInfo] = None) -> Any:
+        """Run `fn` with retries and circuit breaking; `info` records what happened."""
+        info = info or CallInfo(endpoint)
+        breaker = self.breaker(endpoint)
+        self.budget(endpoint).record_request()
+
+        while True:
+            info.attempts += 1
+            probe = False
+            try:
+                probe = breaker.before_call()
+                result = fn()
+            except Exception as e:
+                delay = self._attempt_failed(endpoint, e, info, breaker)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Interrupted: neither a success nor a failure of the endpoint
+                if probe:
+                    breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            info.circuit = breaker.state
+            return result
+
+    async def acall(
+        self,
+        endpoint: str,
+        factory: Callable[[], Awaitable[Any]],
+        info: Optional[CallInfo] = None
+    ) -> Any:
+        """Async version of call(); `factory` must return a fresh awaitable per attempt."""
+        import asyncio
+
+        info = info or CallInfo(endpoint)
+        breaker = self.breaker(endpoint)
+        self.budget(endpoint).record_request()
+
+        while True:
+            info.attempts += 1
+            probe = False
+            try:
+                probe = breaker.before_call()
+                result = await factory()
+            except Exception as e:
+                delay = self._attempt_failed(endpoint, e, info, breaker)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (e.g. by a timeout around acall): without this the
+                # probe would stay in flight and the breaker half open for good
+                if probe:
+                    breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            info.circuit = breaker.state
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Breaker state and retry budget usage per endpoint."""
+        with self._lock:
+            endpoints = sorted(set(self._breakers) | set(self._budgets))
+        return {
+            endpoint: {
+                "circuit": self.breaker(endpoint).snapshot(),
+                "retry_budget": self.budget(endpoint).snapshot()
+            }
+            for endpoint in endpoints
+        }
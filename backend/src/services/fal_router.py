@@ -0,0 +1,251 @@
+"""
+Latency-aware model routing for the any-llm endpoints.
+
+Callers pass a single model, a ranked list of acceptable models, or a
+named tier (see MODEL_TIERS). ModelRouter keeps an exponentially
+weighted moving average (EWMA) of latency and error rate per model and
+sends each call to the fastest healthy candidate, falling back down the
+list when a model fails:
+
+    - models never measured are tried first (in the caller's order), so
+      every acceptable model gets a latency estimate
+    - a model is unhealthy while its error EWMA is above
+      `error_threshold`, until `cooldown` seconds after its last failure
+    - unhealthy models are still tried last rather than failing the call
+    - a call shed by admission control (result "shed") ends the routing
+      without counting against the model
+
+Example:
+    >>> router = ModelRouter()
+    >>> result = router.route(["google/gemini-2.5-flash-lite", "openai/gpt-4o-mini"], attempt)
+    >>> result["routing"]["model"], result["routing"]["fallbacks"]
+    ('google/gemini-2.5-flash-lite', 0)
+"""
+
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+
+# Named tiers, each a ranked list of acceptable models
+MODEL_TIERS: Dict[str, List[str]] = {
+    "fast": [
+        "google/gemini-2.5-flash-lite",
+        "openai/gpt-4o-mini",
+        "google/gemini-2.5-flash"
+    ],
+    "vision": [
+        "google/gemini-2.5-flash",
+        "google/gemini-2.5-pro"
+    ],
+    "premium": [
+        "google/gemini-2.5-pro",
+        "openai/gpt-4-turbo",
+        "openai/gpt-5-mini"
+    ]
+}
+
+ModelSpec = Union[str, Sequence[str], None]
+
+
+def resolve_models(model: ModelSpec, default: str) -> Tuple[List[str], Optional[str]]:
+    """
+    Normalize a model argument to (ranked models, tier name or None).
+
+    Accepts a model name, a tier name, a comma-separated string of
+    models, a list of models, or None for `default`.
+    """
+    if not model:
+        return [default], None
+    if isinstance(model, str):
+        if model in MODEL_TIERS:
+            return list(MODEL_TIERS[model]), model
+        models = [name.strip() for name in model.split(",") if name.strip()]
+    else:
+        models = [str(name) for name in model if name]
+    if not models:
+        return [default], None
+    # Keep the caller's order, drop duplicates
+    return list(dict.fromkeys(models)), None
+
+
+def model_key(model: ModelSpec) -> str:
+    """Stable string for a model argument (used in cache keys)."""
+    if model is None or isinstance(model, str):
+        return model or ""
+    return ",".join(model)
+
+
+class _ModelStats:
+    """EWMA latency and error rate of one model."""
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.last_failure: Optional[float] = None
+
+
+class ModelRouter:
+    """Per-model latency/error EWMAs and fastest-healthy-first routing (thread-safe)."""
+
+    def __init__(
+        self,
+        *,
+        alpha: float = 0.3,
+        error_threshold: float = 0.5,
+        cooldown: float = 30.0
+    ):
+        """
+        Args:
+            alpha: EWMA smoothing factor (weight of the newest sample)
+            error_threshold: Error-rate EWMA above which a model is unhealthy
+            cooldown: Seconds after its last failure before an unhealthy
+                model is tried first again
+        """
+        self.alpha = alpha
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self._stats: Dict[str, _ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model: str) -> _ModelStats:
+        if model not in self._stats:
+            self._stats[model] = _ModelStats()
+        return self._stats[model]
+
+    def _healthy(self, stats: _ModelStats, now: float) -> bool:
+        if stats.error_rate < self.error_threshold:
+            return True
+        return stats.last_failure is not None and now - stats.last_failure >= self.cooldown
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        """Fold one call outcome into the model's EWMAs."""
+        with self._lock:
+            stats = self._get(model)
+            stats.calls += 1
+            stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+            if ok:
+                if stats.latency is None:
+                    stats.latency = latency
+                else:
+                    stats.latency += self.alpha * (latency - stats.latency)
+            else:
+                stats.failures += 1
+                stats.last_failure = time.monotonic()
+
+    def rank(self, models: List[str]) -> List[str]:
+        """
+        Order `models` for one call: unmeasured models first, then healthy
+        models fastest first, then models that have never succeeded, then
+        unhealthy ones; ties keep the caller's order.
+        """
+        now = time.monotonic()
+        with self._lock:
+            def sort_key(item):
+                position, model = item
+                stats = self._stats.get(model)
+                if stats is None:
+                    return (0, 0.0, position)
+                if not self._healthy(stats, now):
+                    return (2, 0.0, position)
+                if stats.latency is None:
+                    # Failed before ever succeeding: after every measured model
+                    return (1, 0.0, position)
+                return (0, stats.latency, position)
+
+            return [model for _, model in sorted(enumerate(models), key=sort_key)]
+
+    def _model_snapshot(self, model: str, now: float) -> Dict[str, Any]:
+        stats = self._stats.get(model)
+        if stats is None:
+            return {"latency_ewma": None, "error_rate": 0.0, "healthy": True, "calls": 0}
+        return {
+            "latency_ewma": round(stats.latency, 3) if stats.latency is not None else None,
+            "error_rate": round(stats.error_rate, 3),
+            "healthy": self._healthy(stats, now),
+            "calls": stats.calls
+        }
+
+    def snapshot(self, models: Optional[List[str]] = None) -> Dict[str, Any]:
+        """EWMA state of `models` (default: every model seen)."""
+        now = time.monotonic()
+        with self._lock:
+            names = models if models is not None else sorted(self._stats)
+            return {model: self._model_snapshot(model, now) for model in names}
+
+    def _decision(self, models: List[str], tier: Optional[str]) -> Dict[str, Any]:
+        ranked = self.rank(models)
+        return {
+            "tier": tier,
+            "requested": list(models),
+            "ranked": ranked,
+            "model": None,
+            "fallbacks": 0,
+            "attempts": [],
+            "stats": self.snapshot(ranked)
+        }
+
+    def _attempted(self, decision: dict, model: str, started: float, result: Any, error: Optional[str]) -> bool:
+        """Record one attempt; True if it succeeded."""
+        latency = time.monotonic() - started
+        if error is None and isinstance(result, dict):
+            error = result.get("error")
+        ok = error is None
+        shed = isinstance(result, dict) and bool(result.get("shed"))
+        if not shed:
+            # A call shed by admission control says nothing about the model
+            self.record(model, latency, ok)
+        decision["attempts"].append({"model": model, "latency": round(latency, 3), "error": error})
+        decision["model"] = model
+        decision["fallbacks"] = len(decision["attempts"]) - 1
+        return ok
+
+    def route(
+        self,
+        models: List[str],
+        attempt: Callable[[str], dict],
+        *,
+        tier: Optional[str] = None
+    ) -> dict:
+        """
+        Call `attempt(model)` on the ranked models until one returns a
+        result without "error". Returns that result (or the last failure)
+        with the decision under "routing".
+        """
+        decision = self._decision(models, tier)
+        result: dict = {}
+        for model in decision["ranked"]:
+            started = time.monotonic()
+            try:
+                result = attempt(model)
+                error = None
+            except Exception as e:
+                result, error = {"output": "", "error": str(e), "raw": {"exception": str(e)}}, str(e)
+            # Fallbacks would be shed just the same
+            if self._attempted(decision, model, started, result, error) or result.get("shed"):
+                break
+        return {**result, "routing": decision}
+
+    async def aroute(
+        self,
+        models: List[str],
+        attempt: Callable[[str], Awaitable[dict]],
+        *,
+        tier: Optional[str] = None
+    ) -> dict:
+        """Async version of route()."""
+        decision = self._decision(models, tier)
+        result: dict = {}
+        for model in decision["ranked"]:
+            started = time.monotonic()
+            try:
+                result = await attempt(model)
+                error = None
+            except Exception as e:
+                result, error = {"output": "", "error": str(e), "raw": {"exception": str(e)}}, str(e)
+            # Fallbacks would be shed just the same
+            if self._attempted(decision, model, started, result, error) or result.get("shed"):
+                break
+        return {**result, "routing": decision}
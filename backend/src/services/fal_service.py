@@ -9,188 +9,3905 @@ Example:
     >>> client = FalClient()
     >>> result = client.any_llm_complete("Write a short product description")
     >>> print(result["output"])
+
+    >>> client = AsyncFalClient()
+    >>> result = await client.any_llm_complete("Write a short product description")
 """
 
-import os
-import sys
-import json
-import re
-from typing import Optional, Any, List, Dict
-import fal_client
-import requests
+from __future__ import annotations
+
+import hashlib
+import importlib
+import os
+import sys
+import json
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Optional, Any, AsyncIterator, Callable, Iterator, List, Dict, Union
+
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from fal_admission import AdmissionController
+    from fal_cache import SqliteCache
+    from fal_download import ImageDownloader
+    from fal_hedging import HedgePolicy
+    from fal_image import ImagePreprocessor
+    from fal_metrics import MetricsRegistry, PhaseTimer
+    from fal_phash import PerceptualIndex
+    from fal_poller import QueuePoller
+    from fal_prompt_cache import PromptCache
+    from fal_resilience import CallInfo, ResilienceLayer
+    from fal_router import ModelRouter, ModelSpec
+    from fal_singleflight import SingleFlight
+    from fal_usage import UsageLedger
+    from fal_webhook import WebhookStore
+
+
+class _LazyModule:
+    """
+    Module proxy that imports on first attribute access.
+    
+    fal_client (httpx) and asyncio dominate import time, and the worker runs
+    as a fresh process per call; commands that never touch them (cache
+    maintenance, --help, argument errors) should not pay for them.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str) -> Any:
+        # importlib caches in sys.modules, so only the first access imports
+        return getattr(importlib.import_module(self._name), attr)
+
+
+def _sibling(name: str) -> str:
+    """Import name of sibling module `name`, inside the package if fal_service is in one."""
+    return f"{__package__}.{name}" if __package__ else name
+
+
+fal_client = _LazyModule("fal_client")
+asyncio = _LazyModule("asyncio")
+# Sibling modules load with the first call or cache that needs them, so
+# processes that exit before it (dry runs, --help, argument errors) skip
+# sqlite3, concurrent.futures, http.server and the rest
+fal_admission = _LazyModule(_sibling("fal_admission"))
+fal_cache = _LazyModule(_sibling("fal_cache"))
+fal_download = _LazyModule(_sibling("fal_download"))
+fal_hedging = _LazyModule(_sibling("fal_hedging"))
+fal_image = _LazyModule(_sibling("fal_image"))
+fal_metrics = _LazyModule(_sibling("fal_metrics"))
+fal_phash = _LazyModule(_sibling("fal_phash"))
+fal_poller = _LazyModule(_sibling("fal_poller"))
+fal_prompt_cache = _LazyModule(_sibling("fal_prompt_cache"))
+fal_resilience = _LazyModule(_sibling("fal_resilience"))
+fal_router = _LazyModule(_sibling("fal_router"))
+fal_singleflight = _LazyModule(_sibling("fal_singleflight"))
+fal_usage = _LazyModule(_sibling("fal_usage"))
+fal_webhook = _LazyModule(_sibling("fal_webhook"))
+
+
+DEFAULT_LLM_MODEL = "google/gemini-2.5-flash-lite"
+
+# Bump whenever the analysis prompt or parsing changes, to invalidate cached analyses
+ANALYSIS_PROMPT_VERSION = "2"
+
+# Keys every product analysis must contain
+ANALYSIS_REQUIRED_KEYS = [
+    "main_product_type", "subcategory", "target_audience",
+    "price_range", "use_case", "style_design",
+    "season_occasion", "industrial_type", "vibe"
+]
+
+# Images per request in analyze_products_batch
+ANALYSIS_BATCH_SIZE = 8
+
+# Seconds between status polls of a job a caller is blocked on (fal_client.subscribe's default)
+BLOCKING_POLL_INTERVAL = 0.1
+
+DEFAULT_BACKGROUND_PROMPT = (
+    "soft key light, seamless studio backdrop, premium e-commerce look, "
+    "product centered, subtle shadow"
+)
+
+DEFAULT_BACKGROUND_STYLES = [
+    {
+        "name": "Studio_Clean",
+        "description": "Clean white studio background for e-commerce, professional lighting, minimal shadows"
+    },
+    {
+        "name": "Lifestyle_Contextual",
+        "description": "Lifestyle and contextual setting matching the product's use case and target audience"
+    },
+    {
+        "name": "Premium_Artistic",
+        "description": "Premium artistic backdrop with dramatic lighting and sophisticated atmosphere"
+    }
+]
+
+
+def _prompt_cache_scope(
+    system_prompt: Optional[str],
+    model: ModelSpec,
+    temperature: Optional[float],
+    max_tokens: Optional[int]
+) -> str:
+    """Prompt cache scope of an any_llm_complete call, with the defaults _build_llm_arguments applies."""
+    return fal_prompt_cache.prompt_scope(
+        system_prompt or None,
+        fal_router.model_key(model) or DEFAULT_LLM_MODEL,
+        0.7 if temperature is None else float(temperature),
+        max_tokens
+    )
+
+
+def _build_llm_arguments(
+    prompt: str,
+    *,
+    system_prompt: Optional[str] = None,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    priority: Optional[str] = "latency"
+) -> dict:
+    """Build fal-ai/any-llm arguments, applying the default model and temperature."""
+    arguments = {
+        "prompt": prompt,
+        "priority": priority or "latency"
+    }
+    
+    if system_prompt:
+        arguments["system_prompt"] = system_prompt
+    if model:
+        arguments["model"] = model
+    else:
+        arguments["model"] = DEFAULT_LLM_MODEL
+    if temperature is not None:
+        arguments["temperature"] = temperature
+    else:
+        arguments["temperature"] = 0.7
+    if max_tokens is not None:
+        arguments["max_tokens"] = max_tokens
+    
+    return arguments
+
+
+def _build_enterprise_arguments(
+    prompt: str,
+    *,
+    system_prompt: Optional[str] = None,
+    model: Optional[str] = "google/gemini-2.5-pro",
+    temperature: Optional[float] = 0.7,
+    max_tokens: Optional[int] = None
+) -> dict:
+    """Build fal-ai/any-llm/enterprise arguments."""
+    arguments = {
+        "prompt": prompt,
+        "model": model,
+        "temperature": temperature
+    }
+    
+    if system_prompt:
+        arguments["system_prompt"] = system_prompt
+    if max_tokens is not None:
+        arguments["max_tokens"] = max_tokens
+    
+    return arguments
+
+
+def _format_llm_result(result: dict) -> dict:
+    """Shape an any-llm response into the client's result dict."""
+    return {
+        "output": result.get("output", ""),
+        "reasoning": result.get("reasoning"),
+        "partial": result.get("partial", False),
+        "error": None,
+        "raw": result
+    }
+
+
+def _format_llm_error(e: Exception) -> dict:
+    """Shape an any-llm failure into the client's result dict."""
+    return {
+        "output": "",
+        "reasoning": None,
+        "partial": False,
+        "error": str(e),
+        "raw": {"exception": str(e)},
+        **_shed(e)
+    }
+
+
+def _shed(e: Exception) -> dict:
+    """{"shed": True} for calls rejected by admission control (ModelRouter stops there), else {}."""
+    return {"shed": True} if isinstance(e, fal_admission.AdmissionRejected) else {}
+
+
+class _StreamAccumulator:
+    """
+    Turns raw any-llm stream events (cumulative "output") into structured deltas.
+    
+    Delta record:
+        {"type": "delta", "delta": str, "output": str, "reasoning": str|None,
+         "partial": bool, "error": str|None}
+    Terminal record (from final()):
+        {"type": "done", "output": str, "reasoning": str|None, "partial": bool,
+         "usage": dict|None, "error": str|None, "events": int}
+    """
+
+    def __init__(self):
+        self.output = ""
+        self.reasoning = None
+        self.last_event: dict = {}
+        self.events = 0
+
+    def delta(self, event: Any) -> Optional[dict]:
+        """Delta record for one raw event, or None if it carries nothing new."""
+        if not isinstance(event, dict):
+            event = {"output": self.output + str(event), "partial": True}
+        self.events += 1
+        self.last_event = event
+        
+        output = event.get("output") or ""
+        if output.startswith(self.output):
+            text = output[len(self.output):]
+        else:
+            # Provider rewrote the output; resend it whole
+            text = output
+        reasoning = event.get("reasoning")
+        
+        changed = bool(text) or reasoning != self.reasoning or event.get("error")
+        self.output = output
+        self.reasoning = reasoning
+        if not changed:
+            return None
+        
+        return {
+            "type": "delta",
+            "delta": text,
+            "output": output,
+            "reasoning": reasoning,
+            "partial": event.get("partial", True),
+            "error": event.get("error")
+        }
+
+    def final(self) -> dict:
+        """Terminal record summarizing the whole stream."""
+        return {
+            "type": "done",
+            "output": self.output,
+            "reasoning": self.reasoning,
+            "partial": bool(self.last_event.get("partial", False)),
+            "usage": self.last_event.get("usage"),
+            "error": self.last_event.get("error"),
+            "events": self.events
+        }
+
+
+class _JsonObjectScanner:
+    """
+    Incremental scanner for the first JSON object in streamed text that
+    contains every one of `required_keys`.
+    
+    Feed it the cumulative output after each stream event; it only scans
+    the new text, tracking brace depth outside of string literals, and
+    tries json.loads once per top-level object that closes. Objects that do
+    not parse or lack a key (e.g. braces in a free-text preamble) are skipped.
+    
+        >>> scanner = _JsonObjectScanner(["a"])
+        >>> scanner.update('Sure: {"a": "x{')
+        >>> scanner.update('Sure: {"a": "x{"} and more')
+        {'a': 'x{'}
+    """
+
+    def __init__(self, required_keys: List[str]):
+        self.required_keys = required_keys
+        self.text = ""
+        self.result: Optional[dict] = None
+        self.end: Optional[int] = None
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def update(self, output: str) -> Optional[dict]:
+        """
+        Scan the cumulative `output`; returns the object once found.
+        
+        Output that does not extend the previous text (a provider rewrite)
+        restarts the scan.
+        """
+        if self.result is not None:
+            return self.result
+        if not output.startswith(self.text):
+            self.__init__(self.required_keys)
+        self.text = output
+        
+        text = self.text
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._start is None:
+                if char == "{":
+                    self._start, self._depth = pos, 1
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self._candidate(text[self._start:pos + 1])
+                    self._start = None
+                    if candidate is not None:
+                        self.result, self.end, self._pos = candidate, pos + 1, pos + 1
+                        return self.result
+        self._pos = len(text)
+        return None
+
+    def _candidate(self, fragment: str) -> Optional[dict]:
+        try:
+            value = json.loads(fragment)
+        except ValueError:
+            return None
+        if isinstance(value, dict) and all(key in value for key in self.required_keys):
+            return value
+        return None
+
+
+def _open_stream(events):
+    """
+    Pull the first stream event eagerly so connection and HTTP errors
+    surface (and can be retried) before anything is yielded to the caller.
+    """
+    events = iter(events)
+    try:
+        first = next(events)
+    except StopIteration:
+        return iter(())
+    
+    def chained():
+        try:
+            yield first
+            yield from events
+        finally:
+            # Closing early (even before the second event) closes the stream
+            if hasattr(events, "close"):
+                events.close()
+    
+    return chained()
+
+
+async def _open_stream_async(events):
+    """Async version of _open_stream; returns an async iterator."""
+    iterator = events.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        first = None
+        exhausted = True
+    else:
+        exhausted = False
+    
+    async def chained():
+        if exhausted:
+            return
+        try:
+            yield first
+            async for event in iterator:
+                yield event
+        finally:
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+    
+    return chained()
+
+
+# Category definitions shared by the analysis and analyze-and-prompt requests
+_ANALYSIS_CATEGORIES = """Categories to determine:
+1. Main Product Type - Be very specific (Examples: Footwear, Electronics, Clothing, Food, Furniture, Accessories, Sports Equipment, Home Decor, Beauty Products, etc.)
+2. Subcategory - Detailed classification (Examples for Footwear: Sneakers, High-top Sneakers, Low-top Sneakers, Boots, Running Shoes, Sandals, Formal Shoes; for Electronics: Smartphone, Laptop, Camera, Headphones; for Clothing: T-shirt, Jeans, Dress, Jacket)
+3. Target Audience (Examples: Men, Women, Kids, Unisex, Teenagers, Adults, Professional, Athletes)
+4. Price Range (Budget, Mid-range, Premium, Luxury)
+5. Use Case (Daily Use, Professional, Sports/Athletic, Casual Lifestyle, Formal, Outdoor, Indoor, etc.)
+6. Style/Design (Modern, Classic, Vintage/Retro, Minimalist, Bold/Statement, Streetwear, Athletic, Elegant, etc.)
+7. Season/Occasion (All Season, Spring/Summer, Fall/Winter, Casual Daily, Formal Events, Sports/Active, etc.)
+8. Industrial Type (Footwear Manufacturing, Fashion/Apparel, Food & Beverage, Electronics Manufacturing, Furniture, Textile, etc.)
+9. Vibe (Fun, Relaxing, Energetic, Professional, Casual, Urban/Street, Sporty, Sophisticated, Youthful, etc.)
+
+CRITICAL INSTRUCTIONS:
+- Look VERY CAREFULLY at the actual product in the image
+- Only consider most exposed product in the image
+- Do NOT make assumptions - only categorize what you actually see
+- Be as specific and accurate as possible
+- If you see shoes, they are NOT clothing or swimwear - they are Footwear
+- If you see electronics, specify the exact type
+- Match all 9 categories to the actual product you see"""
+
+_ANALYSIS_INSTRUCTIONS = f"""STEP 1: First, carefully describe what you see in the image. What is the main product?
+
+STEP 2: Then categorize the product into exactly 9 categories with specific classifications.
+
+{_ANALYSIS_CATEGORIES}"""
+
+# Requirements every generated background prompt must meet
+_BACKGROUND_PROMPT_REQUIREMENTS = """- The prompt must START with "Change only the background to..."
+- The prompt must be specific about keeping the original product unchanged
+- The prompt must be suitable for e-commerce photography
+- The prompt should be creative and detailed
+- The prompt should match the product's categories and the requested style type
+- Length: 2-3 sentences maximum"""
+
+
+def _build_analysis_prompt(image_url: str, preamble: bool = True) -> str:
+    """
+    Detailed prompt for 9-category product analysis.
+    
+    With preamble=False the model is told to answer with the JSON object
+    only, without first describing the image, so the time to a result is
+    bounded by the JSON itself.
+    """
+    if not preamble:
+        return f"""Image URL: {image_url}
+
+You are an expert product analyst for e-commerce. Categorize the product in the image provided into exactly 9 categories with specific classifications.
+
+{_ANALYSIS_CATEGORIES}
+
+Do NOT describe the image or explain your answer. Respond with ONLY a JSON object in this EXACT format, starting with {{ (no code fences, no text before or after it):
+{{
+    "main_product_type": "category_value",
+    "subcategory": "specific_subcategory",
+    "target_audience": "audience_value",
+    "price_range": "price_value",
+    "use_case": "use_case_value",
+    "style_design": "style_value",
+    "season_occasion": "season_value",
+    "industrial_type": "industry_value",
+    "vibe": "vibe_value"
+}}"""
+    return f"""Image URL: {image_url}
+
+You are an expert product analyst for e-commerce. Analyze the product image provided.
+
+{_ANALYSIS_INSTRUCTIONS}
+
+Respond with a JSON object in this EXACT format (no additional text):
+{{
+    "main_product_type": "category_value",
+    "subcategory": "specific_subcategory",
+    "target_audience": "audience_value",
+    "price_range": "price_value",
+    "use_case": "use_case_value",
+    "style_design": "style_value",
+    "season_occasion": "season_value",
+    "industrial_type": "industry_value",
+    "vibe": "vibe_value"
+}}"""
+
+
+def _parse_analysis_output(output_text: Any) -> dict:
+    """
+    Extract the categories dict from a model response and fill any
+    missing category with "Unknown".
+    """
+    # Parse JSON from output
+    # Try direct JSON parse first
+    if isinstance(output_text, dict):
+        categories = output_text
+    else:
+        # First complete object with every category (skips braces in the
+        # description preamble), else the widest {...} span
+        categories = _JsonObjectScanner(ANALYSIS_REQUIRED_KEYS).update(output_text)
+        if categories is None:
+            json_match = re.search(r'\{[\s\S]*\}', output_text)
+            if json_match:
+                categories = json.loads(json_match.group())
+            else:
+                raise RuntimeError("No JSON found in response")
+    
+    # Validate that we have all 9 categories
+    for key in ANALYSIS_REQUIRED_KEYS:
+        if key not in categories:
+            categories[key] = "Unknown"
+    
+    return categories
+
+
+def _build_background_prompt_request(categories: dict, style_type: str) -> str:
+    """Prompt asking the LLM for an image-to-image background replacement prompt."""
+    # Build categories text
+    categories_text = "\n".join([f"- {key}: {value}" for key, value in categories.items()])
+    
+    return f"""Based on these product categories:
+{categories_text}
+
+Generate a detailed, professional image generation prompt for an image-to-image background replacement task.
+
+The style type is: {style_type}
+
+Requirements:
+{_BACKGROUND_PROMPT_REQUIREMENTS}
+
+Return ONLY the prompt text, nothing else."""
+
+
+def _fallback_background_prompt(categories: dict, style_type: str) -> str:
+    """Template prompt used when the LLM returns nothing or fails."""
+    subcategory = categories.get("subcategory") or "product"
+    if subcategory == "Unknown":
+        subcategory = "product"
+    return f"Change only the background to a {style_type} style. Keep the {subcategory} exactly as it is in the original image."
+
+
+def _build_analyze_and_prompt_request(image_url: str, styles: List[dict]) -> str:
+    """Prompt asking a vision model for the 9 categories plus one background prompt per style."""
+    style_lines = "\n".join(f"- {json.dumps(style['name'])}: {style['description']}" for style in styles)
+    prompt_lines = ",\n".join(
+        f'        {json.dumps(style["name"])}: "Change only the background to ..."' for style in styles
+    )
+    return f"""Image URL: {image_url}
+
+You are an expert product analyst and e-commerce art director. Analyze the product image provided, then write one background replacement prompt per requested style.
+
+{_ANALYSIS_INSTRUCTIONS}
+
+STEP 3: For each style below, write an image-to-image background replacement prompt for this product, based on its categories.
+
+Styles:
+{style_lines}
+
+Prompt requirements:
+{_BACKGROUND_PROMPT_REQUIREMENTS}
+
+Respond with a JSON object in this EXACT format (no additional text), with one entry in "prompts" per style, keyed by the style name:
+{{
+    "categories": {{
+        "main_product_type": "category_value",
+        "subcategory": "specific_subcategory",
+        "target_audience": "audience_value",
+        "price_range": "price_value",
+        "use_case": "use_case_value",
+        "style_design": "style_value",
+        "season_occasion": "season_value",
+        "industrial_type": "industry_value",
+        "vibe": "vibe_value"
+    }},
+    "prompts": {{
+{prompt_lines}
+    }}
+}}"""
+
+
+def _styles_signature(styles: List[dict]) -> str:
+    """Short stable digest of a style list (part of analyze-and-prompt cache keys)."""
+    canonical = json.dumps(
+        [[style["name"], style["description"]] for style in styles],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _background_prompt_problem(prompt: Any) -> Optional[str]:
+    """Why a model-written background prompt is unusable, or None if it is valid."""
+    if not isinstance(prompt, str) or not prompt.strip():
+        return "missing or empty prompt"
+    if not prompt.strip().strip('"').lower().startswith("change only the background"):
+        return 'prompt does not start with "Change only the background"'
+    if len(prompt) > 1200:
+        return "prompt longer than 1200 characters"
+    return None
+
+
+def _parse_analyze_and_prompt_output(output_text: Any, styles: List[dict]) -> tuple:
+    """
+    Validate a fused analysis response ({"categories": {...}, "prompts": {...}}).
+    
+    Categories are validated like _parse_analysis_output (missing or non-text
+    values become "Unknown"). Each style's prompt must be a non-empty string
+    starting with "Change only the background"; invalid or missing prompts are
+    replaced by _fallback_background_prompt. "prompts" may also be a list in
+    style order.
+    
+    Returns:
+        (categories, prompts by style name, fallback reasons by style name)
+    
+    Raises:
+        RuntimeError: No JSON object with a "categories" object in the response
+    """
+    if isinstance(output_text, dict):
+        data = output_text
+    else:
+        json_match = re.search(r'\{[\s\S]*\}', output_text or "")
+        if not json_match:
+            raise RuntimeError("No JSON found in response")
+        try:
+            data = json.loads(json_match.group())
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Invalid JSON in response: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get("categories"), dict):
+        raise RuntimeError('Response has no "categories" object')
+    
+    categories = _parse_analysis_output(dict(data["categories"]))
+    for key in ANALYSIS_REQUIRED_KEYS:
+        if not isinstance(categories[key], str) or not categories[key].strip():
+            categories[key] = "Unknown"
+    
+    raw_prompts = data.get("prompts")
+    if isinstance(raw_prompts, list):
+        raw_prompts = {style["name"]: prompt for style, prompt in zip(styles, raw_prompts)}
+    elif not isinstance(raw_prompts, dict):
+        raw_prompts = {}
+    
+    prompts = {}
+    fallbacks = {}
+    for style in styles:
+        candidate = raw_prompts.get(style["name"])
+        problem = _background_prompt_problem(candidate)
+        if problem is None:
+            prompts[style["name"]] = candidate.strip().strip('"').strip()
+        else:
+            prompts[style["name"]] = _fallback_background_prompt(categories, style["description"])
+            fallbacks[style["name"]] = problem
+    
+    return categories, prompts, fallbacks
+
+
+def _build_batch_analysis_prompt(image_urls: List[str]) -> str:
+    """JSON-only prompt for the 9-category analysis of several images in one request."""
+    count = len(image_urls)
+    image_lines = "\n".join(f"Image {index} URL: {url}" for index, url in enumerate(image_urls, 1))
+    return f"""{image_lines}
+
+You are an expert product analyst for e-commerce. Analyze each of the {count} product images provided on its own, and categorize the product in each image into exactly 9 categories with specific classifications.
+
+{_ANALYSIS_CATEGORIES}
+
+Do NOT describe the images or explain your answers. Respond with ONLY a JSON array of exactly {count} objects, one per image in the order given, each with the image number as "index" (no code fences, no text before or after it):
+[
+    {{
+        "index": 1,
+        "main_product_type": "category_value",
+        "subcategory": "specific_subcategory",
+        "target_audience": "audience_value",
+        "price_range": "price_value",
+        "use_case": "use_case_value",
+        "style_design": "style_value",
+        "season_occasion": "season_value",
+        "industrial_type": "industry_value",
+        "vibe": "vibe_value"
+    }}
+]"""
+
+
+def _parse_batch_analysis_output(output_text: Any, count: int) -> Dict[int, dict]:
+    """
+    Demultiplex a batched analysis response (a JSON array of objects with
+    "index" 1..count plus the 9 categories) into categories per image.
+    
+    Entries are validated per image: an image whose entry is missing,
+    duplicated, out of range or lacks a non-empty category gets no result,
+    so the caller can retry it. Entries without "index" are matched by
+    position.
+    
+    Returns:
+        {0-based image position: categories} for the valid entries
+    
+    Raises:
+        RuntimeError: No JSON array in the response
+    """
+    if isinstance(output_text, (list, dict)):
+        data = output_text
+    else:
+        json_match = re.search(r'\[[\s\S]*\]', output_text or "")
+        if not json_match:
+            raise RuntimeError("No JSON array found in response")
+        try:
+            data = json.loads(json_match.group())
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Invalid JSON in response: {e}")
+    if isinstance(data, dict):
+        data = data.get("results")
+    if not isinstance(data, list):
+        raise RuntimeError("Response is not a JSON array")
+    
+    entries: Dict[int, List[dict]] = {}
+    for position, item in enumerate(data):
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index", position + 1)
+        if isinstance(index, str) and index.strip().isdigit():
+            index = int(index)
+        if isinstance(index, bool) or not isinstance(index, int) or not 1 <= index <= count:
+            continue
+        entries.setdefault(index - 1, []).append(item)
+    
+    results = {}
+    for position, items in entries.items():
+        if len(items) > 1:
+            # Two entries claim the same image; neither can be trusted
+            continue
+        categories = {key: items[0].get(key) for key in ANALYSIS_REQUIRED_KEYS}
+        if all(isinstance(value, str) and value.strip() for value in categories.values()):
+            results[position] = {key: value.strip() for key, value in categories.items()}
+    return results
+
+
+def _batch_analysis_result(url: str, analysis: dict, batch_size: int) -> dict:
+    """One image's entry in analyze_products_batch results."""
+    return {
+        "image_url": url,
+        "categories": analysis.get("categories") or {},
+        "error": analysis.get("error"),
+        "cached": bool(analysis.get("cached")),
+        "batch_size": batch_size
+    }
+
+
+def _batch_resplit(batch: List[str], results: Dict[str, dict]) -> List[List[str]]:
+    """The halves of `batch` to retry: its images without an entry in `results`."""
+    missing = [url for url in batch if url not in results]
+    middle = max(1, len(missing) // 2)
+    return [part for part in (missing[:middle], missing[middle:]) if part]
+
+
+def _add_stats(stats: Dict[str, int], increments: Dict[str, int]) -> None:
+    """Add the counters of a sub-call to `stats`."""
+    for name, value in increments.items():
+        stats[name] += value
+
+
+def _analysis_stream_info(result: dict) -> dict:
+    """The "stream" entry of an analysis result: how the completion was read."""
+    return {
+        "streamed": bool(result.get("streamed")),
+        "stopped_early": bool(result.get("stopped_early")),
+        "events": result.get("events", 0)
+    }
+
+
+def _stream_never_started(result: dict) -> bool:
+    """Whether a streamed analysis failed before its first event, so the blocking call should be tried."""
+    if result.get("error") and not result.get("events") and not result.get("shed"):
+        print(f"[analyze] stream failed ({result['error']}); retrying without streaming", file=sys.stderr)
+        return True
+    return False
+
+
+def _failed_analyze_and_prompt(styles: List[dict], error: Exception, result: Optional[dict]) -> dict:
+    """analyze_and_prompt result for a failed call: template prompts for every style."""
+    return {
+        "categories": {},
+        "prompts": {style["name"]: _fallback_background_prompt({}, style["description"]) for style in styles},
+        "fallbacks": {style["name"]: "analysis failed" for style in styles},
+        "error": str(error),
+        "raw_output": "",
+        "cached": False,
+        "resilience": result.get("resilience") if result else None,
+        "routing": result.get("routing") if result else None
+    }
+
+
+def _format_background_result(result: dict) -> dict:
+    """Shape a nano-banana/edit response; raises if no image was generated."""
+    # Format response to match expected structure
+    if "images" in result and len(result["images"]) > 0:
+        first_image = result["images"][0]
+        return {
+            "image": first_image,
+            "images": result["images"],
+            "timings": result.get("timings", {}),
+            "has_nsfw_concepts": result.get("has_nsfw_concepts", [False])
+        }
+    else:
+        raise RuntimeError("No images generated in response")
+
+
+def _build_background_arguments(image_url: str, prompt: str) -> dict:
+    """Build fal-ai/nano-banana/edit arguments (the prompt is used as given)."""
+    # The /edit endpoint preserves the product automatically
+    return {
+        "prompt": prompt,
+        "image_urls": [image_url]
+    }
+
+
+def _format_queue_status(request_id: str, status: Any) -> dict:
+    """Shape a fal_client queue status object as a JSON-friendly dict."""
+    if isinstance(status, fal_client.Queued):
+        return {"request_id": request_id, "status": "queued", "queue_position": status.position}
+    if isinstance(status, fal_client.InProgress):
+        return {"request_id": request_id, "status": "in_progress", "queue_position": None}
+    return {"request_id": request_id, "status": "completed", "queue_position": None}
+
+
+def _format_llm_status(request_id: str, status: Any, with_logs: bool) -> dict:
+    """_format_queue_status plus the request's logs, when they were requested."""
+    result = _format_queue_status(request_id, status)
+    if with_logs:
+        result["logs"] = getattr(status, "logs", None)
+    return result
+
+
+def _format_webhook_record(record: dict) -> dict:
+    """Turn a stored webhook completion into the matching client result."""
+    payload = record.get("payload")
+    webhook = {"status": record.get("status"), "received_at": record.get("received_at")}
+    if record.get("status") == "ERROR":
+        return {
+            "error": record.get("error") or "Request failed",
+            "raw": payload,
+            "request_id": record["request_id"],
+            "webhook": webhook
+        }
+    if isinstance(payload, dict) and "images" in payload:
+        result = _format_background_result(payload)
+    elif isinstance(payload, dict) and "output" in payload:
+        result = _format_llm_result(payload)
+    else:
+        result = {"raw": payload, "error": None}
+    return {**result, "request_id": record["request_id"], "webhook": webhook}
+
+
+def _style_image_entry(style: dict, bg_prompt: str, bg_result: dict) -> dict:
+    """Result entry for one generated style variation."""
+    return {
+        "style_name": style["name"],
+        "style_description": style["description"],
+        "image_url": bg_result["image"]["url"],
+        "prompt": bg_prompt,
+        "width": bg_result["image"].get("width"),
+        "height": bg_result["image"].get("height")
+    }
+
+
+def _style_outcome(style: dict, bg_prompt: str, bg_result: dict) -> tuple:
+    """_generate_style_background outcome of a background_replace result."""
+    if "image" in bg_result:
+        return ("image", _style_image_entry(style, bg_prompt, bg_result))
+    return ("error", {"style": style["name"], "error": "No image in response"})
+
+
+def _style_prompt_failure(style: dict, prompt_result: dict) -> Optional[tuple]:
+    """_generate_style_background outcome when its prompt generation failed, else None."""
+    if prompt_result.get("error"):
+        return ("error", {
+            "style": style["name"],
+            "error": f"Prompt generation failed: {prompt_result['error']}"
+        })
+    return None
+
+
+def _flight_key(operation: str, *parts: Any) -> tuple:
+    """
+    Single-flight key of a call: existing local paths are resolved,
+    strings stripped, and dicts/lists serialized canonically.
+    """
+    normalized = []
+    for part in parts:
+        if isinstance(part, str):
+            part = os.path.realpath(part) if os.path.exists(part) else part.strip()
+        elif isinstance(part, (dict, list, tuple)):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False, default=str)
+        normalized.append(part)
+    return (operation, *normalized)
+
+
+class _HedgedCall:
+    """
+    Bookkeeping of one hedged any-llm call, shared by both clients' _hedged_complete:
+    per-leg call info, timers and queue handles, plus the cancelled request ids.
+    """
+
+    LEGS = ("primary", "hedge")
+
+    def __init__(self, policy: HedgePolicy, arguments: dict, hedge_delay: Optional[float]):
+        self.policy = policy
+        self.threshold = hedge_delay if hedge_delay is not None else policy.threshold()
+        policy.record_request()
+        self.infos = [fal_resilience.CallInfo("fal-ai/any-llm") for _ in self.LEGS]
+        self.timers = [fal_metrics.PhaseTimer("fal-ai/any-llm", arguments.get("model")) for _ in self.LEGS]
+        self.handles: List[Any] = [None, None]
+        self.cancelled: List[str] = []
+        self.started = time.monotonic()
+
+    def leg_started(self, index: int) -> None:
+        """Time a hedge leg's wait for the threshold."""
+        if index:
+            self.timers[index].add("hedge_wait", time.monotonic() - self.started)
+
+    def should_hedge(self) -> bool:
+        """Whether to start the hedge leg, the primary having missed the threshold."""
+        if not self.policy.try_hedge():
+            return False
+        print(f"[FAL Hedge] no result after {self.threshold:.2f}s, hedging", file=sys.stderr)
+        return True
+
+    def cancel_done(self, handle: Any, error: Optional[Exception] = None) -> None:
+        """Count the cancellation of a losing leg's request."""
+        if error is not None:
+            print(f"[FAL Hedge] cancel of {handle.request_id} failed: {error}", file=sys.stderr)
+            self.policy.record_cancel(False)
+            return
+        self.cancelled.append(handle.request_id)
+        self.policy.record_cancel(True)
+
+    def summary(self, legs: int, winner: Optional[int]) -> dict:
+        """The "hedge" entry of the result."""
+        return {
+            "hedged": legs > 1,
+            "winner": self.LEGS[winner] if winner is not None else None,
+            "threshold": round(self.threshold, 3),
+            "cancelled": self.cancelled
+        }
+
+
+class _BatchAnalysis:
+    """State of one analyze_products_batch call, shared by both clients."""
+
+    def __init__(self, image_urls: List[str], batch_size: int, model: ModelSpec):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.image_urls = image_urls
+        self.batch_size = batch_size
+        self.timer = fal_metrics.PhaseTimer("analyze-batch", fal_router.model_key(model))
+        self.unique = list(dict.fromkeys(image_urls))
+        self.stats = {"images": len(self.unique), "cached": 0, "calls": 0, "resplits": 0, "single": 0, "errors": 0}
+        self.results: Dict[str, dict] = {}
+        self.cache_keys: Dict[str, Optional[str]] = {}
+
+    def add_cached(self, lookups: List[tuple]) -> None:
+        """Take the (cache key, cached analysis) of each unique image."""
+        for url, (key, cached) in zip(self.unique, lookups):
+            self.cache_keys[url] = key
+            if cached is not None:
+                self.results[url] = _batch_analysis_result(url, cached, 0)
+                self.stats["cached"] += 1
+
+    def batches(self) -> List[List[str]]:
+        """The images still to analyze, `batch_size` per request."""
+        pending = [url for url in self.unique if url not in self.results]
+        return [pending[start:start + self.batch_size] for start in range(0, len(pending), self.batch_size)]
+
+    def add(self, results: Dict[str, dict], stats: Dict[str, int]) -> None:
+        """Take the outcome of one batch."""
+        self.results.update(results)
+        _add_stats(self.stats, stats)
+
+    def summary(self) -> dict:
+        """analyze_products_batch result (before timings)."""
+        self.stats["errors"] = sum(1 for url in self.unique if self.results[url]["error"])
+        return {
+            "results": [self.results[url] for url in self.image_urls],
+            "stats": self.stats,
+            "error": None
+        }
+
+
+def _configure_fal_key() -> str:
+    """Validate the FAL API key and export it where fal-client expects it."""
+    # Support both FAL_KEY and FAL_API_KEY
+    fal_key = os.environ.get("FAL_KEY") or os.environ.get("FAL_API_KEY")
+    if not fal_key:
+        raise ValueError(
+            "FAL_KEY or FAL_API_KEY environment variable is required. "
+            "Please set it in your .env file or environment."
+        )
+    
+    # Set FAL credentials (fal-client expects FAL_KEY)
+    os.environ["FAL_KEY"] = fal_key
+    return fal_key
+
+
+# Timers of client-side work or of calls already recorded as their own
+# FAL calls; the usage ledger only holds calls to FAL itself
+_UNLEDGERED_ENDPOINTS = (
+    "analyze-product", "analyze-batch", "analyze-and-prompt", "generate-bg-prompt", "download", "prompt-cache"
+)
+
+
+class _FalClientBase:
+    """State and helpers shared by FalClient and AsyncFalClient."""
+
+    def __init__(
+        self,
+        *,
+        upload_cache: Optional[SqliteCache] = None,
+        use_upload_cache: bool = True,
+        analysis_cache: Optional[SqliteCache] = None,
+        use_analysis_cache: bool = True,
+        background_cache: Optional[SqliteCache] = None,
+        phash_index: Optional[PerceptualIndex] = None,
+        use_phash_index: bool = True,
+        prompt_cache: Optional[PromptCache] = None,
+        use_prompt_cache: bool = True,
+        resilience: Optional[ResilienceLayer] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        router: Optional[ModelRouter] = None,
+        webhook_store: Optional["WebhookStore"] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        preprocessor: Optional[ImagePreprocessor] = None,
+        downloader: Optional[ImageDownloader] = None,
+        download_results: Optional[bool] = None,
+        usage_ledger: Optional[UsageLedger] = None,
+        use_usage_ledger: bool = True,
+        admission: Optional[AdmissionController] = None,
+        use_admission: bool = True
+    ):
+        """
+        Initialize FAL client and validate API key.
+        
+        Args:
+            upload_cache: Cache mapping file SHA-256 to CDN URL
+                (default: shared on-disk cache, see fal_cache)
+            use_upload_cache: Set False to always re-upload files
+            analysis_cache: Cache of analyze_product_image results keyed by
+                image content, model, temperature and prompt version
+            use_analysis_cache: Set False to always call the model
+            background_cache: Cache of background_replace results keyed by
+                image content and prompt, used by calls with reuse=True
+            phash_index: Perceptual hashes of images with cached results;
+                a cache miss falls back to the results of a near-duplicate
+                image (default: shared on-disk index configured by
+                FAL_PHASH_*, see fal_phash)
+            use_phash_index: Set False to only reuse results of identical files
+            prompt_cache: Similarity cache serving any_llm_complete calls
+                made with a cache_namespace (default: shared on-disk cache
+                configured by FAL_PROMPT_CACHE_*, see fal_prompt_cache)
+            use_prompt_cache: Set False to never reuse completions
+            resilience: Retry/backoff/circuit-breaker layer wrapped around
+                every fal_client call (default: one per client)
+            hedge_policy: Threshold, cap and statistics for hedged
+                any_llm_complete calls (`hedge=True`)
+            router: Latency/error tracking and fallback across models for
+                the any-llm endpoints (default: one per client)
+            webhook_store: Where the webhook receiver stores completions
+                (default: shared on-disk store, see fal_webhook)
+            metrics: Registry receiving per-phase timing histograms of
+                every call (default: one per client)
+            preprocessor: Downscales/re-encodes local images before they
+                are uploaded (default: configured by FAL_PREPROCESS*,
+                off unless FAL_PREPROCESS=1)
+            downloader: Fetches generated images into the local image store
+                (default: configured by FAL_IMAGE_STORE_*, see fal_download)
+            download_results: Default of the `download` option of
+                background_replace/generate_multiple_backgrounds
+                (default: FAL_DOWNLOAD_RESULTS=1, else False)
+            usage_ledger: Where every FAL call's tokens, wall time and
+                outcome are appended (default: shared on-disk ledger, see
+                fal_usage; off with FAL_USAGE_LEDGER=0)
+            use_usage_ledger: Set False to record nothing
+            admission: Token buckets, concurrency limits and interactive/bulk
+                queues in front of every call that starts work on an
+                endpoint (default: shared on-disk controller configured by
+                FAL_ADMISSION_*, see fal_admission)
+            use_admission: Set False to send every call immediately
+        """
+        self.fal_key = _configure_fal_key()
+        # Built on first use (see _component); given ones are used as-is
+        self._components: Dict[str, Any] = {
+            name: component
+            for name, component in (
+                ("resilience", resilience),
+                ("hedge_policy", hedge_policy),
+                ("router", router),
+                ("metrics", metrics),
+                ("preprocessor", preprocessor)
+            )
+            if component is not None
+        }
+        self._component_lock = threading.Lock()
+        self.download_results = (
+            os.environ.get("FAL_DOWNLOAD_RESULTS", "0").strip().lower() in ("1", "true", "yes", "on")
+            if download_results is None else download_results
+        )
+        self._downloader = downloader
+        self._usage_ledger = usage_ledger
+        self._use_usage_ledger = use_usage_ledger
+        self._admission = admission
+        self._use_admission = use_admission
+        self._phash_index = phash_index
+        self._use_phash_index = use_phash_index
+        self._prompt_cache = prompt_cache
+        self._use_prompt_cache = use_prompt_cache
+        self._poller: Optional["QueuePoller"] = None
+        self._webhook_store = webhook_store
+        self._lock = threading.Lock()
+        self._caches = {
+            "uploads": upload_cache,
+            "analysis": analysis_cache,
+            "image_hashes": None,
+            "backgrounds": background_cache
+        }
+        self._cache_enabled = {
+            "uploads": use_upload_cache,
+            "analysis": use_analysis_cache,
+            "image_hashes": use_analysis_cache,
+            "backgrounds": True
+        }
+
+    def _component(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Component `name`, built by `factory` on first use."""
+        try:
+            return self._components[name]
+        except KeyError:
+            pass
+        with self._component_lock:
+            if name not in self._components:
+                self._components[name] = factory()
+            return self._components[name]
+
+    @property
+    def resilience(self) -> ResilienceLayer:
+        """Retry/backoff/circuit-breaker layer wrapped around every fal_client call."""
+        return self._component("resilience", lambda: fal_resilience.ResilienceLayer())
+
+    @property
+    def hedge_policy(self) -> HedgePolicy:
+        """Threshold, cap and statistics of hedged any_llm_complete calls."""
+        return self._component("hedge_policy", lambda: fal_hedging.HedgePolicy())
+
+    @property
+    def router(self) -> ModelRouter:
+        """Latency/error tracking and fallback across models for the any-llm endpoints."""
+        return self._component("router", lambda: fal_router.ModelRouter())
+
+    @property
+    def metrics(self) -> MetricsRegistry:
+        """Per-phase timing histograms and counters of every call."""
+        return self._component("metrics", lambda: fal_metrics.MetricsRegistry())
+
+    @property
+    def preprocessor(self) -> Optional[ImagePreprocessor]:
+        """Client-wide upload preprocessor (FAL_PREPROCESS*), or None."""
+        return self._component("preprocessor", lambda: fal_image.ImagePreprocessor.from_env())
+
+    @property
+    def _flights(self) -> SingleFlight:
+        """Identical analyze/prompt/upload calls in flight share one run."""
+        return self._component("flights", lambda: fal_singleflight.SingleFlight())
+
+    @property
+    def use_upload_cache(self) -> bool:
+        return self._cache_enabled["uploads"]
+
+    @property
+    def use_analysis_cache(self) -> bool:
+        return self._cache_enabled["analysis"]
+
+    def _get_cache(self, name: str) -> Optional[SqliteCache]:
+        """Return cache `name`, opening the default on-disk one on first use."""
+        if not self._cache_enabled.get(name):
+            return None
+        cache = self._caches.get(name)
+        if cache is None:
+            with self._lock:
+                cache = self._caches.get(name)
+                if cache is None:
+                    try:
+                        cache = fal_cache.open_default_cache(name)
+                    except Exception as e:
+                        print(f"[{name}-cache] disabled: {e}", file=sys.stderr)
+                    if cache is None:
+                        self._cache_enabled[name] = False
+                    self._caches[name] = cache
+        return cache
+
+    def _upload_cache_lookup(self, path: str, variant: Optional[str] = None) -> tuple:
+        """
+        Hash `path` and look it up in the upload cache.
+        
+        Args:
+            path: Local file to upload
+            variant: Preprocessing signature; each preprocessed variant of
+                a file is cached under its own key
+        
+        Returns:
+            (cache key or None, cached URL or None). Cache failures never
+            fail the upload; they only disable the lookup.
+        """
+        cache = self._get_cache("uploads")
+        if cache is None:
+            return None, None
+        try:
+            digest = fal_cache.file_sha256(path)
+            key = f"{digest}:{variant}" if variant else digest
+            entry = cache.get(key)
+            if entry:
+                print(f"[upload-cache] hit {digest[:12]} -> {entry['url']}", file=sys.stderr)
+                return key, entry["url"]
+            return key, None
+        except OSError:
+            # Missing/unreadable file: let the upload itself report it
+            return None, None
+        except Exception as e:
+            print(f"[upload-cache] lookup failed: {e}", file=sys.stderr)
+            return None, None
+
+    def _upload_cache_store(
+        self,
+        key: Optional[str],
+        path: str,
+        url: str,
+        uploaded_path: Optional[str] = None
+    ) -> None:
+        """
+        Remember the CDN URL returned for a file's cache key.
+        
+        Args:
+            key: Key returned by _upload_cache_lookup
+            path: Local file that was requested to be uploaded
+            url: CDN URL of the upload
+            uploaded_path: File actually uploaded, when preprocessing replaced `path`
+        """
+        cache = self._get_cache("uploads")
+        if cache is None or key is None:
+            return
+        try:
+            cache.set(key, {"url": url, "size_bytes": os.path.getsize(uploaded_path or path)})
+            # The CDN URL now identifies this content; no need to download it to hash it
+            hashes = self._get_cache("image_hashes")
+            if hashes is not None:
+                # Without preprocessing the key is "<digest of path>[:<variant>]"
+                # (a variant that was skipped), and path is what was uploaded
+                digest = fal_cache.file_sha256(uploaded_path) if uploaded_path else key.split(":", 1)[0]
+                entry = {"sha256": digest}
+                index = self._get_phash_index()
+                if index is not None:
+                    entry[index.algorithm] = self._local_perceptual_hash(uploaded_path or path)
+                hashes.set(url, entry)
+        except Exception as e:
+            print(f"[upload-cache] store failed: {e}", file=sys.stderr)
+
+    def _image_content_hash(self, image_url: str) -> str:
+        """
+        SHA-256 of the image behind `image_url`.
+        
+        Local paths are hashed directly; remote URLs are remembered in the
+        image_hashes cache (CDN URLs are immutable) and otherwise streamed
+        and hashed once.
+        """
+        if os.path.isfile(image_url):
+            return fal_cache.file_sha256(image_url)
+        
+        hashes = self._get_cache("image_hashes")
+        if hashes is not None:
+            entry = hashes.get(image_url)
+            if entry:
+                return entry["sha256"]
+        
+        index = self._get_phash_index()
+        if index is not None:
+            # One download for both hashes; near-duplicate lookups need the second
+            digest, value = fal_phash.url_fingerprint(image_url, index.algorithm)
+            entry = {"sha256": digest, index.algorithm: value}
+        else:
+            digest = fal_cache.url_sha256(image_url)
+            entry = {"sha256": digest}
+        if hashes is not None:
+            hashes.set(image_url, entry)
+        return digest
+
+    def _get_phash_index(self) -> Optional[PerceptualIndex]:
+        """Perceptual-hash index, opening the default one on first use (None if disabled)."""
+        if not self._use_phash_index:
+            return None
+        if self._phash_index is None:
+            with self._lock:
+                if self._phash_index is None and self._use_phash_index:
+                    try:
+                        self._phash_index = fal_phash.PerceptualIndex.from_env()
+                    except Exception as e:
+                        print(f"[phash] index disabled: {e}", file=sys.stderr)
+                    if self._phash_index is None:
+                        self._use_phash_index = False
+        return self._phash_index
+
+    def _local_perceptual_hash(self, path: str) -> Optional[int]:
+        """Perceptual hash of a local file, or None if it is not a readable image."""
+        try:
+            return self._get_phash_index().hash_image(path)
+        except Exception:
+            return None
+
+    def _image_perceptual_hash(self, image_url: str) -> Optional[int]:
+        """
+        Perceptual hash of the image behind `image_url` (None without an
+        index, without Pillow, or for files that are not images).
+        
+        Like content hashes, hashes of remote URLs are remembered in the
+        image_hashes cache, next to the SHA-256.
+        """
+        index = self._get_phash_index()
+        if index is None:
+            return None
+        if os.path.isfile(image_url):
+            return self._local_perceptual_hash(image_url)
+        
+        hashes = self._get_cache("image_hashes")
+        entry = hashes.peek(image_url) if hashes is not None else None
+        if entry and index.algorithm in entry:
+            return entry[index.algorithm]
+        
+        digest, value = fal_phash.url_fingerprint(image_url, index.algorithm)
+        if hashes is not None:
+            hashes.set(image_url, {**(entry or {}), "sha256": digest, index.algorithm: value})
+        return value
+
+    def _near_duplicate_get(self, cache_name: str, image_url: str, key: Optional[str]) -> Optional[dict]:
+        """
+        Entry of cache `cache_name` stored for a near-duplicate of the image.
+        
+        Cache keys start with the image digest; the same key with the digest
+        of each indexed image within the index's distance is tried, closest
+        first. A hit has "near_duplicate": {"sha256", "distance"} naming the
+        image whose entry was reused.
+        """
+        cache = self._get_cache(cache_name)
+        if cache is None or key is None:
+            return None
+        try:
+            value = self._image_perceptual_hash(image_url)
+            if value is None:
+                return None
+            digest, suffix = key.split(":", 1)
+            for match, distance in self._get_phash_index().query(value):
+                if match == digest:
+                    continue
+                entry = cache.peek(f"{match}:{suffix}")
+                if entry is not None:
+                    print(
+                        f"[{cache_name}-cache] near-duplicate hit {digest[:12]} ~ {match[:12]} "
+                        f"({distance} bits)",
+                        file=sys.stderr
+                    )
+                    return {**entry, "near_duplicate": {"sha256": match, "distance": distance}}
+        except Exception as e:
+            print(f"[phash] near-duplicate lookup failed: {e}", file=sys.stderr)
+        return None
+
+    def _phash_remember(self, image_url: str, key: Optional[str]) -> None:
+        """Index the image whose result was just cached under `key`."""
+        index = self._get_phash_index()
+        if index is None or key is None:
+            return
+        try:
+            value = self._image_perceptual_hash(image_url)
+            if value is not None:
+                index.add(key.split(":", 1)[0], value)
+        except Exception as e:
+            print(f"[phash] could not index image: {e}", file=sys.stderr)
+
+    def _analysis_cache_key(
+        self,
+        image_url: str,
+        model: ModelSpec,
+        temperature: float,
+        variant: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Cache key for an analysis, or None if the analysis cache is unavailable.
+        
+        `variant` distinguishes other results cached per image (e.g. fused
+        analyze-and-prompt results for one style list); keys always start with
+        the image digest so invalidate_analysis_cache drops them too.
+        """
+        if self._get_cache("analysis") is None:
+            return None
+        try:
+            digest = self._image_content_hash(image_url)
+        except Exception as e:
+            print(f"[analysis-cache] could not hash image: {e}", file=sys.stderr)
+            return None
+        key = f"{digest}:{fal_router.model_key(model)}:{float(temperature)}:v{ANALYSIS_PROMPT_VERSION}"
+        return f"{key}:{variant}" if variant else key
+
+    def _get_prompt_cache(self) -> Optional[PromptCache]:
+        """Prompt similarity cache, opening the default one on first use (None if disabled)."""
+        if not self._use_prompt_cache:
+            return None
+        if self._prompt_cache is None:
+            with self._lock:
+                if self._prompt_cache is None and self._use_prompt_cache:
+                    try:
+                        self._prompt_cache = fal_prompt_cache.PromptCache.from_env()
+                    except Exception as e:
+                        print(f"[prompt-cache] disabled: {e}", file=sys.stderr)
+                    if self._prompt_cache is None:
+                        self._use_prompt_cache = False
+        return self._prompt_cache
+
+    def _prompt_cache_lookup(
+        self,
+        namespace: str,
+        scope: str,
+        prompt: str,
+        threshold: Optional[float]
+    ) -> Optional[dict]:
+        """Cached completion of a similar prompt, with "cached" and "prompt_cache" details."""
+        cache = self._get_prompt_cache()
+        if cache is None:
+            return None
+        timer = fal_metrics.PhaseTimer("prompt-cache")
+        try:
+            with timer.phase("lookup"):
+                hit = cache.lookup(namespace, scope, prompt, threshold=threshold)
+        except Exception as e:
+            print(f"[prompt-cache] lookup failed: {e}", file=sys.stderr)
+            return None
+        timings = self._record(timer)
+        if hit is None:
+            return None
+        print(
+            f"[prompt-cache] {namespace}: hit at similarity {hit['similarity']} "
+            f"({hit['age_seconds']:.0f}s old)",
+            file=sys.stderr
+        )
+        return {
+            **hit["value"],
+            "cached": True,
+            "prompt_cache": {
+                "namespace": namespace,
+                "similarity": hit["similarity"],
+                "age_seconds": hit["age_seconds"]
+            },
+            "timings": timings
+        }
+
+    def _prompt_cache_store(self, namespace: str, scope: str, prompt: str, result: dict) -> dict:
+        """Cache a complete, successful completion; returns `result` marked as not cached."""
+        cache = self._get_prompt_cache()
+        if cache is None:
+            return result
+        if not result.get("error") and not result.get("partial") and result.get("output"):
+            try:
+                cache.store(namespace, scope, prompt, {
+                    k: v for k, v in result.items()
+                    if k not in ("cached", "prompt_cache", "resilience", "routing", "timings", "hedge")
+                })
+            except Exception as e:
+                print(f"[prompt-cache] store failed: {e}", file=sys.stderr)
+        return {**result, "cached": False, "prompt_cache": {"namespace": namespace, "similarity": None}}
+
+    def _analysis_cache_get(self, key: Optional[str], image_url: Optional[str] = None) -> Optional[dict]:
+        """
+        Cached analysis result for `key`, marked as cached.
+        
+        With `image_url`, a miss falls back to the analysis of a
+        near-duplicate image (see _near_duplicate_get).
+        """
+        cache = self._get_cache("analysis")
+        if cache is None or key is None:
+            return None
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            print(f"[analysis-cache] lookup failed: {e}", file=sys.stderr)
+            return None
+        if entry is None and image_url is not None:
+            entry = self._near_duplicate_get("analysis", image_url, key)
+        if entry is None:
+            return None
+        return {**entry, "cached": True}
+
+    def _analysis_cache_store(self, key: Optional[str], result: dict, image_url: Optional[str] = None) -> None:
+        """Store a successful analysis result (and index `image_url` for near-duplicate lookups)."""
+        cache = self._get_cache("analysis")
+        if cache is None or key is None or result.get("error"):
+            return
+        try:
+            cache.set(key, {
+                k: v for k, v in result.items()
+                if k not in ("cached", "resilience", "routing", "timings", "stream")
+            })
+        except Exception as e:
+            print(f"[analysis-cache] store failed: {e}", file=sys.stderr)
+            return
+        if image_url is not None:
+            self._phash_remember(image_url, key)
+
+    def _background_cache_key(self, image_url: str, prompt: str) -> Optional[str]:
+        """Cache key of a background_replace result, or None if the cache is unavailable."""
+        if self._get_cache("backgrounds") is None:
+            return None
+        try:
+            digest = self._image_content_hash(image_url)
+        except Exception as e:
+            print(f"[backgrounds-cache] could not hash image: {e}", file=sys.stderr)
+            return None
+        return f"{digest}:nano-banana/edit:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]}"
+
+    def _background_cache_get(self, key: Optional[str], image_url: str) -> Optional[dict]:
+        """Earlier result for the same (or a near-duplicate) image and prompt, marked as cached."""
+        cache = self._get_cache("backgrounds")
+        if cache is None or key is None:
+            return None
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            print(f"[backgrounds-cache] lookup failed: {e}", file=sys.stderr)
+            return None
+        if entry is None:
+            entry = self._near_duplicate_get("backgrounds", image_url, key)
+        if entry is None:
+            return None
+        return {**entry, "cached": True}
+
+    def _background_cache_store(self, key: Optional[str], image_url: str, result: dict) -> None:
+        """Store a background_replace result (before any download adds local paths)."""
+        cache = self._get_cache("backgrounds")
+        if cache is None or key is None:
+            return
+        try:
+            cache.set(key, {
+                k: v for k, v in result.items()
+                if k not in ("cached", "resilience", "timings", "upload")
+            })
+        except Exception as e:
+            print(f"[backgrounds-cache] store failed: {e}", file=sys.stderr)
+            return
+        self._phash_remember(image_url, key)
+
+    def _observe(self, timer: PhaseTimer, result: dict) -> dict:
+        """Record `timer` in the metrics registry and attach it as "timings"."""
+        if result.get("shed"):
+            # Rejected by admission control: nothing reached FAL, so nothing to ledger
+            return {**result, "timings": timer.observe(self.metrics, ok=False)}
+        usage = result.get("usage") or (result.get("raw") or {}).get("usage")
+        timings = self._record(
+            timer,
+            ok=not result.get("error"),
+            usage=usage,
+            request_id=result.get("request_id")
+        )
+        return {**result, "timings": timings}
+
+    def _record(
+        self,
+        timer: PhaseTimer,
+        *,
+        ok: bool = True,
+        usage: Optional[dict] = None,
+        request_id: Optional[str] = None,
+        command: Optional[str] = None
+    ) -> Dict[str, float]:
+        """
+        Observe `timer` into the metrics registry and, for calls to FAL
+        itself, append it to the usage ledger. Returns the timings.
+        
+        `command` overrides the context's command, for timers finished on
+        another thread (e.g. by the queue poller).
+        """
+        timings = timer.observe(self.metrics, ok=ok)
+        if timer.endpoint not in _UNLEDGERED_ENDPOINTS:
+            ledger = self._get_usage_ledger()
+            if ledger is not None:
+                ledger.record(
+                    timer.endpoint,
+                    timer.model,
+                    wall_seconds=timings["total"],
+                    ok=ok,
+                    usage=usage,
+                    request_id=request_id,
+                    command=command
+                )
+        return timings
+
+    def _get_usage_ledger(self) -> Optional[UsageLedger]:
+        """Usage ledger, opening the default one on first use (None if disabled)."""
+        if not self._use_usage_ledger:
+            return None
+        if self._usage_ledger is None:
+            with self._lock:
+                if self._usage_ledger is None and self._use_usage_ledger:
+                    try:
+                        self._usage_ledger = fal_usage.UsageLedger.from_env()
+                    except Exception as e:
+                        print(f"[usage] ledger disabled: {e}", file=sys.stderr)
+                    if self._usage_ledger is None:
+                        self._use_usage_ledger = False
+        return self._usage_ledger
+
+    def _get_admission(self) -> Optional[AdmissionController]:
+        """Admission controller, opening the default one on first use (None if disabled)."""
+        if not self._use_admission:
+            return None
+        if self._admission is None:
+            with self._lock:
+                if self._admission is None and self._use_admission:
+                    try:
+                        self._admission = fal_admission.AdmissionController.from_env(metrics=self.metrics)
+                    except Exception as e:
+                        print(f"[admission] disabled: {e}", file=sys.stderr)
+                    if self._admission is None:
+                        self._use_admission = False
+        return self._admission
+
+    @contextmanager
+    def _admit(
+        self,
+        endpoint: str,
+        info: Optional[CallInfo] = None,
+        timer: Optional[PhaseTimer] = None
+    ) -> Iterator[None]:
+        """
+        Hold an admission slot of `endpoint` around the block; raises
+        AdmissionRejected when the call is shed.
+        
+        The wait is recorded as the timer's "admission" phase and under
+        "admission" in the call's resilience info.
+        """
+        controller = self._get_admission()
+        if controller is None:
+            yield
+            return
+        with controller.admit(endpoint) as ticket:
+            self._admitted(ticket, info, timer)
+            yield
+
+    @asynccontextmanager
+    async def _admit_async(
+        self,
+        endpoint: str,
+        info: Optional[CallInfo] = None,
+        timer: Optional[PhaseTimer] = None
+    ) -> AsyncIterator[None]:
+        """Async version of _admit()."""
+        controller = self._get_admission()
+        if controller is None:
+            yield
+            return
+        async with controller.admit_async(endpoint) as ticket:
+            self._admitted(ticket, info, timer)
+            yield
+
+    @staticmethod
+    def _admitted(ticket, info: Optional[CallInfo], timer: Optional[PhaseTimer]) -> None:
+        if ticket is None:
+            return
+        if info is not None:
+            info.admission = ticket.as_dict()
+        if timer is not None:
+            timer.add("admission", ticket.waited)
+            # The FAL queue wait starts now, not when the call was made
+            timer.start_queue()
+
+    def admission_stats(self) -> dict:
+        """
+        Limits, bucket level, calls in flight, queue depth per lane and
+        admission counters per endpoint, across all worker processes.
+        """
+        controller = self._get_admission()
+        if controller is None:
+            return {"enabled": False}
+        return {"enabled": True, **controller.stats()}
+
+    def reset_admission(self) -> dict:
+        """Clear the admission counters and reclaim slots left by dead processes."""
+        controller = self._get_admission()
+        if controller is None:
+            return {"enabled": False}
+        return {"enabled": True, **controller.reset()}
+
+    def usage_report(
+        self,
+        *,
+        by: List[str] = ("command", "model"),
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        command: Optional[str] = None,
+        model: Optional[str] = None,
+        sort: str = "total_tokens",
+        limit: Optional[int] = None,
+        prices: Optional[Dict[str, Dict[str, float]]] = None
+    ) -> dict:
+        """
+        Aggregate the usage ledger, e.g. tokens and wall time per command
+        and model, or per hour (see UsageLedger.report for the arguments).
+        
+        Token prices default to FAL_USAGE_PRICES; with prices, groups also
+        carry an estimated "cost_usd".
+        
+        Returns:
+            {"by", "since", "until", "groups": [...], "totals": {...}, "enabled": bool}
+        """
+        ledger = self._get_usage_ledger()
+        if ledger is None:
+            return {"enabled": False, "groups": [], "totals": {}}
+        report = ledger.report(
+            by=by,
+            since=since,
+            until=until,
+            command=command,
+            model=model,
+            sort=sort,
+            limit=limit,
+            prices=fal_usage.load_prices() if prices is None else prices
+        )
+        return {**report, "enabled": True}
+
+    @staticmethod
+    def _absorb_timings(timer: PhaseTimer, result: Optional[dict]) -> None:
+        """Add the phases of a nested call's result to `timer`."""
+        for phase, seconds in ((result or {}).get("timings") or {}).items():
+            if phase not in ("total", "server", "upload_bytes", "bytes_saved") and isinstance(seconds, (int, float)):
+                timer.add(phase, seconds)
+
+    def _resolve_preprocessor(
+        self,
+        preprocess: Union[None, bool, ImagePreprocessor]
+    ) -> Optional[ImagePreprocessor]:
+        """
+        Preprocessor for one upload: None uses the client's setting, True
+        forces preprocessing (client's or default settings), False disables it.
+        """
+        if isinstance(preprocess, fal_image.ImagePreprocessor):
+            return preprocess
+        if preprocess is None:
+            return self.preprocessor
+        if preprocess:
+            return self.preprocessor or fal_image.ImagePreprocessor()
+        return None
+
+    @staticmethod
+    def _upload_result(url: str, cached: bool, report: Optional[dict]) -> dict:
+        """Result of upload_image; the report's temporary path is dropped."""
+        return {
+            "url": url,
+            "cached": cached,
+            "preprocess": {k: v for k, v in report.items() if k != "path"} if report else None
+        }
+
+    def _get_downloader(self) -> ImageDownloader:
+        """Image downloader, opening the default store on first use."""
+        with self._lock:
+            if self._downloader is None:
+                self._downloader = fal_download.ImageDownloader.from_env()
+            return self._downloader
+
+    def _attach_downloads(self, targets: List[dict], url_key: str) -> None:
+        """
+        Download the image at each target's `url_key` into the local store
+        and add its "local_path" (None plus "download_error" on failure).
+        Download failures never fail the call that generated the images.
+        """
+        unique = {}
+        for target in targets:
+            if target.get(url_key):
+                unique.setdefault(id(target), target)
+        targets = list(unique.values())
+        if not targets:
+            return
+        
+        try:
+            files = self._download_images([target[url_key] for target in targets])
+        except Exception as e:
+            files = [{"path": None, "error": str(e)} for _ in targets]
+        
+        for target, f in zip(targets, files):
+            target["local_path"] = f["path"]
+            if f["path"] is None:
+                target["download_error"] = f["error"]
+
+    def _download_images(self, urls: List[str]) -> List[dict]:
+        """fetch_many through the client's downloader, timed as the "download" phase."""
+        timer = fal_metrics.PhaseTimer("download")
+        with timer.phase("download"):
+            files = self._get_downloader().fetch_many(urls)
+        timer.set("download_bytes", sum(f["bytes"] for f in files if f["path"] and not f["cached"]))
+        self._record(timer, ok=all(f["path"] for f in files))
+        return files
+
+    def download_result_images(self, result: dict) -> dict:
+        """
+        Fetch the images of a background_replace/background_result result
+        into the local image store, adding "local_path" to each image dict.
+        
+        Returns:
+            `result`, updated in place
+        """
+        images = [result.get("image"), *result.get("images", [])]
+        self._attach_downloads([image for image in images if isinstance(image, dict)], "url")
+        return result
+
+    def download_stats(self) -> dict:
+        """Local image store usage and download counters (see fal_download)."""
+        return self._get_downloader().stats()
+
+    def clear_image_store(self) -> dict:
+        """
+        Delete every image in the local image store.
+        
+        Returns:
+            {"removed": int, "error": None}
+        """
+        return {"removed": self._get_downloader().store.clear(), "error": None}
+
+    def _get_poller(self) -> "QueuePoller":
+        """Shared queue poller for background jobs, started on first use."""
+        with self._lock:
+            if self._poller is None:
+                self._poller = fal_poller.QueuePoller()
+            return self._poller
+
+    def background_track(
+        self,
+        request_id: str,
+        *,
+        callback: Optional[Any] = None,
+        timeout: Optional[float] = None,
+        poll_interval: Optional[float] = None
+    ) -> "Future":
+        """
+        Poll a submitted background job and deliver its result.
+        
+        All tracked jobs share one polling thread (see fal_poller), so many
+        generations can be outstanding without a blocked thread each.
+        
+        Args:
+            request_id: Request id returned by background_submit
+            callback: Called with the Future once the job is done
+            timeout: Seconds after which the job is cancelled (TimeoutError)
+            poll_interval: Fixed poll interval, for a caller blocked on the
+                result (default: the poller's adaptive schedule)
+        
+        Returns:
+            concurrent.futures.Future resolving to the same dict as
+            background_replace, including "request_id" (AsyncFalClient
+            callers can await it via asyncio.wrap_future)
+        """
+        timer = fal_metrics.PhaseTimer("fal-ai/nano-banana/edit")
+        # The poller finishes the job on its own thread
+        command = fal_usage.current_command()
+
+        def transform(raw: dict) -> dict:
+            timer.finish_queue()
+            return self._background_result(timer, raw, request_id, command)
+
+        def record_failure(future: "Future") -> None:
+            if future.cancelled() or future.exception() is not None:
+                self._record(timer, ok=False, request_id=request_id, command=command)
+
+        future = self._get_poller().track(
+            "fal-ai/nano-banana/edit",
+            request_id,
+            callback=callback,
+            transform=transform,
+            on_status=timer.on_queue_update,
+            timeout=timeout,
+            poll_interval=poll_interval
+        )
+        future.add_done_callback(record_failure)
+        return future
+
+    def background_jobs(self) -> dict:
+        """Poller counters and the background jobs still outstanding."""
+        if self._poller is None:
+            return {"stats": fal_poller.QueuePoller().stats(), "pending": []}
+        return {"stats": self._poller.stats(), "pending": self._poller.pending()}
+
+    def _get_webhook_store(self) -> "WebhookStore":
+        with self._lock:
+            if self._webhook_store is None:
+                self._webhook_store = fal_webhook.WebhookStore()
+            return self._webhook_store
+
+    def wait_for_result(self, request_id: str, *, timeout: Optional[float] = None) -> dict:
+        """
+        Block until the webhook completion of a submitted job arrives.
+        
+        The job must have been submitted with `webhook_url` pointing at a
+        running WebhookReceiver (`fal_worker.py webhook-serve`) that shares
+        this client's webhook store. No request is made to FAL.
+        
+        Args:
+            request_id: Request id returned by any_llm_submit/background_submit
+            timeout: Seconds to wait (default: forever)
+        
+        Returns:
+            The same dict any_llm_result/background_result would return,
+            plus "request_id" and "webhook" ({"status", "received_at"})
+        
+        Raises:
+            TimeoutError: No completion arrived within `timeout`
+        """
+        record = self._get_webhook_store().wait(request_id, timeout)
+        return _format_webhook_record(record)
+
+    def coalescing_stats(self) -> dict:
+        """Single-flight counters: calls in flight, run, and joined."""
+        return self._flights.stats()
+
+    def hedge_stats(self) -> dict:
+        """Hedging counters, current threshold and recent latencies."""
+        return self.hedge_policy.stats()
+
+    def analysis_cache_stats(self) -> dict:
+        """Hit/miss counters and size of the analysis cache."""
+        cache = self._get_cache("analysis")
+        if cache is None:
+            return {"cache": "analysis", "enabled": False}
+        return {**cache.stats(), "enabled": True}
+
+    def invalidate_analysis_cache(self, image_url: Optional[str] = None) -> dict:
+        """
+        Drop cached analyses for one image (all models/temperatures), or
+        every cached analysis when `image_url` is None.
+        
+        Returns:
+            {"removed": int, "error": None}
+        """
+        cache = self._get_cache("analysis")
+        if cache is None:
+            return {"removed": 0, "error": None}
+        if image_url is None:
+            return {"removed": cache.clear(), "error": None}
+        digest = self._image_content_hash(image_url)
+        return {"removed": cache.delete_prefix(f"{digest}:"), "error": None}
+
+    def similar_images(
+        self,
+        image_url: str,
+        *,
+        max_distance: Optional[int] = None,
+        limit: int = 10
+    ) -> dict:
+        """
+        Indexed images that look like `image_url` (see fal_phash).
+        
+        Args:
+            image_url: Image URL or local file path
+            max_distance: Largest Hamming distance between the 64-bit hashes
+                (default: the index's, FAL_PHASH_MAX_DISTANCE)
+            limit: Maximum number of matches
+        
+        Returns:
+            {"sha256": str, "hash": hex str or None, "algorithm": str,
+             "matches": [{"sha256", "distance"}, ...] closest first,
+             "error": None}
+        """
+        index = self._get_phash_index()
+        if index is None:
+            raise RuntimeError("Perceptual-hash index is disabled (FAL_PHASH_INDEX=0)")
+        digest = self._image_content_hash(image_url)
+        value = self._image_perceptual_hash(image_url)
+        if value is None:
+            raise RuntimeError("Could not compute a perceptual hash (Pillow missing or not an image)")
+        matches = index.query(value, max_distance=max_distance, limit=limit)
+        return {
+            "sha256": digest,
+            "hash": f"{value:016x}",
+            "algorithm": index.algorithm,
+            "matches": [{"sha256": match, "distance": distance} for match, distance in matches],
+            "error": None
+        }
+
+    def phash_index_stats(self) -> dict:
+        """Size, bucket occupancy and query counters of the perceptual-hash index."""
+        index = self._get_phash_index()
+        if index is None:
+            return {"enabled": False}
+        return {**index.stats(), "enabled": True}
+
+    def clear_phash_index(self) -> dict:
+        """
+        Forget every indexed image hash (cached results are kept).
+        
+        Returns:
+            {"removed": int, "error": None}
+        """
+        index = self._get_phash_index()
+        return {"removed": index.clear() if index is not None else 0, "error": None}
+
+    def prompt_cache_stats(self) -> dict:
+        """Entries and hit/miss counters per namespace of the prompt similarity cache."""
+        cache = self._get_prompt_cache()
+        if cache is None:
+            return {"cache": "prompt", "enabled": False}
+        return {**cache.stats(), "enabled": True}
+
+    def clear_prompt_cache(self, namespace: Optional[str] = None) -> dict:
+        """
+        Drop cached completions of one namespace, or all of them.
+        
+        Returns:
+            {"removed": int, "error": None}
+        """
+        cache = self._get_prompt_cache()
+        return {"removed": cache.clear(namespace) if cache is not None else 0, "error": None}
+
+    # Request building, parsing and result shaping shared by FalClient and
+    # AsyncFalClient, which only differ in how they make the calls
+
+    @staticmethod
+    def _queue_listener(timer: PhaseTimer, with_logs: bool, label: str) -> Callable[[Any], None]:
+        """on_queue_update for subscribe: times the queue phases and prints updates if `with_logs`."""
+        def on_queue_update(update):
+            timer.on_queue_update(update)
+            if with_logs:
+                print(f"[{label}] {update}", file=sys.stderr)
+        return on_queue_update
+
+    def _enterprise_result(self, timer: PhaseTimer, info: CallInfo, result: dict) -> dict:
+        """_subscribe_enterprise result of a completed call."""
+        timer.finish_queue()
+        with timer.phase("parse"):
+            output = result.get("output", "")
+        return self._observe(timer, {
+            "output": output,
+            "error": None,
+            "raw": result,
+            "resilience": info.as_dict()
+        })
+
+    def _enterprise_error(self, timer: PhaseTimer, info: CallInfo, error: Exception, **extra: Any) -> dict:
+        """_subscribe_enterprise/_stream_enterprise_json result of a failed call."""
+        return self._observe(timer, {
+            "output": "",
+            "error": str(error),
+            "raw": {"exception": str(error)},
+            "resilience": info.as_dict(),
+            **extra,
+            **_shed(error)
+        })
+
+    @staticmethod
+    def _json_stream_event(
+        timer: PhaseTimer,
+        accumulator: _StreamAccumulator,
+        scanner: _JsonObjectScanner,
+        event: Any
+    ) -> Optional[bool]:
+        """
+        Take one event of a _stream_enterprise_json stream.
+        
+        Returns:
+            None to keep reading; once the object has closed, whether that
+            was before the last event (stopped_early)
+        """
+        timer.mark_in_progress()
+        record = accumulator.delta(event)
+        if record is None:
+            return None
+        if record.get("error"):
+            raise RuntimeError(record["error"])
+        if scanner.update(record["output"]) is not None:
+            return bool(record.get("partial"))
+        return None
+
+    def _json_stream_result(
+        self,
+        timer: PhaseTimer,
+        info: CallInfo,
+        accumulator: _StreamAccumulator,
+        scanner: _JsonObjectScanner,
+        stopped_early: bool
+    ) -> dict:
+        """_stream_enterprise_json result once the stream is done."""
+        timer.finish_queue()
+        with timer.phase("parse"):
+            final = accumulator.final()
+            output = final["output"][:scanner.end] if scanner.end else final["output"]
+        return self._observe(timer, {
+            "output": output,
+            "error": final["error"],
+            "raw": accumulator.last_event,
+            "resilience": info.as_dict(),
+            "json": scanner.result,
+            "stopped_early": stopped_early,
+            "events": accumulator.events
+        })
+
+    def _json_stream_error(
+        self,
+        timer: PhaseTimer,
+        info: CallInfo,
+        accumulator: _StreamAccumulator,
+        error: Exception
+    ) -> dict:
+        """_stream_enterprise_json result of a failed stream."""
+        return self._enterprise_error(
+            timer, info, error, json=None, stopped_early=False, events=accumulator.events
+        )
+
+    def _llm_result(self, timer: PhaseTimer, info: CallInfo, result: dict, **extra: Any) -> dict:
+        """Parse an any-llm response and observe the call."""
+        with timer.phase("parse"):
+            formatted = _format_llm_result(result)
+        return self._observe(timer, {**formatted, "resilience": info.as_dict(), **extra})
+
+    def _complete_result(self, timer: PhaseTimer, info: CallInfo, result: dict, started: float) -> dict:
+        """_subscribe_complete result of a completed call started (past admission) at `started`."""
+        timer.finish_queue()
+        # Hedge thresholds are about FAL latency, not our own queue
+        self.hedge_policy.record_latency(time.monotonic() - started)
+        return self._llm_result(timer, info, result)
+
+    def _complete_error(self, timer: PhaseTimer, info: CallInfo, error: Exception) -> dict:
+        """_subscribe_complete result of a failed call."""
+        return self._observe(timer, {**_format_llm_error(error), "resilience": info.as_dict()})
+
+    def _hedge_result(
+        self,
+        hedge: _HedgedCall,
+        legs: int,
+        winner: Optional[int],
+        result: Any,
+        error: Optional[BaseException]
+    ) -> dict:
+        """_hedged_complete result once a leg has won (or every leg failed)."""
+        summary = hedge.summary(legs, winner)
+        if winner is None:
+            return self._observe(hedge.timers[0], {
+                **_format_llm_error(error),
+                "resilience": hedge.infos[0].as_dict(),
+                "hedge": summary
+            })
+        hedge.policy.record_latency(time.monotonic() - hedge.started)
+        if legs > 1:
+            hedge.policy.record_winner(hedge.LEGS[winner])
+        return self._llm_result(hedge.timers[winner], hedge.infos[winner], result, hedge=summary)
+
+    @staticmethod
+    def _stream_event(timer: PhaseTimer, accumulator: _StreamAccumulator, event: Any) -> Optional[dict]:
+        """any_llm_stream's delta record for one event (None if it adds nothing)."""
+        timer.mark_in_progress()
+        return accumulator.delta(event)
+
+    def _stream_done(self, timer: PhaseTimer, info: CallInfo, accumulator: _StreamAccumulator) -> dict:
+        """any_llm_stream's terminal "done" record."""
+        timer.finish_queue()
+        return self._observe(timer, {**accumulator.final(), "resilience": info.as_dict()})
+
+    def _stream_failure(self, timer: PhaseTimer, error: Exception) -> RuntimeError:
+        """Record a failed any_llm_stream; returns the error to raise."""
+        print(f"Stream error: {error}", file=sys.stderr)
+        self._record(timer, ok=False)
+        return RuntimeError(f"Streaming failed: {error}")
+
+    @staticmethod
+    def _upload_prepare(
+        timer: PhaseTimer,
+        path: str,
+        preprocessor: Optional[ImagePreprocessor]
+    ) -> tuple:
+        """
+        Preprocess an upload (if requested).
+        
+        Returns:
+            (preprocessing report or None, path of the file to upload)
+        """
+        report = None
+        if preprocessor is not None:
+            with timer.phase("preprocess"):
+                report = preprocessor.process(path)
+            timer.set("bytes_saved", report["bytes_saved"])
+        upload_path = report["path"] if report else path
+        timer.set("upload_bytes", os.path.getsize(upload_path))
+        return report, upload_path
+
+    def _upload_done(
+        self,
+        timer: PhaseTimer,
+        key: Optional[str],
+        path: str,
+        upload_path: str,
+        url: str,
+        report: Optional[dict]
+    ) -> dict:
+        """Record an upload and remember its URL; returns the upload_image result."""
+        self._record(timer)
+        self._upload_cache_store(key, path, url, upload_path if upload_path != path else None)
+        return self._upload_result(url, False, report)
+
+    @staticmethod
+    def _upload_cleanup(path: str, upload_path: str) -> None:
+        """Remove the preprocessed copy of an upload."""
+        if upload_path != path:
+            os.unlink(upload_path)
+
+    def _background_result(
+        self,
+        timer: PhaseTimer,
+        raw: dict,
+        request_id: Optional[str] = None,
+        command: Optional[str] = None
+    ) -> dict:
+        """Shape a completed nano-banana/edit job and record its timer."""
+        with timer.phase("parse"):
+            result = _format_background_result(raw)
+        # FAL's own server-side timings stay available under "server"
+        timings = self._record(timer, request_id=request_id, command=command)
+        if request_id is not None:
+            result["request_id"] = request_id
+        return {**result, "timings": {**timings, "server": result["timings"]}}
+
+    def _background_reused(self, image_url: str, prompt: str, download: Optional[bool]) -> tuple:
+        """
+        background_replace(reuse=True) lookup, keyed by the original file
+        so a hit skips the upload too.
+        
+        Returns:
+            (reuse key, earlier result or None)
+        """
+        reuse_key = self._background_cache_key(image_url, prompt)
+        reused = self._background_cache_get(reuse_key, image_url)
+        if reused is not None and (self.download_results if download is None else download):
+            self.download_result_images(reused)
+        return reuse_key, reused
+
+    def _background_done(
+        self,
+        result: dict,
+        info: CallInfo,
+        *,
+        reuse: bool,
+        reuse_key: Optional[str],
+        source_url: str,
+        upload: Optional[dict],
+        download: Optional[bool]
+    ) -> dict:
+        """Finish a background_replace result: reuse cache, upload report and downloads."""
+        result = {**result, "resilience": info.as_dict()}
+        if reuse:
+            result["cached"] = False
+            self._background_cache_store(reuse_key, source_url, result)
+        if upload is not None:
+            result["upload"] = upload
+        if self.download_results if download is None else download:
+            self.download_result_images(result)
+        return result
+
+    @staticmethod
+    def _background_failure(info: CallInfo, error: Exception) -> RuntimeError:
+        """The error background_replace raises."""
+        return RuntimeError(
+            f"Background replacement failed after {info.attempts} attempt(s) "
+            f"(circuit {info.circuit}): {error}"
+        )
+
+    def _analysis_lookup(
+        self,
+        timer: PhaseTimer,
+        image_url: str,
+        model: ModelSpec,
+        temperature: float,
+        variant: Optional[str],
+        use_cache: bool
+    ) -> tuple:
+        """
+        Analysis cache lookup, timed as "cache_lookup".
+        
+        Returns:
+            (cache key, cached result); both None when not using the cache
+        """
+        if not use_cache:
+            return None, None
+        with timer.phase("cache_lookup"):
+            key = self._analysis_cache_key(image_url, model, temperature, variant)
+            return key, self._analysis_cache_get(key, image_url)
+
+    def _llm_output(self, timer: PhaseTimer, result: dict) -> str:
+        """Output of a nested LLM call, whose phases are added to `timer`; raises on its error."""
+        self._absorb_timings(timer, result)
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+        return result.get("output", "")
+
+    def _analysis_parsed(self, timer: PhaseTimer, result: dict) -> dict:
+        """The analysis (as cached) in an analyze_product_image completion."""
+        output_text = self._llm_output(timer, result)
+        with timer.phase("parse"):
+            categories = _parse_analysis_output(result.get("json") or output_text)
+        return {
+            "categories": categories,
+            "error": None,
+            "raw_output": output_text,
+            "cached": False
+        }
+
+    def _analyze_and_prompt_parsed(self, timer: PhaseTimer, result: dict, styles: list) -> dict:
+        """The fused analysis (as cached) in an analyze_and_prompt completion."""
+        output_text = self._llm_output(timer, result)
+        with timer.phase("parse"):
+            categories, prompts, fallbacks = _parse_analyze_and_prompt_output(output_text, styles)
+        return {
+            "categories": categories,
+            "prompts": prompts,
+            "fallbacks": fallbacks,
+            "error": None,
+            "raw_output": output_text,
+            "cached": False
+        }
+
+    def _analysis_response(self, timer: PhaseTimer, analysis: dict, result: dict, **extra: Any) -> dict:
+        """Observe an analysis along with the completion's resilience and routing."""
+        return self._observe(timer, {
+            **analysis,
+            **extra,
+            "resilience": result.get("resilience"),
+            "routing": result.get("routing")
+        })
+
+    def _analysis_failure(self, timer: PhaseTimer, error: Exception, result: Optional[dict]) -> dict:
+        """analyze_product_image result of a failed analysis."""
+        return self._observe(timer, {
+            "categories": {},
+            "error": str(error),
+            "raw_output": "",
+            "cached": False,
+            "resilience": result.get("resilience") if result else None,
+            "routing": result.get("routing") if result else None
+        })
+
+    def _batch_lookup(self, url: str, model: ModelSpec, temperature: float) -> tuple:
+        """(cache key, cached analysis) of one image of analyze_products_batch."""
+        key = self._analysis_cache_key(url, model, temperature)
+        return key, self._analysis_cache_get(key, url)
+
+    def _batch_entries(self, batch: List[str], cache_keys: Dict[str, Optional[str]], result: dict) -> Dict[str, dict]:
+        """
+        Entries of the images with a valid analysis in a batch response
+        (caching each); every image gets an error entry if the call failed.
+        """
+        if result.get("error"):
+            # The call itself failed (after retries and fallback models); splitting would not help
+            failed = {"categories": {}, "error": result["error"]}
+            return {url: _batch_analysis_result(url, failed, len(batch)) for url in batch}
+
+        try:
+            valid = _parse_batch_analysis_output(result.get("output", ""), len(batch))
+        except RuntimeError as e:
+            print(f"[analyze-batch] malformed response for {len(batch)} images ({e}); re-splitting", file=sys.stderr)
+            valid = {}
+
+        entries = {}
+        for position, url in enumerate(batch):
+            if position in valid:
+                analysis = {
+                    "categories": valid[position],
+                    "error": None,
+                    "raw_output": json.dumps(valid[position], ensure_ascii=False),
+                    "cached": False
+                }
+                self._analysis_cache_store(cache_keys.get(url), analysis, url)
+                entries[url] = _batch_analysis_result(url, analysis, len(batch))
+        return entries
+
+    def _background_prompt_result(self, timer: PhaseTimer, categories: dict, style_type: str, result: dict) -> dict:
+        """generate_background_prompt result of a completion (the template prompt if it is empty)."""
+        output_text = self._llm_output(timer, result)
+        with timer.phase("parse"):
+            generated_prompt = output_text.strip() or _fallback_background_prompt(categories, style_type)
+        return self._observe(timer, {"prompt": generated_prompt, "error": None})
+
+    def _background_prompt_failure(self, timer: PhaseTimer, categories: dict, style_type: str, error: Exception) -> dict:
+        """generate_background_prompt result of a failed call: the template prompt."""
+        return self._observe(timer, {
+            "prompt": _fallback_background_prompt(categories, style_type),
+            "error": str(error)
+        })
+
+    def _backgrounds_result(self, outcomes: List[tuple], styles: list, download: Optional[bool]) -> dict:
+        """generate_multiple_backgrounds result of the per-style outcomes (in style order)."""
+        generated_images = [payload for kind, payload in outcomes if kind == "image"]
+        errors = [payload for kind, payload in outcomes if kind == "error"]
+        if self.download_results if download is None else download:
+            self._attach_downloads(generated_images, "image_url")
+        return {
+            "images": generated_images,
+            "total_generated": len(generated_images),
+            "total_requested": len(styles),
+            "errors": errors if errors else None
+        }
+
+
+class FalClient(_FalClientBase):
+    """
+    FAL wrapper (Python) for:
+      - any-llm (OpenRouter) text generation
+      - background replacement via photokit
+    
+    Requires env: FAL_KEY
+    """
+
+    def any_llm_enterprise(
+        self,
+        prompt: str,
+        *,
+        system_prompt: Optional[str] = None,
+        model: ModelSpec = "google/gemini-2.5-pro",
+        temperature: Optional[float] = 0.7,
+        max_tokens: Optional[int] = None,
+        with_logs: bool = False
+    ) -> dict:
+        """
+        Enterprise LLM endpoint with support for premium models like Gemini 2.5 Pro.
+        Blocks until result. Returns dict with output and error.
+        
+        Args:
+            prompt: The user prompt to send
+            system_prompt: Optional system prompt
+            model: Model, ranked list of acceptable models, or tier name
+                ("fast", "vision", "premium") (default: "google/gemini-2.5-pro")
+            temperature: Sampling temperature (default: 0.7)
+            max_tokens: Maximum tokens to generate
+            with_logs: If True, prints log streams to stdout
+        
+        Returns:
+            Dictionary with output, error, raw response and the "routing" decision
+        """
+        models, tier = fal_router.resolve_models(model, "google/gemini-2.5-pro")
+
+        def attempt(chosen: str) -> dict:
+            arguments = _build_enterprise_arguments(
+                prompt,
+                system_prompt=system_prompt,
+                model=chosen,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            return self._subscribe_enterprise(arguments, with_logs)
+
+        return self.router.route(models, attempt, tier=tier)
+
+    def _subscribe_enterprise(self, arguments: dict, with_logs: bool) -> dict:
+        """One fal-ai/any-llm/enterprise call for a single model."""
+        info = fal_resilience.CallInfo("fal-ai/any-llm/enterprise")
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm/enterprise", arguments.get("model"))
+        on_queue_update = self._queue_listener(timer, with_logs, "FAL Enterprise Queue Update")
+
+        def subscribe():
+            timer.start_queue()
+            return fal_client.subscribe(
+                "fal-ai/any-llm/enterprise",
+                arguments=arguments,
+                with_logs=with_logs,
+                on_queue_update=on_queue_update
+            )
+
+        try:
+            with self._admit("fal-ai/any-llm/enterprise", info, timer):
+                result = self.resilience.call("fal-ai/any-llm/enterprise", subscribe, info)
+            return self._enterprise_result(timer, info, result)
+        except Exception as e:
+            return self._enterprise_error(timer, info, e)
+
+    def _stream_enterprise_json(self, arguments: dict, required_keys: List[str]) -> dict:
+        """
+        One streamed fal-ai/any-llm/enterprise call for a single model that
+        stops as soon as a JSON object with all `required_keys` has closed.
+        
+        Closing the stream there cancels the rest of the generation. Returns
+        the _subscribe_enterprise result plus "json" (the object, or None if
+        the output ended without one), "stopped_early" and "events".
+        """
+        info = fal_resilience.CallInfo("fal-ai/any-llm/enterprise")
+        # queue_wait: until the first event; inference: until the object closed
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm/enterprise", arguments.get("model"))
+        accumulator = _StreamAccumulator()
+        scanner = _JsonObjectScanner(required_keys)
+        events = None
+        stopped_early = None
+        try:
+            with self._admit("fal-ai/any-llm/enterprise", info, timer):
+                # Only opening the stream is retried; once events flow, a failure is final
+                events = self.resilience.call(
+                    "fal-ai/any-llm/enterprise",
+                    lambda: _open_stream(fal_client.stream("fal-ai/any-llm/enterprise", arguments=arguments)),
+                    info
+                )
+                for event in events:
+                    stopped_early = self._json_stream_event(timer, accumulator, scanner, event)
+                    if stopped_early is not None:
+                        break
+            return self._json_stream_result(timer, info, accumulator, scanner, bool(stopped_early))
+        except Exception as e:
+            return self._json_stream_error(timer, info, accumulator, e)
+        finally:
+            if events is not None and hasattr(events, "close"):
+                # Drops the SSE connection, which cancels the generation
+                events.close()
+
+    def any_llm_complete(
+        self,
+        prompt: str,
+        *,
+        system_prompt: Optional[str] = None,
+        model: ModelSpec = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: Optional[str] = "latency",
+        with_logs: bool = False,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        cache_namespace: Optional[str] = None,
+        cache_threshold: Optional[float] = None,
+        cache_bypass: bool = False
+    ) -> dict:
+        """
+        Blocks until result. Returns dict with:
+          { "output": str, "reasoning": str|None, "partial": bool|None, 
+            "error": str|None, "raw": <full_response> }
+        
+        Args:
+            prompt: The user prompt to send
+            system_prompt: Optional system prompt
+            model: Model, ranked list of acceptable models, or tier name
+                ("fast", "vision", "premium") (default: "google/gemini-2.5-flash-lite")
+            temperature: Sampling temperature (default: 0.7)
+            max_tokens: Maximum tokens to generate
+            priority: "throughput" or "latency" (default: "latency")
+            with_logs: If True, prints log streams to stdout
+            hedge: If True, submit a duplicate request when the first one
+                has not completed within the hedge threshold; the first
+                result wins and the other request is cancelled
+            hedge_delay: Threshold in seconds for this call (default: the
+                client's hedge_policy threshold)
+            cache_namespace: Opt in to the prompt similarity cache (see
+                fal_prompt_cache): a prompt nearly identical to an earlier
+                one of this namespace (same system prompt, model,
+                temperature and max_tokens) returns that completion. The
+                namespace also selects the entries' TTL.
+            cache_threshold: Minimum similarity for a hit (default: the
+                cache's, FAL_PROMPT_CACHE_THRESHOLD)
+            cache_bypass: Skip the lookup but cache the new completion
+                (regenerates a cached answer)
+        
+        Returns:
+            Dictionary with output, reasoning, error, raw response and the
+            "routing" decision (plus "hedge" details when hedge=True). With
+            a cache_namespace, also "cached" and "prompt_cache":
+            {"namespace", "similarity", "age_seconds"} on a hit.
+        """
+        models, tier = fal_router.resolve_models(model, DEFAULT_LLM_MODEL)
+        if cache_namespace:
+            scope = _prompt_cache_scope(system_prompt, model, temperature, max_tokens)
+            cached = None if cache_bypass else self._prompt_cache_lookup(
+                cache_namespace, scope, prompt, cache_threshold
+            )
+            if cached is not None:
+                return cached
+
+        def attempt(chosen: str) -> dict:
+            arguments = _build_llm_arguments(
+                prompt,
+                system_prompt=system_prompt,
+                model=chosen,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                priority=priority
+            )
+            if hedge:
+                return self._hedged_complete(arguments, hedge_delay)
+            return self._subscribe_complete(arguments, with_logs)
+
+        result = self.router.route(models, attempt, tier=tier)
+        if cache_namespace:
+            return self._prompt_cache_store(cache_namespace, scope, prompt, result)
+        return result
+
+    def _subscribe_complete(self, arguments: dict, with_logs: bool) -> dict:
+        """One blocking fal-ai/any-llm call for a single model."""
+        info = fal_resilience.CallInfo("fal-ai/any-llm")
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm", arguments.get("model"))
+        on_queue_update = self._queue_listener(timer, with_logs, "FAL Queue Update")
+
+        def subscribe():
+            timer.start_queue()
+            return fal_client.subscribe(
+                "fal-ai/any-llm",
+                arguments=arguments,
+                with_logs=with_logs,
+                on_queue_update=on_queue_update
+            )
+
+        try:
+            with self._admit("fal-ai/any-llm", info, timer):
+                started = time.monotonic()
+                result = self.resilience.call("fal-ai/any-llm", subscribe, info)
+            return self._complete_result(timer, info, result, started)
+        except Exception as e:
+            return self._complete_error(timer, info, e)
+
+    def _hedged_complete(self, arguments: dict, hedge_delay: Optional[float]) -> dict:
+        """
+        any_llm_complete via submit + get, hedged after the threshold.
+        
+        Each leg submits its own queue request and blocks on its result in
+        a worker thread. Whichever succeeds first wins; the other leg's
+        request is cancelled (or cancelled right after submission if it
+        was still being submitted).
+        """
+        import contextvars
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        hedge = _HedgedCall(self.hedge_policy, arguments, hedge_delay)
+        state = {"winner": None}
+        state_lock = threading.Lock()
+
+        def cancel(handle) -> None:
+            try:
+                handle.cancel()
+            except Exception as e:
+                hedge.cancel_done(handle, e)
+            else:
+                hedge.cancel_done(handle)
+
+        def leg(index: int) -> dict:
+            timer = hedge.timers[index]
+            hedge.leg_started(index)
+            with self._admit("fal-ai/any-llm", hedge.infos[index], timer):
+                timer.start_queue()
+                handle = self.resilience.call(
+                    "fal-ai/any-llm",
+                    lambda: fal_client.submit("fal-ai/any-llm", arguments=arguments),
+                    hedge.infos[index]
+                )
+                with state_lock:
+                    hedge.handles[index] = handle
+                    lost = state["winner"] is not None
+                if lost:
+                    cancel(handle)
+                    raise RuntimeError(f"{hedge.LEGS[index]} request superseded")
+                # Status transitions timed; get() then only re-checks the
+                # completed status and fetches the result
+                for status in handle.iter_events(with_logs=False):
+                    timer.on_queue_update(status)
+                result = handle.get()
+                timer.finish_queue()
+            return result
+
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fal-hedge")
+        try:
+            # Legs run in copies of this context (usage attribution, admission lane)
+            futures = {pool.submit(contextvars.copy_context().run, leg, 0): 0}
+            done, _ = wait(futures, timeout=hedge.threshold)
+            if not done and hedge.should_hedge():
+                futures[pool.submit(contextvars.copy_context().run, leg, 1)] = 1
+
+            pending = set(futures)
+            error: Optional[BaseException] = None
+            winner, result = None, None
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        winner, result = futures[future], future.result()
+                        break
+                    error = future.exception()
+
+            # Legs still running lost; ones still submitting cancel themselves
+            with state_lock:
+                state["winner"] = winner if winner is not None else -1
+                losers = [hedge.handles[futures[f]] for f in pending if hedge.handles[futures[f]] is not None]
+            for handle in losers:
+                cancel(handle)
+
+            return self._hedge_result(hedge, len(futures), winner, result, error)
+        finally:
+            # Never wait for the losing leg; its request has been cancelled
+            pool.shutdown(wait=False)
+
+    def any_llm_stream(
+        self,
+        prompt: str,
+        *,
+        system_prompt: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: Optional[str] = "latency",
+    ):
+        """
+        Streams text generation as structured deltas.
+        
+        Yields one {"type": "delta", ...} record per event that adds text or
+        reasoning (with the new text in "delta" and the cumulative text in
+        "output"), then a terminal {"type": "done", ...} record carrying the
+        final output, partial flag and usage.
+        
+        Example:
+            >>> for record in client.any_llm_stream("Short product pitch"):
+            ...     if record["type"] == "delta":
+            ...         print(record["delta"], end="", flush=True)
+        
+        Args:
+            prompt: The user prompt to send
+            system_prompt: Optional system prompt
+            model: Model to use (default: "google/gemini-2.5-flash-lite")
+            temperature: Sampling temperature (default: 0.7)
+            max_tokens: Maximum tokens to generate
+            priority: "throughput" or "latency" (default: "latency")
+        """
+        # Build arguments
+        arguments = _build_llm_arguments(
+            prompt,
+            system_prompt=system_prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            priority=priority
+        )
+
+        accumulator = _StreamAccumulator()
+        info = fal_resilience.CallInfo("fal-ai/any-llm")
+        # queue_wait: until the first event (time to first token); inference: the rest
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm", arguments.get("model"))
+        try:
+            with self._admit("fal-ai/any-llm", info, timer):
+                # Only opening the stream is retried; once events flow, a failure is final
+                events = iter(self.resilience.call(
+                    "fal-ai/any-llm",
+                    lambda: _open_stream(fal_client.stream("fal-ai/any-llm", arguments=arguments)),
+                    info
+                ))
+                for event in events:
+                    record = self._stream_event(timer, accumulator, event)
+                    if record is not None:
+                        yield record
+        except Exception as e:
+            raise self._stream_failure(timer, e)
+        
+        yield self._stream_done(timer, info, accumulator)
+
+    def any_llm_submit(
+        self,
+        prompt: str,
+        *,
+        system_prompt: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: Optional[str] = "latency",
+        webhook_url: Optional[str] = None
+    ) -> str:
+        """
+        Submits a job and returns request_id.
+        
+        Args:
+            prompt: The user prompt to send
+            system_prompt: Optional system prompt
+            model: Model to use (default: "google/gemini-2.5-flash-lite")
+            temperature: Sampling temperature (default: 0.7)
+            max_tokens: Maximum tokens to generate
+            priority: "throughput" or "latency" (default: "latency")
+            webhook_url: Optional webhook URL for completion notification
+        
+        Returns:
+            Request ID string
+        """
+        # Build arguments
+        arguments = _build_llm_arguments(
+            prompt,
+            system_prompt=system_prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            priority=priority
+        )
+
+        try:
+            # The slot covers the submission; the job then runs in FAL's queue
+            with self._admit("fal-ai/any-llm"):
+                handler = self.resilience.call(
+                    "fal-ai/any-llm",
+                    lambda: fal_client.submit(
+                        "fal-ai/any-llm",
+                        arguments=arguments,
+                        webhook_url=webhook_url
+                    )
+                )
+            return handler.request_id
+        except Exception as e:
+            raise RuntimeError(f"Submit failed: {e}")
+
+    def any_llm_status(self, request_id: str, with_logs: bool = True) -> dict:
+        """
+        Returns queue status dict (including logs if requested).
+        
+        Args:
+            request_id: The request ID from submit()
+            with_logs: Include logs in response
+        
+        Returns:
+            {"request_id": str, "status": "queued"|"in_progress"|"completed",
+             "queue_position": int|None, "logs": list|None}
+        """
+        try:
+            status = self.resilience.call(
+                "fal-ai/any-llm",
+                lambda: fal_client.status("fal-ai/any-llm", request_id, with_logs=with_logs)
+            )
+            return _format_llm_status(request_id, status, with_logs)
+        except Exception as e:
+            raise RuntimeError(f"Status check failed: {e}")
+
+    def any_llm_result(self, request_id: str) -> dict:
+        """
+        Returns final result dict: { "output": str, ... } or raises if not completed.
+        
+        Args:
+            request_id: The request ID from submit()
+        
+        Returns:
+            Dictionary with output, reasoning, error, and raw response
+        """
+        try:
+            info = fal_resilience.CallInfo("fal-ai/any-llm")
+            timer = fal_metrics.PhaseTimer("fal-ai/any-llm")
+            with timer.phase("fetch"):
+                result = self.resilience.call(
+                    "fal-ai/any-llm",
+                    lambda: fal_client.result("fal-ai/any-llm", request_id),
+                    info
+                )
+            return self._llm_result(timer, info, result)
+        except Exception as e:
+            raise RuntimeError(f"Result retrieval failed: {e}")
+
+    def upload_file(self, path: str, *, preprocess: Union[None, bool, ImagePreprocessor] = None) -> str:
+        """
+        Uses fal_client.upload_file and returns public URL string.
+        
+        Files are content-addressed: the SHA-256 of the file is looked up in
+        the shared upload cache first, and the upload is skipped on a hit.
+        
+        Args:
+            path: Local file path to upload
+            preprocess: Downscale/re-encode images first (see fal_image):
+                None uses the client's preprocessor, True forces it, False
+                uploads the file byte-for-byte, or pass an ImagePreprocessor
+        
+        Returns:
+            Public URL string
+        """
+        return self.upload_image(path, preprocess=preprocess)["url"]
+
+    def upload_image(self, path: str, *, preprocess: Union[None, bool, ImagePreprocessor] = True) -> dict:
+        """
+        Uploads a local image, preprocessed by default, and reports the savings.
+        
+        Args:
+            path: Local image path
+            preprocess: As in upload_file (default: True)
+        
+        Returns:
+            {"url": str, "cached": bool, "preprocess": dict|None}, where
+            "preprocess" is the ImagePreprocessor report (original/processed
+            bytes and size, bytes_saved, rotated, skipped reason); None on
+            upload cache hits and when not preprocessing
+        """
+        preprocessor = self._resolve_preprocessor(preprocess)
+        return self._flights.do(
+            _flight_key("upload", path, preprocessor.signature if preprocessor else None),
+            lambda: self._upload_file(path, preprocessor)
+        )
+
+    def _upload_file(self, path: str, preprocessor: Optional[ImagePreprocessor]) -> dict:
+        """upload_image without coalescing."""
+        try:
+            key, cached_url = self._upload_cache_lookup(path, preprocessor.signature if preprocessor else None)
+            if cached_url:
+                return self._upload_result(cached_url, True, None)
+            
+            timer = fal_metrics.PhaseTimer("upload")
+            report, upload_path = self._upload_prepare(timer, path, preprocessor)
+            try:
+                with self._admit("upload", timer=timer), timer.phase("upload"):
+                    url = self.resilience.call("upload", lambda: fal_client.upload_file(upload_path))
+                return self._upload_done(timer, key, path, upload_path, url, report)
+            finally:
+                self._upload_cleanup(path, upload_path)
+        except Exception as e:
+            raise RuntimeError(f"File upload failed: {e}")
+
+    def download_images(self, urls: List[str]) -> List[dict]:
+        """
+        Fetches images into the local image store over a pooled session.
+        
+        Stored URLs are served from disk (re-checked with a conditional GET
+        once older than FAL_IMAGE_STORE_REVALIDATE); the store is bounded by
+        FAL_IMAGE_STORE_MAX_BYTES with least recently used eviction.
+        
+        Args:
+            urls: Image URLs, e.g. the "url"s of a background_replace result
+        
+        Returns:
+            One dict per URL, in order: {"url", "path", "sha256", "bytes",
+            "content_type", "cached", "revalidated"}, or {"url", "path": None,
+            "error"} when that download failed
+        """
+        return self._download_images(urls)
+
+    def background_replace(
+        self,
+        image_url: str,
+        *,
+        prompt: str = DEFAULT_BACKGROUND_PROMPT,
+        remove_bg: bool = True,
+        timeout: int = 110,
+        preprocess: Union[None, bool, ImagePreprocessor] = None,
+        download: Optional[bool] = None,
+        reuse: bool = False
+    ) -> dict:
+        """
+        Replaces image background using FAL AI image generation.
+        Uses fal-ai/nano-banana for fast, high-quality image generation.
+        
+        Submits the job to the queue and waits for the shared poller to
+        deliver its result; see background_submit/background_track to
+        run many jobs without blocking a thread each.
+        
+        Args:
+            image_url: URL of the image to process, or a local file path
+                (uploaded first, see upload_image)
+            prompt: Background replacement prompt
+            remove_bg: Whether to remove background first (currently uses prompt-based approach)
+            timeout: Seconds before the job is cancelled and this call fails
+            preprocess: Preprocessing of a local image_url, as in upload_file
+            download: Also fetch the generated images into the local image
+                store; each image dict then has "local_path" (None uses the
+                client's download_results)
+            reuse: Return the earlier result for the same prompt and the
+                same image, or a near-duplicate of it (re-encoded, resized,
+                renamed; see fal_phash), instead of generating again; new
+                results are remembered for later reuse
+        
+        Returns:
+            JSON response dictionary with keys like:
+                - image: {"url": "...", "width": ..., "height": ...}
+                - images: [{"url": "...", ...}]
+                - upload: upload_image result when image_url was a local file
+                - cached: (reuse=True) whether an earlier result was returned;
+                  "near_duplicate" names the image it was generated for
+                  when that was not this exact file
+        
+        Example response:
+            {
+                "images": [{
+                    "url": "https://fal.media/files/...",
+                    "content_type": "image/jpeg",
+                    "file_name": "...",
+                    "file_size": 123456,
+                    "width": 1024,
+                    "height": 1024
+                }]
+            }
+        """
+        source_url, reuse_key = image_url, None
+        if reuse:
+            reuse_key, reused = self._background_reused(source_url, prompt, download)
+            if reused is not None:
+                return reused
+        
+        upload = None
+        if os.path.isfile(image_url):
+            upload = self.upload_image(image_url, preprocess=preprocess)
+            image_url = upload["url"]
+        
+        # Use FAL's nano-banana/edit model for image-to-image (product preservation)
+        # EXACTLY like backgroundGeneration.py - no prompt modification
+        info = fal_resilience.CallInfo("fal-ai/nano-banana/edit")
+        try:
+            # Polled as often as fal_client.subscribe would, since this thread waits on it
+            result = self._background_start(
+                _build_background_arguments(image_url, prompt),
+                info,
+                timeout=timeout,
+                poll_interval=BLOCKING_POLL_INTERVAL
+            ).result()
+            return self._background_done(
+                result, info,
+                reuse=reuse, reuse_key=reuse_key, source_url=source_url, upload=upload, download=download
+            )
+        except Exception as e:
+            raise self._background_failure(info, e)
+
+    def background_start(
+        self,
+        image_url: str,
+        *,
+        prompt: str = DEFAULT_BACKGROUND_PROMPT,
+        remove_bg: bool = True,
+        timeout: Optional[float] = 110,
+        callback: Optional[Any] = None
+    ) -> "Future":
+        """
+        Submits a background replacement job and tracks it without blocking.
+        
+        Like background_replace, the job holds its admission slot until its
+        result is delivered, so max_concurrent bounds running generations.
+        
+        Args:
+            image_url: URL of the image to process
+            prompt: Background replacement prompt
+            remove_bg: Whether to remove background first (currently uses prompt-based approach)
+            timeout: Seconds before the job is cancelled (TimeoutError)
+            callback: Called with the Future once the job is done
+        
+        Returns:
+            concurrent.futures.Future resolving to the same dict as
+            background_replace, including "request_id"
+        """
+        try:
+            return self._background_start(
+                _build_background_arguments(image_url, prompt),
+                fal_resilience.CallInfo("fal-ai/nano-banana/edit"),
+                timeout=timeout,
+                callback=callback
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to submit background job: {e}")
+
+    def _background_start(
+        self,
+        arguments: dict,
+        info: CallInfo,
+        *,
+        timeout: Optional[float],
+        callback: Optional[Any] = None,
+        poll_interval: Optional[float] = None
+    ) -> "Future":
+        """Submit and track a job; its admission slot is freed when the Future is done."""
+        controller = self._get_admission()
+        ticket = controller.acquire("fal-ai/nano-banana/edit") if controller is not None else None
+        self._admitted(ticket, info, None)
+        try:
+            request_id = self._background_submit(arguments, None, info)
+            future = self.background_track(request_id, timeout=timeout, poll_interval=poll_interval)
+        except BaseException:
+            if ticket is not None:
+                ticket.release()
+            raise
+        # Added first, so the slot is free before `callback` runs
+        if ticket is not None:
+            future.add_done_callback(lambda _: ticket.release())
+        if callback is not None:
+            future.add_done_callback(callback)
+        return future
+
+    def background_submit(
+        self,
+        image_url: str,
+        *,
+        prompt: str = DEFAULT_BACKGROUND_PROMPT,
+        remove_bg: bool = True,
+        webhook_url: Optional[str] = None
+    ) -> str:
+        """
+        Submits a background replacement job and returns immediately.
+        
+        The job is handed to the caller, so its admission slot only covers
+        the submission; use background_start to count it as in flight
+        until it is done.
+        
+        Args:
+            image_url: URL of the image to process
+            prompt: Background replacement prompt
+            remove_bg: Whether to remove background first (currently uses prompt-based approach)
+            webhook_url: Optional URL FAL calls when the job completes
+        
+        Returns:
+            Request ID string (track it with background_track, or query
+            background_status / background_result)
+        """
+        try:
+            with self._admit("fal-ai/nano-banana/edit"):
+                return self._background_submit(
+                    _build_background_arguments(image_url, prompt),
+                    webhook_url,
+                    fal_resilience.CallInfo("fal-ai/nano-banana/edit")
+                )
+        except Exception as e:
+            raise RuntimeError(f"Failed to submit background job: {e}")
+
+    def _background_submit(self, arguments: dict, webhook_url: Optional[str], info: CallInfo) -> str:
+        handler = self.resilience.call(
+            "fal-ai/nano-banana/edit",
+            lambda: fal_client.submit(
+                "fal-ai/nano-banana/edit",
+                arguments=arguments,
+                webhook_url=webhook_url
+            ),
+            info
+        )
+        return handler.request_id
+
+    def background_status(self, request_id: str) -> dict:
+        """
+        Checks the queue status of a background job.
+        
+        Returns:
+            {"request_id": str, "status": "queued"|"in_progress"|"completed",
+             "queue_position": int|None}
+        """
+        try:
+            status = self.resilience.call(
+                "fal-ai/nano-banana/edit",
+                lambda: fal_client.status("fal-ai/nano-banana/edit", request_id, with_logs=False)
+            )
+            return _format_queue_status(request_id, status)
+        except Exception as e:
+            raise RuntimeError(f"Failed to get background job status: {e}")
+
+    def background_result(self, request_id: str) -> dict:
+        """
+        Fetches the result of a background job (blocks until it completes).
+        
+        Returns:
+            Same dict as background_replace
+        """
+        try:
+            timer = fal_metrics.PhaseTimer("fal-ai/nano-banana/edit")
+            with timer.phase("fetch"):
+                result = self.resilience.call(
+                    "fal-ai/nano-banana/edit",
+                    lambda: fal_client.result("fal-ai/nano-banana/edit", request_id)
+                )
+            return self._background_result(timer, result, request_id)
+        except Exception as e:
+            raise RuntimeError(f"Failed to get background job result: {e}")
+
+    def analyze_product_image(
+        self,
+        image_url: str,
+        *,
+        model: ModelSpec = "google/gemini-2.5-flash",
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        stream: bool = True,
+        preamble: bool = True
+    ) -> dict:
+        """
+        Analyzes product image and returns 9-category classification.
+        Uses multimodal vision (Enterprise endpoint) with Gemini 2.5 Flash.
+        
+        By default the completion is streamed and parsed incrementally: as
+        soon as the JSON object with all 9 categories has closed, the stream
+        is closed (cancelling the rest of the generation) and the result is
+        returned. If the stream cannot be opened, the blocking call is used.
+        
+        Successful results are cached by (image content hash, model,
+        temperature, prompt version, prompt variant); a cache hit returns
+        without a model call and has "cached": True.
+        
+        Args:
+            image_url: URL of the product image to analyze
+            model: Vision model, ranked list or tier (default: "google/gemini-2.5-flash")
+            temperature: Sampling temperature (default: 0.3)
+            use_cache: Set False to bypass the analysis cache
+            stream: Set False to wait for the full completion instead
+            preamble: Set False for the JSON-only prompt, which skips the
+                free-text image description so the time to a result is
+                bounded by the JSON itself
+        
+        Returns:
+            Dictionary with 9 product categories:
+                - main_product_type: Main category (Footwear, Electronics, etc.)
+                - subcategory: Detailed classification
+                - target_audience: Target demographic
+                - price_range: Budget/Mid-range/Premium/Luxury
+                - use_case: Usage scenario
+                - style_design: Design aesthetic
+                - season_occasion: Seasonal/occasional context
+                - industrial_type: Industry classification
+                - vibe: Overall vibe/feeling
+        
+        Example:
+            >>> result = client.analyze_product_image("https://example.com/shoe.jpg")
+            >>> print(result["main_product_type"])  # "Footwear"
+        """
+        return self._flights.do(
+            _flight_key("analyze", image_url, fal_router.model_key(model), float(temperature), use_cache, stream, preamble),
+            lambda: self._analyze_product_image(
+                image_url,
+                model=model,
+                temperature=temperature,
+                use_cache=use_cache,
+                stream=stream,
+                preamble=preamble
+            )
+        )
+
+    def _analyze_product_image(
+        self,
+        image_url: str,
+        *,
+        model: ModelSpec,
+        temperature: float,
+        use_cache: bool,
+        stream: bool,
+        preamble: bool
+    ) -> dict:
+        """analyze_product_image without coalescing."""
+        timer = fal_metrics.PhaseTimer("analyze-product", fal_router.model_key(model))
+        cache_key, cached = self._analysis_lookup(
+            timer, image_url, model, temperature, None if preamble else "json", use_cache
+        )
+        if cached is not None:
+            return self._observe(timer, cached)
+        
+        # Detailed prompt for 9-category product analysis
+        prompt = _build_analysis_prompt(image_url, preamble=preamble)
+        result = None
+
+        try:
+            # Use enterprise endpoint for vision support
+            if stream:
+                result = self._analysis_completion(prompt, model=model, temperature=temperature)
+            else:
+                result = self.any_llm_enterprise(
+                    prompt=prompt,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=2000
+                )
+            analysis = self._analysis_parsed(timer, result)
+            self._analysis_cache_store(cache_key, analysis, image_url)
+            return self._analysis_response(
+                timer, analysis, result, stream=_analysis_stream_info(result) if stream else None
+            )
+        except Exception as e:
+            return self._analysis_failure(timer, e, result)
+
+    def _analysis_completion(self, prompt: str, *, model: ModelSpec, temperature: float) -> dict:
+        """
+        Streamed analysis completion over the model ranking, stopping at the
+        closed analysis object; a model whose stream fails before the first
+        event is called without streaming instead.
+        """
+        models, tier = fal_router.resolve_models(model, "google/gemini-2.5-flash")
+
+        def attempt(chosen: str) -> dict:
+            arguments = _build_enterprise_arguments(
+                prompt,
+                model=chosen,
+                temperature=temperature,
+                max_tokens=2000
+            )
+            result = self._stream_enterprise_json(arguments, ANALYSIS_REQUIRED_KEYS)
+            if _stream_never_started(result):
+                return {**self._subscribe_enterprise(arguments, False), "streamed": False}
+            return {**result, "streamed": True}
+
+        return self.router.route(models, attempt, tier=tier)
+
+    def analyze_products_batch(
+        self,
+        image_urls: List[str],
+        *,
+        batch_size: int = ANALYSIS_BATCH_SIZE,
+        model: ModelSpec = "google/gemini-2.5-flash",
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        max_workers: int = 4
+    ) -> dict:
+        """
+        Analyzes many product images, packing up to `batch_size` images into
+        each multimodal request.
+        
+        A catalog import of N images costs about N / batch_size queued
+        calls instead of N, and the category instructions are sent once per
+        batch instead of once per image. The model answers with a JSON array
+        indexed by image, which is validated per image: images whose entry
+        is missing, duplicated or incomplete (or all images of a malformed
+        response) are re-split into halves and retried, down to a regular
+        analyze_product_image call for a single image. Images are looked up
+        in and stored to the analysis cache individually, so a later
+        analyze_product_image of the same image is a cache hit.
+        
+        Args:
+            image_urls: URLs of the product images (duplicates are analyzed once)
+            batch_size: Maximum images per request (default: 8)
+            model: Vision model, ranked list or tier (default: "google/gemini-2.5-flash")
+            temperature: Sampling temperature (default: 0.3)
+            use_cache: Set False to bypass the analysis cache
+            max_workers: Batches analyzed concurrently (default: 4)
+        
+        Returns:
+            Dictionary with:
+                - results: One entry per input URL, in order: {"image_url",
+                  "categories", "error", "cached", "batch_size"} (the size of
+                  the request that produced the entry)
+                - stats: images, cached, calls (batch requests), resplits,
+                  single (single-image analyses) and errors
+                - error: None
+        
+        Example:
+            >>> batch = client.analyze_products_batch(urls, batch_size=10)
+            >>> {r["image_url"]: r["categories"]["subcategory"] for r in batch["results"]}
+        """
+        import contextvars
+        from concurrent.futures import ThreadPoolExecutor
+        
+        state = _BatchAnalysis(image_urls, batch_size, model)
+        
+        def run(fn, items):
+            # Each task runs in a copy of this context (usage attribution)
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                return list(executor.map(
+                    lambda item, context: context.run(fn, item),
+                    items,
+                    [contextvars.copy_context() for _ in items]
+                ))
+        
+        if use_cache and state.unique:
+            with state.timer.phase("cache_lookup"):
+                state.add_cached(run(lambda url: self._batch_lookup(url, model, temperature), state.unique))
+        
+        for batch_results, batch_stats in run(
+            lambda batch: self._analyze_batch(
+                batch, state.cache_keys, model=model, temperature=temperature, use_cache=use_cache
+            ),
+            state.batches()
+        ):
+            state.add(batch_results, batch_stats)
+        return self._observe(state.timer, state.summary())
+
+    def _analyze_batch(
+        self,
+        batch: List[str],
+        cache_keys: Dict[str, Optional[str]],
+        *,
+        model: ModelSpec,
+        temperature: float,
+        use_cache: bool
+    ) -> tuple:
+        """
+        Analyze one batch, re-splitting the images without a valid entry.
+        
+        Returns:
+            ({url: result entry}, stats increments)
+        """
+        stats = {"calls": 0, "resplits": 0, "single": 0}
+        if len(batch) == 1:
+            stats["single"] += 1
+            analysis = self._analyze_product_image(
+                batch[0], model=model, temperature=temperature, use_cache=use_cache, stream=True, preamble=True
+            )
+            return {batch[0]: _batch_analysis_result(batch[0], analysis, 1)}, stats
+        
+        stats["calls"] += 1
+        result = self.any_llm_enterprise(
+            prompt=_build_batch_analysis_prompt(batch),
+            model=model,
+            temperature=temperature,
+            max_tokens=200 + 300 * len(batch)
+        )
+        results = self._batch_entries(batch, cache_keys, result)
+        
+        parts = _batch_resplit(batch, results)
+        if parts:
+            stats["resplits"] += 1
+        for part in parts:
+            part_results, part_stats = self._analyze_batch(
+                part, cache_keys, model=model, temperature=temperature, use_cache=use_cache
+            )
+            results.update(part_results)
+            _add_stats(stats, part_stats)
+        return results, stats
+
+    def analyze_and_prompt(
+        self,
+        image_url: str,
+        styles: Optional[list] = None,
+        *,
+        model: ModelSpec = "google/gemini-2.5-flash",
+        temperature: float = 0.3,
+        use_cache: bool = True
+    ) -> dict:
+        """
+        Analyzes a product image and writes a background prompt per style
+        in one multimodal call.
+        
+        Replaces analyze_product_image followed by one generate_background_prompt
+        per style (1 + N queued LLM calls) with a single round trip. The
+        response is validated strictly: any style whose prompt is missing or
+        malformed gets the template prompt instead and is listed in "fallbacks".
+        Fully valid results are cached like analyze_product_image (per style list).
+        
+        Args:
+            image_url: URL of the product image to analyze
+            styles: List of style dicts with 'name' and 'description' keys
+                (default: DEFAULT_BACKGROUND_STYLES)
+            model: Vision model, ranked list or tier (default: "google/gemini-2.5-flash")
+            temperature: Sampling temperature (default: 0.3)
+            use_cache: Set False to bypass the analysis cache
+        
+        Returns:
+            Dictionary with:
+                - categories: The 9 product categories (as analyze_product_image)
+                - prompts: {style name: background prompt} for every style
+                - fallbacks: {style name: reason} for styles that got the
+                  template prompt
+                - error: None, or why the call failed (prompts are then all
+                  template prompts)
+        
+        Example:
+            >>> fused = client.analyze_and_prompt(url)
+            >>> client.generate_multiple_backgrounds(url, fused["categories"], prompts=fused["prompts"])
+        """
+        if styles is None:
+            styles = DEFAULT_BACKGROUND_STYLES
+        return self._flights.do(
+            _flight_key("analyze_prompt", image_url, styles, fal_router.model_key(model), float(temperature), use_cache),
+            lambda: self._analyze_and_prompt(
+                image_url,
+                styles,
+                model=model,
+                temperature=temperature,
+                use_cache=use_cache
+            )
+        )
+
+    def _analyze_and_prompt(
+        self,
+        image_url: str,
+        styles: list,
+        *,
+        model: ModelSpec,
+        temperature: float,
+        use_cache: bool
+    ) -> dict:
+        """analyze_and_prompt without coalescing."""
+        timer = fal_metrics.PhaseTimer("analyze-and-prompt", fal_router.model_key(model))
+        cache_key, cached = self._analysis_lookup(
+            timer, image_url, model, temperature, f"fused-{_styles_signature(styles)}", use_cache
+        )
+        if cached is not None:
+            return self._observe(timer, cached)
+        
+        result = None
+        try:
+            result = self.any_llm_enterprise(
+                prompt=_build_analyze_and_prompt_request(image_url, styles),
+                model=model,
+                temperature=temperature,
+                max_tokens=2000 + 300 * len(styles)
+            )
+            fused = self._analyze_and_prompt_parsed(timer, result, styles)
+            if not fused["fallbacks"]:
+                self._analysis_cache_store(cache_key, fused, image_url)
+            return self._analysis_response(timer, fused, result)
+        except Exception as e:
+            return self._observe(timer, _failed_analyze_and_prompt(styles, e, result))
+
+    def generate_background_prompt(
+        self,
+        categories: dict,
+        style_type: str,
+        *,
+        model: str = "openai/gpt-5-mini"
+    ) -> dict:
+        """
+        Generates a professional background replacement prompt using GPT-5-mini.
+        Based on product categories and desired style type.
+        
+        Args:
+            categories: Product categories dict (from analyze_product_image)
+            style_type: Style description for the background
+            model: Model to use (default: "openai/gpt-5-mini")
+        
+        Returns:
+            Dictionary with generated prompt and error info
+        
+        Example:
+            >>> categories = {"main_product_type": "Footwear", "subcategory": "Sneakers"}
+            >>> style = "Clean white studio background for e-commerce"
+            >>> result = client.generate_background_prompt(categories, style)
+            >>> print(result["prompt"])
+        """
+        return self._flights.do(
+            _flight_key("bg_prompt", categories, style_type, fal_router.model_key(model)),
+            lambda: self._generate_background_prompt(categories, style_type, model=model)
+        )
+
+    def _generate_background_prompt(self, categories: dict, style_type: str, *, model: ModelSpec) -> dict:
+        """generate_background_prompt without coalescing."""
+        gpt_prompt = _build_background_prompt_request(categories, style_type)
+        timer = fal_metrics.PhaseTimer("generate-bg-prompt", fal_router.model_key(model))
+
+        try:
+            result = self.any_llm_enterprise(
+                prompt=gpt_prompt,
+                model=model,
+                temperature=0.7
+            )
+            return self._background_prompt_result(timer, categories, style_type, result)
+        except Exception as e:
+            # Fallback prompt
+            return self._background_prompt_failure(timer, categories, style_type, e)
+
+    def _generate_style_background(
+        self,
+        image_url: str,
+        categories: dict,
+        style: dict,
+        bg_prompt: Optional[str] = None
+    ) -> tuple:
+        """
+        Runs prompt generation + background replacement for a single style.
+        
+        Args:
+            bg_prompt: Prompt written beforehand (e.g. by analyze_and_prompt);
+                skips prompt generation
+        
+        Returns:
+            ("image", image_dict) on success or ("error", error_dict) on failure
+        """
+        try:
+            if bg_prompt is None:
+                # Generate prompt using GPT
+                prompt_result = self.generate_background_prompt(
+                    categories,
+                    style["description"]
+                )
+                failure = _style_prompt_failure(style, prompt_result)
+                if failure is not None:
+                    return failure
+                bg_prompt = prompt_result["prompt"]
+            
+            # Generate image with background replacement
+            bg_result = self.background_replace(
+                image_url,
+                prompt=bg_prompt,
+                download=False
+            )
+            return _style_outcome(style, bg_prompt, bg_result)
+        except Exception as e:
+            return ("error", {
+                "style": style["name"],
+                "error": str(e)
+            })
+
+    def generate_multiple_backgrounds(
+        self,
+        image_url: str,
+        categories: dict,
+        *,
+        styles: Optional[list] = None,
+        max_workers: Optional[int] = None,
+        download: Optional[bool] = None,
+        prompts: Optional[dict] = None
+    ) -> dict:
+        """
+        Generates multiple background variations for a product image.
+        Uses GPT to generate prompts, then creates images with different styles.
+        Styles are processed concurrently, so wall time approaches the slowest
+        single style instead of the sum of all of them.
+        
+        Args:
+            image_url: URL of the original product image
+            categories: Product categories (from analyze_product_image)
+            styles: List of style dicts with 'name' and 'description' keys.
+                   If None, uses default 3 styles (Studio, Lifestyle, Premium)
+            max_workers: Maximum number of styles processed in parallel
+                   (default: all styles at once; 1 = sequential)
+            download: Fetch all generated images into the local image store
+                   in one pooled batch; each entry then has "local_path"
+                   (None uses the client's download_results)
+            prompts: {style name: background prompt} written beforehand, e.g.
+                   analyze_and_prompt()["prompts"]; those styles skip the
+                   per-style prompt generation call
+        
+        Returns:
+            Dictionary with list of generated images and metadata.
+            Images and errors keep the order of `styles`.
+        
+        Example:
+            >>> categories = client.analyze_product_image(url)["categories"]
+            >>> result = client.generate_multiple_backgrounds(url, categories)
+            >>> for img in result["images"]:
+            ...     print(img["style_name"], img["image_url"])
+        """
+        # Default styles if none provided
+        if styles is None:
+            styles = DEFAULT_BACKGROUND_STYLES
+        
+        outcomes = []
+        if styles:
+            import contextvars
+            from concurrent.futures import ThreadPoolExecutor
+            
+            workers = max(1, min(max_workers or len(styles), len(styles)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # executor.map yields in submission order, preserving style order;
+                # each style runs in a copy of this context (usage attribution)
+                outcomes = list(executor.map(
+                    lambda style, context: context.run(
+                        self._generate_style_background,
+                        image_url, categories, style, (prompts or {}).get(style["name"])
+                    ),
+                    styles,
+                    [contextvars.copy_context() for _ in styles]
+                ))
+        
+        return self._backgrounds_result(outcomes, styles, download)
+
+
+async def _with_timeout(awaitable, timeout: Optional[float], what: str):
+    """Await `awaitable`, raising TimeoutError with a readable message after `timeout` seconds."""
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"{what} timed out after {timeout}s") from None
 
 
-class FalClient:
+class AsyncFalClient(_FalClientBase):
     """
-    FAL wrapper (Python) for:
-      - any-llm (OpenRouter) text generation
-      - background replacement via photokit
+    asyncio-native counterpart to FalClient.
+    
+    Exposes the same methods and returns the same dicts, but is built on
+    fal_client's async APIs so one event loop can keep many queue requests
+    outstanding. Every method accepts an optional per-call `timeout` (seconds),
+    so flows compose naturally with asyncio.gather:
+    
+        >>> client = AsyncFalClient()
+        >>> analysis, url = await asyncio.gather(
+        ...     client.analyze_product_image(image_url, timeout=60),
+        ...     client.upload_file("product.jpg", timeout=30),
+        ... )
+    
+    Identical analyze/prompt/upload calls already in flight are coalesced;
+    a call that joins one shares that call's timeout.
     
     Requires env: FAL_KEY
     """
 
-    def __init__(self):
-        """Initialize FAL client and validate API key."""
-        # Support both FAL_KEY and FAL_API_KEY
-        self.fal_key = os.environ.get("FAL_KEY") or os.environ.get("FAL_API_KEY")
-        if not self.fal_key:
-            raise ValueError(
-                "FAL_KEY or FAL_API_KEY environment variable is required. "
-                "Please set it in your .env file or environment."
-            )
-        
-        # Set FAL credentials (fal-client expects FAL_KEY)
-        os.environ["FAL_KEY"] = self.fal_key
-
-    def any_llm_enterprise(
+    async def any_llm_enterprise(
         self,
         prompt: str,
         *,
         system_prompt: Optional[str] = None,
-        model: Optional[str] = "google/gemini-2.5-pro",
+        model: ModelSpec = "google/gemini-2.5-pro",
         temperature: Optional[float] = 0.7,
         max_tokens: Optional[int] = None,
-        with_logs: bool = False
+        with_logs: bool = False,
+        timeout: Optional[float] = None
     ) -> dict:
         """
-        Enterprise LLM endpoint with support for premium models like Gemini 2.5 Pro.
-        Blocks until result. Returns dict with output and error.
-        
-        Args:
-            prompt: The user prompt to send
-            system_prompt: Optional system prompt
-            model: Model to use (default: "google/gemini-2.5-pro")
-            temperature: Sampling temperature (default: 0.7)
-            max_tokens: Maximum tokens to generate
-            with_logs: If True, prints log streams to stdout
+        Async version of FalClient.any_llm_enterprise.
         
-        Returns:
-            Dictionary with output, error, and raw response
+        `timeout` applies to each model attempt.
         """
-        # Build arguments
-        arguments = {
-            "prompt": prompt,
-            "model": model,
-            "temperature": temperature
-        }
-        
-        if system_prompt:
-            arguments["system_prompt"] = system_prompt
-        if max_tokens is not None:
-            arguments["max_tokens"] = max_tokens
+        models, tier = fal_router.resolve_models(model, "google/gemini-2.5-pro")
 
-        try:
-            # Subscribe (blocking call)
-            def on_queue_update(update):
-                if with_logs:
-                    print(f"[FAL Enterprise Queue Update] {update}", file=sys.stderr)
+        async def attempt(chosen: str) -> dict:
+            arguments = _build_enterprise_arguments(
+                prompt,
+                system_prompt=system_prompt,
+                model=chosen,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            return await self._subscribe_enterprise(arguments, with_logs, timeout)
+
+        return await self.router.aroute(models, attempt, tier=tier)
+
+    async def _subscribe_enterprise(
+        self,
+        arguments: dict,
+        with_logs: bool,
+        timeout: Optional[float]
+    ) -> dict:
+        """One fal-ai/any-llm/enterprise call for a single model."""
+        info = fal_resilience.CallInfo("fal-ai/any-llm/enterprise")
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm/enterprise", arguments.get("model"))
+        on_queue_update = self._queue_listener(timer, with_logs, "FAL Enterprise Queue Update")
 
-            result = fal_client.subscribe(
+        def subscribe():
+            timer.start_queue()
+            return fal_client.subscribe_async(
                 "fal-ai/any-llm/enterprise",
                 arguments=arguments,
                 with_logs=with_logs,
-                on_queue_update=on_queue_update if with_logs else None
+                on_queue_update=on_queue_update
             )
 
-            # Parse result
-            output = result.get("output", "")
-            
-            return {
-                "output": output,
-                "error": None,
-                "raw": result
-            }
+        try:
+            async with self._admit_async("fal-ai/any-llm/enterprise", info, timer):
+                result = await _with_timeout(
+                    self.resilience.acall("fal-ai/any-llm/enterprise", subscribe, info),
+                    timeout,
+                    "any-llm/enterprise"
+                )
+            return self._enterprise_result(timer, info, result)
+        except Exception as e:
+            return self._enterprise_error(timer, info, e)
+
+    async def _stream_enterprise_json(
+        self,
+        arguments: dict,
+        required_keys: List[str],
+        timeout: Optional[float]
+    ) -> dict:
+        """Async version of FalClient._stream_enterprise_json (`timeout` covers the whole stream)."""
+        info = fal_resilience.CallInfo("fal-ai/any-llm/enterprise")
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm/enterprise", arguments.get("model"))
+        accumulator = _StreamAccumulator()
+        scanner = _JsonObjectScanner(required_keys)
+
+        async def read() -> bool:
+            """Consume events until the object closed; True if that was before the last event."""
+            events = await self.resilience.acall(
+                "fal-ai/any-llm/enterprise",
+                lambda: _open_stream_async(fal_client.stream_async("fal-ai/any-llm/enterprise", arguments=arguments)),
+                info
+            )
+            try:
+                async for event in events:
+                    stopped_early = self._json_stream_event(timer, accumulator, scanner, event)
+                    if stopped_early is not None:
+                        return stopped_early
+                return False
+            finally:
+                # Drops the SSE connection, which cancels the generation
+                await events.aclose()
 
+        try:
+            async with self._admit_async("fal-ai/any-llm/enterprise", info, timer):
+                stopped_early = await _with_timeout(read(), timeout, "any-llm/enterprise stream")
+            return self._json_stream_result(timer, info, accumulator, scanner, stopped_early)
         except Exception as e:
-            return {
-                "output": "",
-                "error": str(e),
-                "raw": {"exception": str(e)}
-            }
+            return self._json_stream_error(timer, info, accumulator, e)
 
-    def any_llm_complete(
+    async def any_llm_complete(
         self,
         prompt: str,
         *,
         system_prompt: Optional[str] = None,
-        model: Optional[str] = None,
+        model: ModelSpec = None,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         priority: Optional[str] = "latency",
-        with_logs: bool = False
+        with_logs: bool = False,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        timeout: Optional[float] = None,
+        cache_namespace: Optional[str] = None,
+        cache_threshold: Optional[float] = None,
+        cache_bypass: bool = False
     ) -> dict:
         """
-        Blocks until result. Returns dict with:
-          { "output": str, "reasoning": str|None, "partial": bool|None, 
-            "error": str|None, "raw": <full_response> }
+        Async version of FalClient.any_llm_complete.
         
-        Args:
-            prompt: The user prompt to send
-            system_prompt: Optional system prompt
-            model: Model to use (default: "google/gemini-2.5-flash-lite")
-            temperature: Sampling temperature (default: 0.7)
-            max_tokens: Maximum tokens to generate
-            priority: "throughput" or "latency" (default: "latency")
-            with_logs: If True, prints log streams to stdout
-        
-        Returns:
-            Dictionary with output, reasoning, error, and raw response
+        `timeout` applies to each model attempt.
         """
-        # Build arguments
-        arguments = {
-            "prompt": prompt,
-            "priority": priority or "latency"
-        }
-        
-        if system_prompt:
-            arguments["system_prompt"] = system_prompt
-        if model:
-            arguments["model"] = model
-        else:
-            arguments["model"] = "google/gemini-2.5-flash-lite"
-        if temperature is not None:
-            arguments["temperature"] = temperature
-        else:
-            arguments["temperature"] = 0.7
-        if max_tokens is not None:
-            arguments["max_tokens"] = max_tokens
+        models, tier = fal_router.resolve_models(model, DEFAULT_LLM_MODEL)
+        if cache_namespace:
+            scope = _prompt_cache_scope(system_prompt, model, temperature, max_tokens)
+            cached = None if cache_bypass else await asyncio.to_thread(
+                self._prompt_cache_lookup, cache_namespace, scope, prompt, cache_threshold
+            )
+            if cached is not None:
+                return cached
 
-        try:
-            # Subscribe (blocking call with queue updates)
-            def on_queue_update(update):
-                if with_logs:
-                    print(f"[FAL Queue Update] {update}", file=sys.stderr)
+        async def attempt(chosen: str) -> dict:
+            arguments = _build_llm_arguments(
+                prompt,
+                system_prompt=system_prompt,
+                model=chosen,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                priority=priority
+            )
+            if hedge:
+                try:
+                    return await _with_timeout(
+                        self._hedged_complete(arguments, hedge_delay),
+                        timeout,
+                        "any-llm"
+                    )
+                except Exception as e:
+                    return _format_llm_error(e)
+            return await self._subscribe_complete(arguments, with_logs, timeout)
+
+        result = await self.router.aroute(models, attempt, tier=tier)
+        if cache_namespace:
+            return await asyncio.to_thread(self._prompt_cache_store, cache_namespace, scope, prompt, result)
+        return result
+
+    async def _subscribe_complete(
+        self,
+        arguments: dict,
+        with_logs: bool,
+        timeout: Optional[float]
+    ) -> dict:
+        """One fal-ai/any-llm call for a single model."""
+        info = fal_resilience.CallInfo("fal-ai/any-llm")
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm", arguments.get("model"))
+        on_queue_update = self._queue_listener(timer, with_logs, "FAL Queue Update")
 
-            result = fal_client.subscribe(
+        def subscribe():
+            timer.start_queue()
+            return fal_client.subscribe_async(
                 "fal-ai/any-llm",
                 arguments=arguments,
                 with_logs=with_logs,
-                on_queue_update=on_queue_update if with_logs else None
+                on_queue_update=on_queue_update
             )
 
-            # Parse result
-            output = result.get("output", "")
-            reasoning = result.get("reasoning")
-            partial = result.get("partial", False)
-            
-            return {
-                "output": output,
-                "reasoning": reasoning,
-                "partial": partial,
-                "error": None,
-                "raw": result
-            }
-
+        try:
+            async with self._admit_async("fal-ai/any-llm", info, timer):
+                started = time.monotonic()
+                result = await _with_timeout(
+                    self.resilience.acall("fal-ai/any-llm", subscribe, info),
+                    timeout,
+                    "any-llm"
+                )
+            return self._complete_result(timer, info, result, started)
         except Exception as e:
-            return {
-                "output": "",
-                "reasoning": None,
-                "partial": False,
-                "error": str(e),
-                "raw": {"exception": str(e)}
-            }
+            return self._complete_error(timer, info, e)
 
-    def any_llm_stream(
+    async def _hedged_complete(self, arguments: dict, hedge_delay: Optional[float]) -> dict:
+        """Async version of FalClient._hedged_complete (one task per leg)."""
+        hedge = _HedgedCall(self.hedge_policy, arguments, hedge_delay)
+
+        async def cancel(handle) -> None:
+            try:
+                await handle.cancel()
+            except Exception as e:
+                hedge.cancel_done(handle, e)
+            else:
+                hedge.cancel_done(handle)
+
+        async def leg(index: int) -> dict:
+            timer = hedge.timers[index]
+            hedge.leg_started(index)
+            async with self._admit_async("fal-ai/any-llm", hedge.infos[index], timer):
+                timer.start_queue()
+                hedge.handles[index] = await self.resilience.acall(
+                    "fal-ai/any-llm",
+                    lambda: fal_client.submit_async("fal-ai/any-llm", arguments=arguments),
+                    hedge.infos[index]
+                )
+                async for status in hedge.handles[index].iter_events(with_logs=False):
+                    timer.on_queue_update(status)
+                result = await hedge.handles[index].get()
+                timer.finish_queue()
+            return result
+
+        tasks = {asyncio.ensure_future(leg(0)): 0}
+        winner, result = None, None
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge.threshold)
+            if not done and hedge.should_hedge():
+                tasks[asyncio.ensure_future(leg(1))] = 1
+
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner, result = tasks[task], task.result()
+                        break
+                    error = task.exception()
+        finally:
+            # Runs on success and on timeout/cancellation of the whole call
+            for task, index in tasks.items():
+                if task.done():
+                    continue
+                task.cancel()
+                if hedge.handles[index] is not None:
+                    await cancel(hedge.handles[index])
+
+        return self._hedge_result(hedge, len(tasks), winner, result, error)
+
+    async def any_llm_stream(
         self,
         prompt: str,
         *,
@@ -199,46 +3916,44 @@ class FalClient:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         priority: Optional[str] = "latency",
-    ) -> None:
+    ):
         """
-        Prints stream events to stdout progressively.
+        Async version of FalClient.any_llm_stream (same delta/done records).
         
-        Args:
-            prompt: The user prompt to send
-            system_prompt: Optional system prompt
-            model: Model to use (default: "google/gemini-2.5-flash-lite")
-            temperature: Sampling temperature (default: 0.7)
-            max_tokens: Maximum tokens to generate
-            priority: "throughput" or "latency" (default: "latency")
+        Example:
+            >>> async for record in client.any_llm_stream("Hello"):
+            ...     print(record)
         """
-        # Build arguments
-        arguments = {
-            "prompt": prompt,
-            "priority": priority or "latency"
-        }
-        
-        if system_prompt:
-            arguments["system_prompt"] = system_prompt
-        if model:
-            arguments["model"] = model
-        else:
-            arguments["model"] = "google/gemini-2.5-flash-lite"
-        if temperature is not None:
-            arguments["temperature"] = temperature
-        else:
-            arguments["temperature"] = 0.7
-        if max_tokens is not None:
-            arguments["max_tokens"] = max_tokens
+        arguments = _build_llm_arguments(
+            prompt,
+            system_prompt=system_prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            priority=priority
+        )
 
+        accumulator = _StreamAccumulator()
+        info = fal_resilience.CallInfo("fal-ai/any-llm")
+        timer = fal_metrics.PhaseTimer("fal-ai/any-llm", arguments.get("model"))
         try:
-            # Stream results
-            for event in fal_client.stream("fal-ai/any-llm", arguments=arguments):
-                print(event, flush=True)
+            async with self._admit_async("fal-ai/any-llm", info, timer):
+                # Only opening the stream is retried; once events flow, a failure is final
+                events = await self.resilience.acall(
+                    "fal-ai/any-llm",
+                    lambda: _open_stream_async(fal_client.stream_async("fal-ai/any-llm", arguments=arguments)),
+                    info
+                )
+                async for event in events:
+                    record = self._stream_event(timer, accumulator, event)
+                    if record is not None:
+                        yield record
         except Exception as e:
-            print(f"Stream error: {e}", file=sys.stderr)
-            raise RuntimeError(f"Streaming failed: {e}")
+            raise self._stream_failure(timer, e)
+        
+        yield self._stream_done(timer, info, accumulator)
 
-    def any_llm_submit(
+    async def any_llm_submit(
         self,
         prompt: str,
         *,
@@ -247,483 +3962,605 @@ class FalClient:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         priority: Optional[str] = "latency",
-        webhook_url: Optional[str] = None
+        webhook_url: Optional[str] = None,
+        timeout: Optional[float] = None
     ) -> str:
-        """
-        Submits a job and returns request_id.
-        
-        Args:
-            prompt: The user prompt to send
-            system_prompt: Optional system prompt
-            model: Model to use (default: "google/gemini-2.5-flash-lite")
-            temperature: Sampling temperature (default: 0.7)
-            max_tokens: Maximum tokens to generate
-            priority: "throughput" or "latency" (default: "latency")
-            webhook_url: Optional webhook URL for completion notification
-        
-        Returns:
-            Request ID string
-        """
-        # Build arguments
-        arguments = {
-            "prompt": prompt,
-            "priority": priority or "latency"
-        }
-        
-        if system_prompt:
-            arguments["system_prompt"] = system_prompt
-        if model:
-            arguments["model"] = model
-        else:
-            arguments["model"] = "google/gemini-2.5-flash-lite"
-        if temperature is not None:
-            arguments["temperature"] = temperature
-        else:
-            arguments["temperature"] = 0.7
-        if max_tokens is not None:
-            arguments["max_tokens"] = max_tokens
+        """Async version of FalClient.any_llm_submit. Returns request_id."""
+        arguments = _build_llm_arguments(
+            prompt,
+            system_prompt=system_prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            priority=priority
+        )
 
         try:
-            handler = fal_client.submit(
-                "fal-ai/any-llm",
-                arguments=arguments,
-                webhook_url=webhook_url
-            )
+            async with self._admit_async("fal-ai/any-llm"):
+                handler = await _with_timeout(
+                    self.resilience.acall(
+                        "fal-ai/any-llm",
+                        lambda: fal_client.submit_async(
+                            "fal-ai/any-llm",
+                            arguments=arguments,
+                            webhook_url=webhook_url
+                        )
+                    ),
+                    timeout,
+                    "any-llm submit"
+                )
             return handler.request_id
         except Exception as e:
             raise RuntimeError(f"Submit failed: {e}")
 
-    def any_llm_status(self, request_id: str, with_logs: bool = True) -> dict:
-        """
-        Returns queue status dict (including logs if requested).
-        
-        Args:
-            request_id: The request ID from submit()
-            with_logs: Include logs in response
-        
-        Returns:
-            Status dictionary with queue information
-        """
+    async def any_llm_status(
+        self,
+        request_id: str,
+        with_logs: bool = True,
+        *,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """Async version of FalClient.any_llm_status."""
         try:
-            status = fal_client.status("fal-ai/any-llm", request_id, with_logs=with_logs)
-            return status
+            status = await _with_timeout(
+                self.resilience.acall(
+                    "fal-ai/any-llm",
+                    lambda: fal_client.status_async("fal-ai/any-llm", request_id, with_logs=with_logs)
+                ),
+                timeout,
+                "any-llm status"
+            )
+            return _format_llm_status(request_id, status, with_logs)
         except Exception as e:
             raise RuntimeError(f"Status check failed: {e}")
 
-    def any_llm_result(self, request_id: str) -> dict:
-        """
-        Returns final result dict: { "output": str, ... } or raises if not completed.
-        
-        Args:
-            request_id: The request ID from submit()
-        
-        Returns:
-            Dictionary with output, reasoning, error, and raw response
-        """
+    async def any_llm_result(self, request_id: str, *, timeout: Optional[float] = None) -> dict:
+        """Async version of FalClient.any_llm_result."""
         try:
-            result = fal_client.result("fal-ai/any-llm", request_id)
-            
-            output = result.get("output", "")
-            reasoning = result.get("reasoning")
-            partial = result.get("partial", False)
-            
-            return {
-                "output": output,
-                "reasoning": reasoning,
-                "partial": partial,
-                "error": None,
-                "raw": result
-            }
+            info = fal_resilience.CallInfo("fal-ai/any-llm")
+            timer = fal_metrics.PhaseTimer("fal-ai/any-llm")
+            with timer.phase("fetch"):
+                result = await _with_timeout(
+                    self.resilience.acall(
+                        "fal-ai/any-llm",
+                        lambda: fal_client.result_async("fal-ai/any-llm", request_id),
+                        info
+                    ),
+                    timeout,
+                    "any-llm result"
+                )
+            return self._llm_result(timer, info, result)
         except Exception as e:
             raise RuntimeError(f"Result retrieval failed: {e}")
 
-    def upload_file(self, path: str) -> str:
-        """
-        Uses fal_client.upload_file and returns public URL string.
-        
-        Args:
-            path: Local file path to upload
-        
-        Returns:
-            Public URL string
-        """
+    async def upload_file(
+        self,
+        path: str,
+        *,
+        preprocess: Union[None, bool, ImagePreprocessor] = None,
+        timeout: Optional[float] = None
+    ) -> str:
+        """Async version of FalClient.upload_file (with the same upload cache)."""
+        result = await self.upload_image(path, preprocess=preprocess, timeout=timeout)
+        return result["url"]
+
+    async def upload_image(
+        self,
+        path: str,
+        *,
+        preprocess: Union[None, bool, ImagePreprocessor] = True,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """Async version of FalClient.upload_image (preprocessing runs in a thread)."""
+        preprocessor = self._resolve_preprocessor(preprocess)
+        return await self._flights.ado(
+            _flight_key("upload", path, preprocessor.signature if preprocessor else None),
+            lambda: self._upload_file(path, preprocessor, timeout=timeout)
+        )
+
+    async def _upload_file(
+        self,
+        path: str,
+        preprocessor: Optional[ImagePreprocessor],
+        *,
+        timeout: Optional[float]
+    ) -> dict:
+        """upload_image without coalescing."""
         try:
-            url = fal_client.upload_file(path)
-            return url
+            key, cached_url = await asyncio.to_thread(
+                self._upload_cache_lookup, path, preprocessor.signature if preprocessor else None
+            )
+            if cached_url:
+                return self._upload_result(cached_url, True, None)
+            
+            timer = fal_metrics.PhaseTimer("upload")
+            report, upload_path = await asyncio.to_thread(self._upload_prepare, timer, path, preprocessor)
+            try:
+                async with self._admit_async("upload", timer=timer):
+                    with timer.phase("upload"):
+                        url = await _with_timeout(
+                            self.resilience.acall("upload", lambda: fal_client.upload_file_async(upload_path)),
+                            timeout,
+                            "upload"
+                        )
+                return await asyncio.to_thread(self._upload_done, timer, key, path, upload_path, url, report)
+            finally:
+                self._upload_cleanup(path, upload_path)
         except Exception as e:
             raise RuntimeError(f"File upload failed: {e}")
 
-    def background_replace(
+    async def download_images(self, urls: List[str], *, timeout: Optional[float] = None) -> List[dict]:
+        """Async version of FalClient.download_images (the pooled downloads run in threads)."""
+        return await _with_timeout(
+            asyncio.to_thread(self._download_images, urls),
+            timeout,
+            "download"
+        )
+
+    async def background_replace(
         self,
-        image_url: str,
-        *,
-        prompt: str = "soft key light, seamless studio backdrop, premium e-commerce look, product centered, subtle shadow",
-        remove_bg: bool = True,
-        timeout: int = 110
-    ) -> dict:
-        """
-        Replaces image background using FAL AI image generation.
-        Uses fal-ai/nano-banana for fast, high-quality image generation.
-        
-        Args:
-            image_url: URL of the image to process
-            prompt: Background replacement prompt
-            remove_bg: Whether to remove background first (currently uses prompt-based approach)
-            timeout: Request timeout in seconds
-        
-        Returns:
-            JSON response dictionary with keys like:
-                - image: {"url": "...", "width": ..., "height": ...}
-                - images: [{"url": "...", ...}]
-        
-        Example response:
-            {
-                "images": [{
-                    "url": "https://fal.media/files/...",
-                    "content_type": "image/jpeg",
-                    "file_name": "...",
-                    "file_size": 123456,
-                    "width": 1024,
-                    "height": 1024
-                }]
-            }
+        image_url: str,
+        *,
+        prompt: str = DEFAULT_BACKGROUND_PROMPT,
+        remove_bg: bool = True,
+        timeout: Optional[float] = 110,
+        preprocess: Union[None, bool, ImagePreprocessor] = None,
+        download: Optional[bool] = None,
+        reuse: bool = False
+    ) -> dict:
         """
-        # Use FAL's nano-banana/edit model for image-to-image (product preservation)
-        # EXACTLY like backgroundGeneration.py - no prompt modification
+        Async version of FalClient.background_replace.
+        Runs on subscribe_async, which does not hold a thread while waiting.
+        """
+        source_url, reuse_key = image_url, None
+        if reuse:
+            reuse_key, reused = await asyncio.to_thread(self._background_reused, source_url, prompt, download)
+            if reused is not None:
+                return reused
+        
+        upload = None
+        if os.path.isfile(image_url):
+            upload = await self.upload_image(image_url, preprocess=preprocess, timeout=timeout)
+            image_url = upload["url"]
+        
+        info = fal_resilience.CallInfo("fal-ai/nano-banana/edit")
+        timer = fal_metrics.PhaseTimer("fal-ai/nano-banana/edit")
         try:
-            # Use the prompt directly as provided (already formatted by GPT or user)
-            # The /edit endpoint preserves the product automatically
-            arguments = {
-                "prompt": prompt,  # Use prompt directly, no wrapping
-                "image_urls": [image_url]
-            }
+            arguments = _build_background_arguments(image_url, prompt)
             
-            # Queue update callback for logs
             def on_queue_update(update):
+                timer.on_queue_update(update)
                 if isinstance(update, fal_client.InProgress):
                     for log in update.logs:
                         print(f"[nano-banana/edit] {log.get('message', '')}", file=sys.stderr)
             
-            # Use fal_client.subscribe - same as backgroundGeneration.py
-            result = fal_client.subscribe(
-                "fal-ai/nano-banana/edit",
-                arguments=arguments,
-                with_logs=True,
-                on_queue_update=on_queue_update
-            )
+            def subscribe():
+                timer.start_queue()
+                return fal_client.subscribe_async(
+                    "fal-ai/nano-banana/edit",
+                    arguments=arguments,
+                    with_logs=True,
+                    on_queue_update=on_queue_update
+                )
             
-            # Format response to match expected structure
-            if "images" in result and len(result["images"]) > 0:
-                first_image = result["images"][0]
-                return {
-                    "image": first_image,
-                    "images": result["images"],
-                    "timings": result.get("timings", {}),
-                    "has_nsfw_concepts": result.get("has_nsfw_concepts", [False])
-                }
-            else:
-                raise RuntimeError("No images generated in response")
-                
+            async with self._admit_async("fal-ai/nano-banana/edit", info, timer):
+                result = await _with_timeout(
+                    self.resilience.acall("fal-ai/nano-banana/edit", subscribe, info),
+                    timeout,
+                    "nano-banana/edit"
+                )
+            timer.finish_queue()
+            return await asyncio.to_thread(
+                self._background_done, self._background_result(timer, result), info,
+                reuse=reuse, reuse_key=reuse_key, source_url=source_url, upload=upload, download=download
+            )
         except Exception as e:
-            raise RuntimeError(f"Background replacement failed: {e}")
+            self._record(timer, ok=False)
+            raise self._background_failure(info, e)
 
-    def analyze_product_image(
+    async def background_submit(
         self,
         image_url: str,
         *,
-        model: str = "google/gemini-2.5-flash",
-        temperature: float = 0.3
-    ) -> dict:
-        """
-        Analyzes product image and returns 9-category classification.
-        Uses multimodal vision (Enterprise endpoint) with Gemini 2.5 Flash.
-        
-        Args:
-            image_url: URL of the product image to analyze
-            model: Vision model to use (default: "google/gemini-2.5-flash")
-            temperature: Sampling temperature (default: 0.3)
-        
-        Returns:
-            Dictionary with 9 product categories:
-                - main_product_type: Main category (Footwear, Electronics, etc.)
-                - subcategory: Detailed classification
-                - target_audience: Target demographic
-                - price_range: Budget/Mid-range/Premium/Luxury
-                - use_case: Usage scenario
-                - style_design: Design aesthetic
-                - season_occasion: Seasonal/occasional context
-                - industrial_type: Industry classification
-                - vibe: Overall vibe/feeling
-        
-        Example:
-            >>> result = client.analyze_product_image("https://example.com/shoe.jpg")
-            >>> print(result["main_product_type"])  # "Footwear"
-        """
-        # Detailed prompt for 9-category product analysis
-        prompt = f"""Image URL: {image_url}
-
-You are an expert product analyst for e-commerce. Analyze the product image provided.
+        prompt: str = DEFAULT_BACKGROUND_PROMPT,
+        remove_bg: bool = True,
+        webhook_url: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> str:
+        """Async version of FalClient.background_submit."""
+        arguments = _build_background_arguments(image_url, prompt)
+        try:
+            async with self._admit_async("fal-ai/nano-banana/edit"):
+                handler = await _with_timeout(
+                    self.resilience.acall(
+                        "fal-ai/nano-banana/edit",
+                        lambda: fal_client.submit_async(
+                            "fal-ai/nano-banana/edit",
+                            arguments=arguments,
+                            webhook_url=webhook_url
+                        )
+                    ),
+                    timeout,
+                    "nano-banana/edit submit"
+                )
+            return handler.request_id
+        except Exception as e:
+            raise RuntimeError(f"Failed to submit background job: {e}")
 
-STEP 1: First, carefully describe what you see in the image. What is the main product?
+    async def background_status(self, request_id: str, *, timeout: Optional[float] = None) -> dict:
+        """Async version of FalClient.background_status."""
+        try:
+            status = await _with_timeout(
+                self.resilience.acall(
+                    "fal-ai/nano-banana/edit",
+                    lambda: fal_client.status_async("fal-ai/nano-banana/edit", request_id, with_logs=False)
+                ),
+                timeout,
+                "nano-banana/edit status"
+            )
+            return _format_queue_status(request_id, status)
+        except Exception as e:
+            raise RuntimeError(f"Failed to get background job status: {e}")
 
-STEP 2: Then categorize the product into exactly 9 categories with specific classifications.
+    async def background_result(self, request_id: str, *, timeout: Optional[float] = None) -> dict:
+        """Async version of FalClient.background_result."""
+        try:
+            timer = fal_metrics.PhaseTimer("fal-ai/nano-banana/edit")
+            with timer.phase("fetch"):
+                result = await _with_timeout(
+                    self.resilience.acall(
+                        "fal-ai/nano-banana/edit",
+                        lambda: fal_client.result_async("fal-ai/nano-banana/edit", request_id)
+                    ),
+                    timeout,
+                    "nano-banana/edit result"
+                )
+            return self._background_result(timer, result, request_id)
+        except Exception as e:
+            raise RuntimeError(f"Failed to get background job result: {e}")
 
-Categories to determine:
-1. Main Product Type - Be very specific (Examples: Footwear, Electronics, Clothing, Food, Furniture, Accessories, Sports Equipment, Home Decor, Beauty Products, etc.)
-2. Subcategory - Detailed classification (Examples for Footwear: Sneakers, High-top Sneakers, Low-top Sneakers, Boots, Running Shoes, Sandals, Formal Shoes; for Electronics: Smartphone, Laptop, Camera, Headphones; for Clothing: T-shirt, Jeans, Dress, Jacket)
-3. Target Audience (Examples: Men, Women, Kids, Unisex, Teenagers, Adults, Professional, Athletes)
-4. Price Range (Budget, Mid-range, Premium, Luxury)
-5. Use Case (Daily Use, Professional, Sports/Athletic, Casual Lifestyle, Formal, Outdoor, Indoor, etc.)
-6. Style/Design (Modern, Classic, Vintage/Retro, Minimalist, Bold/Statement, Streetwear, Athletic, Elegant, etc.)
-7. Season/Occasion (All Season, Spring/Summer, Fall/Winter, Casual Daily, Formal Events, Sports/Active, etc.)
-8. Industrial Type (Footwear Manufacturing, Fashion/Apparel, Food & Beverage, Electronics Manufacturing, Furniture, Textile, etc.)
-9. Vibe (Fun, Relaxing, Energetic, Professional, Casual, Urban/Street, Sporty, Sophisticated, Youthful, etc.)
+    async def wait_for_result(self, request_id: str, *, timeout: Optional[float] = None) -> dict:
+        """Async version of FalClient.wait_for_result (waits in a worker thread)."""
+        record = await asyncio.to_thread(self._get_webhook_store().wait, request_id, timeout)
+        return _format_webhook_record(record)
 
-CRITICAL INSTRUCTIONS:
-- Look VERY CAREFULLY at the actual product in the image
-- Only consider most exposed product in the image
-- Do NOT make assumptions - only categorize what you actually see
-- Be as specific and accurate as possible
-- If you see shoes, they are NOT clothing or swimwear - they are Footwear
-- If you see electronics, specify the exact type
-- Match all 9 categories to the actual product you see
+    async def analyze_product_image(
+        self,
+        image_url: str,
+        *,
+        model: ModelSpec = "google/gemini-2.5-flash",
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        stream: bool = True,
+        preamble: bool = True,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """Async version of FalClient.analyze_product_image (with the same cache)."""
+        return await self._flights.ado(
+            _flight_key("analyze", image_url, fal_router.model_key(model), float(temperature), use_cache, stream, preamble),
+            lambda: self._analyze_product_image(
+                image_url,
+                model=model,
+                temperature=temperature,
+                use_cache=use_cache,
+                stream=stream,
+                preamble=preamble,
+                timeout=timeout
+            )
+        )
 
-Respond with a JSON object in this EXACT format (no additional text):
-{{
-    "main_product_type": "category_value",
-    "subcategory": "specific_subcategory",
-    "target_audience": "audience_value",
-    "price_range": "price_value",
-    "use_case": "use_case_value",
-    "style_design": "style_value",
-    "season_occasion": "season_value",
-    "industrial_type": "industry_value",
-    "vibe": "vibe_value"
-}}"""
+    async def _analyze_product_image(
+        self,
+        image_url: str,
+        *,
+        model: ModelSpec,
+        temperature: float,
+        use_cache: bool,
+        stream: bool,
+        preamble: bool,
+        timeout: Optional[float]
+    ) -> dict:
+        """analyze_product_image without coalescing."""
+        timer = fal_metrics.PhaseTimer("analyze-product", fal_router.model_key(model))
+        cache_key, cached = await asyncio.to_thread(
+            self._analysis_lookup, timer, image_url, model, temperature, None if preamble else "json", use_cache
+        )
+        if cached is not None:
+            return self._observe(timer, cached)
+        
+        prompt = _build_analysis_prompt(image_url, preamble=preamble)
+        result = None
 
         try:
-            # Use enterprise endpoint for vision support
-            result = self.any_llm_enterprise(
-                prompt=prompt,
-                model=model,
+            if stream:
+                result = await self._analysis_completion(
+                    prompt, model=model, temperature=temperature, timeout=timeout
+                )
+            else:
+                result = await self.any_llm_enterprise(
+                    prompt=prompt,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=2000,
+                    timeout=timeout
+                )
+            analysis = self._analysis_parsed(timer, result)
+            await asyncio.to_thread(self._analysis_cache_store, cache_key, analysis, image_url)
+            return self._analysis_response(
+                timer, analysis, result, stream=_analysis_stream_info(result) if stream else None
+            )
+        except Exception as e:
+            return self._analysis_failure(timer, e, result)
+
+    async def _analysis_completion(
+        self,
+        prompt: str,
+        *,
+        model: ModelSpec,
+        temperature: float,
+        timeout: Optional[float]
+    ) -> dict:
+        """Async version of FalClient._analysis_completion (`timeout` applies to each model attempt)."""
+        models, tier = fal_router.resolve_models(model, "google/gemini-2.5-flash")
+
+        async def attempt(chosen: str) -> dict:
+            arguments = _build_enterprise_arguments(
+                prompt,
+                model=chosen,
                 temperature=temperature,
                 max_tokens=2000
             )
-            
-            if result.get("error"):
-                raise RuntimeError(result["error"])
-            
-            output_text = result.get("output", "")
-            
-            # Parse JSON from output
-            # Try direct JSON parse first
-            if isinstance(output_text, dict):
-                categories = output_text
-            else:
-                # Extract JSON from string
-                json_match = re.search(r'\{[\s\S]*\}', output_text)
-                if json_match:
-                    categories = json.loads(json_match.group())
-                else:
-                    raise RuntimeError("No JSON found in response")
-            
-            # Validate that we have all 9 categories
-            required_keys = [
-                "main_product_type", "subcategory", "target_audience",
-                "price_range", "use_case", "style_design",
-                "season_occasion", "industrial_type", "vibe"
-            ]
-            
-            for key in required_keys:
-                if key not in categories:
-                    categories[key] = "Unknown"
-            
-            return {
-                "categories": categories,
-                "error": None,
-                "raw_output": output_text
-            }
-            
-        except Exception as e:
-            return {
-                "categories": {},
-                "error": str(e),
-                "raw_output": ""
-            }
+            result = await self._stream_enterprise_json(arguments, ANALYSIS_REQUIRED_KEYS, timeout)
+            if _stream_never_started(result):
+                return {**await self._subscribe_enterprise(arguments, False, timeout), "streamed": False}
+            return {**result, "streamed": True}
 
-    def generate_background_prompt(
+        return await self.router.aroute(models, attempt, tier=tier)
+
+    async def analyze_products_batch(
         self,
-        categories: dict,
-        style_type: str,
+        image_urls: List[str],
         *,
-        model: str = "openai/gpt-5-mini"
+        batch_size: int = ANALYSIS_BATCH_SIZE,
+        model: ModelSpec = "google/gemini-2.5-flash",
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        max_workers: int = 4,
+        timeout: Optional[float] = None
     ) -> dict:
         """
-        Generates a professional background replacement prompt using GPT-5-mini.
-        Based on product categories and desired style type.
+        Async version of FalClient.analyze_products_batch (`max_workers`
+        batches in flight; `timeout` applies to each request).
+        """
+        state = _BatchAnalysis(image_urls, batch_size, model)
+        limit = asyncio.Semaphore(max(1, max_workers))
         
-        Args:
-            categories: Product categories dict (from analyze_product_image)
-            style_type: Style description for the background
-            model: Model to use (default: "openai/gpt-5-mini")
+        if use_cache and state.unique:
+            async def limited_lookup(url: str) -> tuple:
+                async with limit:
+                    return await asyncio.to_thread(self._batch_lookup, url, model, temperature)
+            
+            with state.timer.phase("cache_lookup"):
+                state.add_cached(await asyncio.gather(*(limited_lookup(url) for url in state.unique)))
         
-        Returns:
-            Dictionary with generated prompt and error info
+        async def limited_batch(batch: List[str]) -> tuple:
+            async with limit:
+                return await self._analyze_batch(
+                    batch, state.cache_keys, model=model, temperature=temperature, use_cache=use_cache, timeout=timeout
+                )
         
-        Example:
-            >>> categories = {"main_product_type": "Footwear", "subcategory": "Sneakers"}
-            >>> style = "Clean white studio background for e-commerce"
-            >>> result = client.generate_background_prompt(categories, style)
-            >>> print(result["prompt"])
-        """
-        # Build categories text
-        categories_text = "\n".join([f"- {key}: {value}" for key, value in categories.items()])
+        for batch_results, batch_stats in await asyncio.gather(*(limited_batch(batch) for batch in state.batches())):
+            state.add(batch_results, batch_stats)
+        return self._observe(state.timer, state.summary())
+
+    async def _analyze_batch(
+        self,
+        batch: List[str],
+        cache_keys: Dict[str, Optional[str]],
+        *,
+        model: ModelSpec,
+        temperature: float,
+        use_cache: bool,
+        timeout: Optional[float]
+    ) -> tuple:
+        """Async version of FalClient._analyze_batch (re-split parts run concurrently)."""
+        stats = {"calls": 0, "resplits": 0, "single": 0}
+        if len(batch) == 1:
+            stats["single"] += 1
+            analysis = await self._analyze_product_image(
+                batch[0], model=model, temperature=temperature, use_cache=use_cache,
+                stream=True, preamble=True, timeout=timeout
+            )
+            return {batch[0]: _batch_analysis_result(batch[0], analysis, 1)}, stats
         
-        gpt_prompt = f"""Based on these product categories:
-{categories_text}
+        stats["calls"] += 1
+        result = await self.any_llm_enterprise(
+            prompt=_build_batch_analysis_prompt(batch),
+            model=model,
+            temperature=temperature,
+            max_tokens=200 + 300 * len(batch),
+            timeout=timeout
+        )
+        results = await asyncio.to_thread(self._batch_entries, batch, cache_keys, result)
+        
+        parts = _batch_resplit(batch, results)
+        if parts:
+            stats["resplits"] += 1
+        for part_results, part_stats in await asyncio.gather(*(
+            self._analyze_batch(
+                part, cache_keys, model=model, temperature=temperature, use_cache=use_cache, timeout=timeout
+            )
+            for part in parts
+        )):
+            results.update(part_results)
+            _add_stats(stats, part_stats)
+        return results, stats
 
-Generate a detailed, professional image generation prompt for an image-to-image background replacement task.
+    async def analyze_and_prompt(
+        self,
+        image_url: str,
+        styles: Optional[list] = None,
+        *,
+        model: ModelSpec = "google/gemini-2.5-flash",
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """Async version of FalClient.analyze_and_prompt (with the same cache)."""
+        if styles is None:
+            styles = DEFAULT_BACKGROUND_STYLES
+        return await self._flights.ado(
+            _flight_key("analyze_prompt", image_url, styles, fal_router.model_key(model), float(temperature), use_cache),
+            lambda: self._analyze_and_prompt(
+                image_url,
+                styles,
+                model=model,
+                temperature=temperature,
+                use_cache=use_cache,
+                timeout=timeout
+            )
+        )
 
-The style type is: {style_type}
+    async def _analyze_and_prompt(
+        self,
+        image_url: str,
+        styles: list,
+        *,
+        model: ModelSpec,
+        temperature: float,
+        use_cache: bool,
+        timeout: Optional[float]
+    ) -> dict:
+        """analyze_and_prompt without coalescing."""
+        timer = fal_metrics.PhaseTimer("analyze-and-prompt", fal_router.model_key(model))
+        cache_key, cached = await asyncio.to_thread(
+            self._analysis_lookup, timer, image_url, model, temperature, f"fused-{_styles_signature(styles)}", use_cache
+        )
+        if cached is not None:
+            return self._observe(timer, cached)
+        
+        result = None
+        try:
+            result = await self.any_llm_enterprise(
+                prompt=_build_analyze_and_prompt_request(image_url, styles),
+                model=model,
+                temperature=temperature,
+                max_tokens=2000 + 300 * len(styles),
+                timeout=timeout
+            )
+            fused = self._analyze_and_prompt_parsed(timer, result, styles)
+            if not fused["fallbacks"]:
+                await asyncio.to_thread(self._analysis_cache_store, cache_key, fused, image_url)
+            return self._analysis_response(timer, fused, result)
+        except Exception as e:
+            return self._observe(timer, _failed_analyze_and_prompt(styles, e, result))
 
-Requirements:
-- The prompt must START with "Change only the background to..."
-- The prompt must be specific about keeping the original product unchanged
-- The prompt must be suitable for e-commerce photography
-- The prompt should be creative and detailed
-- The prompt should match the product's categories and the requested style type
-- Length: 2-3 sentences maximum
+    async def generate_background_prompt(
+        self,
+        categories: dict,
+        style_type: str,
+        *,
+        model: str = "openai/gpt-5-mini",
+        timeout: Optional[float] = None
+    ) -> dict:
+        """Async version of FalClient.generate_background_prompt."""
+        return await self._flights.ado(
+            _flight_key("bg_prompt", categories, style_type, fal_router.model_key(model)),
+            lambda: self._generate_background_prompt(
+                categories,
+                style_type,
+                model=model,
+                timeout=timeout
+            )
+        )
 
-Return ONLY the prompt text, nothing else."""
+    async def _generate_background_prompt(
+        self,
+        categories: dict,
+        style_type: str,
+        *,
+        model: ModelSpec,
+        timeout: Optional[float]
+    ) -> dict:
+        """generate_background_prompt without coalescing."""
+        gpt_prompt = _build_background_prompt_request(categories, style_type)
+        timer = fal_metrics.PhaseTimer("generate-bg-prompt", fal_router.model_key(model))
 
         try:
-            result = self.any_llm_enterprise(
+            result = await self.any_llm_enterprise(
                 prompt=gpt_prompt,
                 model=model,
-                temperature=0.7
+                temperature=0.7,
+                timeout=timeout
             )
-            
-            if result.get("error"):
-                raise RuntimeError(result["error"])
-            
-            generated_prompt = result.get("output", "").strip()
-            
-            # Fallback if prompt is empty
-            if not generated_prompt:
-                subcategory = categories.get("subcategory", "product")
-                generated_prompt = f"Change only the background to a {style_type} style. Keep the {subcategory} exactly as it is in the original image."
-            
-            return {
-                "prompt": generated_prompt,
-                "error": None
-            }
-            
+            return self._background_prompt_result(timer, categories, style_type, result)
         except Exception as e:
-            # Fallback prompt
-            subcategory = categories.get("subcategory", "product")
-            fallback_prompt = f"Change only the background to a {style_type} style. Keep the {subcategory} exactly as it is in the original image."
+            return self._background_prompt_failure(timer, categories, style_type, e)
+
+    async def _generate_style_background(
+        self,
+        image_url: str,
+        categories: dict,
+        style: dict,
+        timeout: Optional[float],
+        bg_prompt: Optional[str] = None
+    ) -> tuple:
+        """Async version of FalClient._generate_style_background."""
+        try:
+            if bg_prompt is None:
+                prompt_result = await self.generate_background_prompt(
+                    categories,
+                    style["description"],
+                    timeout=timeout
+                )
+                failure = _style_prompt_failure(style, prompt_result)
+                if failure is not None:
+                    return failure
+                bg_prompt = prompt_result["prompt"]
             
-            return {
-                "prompt": fallback_prompt,
+            bg_result = await self.background_replace(
+                image_url,
+                prompt=bg_prompt,
+                timeout=timeout,
+                download=False
+            )
+            return _style_outcome(style, bg_prompt, bg_result)
+        except Exception as e:
+            return ("error", {
+                "style": style["name"],
                 "error": str(e)
-            }
+            })
 
-    def generate_multiple_backgrounds(
+    async def generate_multiple_backgrounds(
         self,
         image_url: str,
         categories: dict,
         *,
-        styles: Optional[list] = None
+        styles: Optional[list] = None,
+        max_workers: Optional[int] = None,
+        timeout: Optional[float] = 110,
+        download: Optional[bool] = None,
+        prompts: Optional[dict] = None
     ) -> dict:
         """
-        Generates multiple background variations for a product image.
-        Uses GPT to generate prompts, then creates images with different styles.
-        
-        Args:
-            image_url: URL of the original product image
-            categories: Product categories (from analyze_product_image)
-            styles: List of style dicts with 'name' and 'description' keys.
-                   If None, uses default 3 styles (Studio, Lifestyle, Premium)
-        
-        Returns:
-            Dictionary with list of generated images and metadata
-        
-        Example:
-            >>> categories = client.analyze_product_image(url)["categories"]
-            >>> result = client.generate_multiple_backgrounds(url, categories)
-            >>> for img in result["images"]:
-            ...     print(img["style_name"], img["image_url"])
+        Async version of FalClient.generate_multiple_backgrounds.
+        Styles run concurrently via asyncio.gather, bounded by `max_workers`;
+        `timeout` applies to each model call.
         """
-        # Default styles if none provided
         if styles is None:
-            styles = [
-                {
-                    "name": "Studio_Clean",
-                    "description": "Clean white studio background for e-commerce, professional lighting, minimal shadows"
-                },
-                {
-                    "name": "Lifestyle_Contextual",
-                    "description": "Lifestyle and contextual setting matching the product's use case and target audience"
-                },
-                {
-                    "name": "Premium_Artistic",
-                    "description": "Premium artistic backdrop with dramatic lighting and sophisticated atmosphere"
-                }
-            ]
+            styles = DEFAULT_BACKGROUND_STYLES
         
-        generated_images = []
-        errors = []
+        semaphore = asyncio.Semaphore(max(1, max_workers or len(styles) or 1))
         
-        for style in styles:
-            try:
-                # Generate prompt using GPT
-                prompt_result = self.generate_background_prompt(
-                    categories,
-                    style["description"]
-                )
-                
-                if prompt_result.get("error"):
-                    errors.append({
-                        "style": style["name"],
-                        "error": f"Prompt generation failed: {prompt_result['error']}"
-                    })
-                    continue
-                
-                bg_prompt = prompt_result["prompt"]
-                
-                # Generate image with background replacement
-                bg_result = self.background_replace(
-                    image_url,
-                    prompt=bg_prompt
+        async def run(style: dict) -> tuple:
+            async with semaphore:
+                return await self._generate_style_background(
+                    image_url, categories, style, timeout, (prompts or {}).get(style["name"])
                 )
-                
-                if "image" in bg_result:
-                    generated_images.append({
-                        "style_name": style["name"],
-                        "style_description": style["description"],
-                        "image_url": bg_result["image"]["url"],
-                        "prompt": bg_prompt,
-                        "width": bg_result["image"].get("width"),
-                        "height": bg_result["image"].get("height")
-                    })
-                else:
-                    errors.append({
-                        "style": style["name"],
-                        "error": "No image in response"
-                    })
-                    
-            except Exception as e:
-                errors.append({
-                    "style": style["name"],
-                    "error": str(e)
-                })
         
-        return {
-            "images": generated_images,
-            "total_generated": len(generated_images),
-            "total_requested": len(styles),
-            "errors": errors if errors else None
-        }
+        # gather preserves argument order, so images/errors keep style order
+        outcomes = await asyncio.gather(*(run(style) for style in styles))
+        return await asyncio.to_thread(self._backgrounds_result, outcomes, styles, download)
 
 
 # Smoke test
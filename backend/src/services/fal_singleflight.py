@@ -0,0 +1,124 @@
+"""
+Single-flight coalescing of identical in-flight calls.
+
+When a call arrives while an identical one (same key) is still running,
+it attaches to the running call and receives the same result (or the
+same exception) instead of starting a second model run or upload.
+Nothing is kept once the call finishes; this is not a cache.
+
+    - do(): threads (FalClient, the serve daemon's worker pool)
+    - ado(): asyncio (AsyncFalClient); the work runs in its own task, so
+      one caller timing out or being cancelled does not cancel it for
+      the others, and it is only cancelled once every caller is gone
+
+Example:
+    >>> flights = SingleFlight()
+    >>> flights.do(("upload", "/tmp/a.jpg"), lambda: fal_client.upload_file("/tmp/a.jpg"))
+    >>> flights.stats()
+    {'in_flight': 0, 'leaders': 1, 'joined': 0}
+"""
+
+import copy
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call:
+    """One in-flight sync call."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.joined = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls by key (thread-safe)."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, list] = {}
+        self._counters = {"leaders": 0, "joined": 0}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run `fn` unless an identical call is in flight; then share its outcome."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.joined += 1
+            self._counters["leaders" if leader else "joined"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Callers must not share one mutable result
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn()
+            with self._lock:
+                del self._calls[key]
+                shared = call.joined > 0
+            # Joiners copy a snapshot taken now; the leader's caller is free
+            # to modify the original while they do
+            call.result = copy.deepcopy(result) if shared else result
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.error = e
+            raise
+        finally:
+            call.done.set()
+        return result
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of do(); `factory` is only called by the first caller."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            entry = self._tasks.get(flight_key)
+            leader = entry is None
+            if leader:
+                # [task, number of callers waiting on it, number that joined]
+                entry = self._tasks[flight_key] = [loop.create_task(factory()), 0, 0]
+                entry[0].add_done_callback(lambda _: self._forget(flight_key, entry))
+            else:
+                entry[2] += 1
+            entry[1] += 1
+            self._counters["leaders" if leader else "joined"] += 1
+
+        task = entry[0]
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            with self._lock:
+                entry[1] -= 1
+                abandoned = entry[1] == 0
+            if abandoned:
+                task.cancel()
+            raise
+        with self._lock:
+            entry[1] -= 1
+            # _forget ran before any caller resumed, so no one joins anymore
+            shared = entry[2] > 0
+        # Every caller gets its own copy once the result is shared, the
+        # leader included: the task's result is never handed out to be modified
+        return copy.deepcopy(result) if shared else result
+
+    def _forget(self, flight_key: Hashable, entry: list) -> None:
+        with self._lock:
+            if self._tasks.get(flight_key) is entry:
+                del self._tasks[flight_key]
+
+    def stats(self) -> Dict[str, int]:
+        """Calls in flight, calls that ran, and calls that joined one in flight."""
+        with self._lock:
+            return {"in_flight": len(self._calls) + len(self._tasks), **self._counters}
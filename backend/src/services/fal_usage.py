@@ -0,0 +1,441 @@
+"""
+Persistent per-call usage ledger.
+
+Every FAL call a client makes (LLM completions, image edits, uploads) is
+appended to a local SQLite table with the command it ran for, endpoint,
+model, prompt/completion tokens, wall time and outcome. Rows are never
+updated, so the ledger doubles as an audit trail; report() aggregates it
+by any of GROUP_KEYS to find the paths that burn tokens or time:
+
+    python src/services/fal_worker.py usage-report --by command,model --since 24h
+
+Calls are attributed to the command set with usage_context() (fal_worker.py
+sets the subcommand name; library callers may set their own). The value
+is a context variable, so it follows asyncio tasks and asyncio.to_thread;
+thread pools have to run their work in a copied context.
+
+The database lives next to the caches (see fal_cache) and is shared by
+all worker processes (SQLite WAL + locking), like the caches.
+
+Configuration (environment):
+    - FAL_USAGE_LEDGER: set to "0" to stop recording
+    - FAL_USAGE_LEDGER_PATH: database file
+      (default: <FAL_CACHE_DIR>/fal_usage.sqlite3)
+    - FAL_USAGE_PRICES: token prices for cost estimates, as a JSON object
+      or the path of a JSON file: {"<model>": {"prompt": USD per 1M
+      tokens, "completion": USD per 1M tokens}, ...}
+
+Example:
+    >>> ledger = UsageLedger(default_ledger_path())
+    >>> with usage_context("analyze-product"):
+    ...     ledger.record("fal-ai/any-llm/enterprise", "google/gemini-2.5-flash",
+    ...                   wall_seconds=1.84, ok=True,
+    ...                   usage={"prompt_tokens": 850, "completion_tokens": 212})
+    >>> ledger.report(by=["command", "model"])["groups"][0]["completion_tokens"]
+    212
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    from .fal_cache import _env_flag, _ImmediateTransaction, default_cache_dir
+except ImportError:
+    from fal_cache import _env_flag, _ImmediateTransaction, default_cache_dir
+
+
+# Report grouping keys -> SQL expression over the usage table (UTC buckets)
+GROUP_KEYS = {
+    "command": "command",
+    "endpoint": "endpoint",
+    "model": "model",
+    "outcome": "outcome",
+    "hour": "strftime('%Y-%m-%dT%H:00Z', ts, 'unixepoch')",
+    "day": "strftime('%Y-%m-%d', ts, 'unixepoch')",
+}
+
+# Report columns that --sort accepts
+SORT_KEYS = ("calls", "errors", "prompt_tokens", "completion_tokens", "total_tokens", "wall_seconds", "cost_usd")
+
+_command: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("fal_usage_command", default=None)
+
+
+def current_command() -> Optional[str]:
+    """Command the calls of the current context are attributed to."""
+    return _command.get()
+
+
+@contextmanager
+def usage_context(command: Optional[str]) -> Iterator[None]:
+    """Attribute the calls made inside the block to `command`."""
+    token = _command.set(command)
+    try:
+        yield
+    finally:
+        _command.reset(token)
+
+
+def default_ledger_path() -> str:
+    """Path of the usage database (FAL_USAGE_LEDGER_PATH or next to the caches)."""
+    return os.environ.get("FAL_USAGE_LEDGER_PATH") or os.path.join(
+        default_cache_dir(), "fal_usage.sqlite3"
+    )
+
+
+def parse_since(value: str) -> float:
+    """
+    Unix time for a --since/--until value: a duration back from now
+    ("90m", "24h", "7d", "3600s") or an ISO 8601 timestamp (UTC unless
+    it carries an offset).
+    """
+    from datetime import datetime, timezone
+
+    value = value.strip()
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if value[-1:] in units and value[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(value[:-1]) * units[value[-1]]
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid time {value!r} (expected e.g. 24h, 7d or 2024-05-01T12:00)") from None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def load_prices(spec: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Token prices per model (USD per 1M tokens) from `spec`, or from
+    FAL_USAGE_PRICES when `spec` is None: a JSON object or a JSON file path.
+    """
+    spec = os.environ.get("FAL_USAGE_PRICES") if spec is None else spec
+    if not spec:
+        return {}
+    if not spec.lstrip().startswith("{"):
+        with open(spec, "r", encoding="utf-8") as f:
+            spec = f.read()
+    prices = json.loads(spec)
+    if not isinstance(prices, dict):
+        raise ValueError("Token prices must be a JSON object keyed by model")
+    return {
+        model: {
+            "prompt": float(price.get("prompt", 0)),
+            "completion": float(price.get("completion", 0))
+        }
+        for model, price in prices.items()
+    }
+
+
+class UsageLedger:
+    """
+    Append-only SQLite log of FAL calls, aggregated by report().
+
+    Safe to share between threads (one connection per thread) and between
+    processes (SQLite WAL + locking). Recording only queues the row for a
+    writer thread and never raises: a broken ledger prints a warning, it
+    never fails the call being recorded.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file (created with its directory if missing)
+        """
+        self.path = path
+        self._local = threading.local()
+        self._warned = False
+        # Calls are written by a background thread, so recording never
+        # waits for the database (or blocks an event loop)
+        self._pending: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._write() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                "ts REAL NOT NULL, "
+                "command TEXT, "
+                "endpoint TEXT NOT NULL, "
+                "model TEXT, "
+                "prompt_tokens INTEGER, "
+                "completion_tokens INTEGER, "
+                "wall_seconds REAL NOT NULL, "
+                "outcome TEXT NOT NULL, "
+                "request_id TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS usage_ts ON usage (ts)")
+
+    @classmethod
+    def from_env(cls) -> Optional["UsageLedger"]:
+        """Ledger at default_ledger_path(), or None if FAL_USAGE_LEDGER=0."""
+        if not _env_flag("FAL_USAGE_LEDGER"):
+            return None
+        return cls(default_ledger_path())
+
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection in WAL mode."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        """Context manager for a write transaction holding the database write lock."""
+        return _ImmediateTransaction(self._connection())
+
+    def record(
+        self,
+        endpoint: str,
+        model: Optional[str],
+        *,
+        wall_seconds: float,
+        ok: bool,
+        usage: Optional[dict] = None,
+        request_id: Optional[str] = None,
+        command: Optional[str] = None
+    ) -> None:
+        """
+        Append one call.
+
+        Args:
+            endpoint: FAL endpoint called (e.g. "fal-ai/any-llm")
+            model: Model used, if any
+            wall_seconds: End-to-end time of the call
+            ok: Whether the call succeeded
+            usage: The response's usage dict ("prompt_tokens",
+                "completion_tokens"), if the endpoint reports one
+            request_id: Queue request id, if any
+            command: Command to attribute the call to (default: current_command())
+        """
+        usage = usage if isinstance(usage, dict) else {}
+        self._pending.put((
+            time.time(),
+            command if command is not None else current_command(),
+            endpoint,
+            model or None,
+            _tokens(usage.get("prompt_tokens")),
+            _tokens(usage.get("completion_tokens")),
+            float(wall_seconds),
+            "ok" if ok else "error",
+            request_id
+        ))
+        if self._writer is None:
+            self._start_writer()
+
+    def _start_writer(self) -> None:
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_pending, name="fal-usage-ledger", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _write_pending(self) -> None:
+        """Writer thread: insert queued rows, batching whatever queued up meanwhile."""
+        while True:
+            rows = [self._pending.get()]
+            while len(rows) < 500:
+                try:
+                    rows.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in rows
+            rows = [row for row in rows if row is not None]
+            try:
+                if rows:
+                    with self._write() as conn:
+                        conn.executemany(
+                            "INSERT INTO usage (ts, command, endpoint, model, prompt_tokens, "
+                            "completion_tokens, wall_seconds, outcome, request_id) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            rows
+                        )
+            except Exception as e:
+                if not self._warned:
+                    self._warned = True
+                    print(f"[usage] could not record calls: {e}", file=sys.stderr)
+            finally:
+                for _ in range(len(rows) + stop):
+                    self._pending.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        """Wait until every recorded call is written."""
+        if self._writer is not None:
+            self._pending.join()
+
+    def close(self) -> None:
+        """Write the remaining calls and stop the writer thread (runs at exit)."""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._pending.put(None)
+            writer.join()
+
+    def report(
+        self,
+        *,
+        by: Sequence[str] = ("command", "model"),
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        command: Optional[str] = None,
+        model: Optional[str] = None,
+        sort: str = "total_tokens",
+        limit: Optional[int] = None,
+        prices: Optional[Dict[str, Dict[str, float]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Aggregate the ledger.
+
+        Args:
+            by: Grouping keys (see GROUP_KEYS); empty for totals only
+            since / until: Unix time bounds of the calls included
+            command / model: Only include calls of this command / model
+            sort: Column to order groups by, descending (see SORT_KEYS;
+                time-based groups are ordered chronologically instead)
+            limit: Keep only the first `limit` groups
+            prices: Token prices per model (see load_prices); adds cost_usd
+
+        Returns:
+            {"by", "since", "until", "groups": [...], "totals": {...}}, each
+            group and the totals carrying calls, errors, error_rate,
+            prompt_tokens, completion_tokens, total_tokens, wall_seconds,
+            mean_seconds, max_seconds and (with prices) cost_usd
+        """
+        self.flush()
+        by = list(by)
+        unknown = [key for key in by if key not in GROUP_KEYS]
+        if unknown:
+            raise ValueError(f"Unknown grouping key(s) {unknown} (expected: {', '.join(GROUP_KEYS)})")
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort column {sort!r} (expected: {', '.join(SORT_KEYS)})")
+
+        conditions, params = [], []
+        for column, value in (("ts >= ?", since), ("ts < ?", until), ("command = ?", command), ("model = ?", model)):
+            if value is not None:
+                conditions.append(column)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # Grouped by model as well, so costs can be priced per model
+        keys = by + ([] if "model" in by else ["model"])
+        expressions = [f"{GROUP_KEYS[key]} AS {key}" for key in keys]
+        rows = self._connection().execute(
+            f"SELECT {', '.join(expressions)}, COUNT(*), "
+            "SUM(outcome = 'error'), "
+            "COALESCE(SUM(prompt_tokens), 0), "
+            "COALESCE(SUM(completion_tokens), 0), "
+            "SUM(wall_seconds), MAX(wall_seconds) "
+            f"FROM usage {where} GROUP BY {', '.join(keys)}",
+            params
+        ).fetchall()
+
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        totals = _empty_group()
+        for row in rows:
+            values = dict(zip(keys, row))
+            calls, errors, prompt_tokens, completion_tokens, wall_seconds, max_seconds = row[len(keys):]
+            cost = _cost(prices, values["model"], prompt_tokens, completion_tokens)
+            for group in (groups.setdefault(tuple(values[key] for key in by), _empty_group()), totals):
+                _add(group, calls, errors, prompt_tokens, completion_tokens, wall_seconds, max_seconds, cost)
+
+        ordered = [
+            {**dict(zip(by, key)), **_finish(group, prices)}
+            for key, group in groups.items()
+        ] if by else []
+        if any(key in ("hour", "day") for key in by):
+            ordered.sort(key=lambda group: tuple("" if group[key] is None else str(group[key]) for key in by))
+        else:
+            ordered.sort(key=lambda group: group.get(sort) or 0, reverse=True)
+        if limit is not None:
+            ordered = ordered[:limit]
+
+        return {
+            "by": by,
+            "since": since,
+            "until": until,
+            "groups": ordered,
+            "totals": _finish(totals, prices)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Row count and time range of the ledger."""
+        self.flush()
+        count, first, last = self._connection().execute(
+            "SELECT COUNT(*), MIN(ts), MAX(ts) FROM usage"
+        ).fetchone()
+        return {"path": self.path, "calls": count, "first": first, "last": last}
+
+
+def _tokens(value: Any) -> Optional[int]:
+    try:
+        return None if value is None else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cost(
+    prices: Optional[Dict[str, Dict[str, float]]],
+    model: Optional[str],
+    prompt_tokens: int,
+    completion_tokens: int
+) -> Optional[float]:
+    """Cost of the tokens at `model`'s prices, or None if it has no price."""
+    price = (prices or {}).get(model or "")
+    if price is None:
+        return None
+    return (prompt_tokens * price["prompt"] + completion_tokens * price["completion"]) / 1_000_000
+
+
+def _empty_group() -> Dict[str, Any]:
+    return {
+        "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        "wall_seconds": 0.0, "max_seconds": 0.0, "cost_usd": 0.0, "unpriced_calls": 0
+    }
+
+
+def _add(group, calls, errors, prompt_tokens, completion_tokens, wall_seconds, max_seconds, cost) -> None:
+    group["calls"] += calls
+    group["errors"] += errors
+    group["prompt_tokens"] += prompt_tokens
+    group["completion_tokens"] += completion_tokens
+    group["wall_seconds"] += wall_seconds
+    group["max_seconds"] = max(group["max_seconds"], max_seconds)
+    if cost is None:
+        group["unpriced_calls"] += calls
+    else:
+        group["cost_usd"] += cost
+
+
+def _finish(group: Dict[str, Any], prices: Optional[dict]) -> Dict[str, Any]:
+    """Derived and rounded columns of an aggregated group."""
+    calls = group["calls"]
+    result = {
+        "calls": calls,
+        "errors": group["errors"],
+        "error_rate": round(group["errors"] / calls, 4) if calls else None,
+        "prompt_tokens": group["prompt_tokens"],
+        "completion_tokens": group["completion_tokens"],
+        "total_tokens": group["prompt_tokens"] + group["completion_tokens"],
+        "wall_seconds": round(group["wall_seconds"], 3),
+        "mean_seconds": round(group["wall_seconds"] / calls, 4) if calls else None,
+        "max_seconds": round(group["max_seconds"], 4),
+    }
+    if prices:
+        result["cost_usd"] = round(group["cost_usd"], 6)
+        result["unpriced_calls"] = group["unpriced_calls"]
+    return result
@@ -0,0 +1,282 @@
+"""
+Local receiver for FAL webhook callbacks.
+
+Jobs submitted with a `webhook_url` (any_llm_submit, background_submit)
+are completed by FAL POSTing the result to that URL. WebhookReceiver is a
+small stdlib HTTP server that accepts those callbacks and writes them to
+a WebhookStore (the shared SQLite cache database, table
+"webhook_results"); waiters block on the store instead of polling FAL:
+
+    - in the receiver's process, waiters are woken as soon as a callback
+      arrives
+    - in other processes (e.g. `fal_worker.py wait`), waiters poll the
+      local database, which costs no HTTP round trip
+
+Callback body (as sent by FAL):
+    {"request_id": "...", "status": "OK", "payload": {...}}
+    {"request_id": "...", "status": "ERROR", "error": "...", "payload": {...}}
+
+Example:
+    >>> store = WebhookStore()
+    >>> receiver = WebhookReceiver(store, port=8787, token="s3cret")
+    >>> receiver.start()
+    >>> request_id = client.any_llm_submit("...", webhook_url=receiver.url)
+    >>> store.wait(request_id, timeout=120)["payload"]["output"]
+
+`send_fake_completion` POSTs a completion like FAL would, so the whole
+flow can be exercised locally without FAL (see the __main__ block).
+"""
+
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+try:
+    from .fal_cache import SqliteCache, open_default_cache
+except ImportError:
+    from fal_cache import SqliteCache, open_default_cache
+
+
+DEFAULT_WEBHOOK_PATH = "/fal/webhook"
+
+
+class WebhookStore:
+    """Webhook completions by request id, plus blocking waits on them."""
+
+    def __init__(self, cache: Optional[SqliteCache] = None, *, poll_interval: float = 0.2):
+        """
+        Args:
+            cache: Backing table (default: "webhook_results" in the shared
+                cache database, configured by FAL_WEBHOOK_STORE*)
+            poll_interval: Seconds between store reads while waiting for a
+                completion written by another process
+        """
+        self.cache = cache or open_default_cache("webhook_results")
+        if self.cache is None:
+            raise RuntimeError("Webhook store is disabled (FAL_WEBHOOK_STORE=0)")
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+
+    def put(self, record: Dict[str, Any]) -> None:
+        """Store one completion record and wake waiters in this process."""
+        self.cache.set(record["request_id"], record)
+        with self._condition:
+            self._condition.notify_all()
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Completion record for `request_id`, or None if not received yet."""
+        return self.cache.peek(request_id)
+
+    def wait(self, request_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Block until the completion of `request_id` arrives; TimeoutError after `timeout`."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            record = self.get(request_id)
+            if record is not None:
+                return record
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"No webhook received for {request_id} within {timeout}s")
+            with self._condition:
+                self._condition.wait(
+                    self.poll_interval if remaining is None else min(self.poll_interval, remaining)
+                )
+
+
+def parse_webhook(body: bytes) -> Dict[str, Any]:
+    """Validate a webhook body and turn it into a store record."""
+    data = json.loads(body.decode("utf-8"))
+    if not isinstance(data, dict) or not data.get("request_id"):
+        raise ValueError("Webhook body must be a JSON object with a request_id")
+    return {
+        "request_id": data["request_id"],
+        "status": data.get("status", "OK"),
+        "payload": data.get("payload"),
+        "error": data.get("error") or data.get("payload_error"),
+        "received_at": time.time()
+    }
+
+
+# Created by _webhook_server_class()
+_WebhookServer: Optional[type] = None
+
+
+def _webhook_server_class() -> type:
+    """
+    ThreadingHTTPServer subclass serving webhook callbacks.
+
+    Defined on first use: http.server (and socketserver) are only imported
+    by processes that actually run a receiver, not by every worker process
+    that merely reads the store.
+    """
+    global _WebhookServer
+    if _WebhookServer is not None:
+        return _WebhookServer
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _WebhookHandler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, body: Dict[str, Any]) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if urlsplit(self.path).path == "/health":
+                self._reply(200, {"ok": True, "received": self.server.received})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path != self.server.webhook_path:
+                self._reply(404, {"error": "not found"})
+                return
+            if self.server.token is not None and parse_qs(url.query).get("token", [None])[0] != self.server.token:
+                self._reply(403, {"error": "invalid token"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                record = parse_webhook(self.rfile.read(length))
+            except Exception as e:
+                self._reply(400, {"error": str(e)})
+                return
+
+            self.server.store.put(record)
+            with self.server.lock:
+                self.server.received += 1
+            self._reply(200, {"ok": True})
+
+        def log_message(self, format, *args):
+            print(f"[webhook] {self.address_string()} {format % args}", file=sys.stderr)
+
+    class WebhookServer(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def __init__(self, address, store: WebhookStore, webhook_path: str, token: Optional[str]):
+            super().__init__(address, _WebhookHandler)
+            self.store = store
+            self.webhook_path = webhook_path
+            self.token = token
+            self.received = 0
+            self.lock = threading.Lock()
+
+    _WebhookServer = WebhookServer
+    return _WebhookServer
+
+
+class WebhookReceiver:
+    """HTTP server accepting FAL webhook callbacks into a WebhookStore."""
+
+    def __init__(
+        self,
+        store: WebhookStore,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 8787,
+        path: str = DEFAULT_WEBHOOK_PATH,
+        token: Optional[str] = None,
+        public_url: Optional[str] = None
+    ):
+        """
+        Args:
+            store: Where completions are written
+            host: Interface to bind (use 0.0.0.0 behind a tunnel/proxy)
+            port: Port to bind (0 picks a free port)
+            path: URL path callbacks are POSTed to
+            token: Shared secret required as ?token=... on callbacks
+            public_url: Base URL FAL can reach (e.g. a tunnel); default http://host:port
+        """
+        self.store = store
+        self.token = token
+        self.public_url = public_url
+        self._server = _webhook_server_class()((host, port), store, path, token)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Webhook URL to pass as `webhook_url` (includes the token)."""
+        host, port = self._server.server_address[:2]
+        base = (self.public_url or f"http://{host}:{port}").rstrip("/")
+        query = f"?{urlencode({'token': self.token})}" if self.token else ""
+        return f"{base}{self._server.webhook_path}{query}"
+
+    def start(self) -> "WebhookReceiver":
+        """Serve in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="fal-webhook-receiver",
+            daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve in the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def send_fake_completion(
+    url: str,
+    request_id: str,
+    payload: Optional[Dict[str, Any]] = None,
+    *,
+    status: str = "OK",
+    error: Optional[str] = None,
+    timeout: float = 10
+) -> int:
+    """POST a FAL-style completion to `url` (local stand-in for FAL). Returns the HTTP status."""
+    import urllib.error
+    import urllib.request
+
+    body = {"request_id": request_id, "status": status, "payload": payload}
+    if error is not None:
+        body["error"] = error
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+if __name__ == "__main__":
+    # Smoke test: receiver on a free port, a fake completion, a waiter
+    import tempfile
+
+    store = WebhookStore(SqliteCache(
+        f"{tempfile.mkdtemp()}/webhooks.sqlite3",
+        "webhook_results"
+    ))
+    receiver = WebhookReceiver(store, port=0, token="smoke").start()
+    print(f"Receiver: {receiver.url}")
+
+    threading.Timer(0.5, send_fake_completion, args=(
+        receiver.url, "req-1", {"output": "Merhaba!", "partial": False}
+    )).start()
+    print(json.dumps(store.wait("req-1", timeout=5), indent=2))
+
+    rejected = send_fake_completion(receiver.url.split("?")[0], "req-2", {})
+    print(f"Without token: HTTP {rejected}")
+    receiver.stop()
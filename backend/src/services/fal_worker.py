@@ -8,10 +8,24 @@ Usage:
     python fal_worker.py any-llm-submit --prompt "Your prompt here"
     python fal_worker.py any-llm-status --request_id <id>
     python fal_worker.py any-llm-result --request_id <id>
+    python fal_worker.py wait --request_id <id> [--timeout 120]
+    python fal_worker.py webhook-serve [--port 8787] [--token secret]
     python fal_worker.py background --image_url "https://..." --prompt "..."
     python fal_worker.py analyze-product --image_url "https://..."
+    python fal_worker.py analyze-product-batch --image_urls "https://..." "https://..." [--batch_size 8] | --input urls.txt
+    python fal_worker.py analyze-and-prompt --image_url "https://..." [--styles '[{"name":"...","description":"..."}]']
+    python fal_worker.py analysis-cache stats|invalidate [--image_url "https://..."]
+    python fal_worker.py prompt-cache stats|clear [--namespace marketing-kit]
+    python fal_worker.py phash-index stats|lookup|clear [--image_url "https://..."] [--max_distance 6]
     python fal_worker.py generate-bg-prompt --categories '{"main_product_type":"Footwear"}' --style_type "Clean studio"
     python fal_worker.py generate-multiple-bg --image_url "https://..." --categories '{"main_product_type":"Footwear"}'
+    python fal_worker.py upload-file --file_path photo.jpg [--preprocess] [--max_edge 2048]
+    python fal_worker.py download --urls "https://fal.media/..." ["https://..." ...]
+    python fal_worker.py image-store stats|clear
+    python fal_worker.py usage-report [--by command,model,hour] [--since 24h] [--sort total_tokens]
+    python fal_worker.py admission stats|reset
+    python fal_worker.py serve [--socket /tmp/fal_worker.sock] [--max_workers 8] [--metrics_port 9464]
+    python fal_worker.py batch --input jobs.jsonl --output results.jsonl [--concurrency 4] [--resume]
 
 Examples:
     # Complete text generation
@@ -22,6 +36,10 @@ Examples:
       --max_tokens 200 \\
       --system "You are a senior e-commerce copywriter."
 
+    # Reuse the completion of a nearly identical earlier prompt (whitespace,
+    # list order, a changed word); prompts with other numbers never match
+    python fal_worker.py any-llm-complete --prompt "..." --cache_namespace marketing-kit
+
     # Enterprise endpoint (vision support)
     python fal_worker.py any-llm-enterprise \\
       --prompt "What is in this image?" \\
@@ -33,23 +51,46 @@ Examples:
       --prompt "Short Turkish product pitch" \\
       --webhook_url "https://frontend.example.com/api/webhooks/openrouter"
 
+    # Stream text generation (NDJSON: delta records, then a "done" record)
+    python fal_worker.py any-llm-stream --prompt "Short Turkish product pitch"
+
     # Check status
     python fal_worker.py any-llm-status --request_id abc123
 
     # Get result
     python fal_worker.py any-llm-result --request_id abc123
 
+    # Receive completions locally instead of polling status/result
+    python fal_worker.py webhook-serve --port 8787 --token s3cret
+    python fal_worker.py any-llm-submit --prompt "Short Turkish product pitch" \
+      --webhook_url "https://tunnel.example.com/fal/webhook?token=s3cret"
+    python fal_worker.py wait --request_id abc123 --timeout 120
+
     # Background replacement
     python fal_worker.py background \\
       --image_url "https://cdn.example.com/uploads/mug.jpg" \\
       --prompt "cozy scandinavian living room, warm tones" \\
       --remove_bg true
 
+    # Local photo: upload downscaled/re-encoded first (needs Pillow)
+    python fal_worker.py background --image_url ./IMG_2041.jpg --preprocess --max_edge 1536
+
+    # Keep local copies of the results (adds "local_path" next to each URL)
+    python fal_worker.py background --image_url "https://..." --download
+
+    # Re-uploads of a product photo (re-compressed, resized, renamed) get
+    # the earlier result instead of a new generation
+    python fal_worker.py background --image_url ./IMG_2041_copy.jpg --reuse
+    python fal_worker.py phash-index lookup --image_url ./IMG_2041_copy.jpg
+
     # Analyze product image
     python fal_worker.py analyze-product \\
       --image_url "https://cdn.example.com/uploads/shoe.jpg" \\
       --model "google/gemini-2.5-pro"
 
+    # Analyze a catalog, 10 images per model request
+    python fal_worker.py analyze-product-batch --input catalog_urls.txt --batch_size 10
+
     # Generate background prompt
     python fal_worker.py generate-bg-prompt \\
       --categories '{"main_product_type":"Footwear","subcategory":"Sneakers"}' \\
@@ -59,13 +100,49 @@ Examples:
     python fal_worker.py generate-multiple-bg \\
       --image_url "https://cdn.example.com/uploads/shoe.jpg" \\
       --categories '{"main_product_type":"Footwear"}'
+
+    # Categories + one prompt per style in a single LLM call
+    python fal_worker.py analyze-and-prompt \\
+      --image_url "https://cdn.example.com/uploads/shoe.jpg"
+
+    # Without --categories, generate-multiple-bg uses that fused call
+    # (1 LLM round trip instead of 1 analysis + 1 per style)
+    python fal_worker.py generate-multiple-bg \\
+      --image_url "https://cdn.example.com/uploads/shoe.jpg"
+
+    # Which commands and models burn tokens and time (every FAL call is
+    # recorded in the local usage ledger)
+    python fal_worker.py usage-report --by command,model --since 7d
+    python fal_worker.py usage-report --by hour --for_command analyze-product --since 24h
+
+    # Client-side admission control: calls wait for a token/slot of their
+    # endpoint, bulk work behind interactive work, and are shed with an
+    # "Admission rejected" error when the lane's queue is full
+    python fal_worker.py --lane bulk generate-multiple-bg --image_url "https://..."
+    python fal_worker.py admission stats
+
+    # Persistent daemon (one warm FalClient, newline-delimited JSON over stdin/stdout)
+    python fal_worker.py serve --max_workers 8
+    # -> {"id": "1", "command": "analyze-product", "args": {"image_url": "https://..."}}
+    # <- {"id": "1", "result": {"categories": {...}, ...}, "error": null}
+
+    # Batch jobs (same request format), results streamed as they finish
+    python fal_worker.py batch --input jobs.jsonl --output results.jsonl \\
+      --concurrency 8 --resume
 """
 
 import argparse
+import io
 import json
 import sys
+import threading
+import time
 import traceback
 import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Union
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
 
 
 def load_env_file(env_file: str) -> None:
@@ -81,249 +158,1672 @@ def load_env_file(env_file: str) -> None:
         )
 
 
-def main():
-    """Main CLI entry point."""
-    parser = argparse.ArgumentParser(
-        description="FAL Worker CLI for any-llm and photokit operations",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog=__doc__
-    )
-    
+def _add_any_llm_complete_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the any-llm-complete subcommand."""
+    parser.add_argument("--prompt", required=True, help="User prompt")
+    parser.add_argument("--system", dest="system_prompt", help="System prompt")
     parser.add_argument(
-        "--env_file",
-        default=".env",
-        help="Path to .env file (default: .env)"
-    )
-    
-    subparsers = parser.add_subparsers(dest="command", help="Available commands")
-    
-    # any-llm-complete
-    complete_parser = subparsers.add_parser(
-        "any-llm-complete",
-        help="Complete text generation (blocking)"
-    )
-    complete_parser.add_argument("--prompt", required=True, help="User prompt")
-    complete_parser.add_argument("--system", dest="system_prompt", help="System prompt")
-    complete_parser.add_argument(
         "--model",
         default="google/gemini-2.5-flash-lite",
-        help="Model name (default: google/gemini-2.5-flash-lite)"
+        help="Model, comma-separated ranked models, or tier: fast/vision/premium (default: google/gemini-2.5-flash-lite)"
     )
-    complete_parser.add_argument(
+    parser.add_argument(
         "--temperature",
         type=float,
         default=0.7,
         help="Temperature (default: 0.7)"
     )
-    complete_parser.add_argument(
+    parser.add_argument(
         "--max_tokens",
         type=int,
         help="Maximum tokens to generate"
     )
-    complete_parser.add_argument(
+    parser.add_argument(
         "--priority",
         choices=["latency", "throughput"],
         default="latency",
         help="Priority mode (default: latency)"
     )
-    complete_parser.add_argument(
+    parser.add_argument(
         "--with_logs",
         action="store_true",
         help="Print log streams to stderr"
     )
-    
-    # any-llm-enterprise
-    enterprise_parser = subparsers.add_parser(
-        "any-llm-enterprise",
-        help="Enterprise LLM endpoint with vision support"
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Submit a duplicate request if the first is slow; first result wins"
+    )
+    parser.add_argument(
+        "--hedge_delay",
+        type=float,
+        help="Seconds before hedging (default: learned p95, 3s until enough samples)"
+    )
+    parser.add_argument(
+        "--cache_namespace",
+        help="Reuse the completion of a nearly identical earlier prompt of this namespace"
+    )
+    parser.add_argument(
+        "--cache_threshold",
+        type=float,
+        help="Minimum prompt similarity 0-1 for reuse (default: FAL_PROMPT_CACHE_THRESHOLD or 0.9)"
+    )
+    parser.add_argument(
+        "--cache_bypass",
+        action="store_true",
+        help="Skip the prompt cache lookup but cache the new completion"
     )
-    enterprise_parser.add_argument("--prompt", required=True, help="User prompt")
-    enterprise_parser.add_argument("--system", dest="system_prompt", help="System prompt")
-    enterprise_parser.add_argument(
+
+
+def _add_any_llm_enterprise_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the any-llm-enterprise subcommand."""
+    parser.add_argument("--prompt", required=True, help="User prompt")
+    parser.add_argument("--system", dest="system_prompt", help="System prompt")
+    parser.add_argument(
         "--model",
         default="google/gemini-2.5-pro",
-        help="Model name (default: google/gemini-2.5-pro)"
+        help="Model, comma-separated ranked models, or tier: fast/vision/premium (default: google/gemini-2.5-pro)"
     )
-    enterprise_parser.add_argument(
+    parser.add_argument(
         "--temperature",
         type=float,
         default=0.7,
         help="Temperature (default: 0.7)"
     )
-    enterprise_parser.add_argument(
+    parser.add_argument(
         "--max_tokens",
         type=int,
         help="Maximum tokens to generate"
     )
-    enterprise_parser.add_argument(
+    parser.add_argument(
         "--with_logs",
         action="store_true",
         help="Print log streams to stderr"
     )
-    
-    # any-llm-stream
-    stream_parser = subparsers.add_parser(
-        "any-llm-stream",
-        help="Stream text generation"
-    )
-    stream_parser.add_argument("--prompt", required=True, help="User prompt")
-    stream_parser.add_argument("--system", dest="system_prompt", help="System prompt")
-    stream_parser.add_argument(
+
+
+def _add_any_llm_stream_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the any-llm-stream subcommand."""
+    parser.add_argument("--prompt", required=True, help="User prompt")
+    parser.add_argument("--system", dest="system_prompt", help="System prompt")
+    parser.add_argument(
         "--model",
         default="google/gemini-2.5-flash-lite",
         help="Model name"
     )
-    stream_parser.add_argument("--temperature", type=float, default=0.7)
-    stream_parser.add_argument("--max_tokens", type=int)
-    stream_parser.add_argument(
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max_tokens", type=int)
+    parser.add_argument(
         "--priority",
         choices=["latency", "throughput"],
         default="latency"
     )
-    
-    # any-llm-submit
-    submit_parser = subparsers.add_parser(
-        "any-llm-submit",
-        help="Submit async text generation job"
-    )
-    submit_parser.add_argument("--prompt", required=True, help="User prompt")
-    submit_parser.add_argument("--system", dest="system_prompt", help="System prompt")
-    submit_parser.add_argument(
+
+
+def _add_any_llm_submit_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the any-llm-submit subcommand."""
+    parser.add_argument("--prompt", required=True, help="User prompt")
+    parser.add_argument("--system", dest="system_prompt", help="System prompt")
+    parser.add_argument(
         "--model",
         default="google/gemini-2.5-flash-lite",
         help="Model name"
     )
-    submit_parser.add_argument("--temperature", type=float, default=0.7)
-    submit_parser.add_argument("--max_tokens", type=int)
-    submit_parser.add_argument(
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max_tokens", type=int)
+    parser.add_argument(
         "--priority",
         choices=["latency", "throughput"],
         default="latency"
     )
-    submit_parser.add_argument("--webhook_url", help="Webhook URL for completion")
-    
-    # any-llm-status
-    status_parser = subparsers.add_parser(
-        "any-llm-status",
-        help="Check job status"
-    )
-    status_parser.add_argument("--request_id", required=True, help="Request ID")
-    status_parser.add_argument(
+    parser.add_argument("--webhook_url", help="Webhook URL for completion")
+
+
+def _add_any_llm_status_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the any-llm-status subcommand."""
+    parser.add_argument("--request_id", required=True, help="Request ID")
+    parser.add_argument(
         "--with_logs",
         action="store_true",
         default=True,
         help="Include logs (default: true)"
     )
-    
-    # any-llm-result
-    result_parser = subparsers.add_parser(
-        "any-llm-result",
-        help="Get job result"
+
+
+def _add_any_llm_result_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the any-llm-result subcommand."""
+    parser.add_argument("--request_id", required=True, help="Request ID")
+
+
+def _add_preprocess_arguments(parser: argparse.ArgumentParser) -> None:
+    """Image preprocessing options shared by upload-file and background."""
+    parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="Fix orientation, downscale, re-encode and strip metadata before uploading (needs Pillow)"
     )
-    result_parser.add_argument("--request_id", required=True, help="Request ID")
-    
-    # background
-    background_parser = subparsers.add_parser(
-        "background",
-        help="Replace image background using photokit"
+    parser.add_argument(
+        "--max_edge",
+        type=int,
+        default=2048,
+        help="Longest edge in pixels when preprocessing (default: 2048)"
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=85,
+        help="Encoder quality 1-100 when preprocessing (default: 85)"
+    )
+    parser.add_argument(
+        "--image_format",
+        choices=["jpeg", "webp", "png"],
+        default="jpeg",
+        help="Output format when preprocessing (default: jpeg)"
+    )
+
+
+def _add_download_arguments(parser: argparse.ArgumentParser) -> None:
+    """--download flag shared by the image generating subcommands."""
+    parser.add_argument(
+        "--download",
+        action="store_true",
+        help="Also fetch the generated images into the local image store (adds local_path)"
     )
-    background_parser.add_argument(
+
+
+def _add_background_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the background subcommand."""
+    parser.add_argument(
         "--image_url",
         required=True,
-        help="Image URL to process"
+        help="Image URL to process, or a local file (uploaded first)"
     )
-    background_parser.add_argument(
+    parser.add_argument(
         "--prompt",
         default="soft key light, seamless studio backdrop, premium e-commerce look, product centered, subtle shadow",
         help="Background replacement prompt"
     )
-    background_parser.add_argument(
+    parser.add_argument(
         "--remove_bg",
         type=lambda x: x.lower() in ("true", "1", "yes"),
         default=True,
         help="Remove background first (true/false, default: true)"
     )
-    background_parser.add_argument(
+    parser.add_argument(
         "--timeout",
         type=int,
         default=110,
         help="Request timeout in seconds (default: 110)"
     )
-    
-    # analyze-product
-    analyze_parser = subparsers.add_parser(
-        "analyze-product",
-        help="Analyze product image and return 9-category classification"
+    parser.add_argument(
+        "--reuse",
+        action="store_true",
+        help="Return the earlier result for this prompt and the same or a near-duplicate image"
+    )
+    _add_preprocess_arguments(parser)
+    _add_download_arguments(parser)
+
+
+def _add_background_submit_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the background-submit subcommand."""
+    parser.add_argument(
+        "--image_url",
+        required=True,
+        help="Image URL to process"
+    )
+    parser.add_argument(
+        "--prompt",
+        default="soft key light, seamless studio backdrop, premium e-commerce look, product centered, subtle shadow",
+        help="Background replacement prompt"
+    )
+    parser.add_argument(
+        "--remove_bg",
+        type=lambda x: x.lower() in ("true", "1", "yes"),
+        default=True,
+        help="Remove background first (true/false, default: true)"
+    )
+    parser.add_argument("--webhook_url", help="Webhook URL for completion")
+
+
+def _add_background_status_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the background-status subcommand."""
+    parser.add_argument("--request_id", required=True, help="Request ID")
+
+
+def _add_background_result_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the background-result subcommand."""
+    parser.add_argument("--request_id", required=True, help="Request ID")
+
+
+def _add_wait_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the wait subcommand."""
+    parser.add_argument("--request_id", required=True, help="Request ID")
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Seconds to wait for the webhook completion (default: forever)"
+    )
+
+
+def _add_webhook_serve_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the webhook-serve subcommand."""
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Interface to bind (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8787,
+        help="Port to listen on (default: 8787)"
+    )
+    parser.add_argument(
+        "--path",
+        default="/fal/webhook",
+        help="URL path completions are POSTed to (default: /fal/webhook)"
+    )
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("FAL_WEBHOOK_TOKEN"),
+        help="Shared secret required as ?token=... (default: $FAL_WEBHOOK_TOKEN)"
+    )
+    parser.add_argument(
+        "--public_url",
+        help="Base URL FAL reaches the receiver at, e.g. a tunnel (only used for the printed webhook URL)"
     )
-    analyze_parser.add_argument(
+
+
+def _add_analyze_product_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the analyze-product subcommand."""
+    parser.add_argument(
         "--image_url",
         required=True,
         help="Product image URL to analyze"
     )
-    analyze_parser.add_argument(
+    parser.add_argument(
         "--model",
         default="google/gemini-2.5-pro",
-        help="Vision model to use (default: google/gemini-2.5-pro)"
+        help="Vision model, comma-separated ranked models, or tier (default: google/gemini-2.5-pro)"
     )
-    analyze_parser.add_argument(
+    parser.add_argument(
         "--temperature",
         type=float,
         default=0.3,
         help="Temperature (default: 0.3)"
     )
-    
-    # generate-bg-prompt
-    bg_prompt_parser = subparsers.add_parser(
-        "generate-bg-prompt",
-        help="Generate background replacement prompt from categories"
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Bypass the analysis result cache"
+    )
+    parser.add_argument(
+        "--no_stream",
+        action="store_true",
+        help="Wait for the full completion instead of stopping once the JSON object closed"
+    )
+    parser.add_argument(
+        "--no_preamble",
+        action="store_true",
+        help="Ask for the JSON object only, without the free-text image description"
+    )
+
+
+def _add_analyze_product_batch_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the analyze-product-batch subcommand."""
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--image_urls",
+        nargs="+",
+        help="Product image URLs to analyze"
+    )
+    source.add_argument(
+        "--input",
+        help="File with one image URL per line (- for stdin)"
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=8,
+        help="Maximum images per model request (default: 8)"
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=4,
+        help="Batches analyzed concurrently (default: 4)"
+    )
+    parser.add_argument(
+        "--model",
+        default="google/gemini-2.5-flash",
+        help="Vision model, comma-separated ranked models, or tier (default: google/gemini-2.5-flash)"
+    )
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=0.3,
+        help="Temperature (default: 0.3)"
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Bypass the analysis result cache"
+    )
+
+
+def _add_analyze_and_prompt_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the analyze-and-prompt subcommand."""
+    parser.add_argument(
+        "--image_url",
+        required=True,
+        help="Product image URL to analyze"
+    )
+    parser.add_argument(
+        "--styles",
+        help="Optional: Custom styles as JSON array (default: Studio, Lifestyle, Premium)"
+    )
+    parser.add_argument(
+        "--model",
+        default="google/gemini-2.5-flash",
+        help="Vision model, comma-separated ranked models, or tier (default: google/gemini-2.5-flash)"
     )
-    bg_prompt_parser.add_argument(
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=0.3,
+        help="Temperature (default: 0.3)"
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Bypass the analysis result cache"
+    )
+
+
+def _add_analysis_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the analysis-cache subcommand."""
+    parser.add_argument(
+        "action",
+        choices=["stats", "invalidate"],
+        help="stats: hit/miss counters; invalidate: drop cached analyses"
+    )
+    parser.add_argument(
+        "--image_url",
+        help="Only invalidate analyses of this image (default: all)"
+    )
+
+
+def _add_prompt_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the prompt-cache subcommand."""
+    parser.add_argument(
+        "action",
+        choices=["stats", "clear"],
+        help="stats: entries and hit/miss counters per namespace; clear: drop cached completions"
+    )
+    parser.add_argument(
+        "--namespace",
+        help="Only clear this namespace (default: all)"
+    )
+
+
+def _add_phash_index_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the phash-index subcommand."""
+    parser.add_argument(
+        "action",
+        choices=["stats", "lookup", "clear"],
+        help="stats: index size and query counters; lookup: indexed images "
+             "similar to --image_url; clear: forget every indexed hash"
+    )
+    parser.add_argument(
+        "--image_url",
+        help="Image to look up (URL or local file)"
+    )
+    parser.add_argument(
+        "--max_distance",
+        type=int,
+        help="Largest Hamming distance, 0-15 (default: FAL_PHASH_MAX_DISTANCE or 6)"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=10,
+        help="Maximum number of matches (default: 10)"
+    )
+
+
+def _add_generate_bg_prompt_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the generate-bg-prompt subcommand."""
+    parser.add_argument(
         "--categories",
         required=True,
         help="Product categories as JSON string"
     )
-    bg_prompt_parser.add_argument(
+    parser.add_argument(
         "--style_type",
         required=True,
         help="Style description for the background"
     )
-    bg_prompt_parser.add_argument(
+    parser.add_argument(
         "--model",
         default="openai/gpt-5-mini",
-        help="Model to use (default: openai/gpt-5-mini)"
+        help="Model, comma-separated ranked models, or tier (default: openai/gpt-5-mini)"
     )
-    
-    # generate-multiple-bg
-    multiple_bg_parser = subparsers.add_parser(
-        "generate-multiple-bg",
-        help="Generate multiple background variations"
-    )
-    multiple_bg_parser.add_argument(
+
+
+def _add_generate_multiple_bg_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the generate-multiple-bg subcommand."""
+    parser.add_argument(
         "--image_url",
         required=True,
         help="Original product image URL"
     )
-    multiple_bg_parser.add_argument(
+    parser.add_argument(
         "--categories",
-        required=True,
-        help="Product categories as JSON string"
+        help="Product categories as JSON string (default: analyze the image and "
+             "write every style's prompt in one analyze-and-prompt call)"
     )
-    multiple_bg_parser.add_argument(
+    parser.add_argument(
         "--styles",
         help="Optional: Custom styles as JSON array"
     )
-    
-    # upload-file
-    upload_parser = subparsers.add_parser(
-        "upload-file",
-        help="Upload a local file to FAL CDN"
+    parser.add_argument(
+        "--prompts",
+        help='Optional: Prompts per style name as JSON object (e.g. analyze-and-prompt\'s "prompts")'
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Maximum number of styles generated in parallel (default: all styles)"
     )
-    upload_parser.add_argument(
+    _add_download_arguments(parser)
+
+
+def _add_upload_file_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the upload-file subcommand."""
+    parser.add_argument(
         "--file_path",
         required=True,
         help="Local file path to upload"
     )
+    _add_preprocess_arguments(parser)
+
+
+def _add_download_command_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the download subcommand."""
+    parser.add_argument(
+        "--urls",
+        nargs="+",
+        required=True,
+        help="Image URLs to fetch into the local image store"
+    )
+
+
+def _add_image_store_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the image-store subcommand."""
+    parser.add_argument(
+        "action",
+        choices=["stats", "clear"],
+        help="stats: size and download counters; clear: delete every stored image"
+    )
+
+
+def _add_usage_report_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the usage-report subcommand."""
+    from fal_usage import GROUP_KEYS, SORT_KEYS
+    
+    parser.add_argument(
+        "--by",
+        default="command,model",
+        help=f"Comma-separated grouping keys: {', '.join(GROUP_KEYS)}, or \"\" for totals only "
+             "(default: command,model)"
+    )
+    parser.add_argument(
+        "--since",
+        help="Only calls since this time: a duration back from now (90m, 24h, 7d) or ISO 8601 (UTC)"
+    )
+    parser.add_argument(
+        "--until",
+        help="Only calls before this time (same format as --since)"
+    )
+    parser.add_argument(
+        "--for_command",
+        help="Only calls made by this subcommand (e.g. analyze-product)"
+    )
+    parser.add_argument(
+        "--model",
+        help="Only calls to this model"
+    )
+    parser.add_argument(
+        "--sort",
+        choices=list(SORT_KEYS),
+        default="total_tokens",
+        help="Column to order groups by, descending; hour/day groups stay chronological "
+             "(default: total_tokens)"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="Show only the first N groups"
+    )
+    parser.add_argument(
+        "--prices",
+        help="Token prices for cost estimates, JSON or a JSON file: "
+             "{\"<model>\": {\"prompt\": USD per 1M, \"completion\": USD per 1M}} "
+             "(default: FAL_USAGE_PRICES)"
+    )
+
+
+def _add_admission_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the admission subcommand."""
+    parser.add_argument(
+        "action",
+        choices=["stats", "reset"],
+        help="stats: limits, calls in flight, queue depth and wait times per endpoint "
+             "and lane; reset: clear the counters and reclaim slots of dead processes"
+    )
+
+
+def _add_serve_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the serve subcommand."""
+    parser.add_argument(
+        "--socket",
+        help="Unix socket path to listen on (default: serve over stdin/stdout)"
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=8,
+        help="Maximum number of requests handled concurrently (default: 8)"
+    )
+    _add_metrics_arguments(parser)
+
+
+def _add_metrics_arguments(parser: argparse.ArgumentParser) -> None:
+    """Prometheus endpoint arguments shared by serve and batch."""
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        help="Serve per-phase timing histograms in Prometheus format on this port (GET /metrics)"
+    )
+    parser.add_argument(
+        "--metrics_host",
+        default="127.0.0.1",
+        help="Interface for --metrics_port (default: 127.0.0.1)"
+    )
+
+
+def _add_batch_arguments(parser: argparse.ArgumentParser) -> None:
+    """Arguments of the batch subcommand."""
+    parser.add_argument(
+        "--input",
+        default="-",
+        help="JSONL job file, one {\"id\", \"command\", \"args\"} object per line (default: stdin)"
+    )
+    parser.add_argument(
+        "--output",
+        default="-",
+        help="JSONL result file (default: stdout)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of jobs in flight (default: 4)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip job ids already present in --output and append to it"
+    )
+    parser.add_argument(
+        "--metrics_file",
+        help="Write the Prometheus metrics of the run to this file when it finishes"
+    )
+    _add_metrics_arguments(parser)
+
+
+# Subcommand name -> (help text, function adding its arguments)
+COMMANDS = {
+    "any-llm-complete": (
+        "Complete text generation (blocking)",
+        _add_any_llm_complete_arguments
+    ),
+    "any-llm-enterprise": (
+        "Enterprise LLM endpoint with vision support",
+        _add_any_llm_enterprise_arguments
+    ),
+    "any-llm-stream": (
+        "Stream text generation",
+        _add_any_llm_stream_arguments
+    ),
+    "any-llm-submit": (
+        "Submit async text generation job",
+        _add_any_llm_submit_arguments
+    ),
+    "any-llm-status": (
+        "Check job status",
+        _add_any_llm_status_arguments
+    ),
+    "any-llm-result": (
+        "Get job result",
+        _add_any_llm_result_arguments
+    ),
+    "background": (
+        "Replace image background using photokit",
+        _add_background_arguments
+    ),
+    "background-submit": (
+        "Submit background replacement job",
+        _add_background_submit_arguments
+    ),
+    "background-status": (
+        "Check background job status",
+        _add_background_status_arguments
+    ),
+    "background-result": (
+        "Get background job result",
+        _add_background_result_arguments
+    ),
+    "wait": (
+        "Wait for a submitted job's webhook completion",
+        _add_wait_arguments
+    ),
+    "webhook-serve": (
+        "Receive FAL webhook completions into the local results store",
+        _add_webhook_serve_arguments
+    ),
+    "analyze-product": (
+        "Analyze product image and return 9-category classification",
+        _add_analyze_product_arguments
+    ),
+    "analyze-product-batch": (
+        "Analyze many product images, several per model request",
+        _add_analyze_product_batch_arguments
+    ),
+    "analyze-and-prompt": (
+        "Analyze product image and write a background prompt per style in one call",
+        _add_analyze_and_prompt_arguments
+    ),
+    "analysis-cache": (
+        "Show stats for or invalidate the analyze-product result cache",
+        _add_analysis_cache_arguments
+    ),
+    "prompt-cache": (
+        "Show stats for or clear the any-llm-complete prompt similarity cache",
+        _add_prompt_cache_arguments
+    ),
+    "phash-index": (
+        "Show stats for, query or clear the near-duplicate image index",
+        _add_phash_index_arguments
+    ),
+    "generate-bg-prompt": (
+        "Generate background replacement prompt from categories",
+        _add_generate_bg_prompt_arguments
+    ),
+    "generate-multiple-bg": (
+        "Generate multiple background variations",
+        _add_generate_multiple_bg_arguments
+    ),
+    "upload-file": (
+        "Upload a local file to FAL CDN",
+        _add_upload_file_arguments
+    ),
+    "download": (
+        "Fetch images into the local image store",
+        _add_download_command_arguments
+    ),
+    "image-store": (
+        "Show stats for or clear the local image store",
+        _add_image_store_arguments
+    ),
+    "usage-report": (
+        "Aggregate recorded token usage and call time by command, model and hour",
+        _add_usage_report_arguments
+    ),
+    "admission": (
+        "Show or reset per-endpoint admission control state (rate limits and queues)",
+        _add_admission_arguments
+    ),
+    "serve": (
+        "Run as a persistent daemon reading newline-delimited JSON requests",
+        _add_serve_arguments
+    ),
+    "batch": (
+        "Run JSONL jobs with bounded concurrency and stream JSONL results",
+        _add_batch_arguments
+    ),
+}
+
+
+def build_parser(commands: Optional[Iterable[str]] = None) -> argparse.ArgumentParser:
+    """
+    Build the CLI argument parser.
+    
+    Args:
+        commands: Subcommands whose arguments should be built. Others are
+            registered with their help text only, which keeps one-shot
+            startup cheap (default: build every subcommand)
+    """
+    parser = argparse.ArgumentParser(
+        description="FAL Worker CLI for any-llm and photokit operations",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    
+    parser.add_argument(
+        "--env_file",
+        default=".env",
+        help="Path to .env file (default: .env)"
+    )
+    parser.add_argument(
+        "--lane",
+        choices=["interactive", "bulk"],
+        help="Admission lane of the command's FAL calls; bulk calls wait behind "
+             "interactive ones (default: FAL_ADMISSION_LANE, bulk for "
+             "analyze-product-batch and batch jobs, else interactive)"
+    )
+    
+    subparsers = parser.add_subparsers(dest="command", help="Available commands")
+    
+    for name, (help_text, add_arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if commands is None or name in commands:
+            add_arguments(subparser)
+    
+    return parser
+
+
+def command_parser(command: str) -> argparse.ArgumentParser:
+    """Standalone parser for one subcommand (used to map daemon/batch requests)."""
+    help_text, add_arguments = COMMANDS[command]
+    parser = argparse.ArgumentParser(prog=command, description=help_text)
+    add_arguments(parser)
+    return parser
+
+
+def requested_command(argv: List[str]) -> Optional[str]:
+    """Subcommand named in `argv`, found without building the full parser."""
+    skip_next = False
+    for token in argv:
+        if skip_next:
+            skip_next = False
+        elif token in ("--env_file", "--lane"):
+            skip_next = True
+        elif not token.startswith("-"):
+            return token if token in COMMANDS else None
+    return None
+
+
+def _json_arg(value: Any) -> Any:
+    """Decode a JSON-string argument; values already decoded (daemon mode) pass through."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def _preprocess_option(args: argparse.Namespace):
+    """
+    ImagePreprocessor for --preprocess, or None to use the client's default
+    (FAL_PREPROCESS environment variables).
+    """
+    if not args.preprocess:
+        return None
+    from fal_image import ImagePreprocessor
+    
+    return ImagePreprocessor(max_edge=args.max_edge, format=args.image_format, quality=args.quality)
+
+
+def run_command(
+    client,
+    args: argparse.Namespace,
+    on_event: Optional[Callable[[dict], None]] = None
+) -> Any:
+    """
+    Execute a single subcommand against an existing FalClient.
+    
+    Shared by the one-shot CLI and the serve daemon so both expose
+    exactly the same commands and arguments.
+    
+    Args:
+        client: FalClient instance
+        args: Parsed arguments (must include `command`)
+        on_event: Receives intermediate stream records (any-llm-stream)
+    
+    Returns:
+        JSON-serializable result (for any-llm-stream, the terminal record)
+    """
+    from fal_admission import admission_lane
+    from fal_usage import usage_context
+    
+    lane = getattr(args, "lane", None) or ("bulk" if args.command in BULK_COMMANDS else None)
+    # FAL calls made for this command are attributed to it in the usage
+    # ledger and admitted in its lane (see fal_admission)
+    with usage_context(args.command), admission_lane(lane):
+        return _run_command(client, args, on_event)
+
+
+def _run_command(
+    client,
+    args: argparse.Namespace,
+    on_event: Optional[Callable[[dict], None]]
+) -> Any:
+    """run_command inside the command's usage context."""
+    result = None
+    
+    if args.command == "any-llm-complete":
+        result = client.any_llm_complete(
+            prompt=args.prompt,
+            system_prompt=args.system_prompt,
+            model=args.model,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+            priority=args.priority,
+            with_logs=args.with_logs,
+            hedge=args.hedge,
+            hedge_delay=args.hedge_delay,
+            cache_namespace=args.cache_namespace,
+            cache_threshold=args.cache_threshold,
+            cache_bypass=args.cache_bypass
+        )
     
+    elif args.command == "any-llm-enterprise":
+        result = client.any_llm_enterprise(
+            prompt=args.prompt,
+            system_prompt=args.system_prompt,
+            model=args.model,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+            with_logs=args.with_logs
+        )
+    
+    elif args.command == "any-llm-stream":
+        for record in client.any_llm_stream(
+            prompt=args.prompt,
+            system_prompt=args.system_prompt,
+            model=args.model,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+            priority=args.priority
+        ):
+            if record["type"] == "done":
+                result = record
+            elif on_event is not None:
+                on_event(record)
+    
+    elif args.command == "any-llm-submit":
+        request_id = client.any_llm_submit(
+            prompt=args.prompt,
+            system_prompt=args.system_prompt,
+            model=args.model,
+            temperature=args.temperature,
+            max_tokens=args.max_tokens,
+            priority=args.priority,
+            webhook_url=args.webhook_url
+        )
+        result = {"request_id": request_id}
+    
+    elif args.command == "any-llm-status":
+        result = client.any_llm_status(
+            request_id=args.request_id,
+            with_logs=args.with_logs
+        )
+    
+    elif args.command == "any-llm-result":
+        result = client.any_llm_result(request_id=args.request_id)
+    
+    elif args.command == "background":
+        result = client.background_replace(
+            image_url=args.image_url,
+            prompt=args.prompt,
+            remove_bg=args.remove_bg,
+            timeout=args.timeout,
+            preprocess=_preprocess_option(args),
+            download=args.download or None,
+            reuse=args.reuse
+        )
+    
+    elif args.command == "background-submit":
+        request_id = client.background_submit(
+            image_url=args.image_url,
+            prompt=args.prompt,
+            remove_bg=args.remove_bg,
+            webhook_url=args.webhook_url
+        )
+        result = {"request_id": request_id}
+    
+    elif args.command == "background-status":
+        result = client.background_status(request_id=args.request_id)
+    
+    elif args.command == "background-result":
+        result = client.background_result(request_id=args.request_id)
+    
+    elif args.command == "wait":
+        result = client.wait_for_result(request_id=args.request_id, timeout=args.timeout)
+    
+    elif args.command == "analyze-product":
+        result = client.analyze_product_image(
+            image_url=args.image_url,
+            model=args.model,
+            temperature=args.temperature,
+            use_cache=not args.no_cache,
+            stream=not args.no_stream,
+            preamble=not args.no_preamble
+        )
+    
+    elif args.command == "analyze-product-batch":
+        image_urls = args.image_urls
+        if isinstance(image_urls, str):
+            image_urls = [image_urls]
+        if image_urls is None:
+            if not args.input:
+                raise ValueError("analyze-product-batch needs --image_urls or --input")
+            stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+            try:
+                image_urls = [line.strip() for line in stream if line.strip() and not line.startswith("#")]
+            finally:
+                if stream is not sys.stdin:
+                    stream.close()
+        result = client.analyze_products_batch(
+            image_urls,
+            batch_size=args.batch_size,
+            model=args.model,
+            temperature=args.temperature,
+            use_cache=not args.no_cache,
+            max_workers=args.max_workers
+        )
+    
+    elif args.command == "analysis-cache":
+        if args.action == "stats":
+            result = client.analysis_cache_stats()
+        else:
+            result = client.invalidate_analysis_cache(image_url=args.image_url)
+    
+    elif args.command == "prompt-cache":
+        if args.action == "stats":
+            result = client.prompt_cache_stats()
+        else:
+            result = client.clear_prompt_cache(namespace=args.namespace)
+    
+    elif args.command == "phash-index":
+        if args.action == "stats":
+            result = client.phash_index_stats()
+        elif args.action == "clear":
+            result = client.clear_phash_index()
+        else:
+            if not args.image_url:
+                raise ValueError("phash-index lookup requires --image_url")
+            result = client.similar_images(
+                args.image_url,
+                max_distance=args.max_distance,
+                limit=args.limit
+            )
+    
+    elif args.command == "generate-bg-prompt":
+        # Parse categories JSON
+        categories = _json_arg(args.categories)
+        result = client.generate_background_prompt(
+            categories=categories,
+            style_type=args.style_type,
+            model=args.model
+        )
+    
+    elif args.command == "analyze-and-prompt":
+        result = client.analyze_and_prompt(
+            image_url=args.image_url,
+            styles=_json_arg(args.styles) if args.styles else None,
+            model=args.model,
+            temperature=args.temperature,
+            use_cache=not args.no_cache
+        )
+    
+    elif args.command == "generate-multiple-bg":
+        # Parse styles JSON if provided
+        styles = None
+        if args.styles:
+            styles = _json_arg(args.styles)
+        prompts = _json_arg(args.prompts) if args.prompts else None
+        analysis = None
+        if args.categories:
+            # Parse categories JSON
+            categories = _json_arg(args.categories)
+        else:
+            # One fused call for the categories and every style's prompt
+            analysis = client.analyze_and_prompt(image_url=args.image_url, styles=styles)
+            if analysis.get("error"):
+                # Never generate from template prompts over empty categories:
+                # fall back to the separate analysis and one prompt call per style
+                separate = client.analyze_product_image(image_url=args.image_url)
+                if separate.get("error"):
+                    raise RuntimeError(
+                        f"Product analysis failed, no backgrounds generated: {separate['error']} "
+                        f"(fused call: {analysis['error']})"
+                    )
+                analysis = {**analysis, "categories": separate["categories"], "fallback": "analyze_product_image"}
+                categories = separate["categories"]
+            else:
+                categories = analysis["categories"]
+                prompts = {**analysis["prompts"], **(prompts or {})}
+        result = client.generate_multiple_backgrounds(
+            image_url=args.image_url,
+            categories=categories,
+            styles=styles,
+            max_workers=args.concurrency,
+            download=args.download or None,
+            prompts=prompts
+        )
+        if analysis is not None:
+            result["analysis"] = {
+                key: analysis.get(key)
+                for key in ("categories", "fallbacks", "error", "fallback", "cached", "timings")
+            }
+    
+    elif args.command == "upload-file":
+        # Upload local file to FAL CDN
+        upload = client.upload_image(args.file_path, preprocess=_preprocess_option(args))
+        result = {
+            "url": upload["url"],
+            "error": None,
+            "cached": upload["cached"],
+            "preprocess": upload["preprocess"]
+        }
+    
+    elif args.command == "download":
+        result = {"files": client.download_images(args.urls)}
+    
+    elif args.command == "image-store":
+        if args.action == "stats":
+            result = client.download_stats()
+        else:
+            result = client.clear_image_store()
+    
+    elif args.command == "usage-report":
+        from fal_usage import load_prices, parse_since
+        
+        result = client.usage_report(
+            by=[key.strip() for key in args.by.split(",") if key.strip()],
+            since=parse_since(args.since) if args.since else None,
+            until=parse_since(args.until) if args.until else None,
+            command=args.for_command,
+            model=args.model,
+            sort=args.sort,
+            limit=args.limit,
+            prices=load_prices(args.prices) if args.prices else None
+        )
+    
+    elif args.command == "admission":
+        if args.action == "stats":
+            result = client.admission_stats()
+        else:
+            result = client.reset_admission()
+    
+    else:
+        raise ValueError(f"Unknown command: {args.command}")
+    
+    return result
+
+
+# Commands whose FAL calls are admitted in the bulk lane unless a lane is given
+BULK_COMMANDS = {"analyze-product-batch"}
+
+# Commands that cannot be multiplexed over the daemon protocol
+SERVE_UNSUPPORTED_COMMANDS = {"serve", "batch", "webhook-serve"}
+
+# Commands the daemon answers from the client's queue poller instead of
+# holding a pool thread for the whole generation
+DEFERRED_COMMANDS = {"background"}
+
+
+def start_deferred_command(
+    client,
+    args: argparse.Namespace,
+    executor: Optional["Executor"] = None
+) -> "Future":
+    """
+    Submit a DEFERRED_COMMANDS request and return a Future of the same
+    result run_command would produce.
+    
+    The tracked job completes on the client's single poller thread, so
+    result downloads (--download) run on `executor` instead; without one
+    they run inline and hold up status polling of every other job.
+    """
+    from concurrent.futures import Future
+    
+    image_url = args.image_url
+    if os.path.isfile(image_url):
+        image_url = client.upload_image(image_url, preprocess=_preprocess_option(args))["url"]
+    result: Future = Future()
+    download = args.download or client.download_results
+    
+    def finish(tracked: "Future") -> None:
+        try:
+            outcome = tracked.result()
+            if download:
+                client.download_result_images(outcome)
+            result.set_result(outcome)
+        except Exception as e:
+            result.set_exception(RuntimeError(f"Background replacement failed: {e}"))
+    
+    def deliver(tracked: "Future") -> None:
+        if download and executor is not None:
+            try:
+                executor.submit(finish, tracked)
+                return
+            except RuntimeError:
+                # Executor already shut down (daemon exiting): download inline
+                pass
+        finish(tracked)
+    
+    # Holds the admission slot until the image is done, like `background` one-shot
+    client.background_start(
+        image_url=image_url,
+        prompt=args.prompt,
+        remove_bg=args.remove_bg,
+        timeout=args.timeout,
+        callback=deliver
+    )
+    return result
+
+
+_TRUE_STRINGS = ("true", "1", "yes", "on")
+_FALSE_STRINGS = ("false", "0", "no", "off", "")
+
+
+def _request_flag(value: Any, label: str) -> bool:
+    """Boolean value of a flag given in a JSON request; rejects anything ambiguous."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in _TRUE_STRINGS:
+            return True
+        if lowered in _FALSE_STRINGS:
+            return False
+    raise ValueError(f"Invalid value for {label}: {value!r} (expected true or false)")
+
+
+def namespace_from_request(
+    subparser: argparse.ArgumentParser,
+    command: str,
+    request_args: Optional[Dict[str, Any]]
+) -> argparse.Namespace:
+    """
+    Build an argparse Namespace for `command` from a JSON args object.
+    
+    Keys may be given either as the destination name (e.g. "system_prompt")
+    or as the CLI option name without dashes (e.g. "system"). Missing
+    optional arguments take the same defaults as the CLI; string values
+    are converted with the option's `type` so "0.3" and 0.3 both work.
+    Flags (store_true/store_false) accept booleans, 0/1 and "true"/"false".
+    """
+    remaining = dict(request_args or {})
+    values: Dict[str, Any] = {"command": command}
+    
+    for action in subparser._actions:
+        if action.dest == "help":
+            continue
+        
+        names = [action.dest] + [opt.lstrip("-") for opt in action.option_strings]
+        label = action.option_strings[0] if action.option_strings else action.dest
+        key = next((name for name in names if name in remaining), None)
+        
+        if key is None:
+            if action.required:
+                raise ValueError(f"Missing required argument for {command}: {label}")
+            values[action.dest] = action.default
+            continue
+        
+        value = remaining.pop(key)
+        if action.nargs == 0 and isinstance(action.const, bool):
+            # store_true/store_false flags have no `type`; "false" must not be truthy
+            value = _request_flag(value, label)
+            if key != action.dest and not action.const:
+                # "--no-x" given by option name: true means the flag was passed
+                value = not value
+        elif isinstance(value, str) and action.type is not None:
+            value = action.type(value)
+        if action.choices is not None and value not in action.choices:
+            raise ValueError(
+                f"Invalid value for {label}: {value!r} "
+                f"(choose from {', '.join(map(str, action.choices))})"
+            )
+        values[action.dest] = value
+    
+    if remaining:
+        raise ValueError(f"Unrecognized arguments for {command}: {', '.join(sorted(remaining))}")
+    
+    return argparse.Namespace(**values)
+
+
+class WorkerDaemon:
+    """
+    Persistent worker that keeps one warm FalClient and serves
+    newline-delimited JSON requests concurrently.
+    
+    Request line:
+        {"id": "abc", "command": "analyze-product", "args": {"image_url": "https://..."}}
+    
+    Response line (same id, written as soon as the request finishes):
+        {"id": "abc", "result": {...}, "error": null}
+        {"id": "abc", "result": null, "error": "...", "trace": "..."}
+    
+    any-llm-stream requests additionally get one line per delta before the
+    final response (whose result is the terminal "done" record):
+        {"id": "abc", "event": {"type": "delta", "delta": "...", ...}}
+    
+    A request may carry "lane": "interactive" or "bulk" to choose the
+    admission lane of its FAL calls (default: the daemon's lane).
+    
+    Besides the regular subcommands, the daemon answers the "ping" command
+    and "metrics" (result: {"text": <Prometheus text format>}).
+    DEFERRED_COMMANDS (background) only hold a pool thread while submitting;
+    their response is written when the client's queue poller delivers the
+    result.
+    """
+    
+    def __init__(self, client, *, max_workers: int = 8, lane: Optional[str] = None):
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.client = client
+        # Admission lane of requests that do not name one (None: per command)
+        self.lane = lane
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._parsers: Dict[str, argparse.ArgumentParser] = {}
+        self._parsers_lock = threading.Lock()
+        self._outstanding: set = set()
+        self._outstanding_lock = threading.Lock()
+    
+    def _command_parser(self, command: str) -> argparse.ArgumentParser:
+        """Per-command parser, built on first use."""
+        with self._parsers_lock:
+            if command not in self._parsers:
+                self._parsers[command] = command_parser(command)
+            return self._parsers[command]
+    
+    def handle_line(
+        self,
+        line: str,
+        write: Optional[Callable[[dict], None]] = None,
+        *,
+        defer: bool = False
+    ) -> Union[dict, "Future", None]:
+        """Handle one raw request line and return the response (see handle_request)."""
+        line = line.strip()
+        if not line:
+            return None
+        
+        try:
+            request = json.loads(line)
+        except Exception as e:
+            return _error_response(None, e)
+        return self.handle_request(request, write, defer=defer)
+    
+    def handle_request(
+        self,
+        request: Any,
+        write: Optional[Callable[[dict], None]] = None,
+        *,
+        defer: bool = False
+    ) -> Union[dict, "Future"]:
+        """
+        Handle one decoded request object and return the response dict.
+        
+        If `write` is given, intermediate stream events are written
+        through it as {"id", "event"} lines. With `defer`, DEFERRED_COMMANDS
+        return right after submission with a Future of the response dict.
+        """
+        request_id = None
+        command = None
+        started = time.monotonic()
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            request_id = request.get("id")
+            command = request.get("command")
+            
+            if command == "ping":
+                return {
+                    "id": request_id,
+                    "result": {
+                        "pong": True,
+                        "circuits": self.client.resilience.snapshot(),
+                        "hedging": self.client.hedge_stats(),
+                        "models": self.client.router.snapshot(),
+                        "coalescing": self.client.coalescing_stats(),
+                        "background_jobs": self.client.background_jobs()["stats"],
+                        "admission": self.client.admission_stats(),
+                        "phases": self.client.metrics.summary()
+                    },
+                    "error": None
+                }
+            if command == "metrics":
+                return {"id": request_id, "result": {"text": self.client.metrics.render()}, "error": None}
+            if command in SERVE_UNSUPPORTED_COMMANDS or command not in COMMANDS:
+                raise ValueError(f"Unsupported command in serve/batch mode: {command}")
+            
+            args = namespace_from_request(self._command_parser(command), command, request.get("args"))
+            args.lane = request.get("lane") or self.lane
+            # Reuse lookups run before anything is submitted; those go through run_command
+            if defer and command in DEFERRED_COMMANDS and not getattr(args, "reuse", False):
+                from fal_admission import admission_lane
+                from fal_usage import usage_context
+                
+                with usage_context(command), admission_lane(args.lane):
+                    started_command = start_deferred_command(self.client, args, self.executor)
+                pending = self._deferred_response(request_id, started_command)
+                pending.add_done_callback(
+                    lambda done: self._record_request(command, started, done.result())
+                )
+                return pending
+            
+            on_event = None
+            if write is not None:
+                on_event = lambda event: write({"id": request_id, "event": event})
+            result = run_command(self.client, args, on_event)
+            response = {"id": request_id, "result": result, "error": None}
+        
+        except Exception as e:
+            response = _error_response(request_id, e)
+        
+        if command in COMMANDS:
+            self._record_request(command, started, response)
+        return response
+    
+    def _record_request(self, command: str, started: float, response: dict) -> None:
+        """Request latency histogram per command and outcome."""
+        self.client.metrics.observe(
+            "fal_worker_request_seconds",
+            time.monotonic() - started,
+            {"command": command, "outcome": "error" if _response_failed(response) else "ok"},
+            help_text="Time from receiving a serve/batch request to its response"
+        )
+    
+    def _deferred_response(self, request_id: Any, pending: "Future") -> "Future":
+        """Future of the response dict for a deferred command's result Future."""
+        from concurrent.futures import Future
+        
+        response: Future = Future()
+        
+        def deliver(done: "Future") -> None:
+            try:
+                response.set_result({"id": request_id, "result": done.result(), "error": None})
+            except Exception as e:
+                response.set_result(_error_response(request_id, e))
+        
+        pending.add_done_callback(deliver)
+        return response
+    
+    def submit_line(self, line: str, write: Callable[[dict], None]) -> "Future":
+        """
+        Schedule a request line on the pool; `write` receives the response.
+        
+        Returns a Future that completes once the response has been written.
+        """
+        from concurrent.futures import Future
+        
+        written: Future = Future()
+        
+        def finish(response: Optional[dict]) -> None:
+            try:
+                if response is not None:
+                    write(response)
+            finally:
+                written.set_result(None)
+        
+        def task():
+            response = self.handle_line(line, write, defer=True)
+            if isinstance(response, Future):
+                response.add_done_callback(lambda done: finish(done.result()))
+            else:
+                finish(response)
+        
+        with self._outstanding_lock:
+            self._outstanding.add(written)
+        written.add_done_callback(self._discard_outstanding)
+        self.executor.submit(task)
+        return written
+    
+    def _discard_outstanding(self, written: "Future") -> None:
+        with self._outstanding_lock:
+            self._outstanding.discard(written)
+    
+    def wait_idle(self) -> None:
+        """Block until every submitted request has been answered."""
+        from concurrent.futures import wait
+        
+        while True:
+            with self._outstanding_lock:
+                outstanding = list(self._outstanding)
+            if not outstanding:
+                return
+            wait(outstanding)
+    
+    def serve_stdio(self) -> None:
+        """Read requests from stdin and write responses to stdout until EOF."""
+        write = _make_line_writer(sys.stdout)
+        for line in sys.stdin:
+            self.submit_line(line, write)
+        self.wait_idle()
+        self.executor.shutdown(wait=True)
+    
+    def serve_socket(self, path: str) -> None:
+        """Accept connections on a Unix socket; each connection speaks the same protocol."""
+        import socketserver
+        
+        daemon = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                stream = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+                write = _make_line_writer(stream)
+                pending = []
+                for raw in self.rfile:
+                    pending.append(daemon.submit_line(raw.decode("utf-8"), write))
+                # Keep the connection open until every response is written
+                for future in pending:
+                    future.result()
+        
+        if os.path.exists(path):
+            os.unlink(path)
+        
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        print(f"FAL worker listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.executor.shutdown(wait=False)
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def _error_response(request_id: Any, e: Exception) -> dict:
+    """Response line for a failed request (same fields as CLI error output)."""
+    return {
+        "id": request_id,
+        "result": None,
+        "error": str(e),
+        "trace": traceback.format_exc()
+    }
+
+
+def _response_failed(response: dict) -> bool:
+    """True if the request failed or its command returned an error result."""
+    result = response.get("result")
+    return bool(response.get("error") or (isinstance(result, dict) and result.get("error")))
+
+
+def _read_done_ids(path: str) -> set:
+    """Ids of jobs already written to a batch output file (for --resume)."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Ignore a truncated last line from an interrupted run
+                continue
+            if isinstance(record, dict) and record.get("id") is not None:
+                done.add(record["id"])
+    return done
+
+
+def run_batch(
+    daemon: "WorkerDaemon",
+    input_path: str,
+    output_path: str,
+    *,
+    concurrency: int = 4,
+    resume: bool = False,
+    metrics_file: Optional[str] = None
+) -> dict:
+    """
+    Run JSONL jobs through a WorkerDaemon with bounded concurrency.
+    
+    Each input line is a daemon request ({"id", "command", "args"}); each
+    result line is written to the output as soon as its job finishes. Job
+    failures are reported inline and do not stop the run.
+    
+    Args:
+        daemon: WorkerDaemon holding the shared FalClient
+        input_path: JSONL job file, or "-" for stdin
+        output_path: JSONL result file, or "-" for stdout
+        concurrency: Maximum number of jobs in flight
+        resume: Skip job ids already present in the output file (and append to it)
+        metrics_file: Write the client's Prometheus metrics here at the end
+    
+    Returns:
+        Summary dict with submitted/skipped/succeeded/failed counts
+    """
+    to_stdout = output_path == "-"
+    done_ids = _read_done_ids(output_path) if resume and not to_stdout else set()
+    
+    source = sys.stdin if input_path == "-" else open(input_path, encoding="utf-8")
+    sink = sys.stdout if to_stdout else open(
+        output_path, "a" if resume else "w", encoding="utf-8"
+    )
+    write = _make_line_writer(sink)
+    slots = threading.BoundedSemaphore(max(1, concurrency))
+    summary = {"submitted": 0, "skipped": 0, "succeeded": 0, "failed": 0}
+    summary_lock = threading.Lock()
+    
+    def finish(response: dict) -> None:
+        try:
+            write(response)
+            with summary_lock:
+                summary["failed" if _response_failed(response) else "succeeded"] += 1
+        finally:
+            slots.release()
+    
+    def run_job(request: Any) -> None:
+        try:
+            response = daemon.handle_request(request, defer=True)
+        except BaseException:
+            slots.release()
+            raise
+        if isinstance(response, dict):
+            finish(response)
+        else:
+            # Deferred command: the slot is held until the poller delivers
+            response.add_done_callback(lambda done: finish(done.result()))
+    
+    try:
+        for line in source:
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                write(_error_response(None, e))
+                with summary_lock:
+                    summary["failed"] += 1
+                continue
+            
+            if isinstance(request, dict) and request.get("id") in done_ids:
+                with summary_lock:
+                    summary["skipped"] += 1
+                continue
+            
+            # Blocks while `concurrency` jobs are in flight, so input is read lazily
+            slots.acquire()
+            with summary_lock:
+                summary["submitted"] += 1
+            daemon.executor.submit(run_job, request)
+        
+        # Every slot is free once all jobs, deferred ones included, are written;
+        # the executor stays up until then since deferred jobs download on it
+        for _ in range(max(1, concurrency)):
+            slots.acquire()
+        daemon.executor.shutdown(wait=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    
+    if metrics_file:
+        with open(metrics_file, "w", encoding="utf-8") as f:
+            f.write(daemon.client.metrics.render())
+    return summary
+
+
+def _make_line_writer(stream) -> Callable[[dict], None]:
+    """Return a thread-safe writer emitting one compact JSON object per line."""
+    lock = threading.Lock()
+    
+    def write(obj: dict) -> None:
+        line = json.dumps(obj, ensure_ascii=False)
+        with lock:
+            stream.write(line + "\n")
+            stream.flush()
+    
+    return write
+
+
+def _import_fal_client_class():
+    """Import FalClient from the sibling fal_service module."""
+    # Import here to allow --help without FAL_KEY
+    from pathlib import Path
+    
+    # Add parent directory to path to import fal_service module
+    sys.path.insert(0, str(Path(__file__).parent))
+    from fal_service import FalClient
+    return FalClient
+
+
+def serve_webhooks(args: argparse.Namespace) -> None:
+    """Run the webhook receiver in the foreground (no FAL_KEY needed)."""
+    from pathlib import Path
+    
+    sys.path.insert(0, str(Path(__file__).parent))
+    from fal_webhook import WebhookReceiver, WebhookStore
+    
+    receiver = WebhookReceiver(
+        WebhookStore(),
+        host=args.host,
+        port=args.port,
+        path=args.path,
+        token=args.token,
+        public_url=args.public_url
+    )
+    print(f"Receiving FAL webhooks; pass --webhook_url {receiver.url}", file=sys.stderr)
+    receiver.serve_forever()
+
+
+def main():
+    """Main CLI entry point."""
+    # Only build the invoked subcommand's arguments (all of them for --help/errors)
+    command = requested_command(sys.argv[1:])
+    parser = build_parser([command] if command else None)
     args = parser.parse_args()
     
     # Load .env if specified and exists
@@ -335,115 +1835,61 @@ def main():
         sys.exit(1)
     
     try:
-        # Import here to allow --help without FAL_KEY
-        from pathlib import Path
-        
-        # Add parent directory to path to import fal_service module
-        sys.path.insert(0, str(Path(__file__).parent))
-        from fal_service import FalClient
+        if args.command == "webhook-serve":
+            serve_webhooks(args)
+            sys.exit(0)
         
+        FalClient = _import_fal_client_class()
         client = FalClient()
-        result = None
-        
-        if args.command == "any-llm-complete":
-            result = client.any_llm_complete(
-                prompt=args.prompt,
-                system_prompt=args.system_prompt,
-                model=args.model,
-                temperature=args.temperature,
-                max_tokens=args.max_tokens,
-                priority=args.priority,
-                with_logs=args.with_logs
-            )
-        
-        elif args.command == "any-llm-enterprise":
-            result = client.any_llm_enterprise(
-                prompt=args.prompt,
-                system_prompt=args.system_prompt,
-                model=args.model,
-                temperature=args.temperature,
-                max_tokens=args.max_tokens,
-                with_logs=args.with_logs
-            )
         
-        elif args.command == "any-llm-stream":
-            # Stream outputs directly to stdout
-            client.any_llm_stream(
-                prompt=args.prompt,
-                system_prompt=args.system_prompt,
-                model=args.model,
-                temperature=args.temperature,
-                max_tokens=args.max_tokens,
-                priority=args.priority
-            )
-            # No JSON output for streaming
+        # Startup benchmark hook: stop right before the first network call
+        if os.environ.get("FAL_WORKER_DRY_RUN") == "1":
+            print(json.dumps({"command": args.command, "dry_run": True}))
             sys.exit(0)
         
-        elif args.command == "any-llm-submit":
-            request_id = client.any_llm_submit(
-                prompt=args.prompt,
-                system_prompt=args.system_prompt,
-                model=args.model,
-                temperature=args.temperature,
-                max_tokens=args.max_tokens,
-                priority=args.priority,
-                webhook_url=args.webhook_url
-            )
-            result = {"request_id": request_id}
-        
-        elif args.command == "any-llm-status":
-            result = client.any_llm_status(
-                request_id=args.request_id,
-                with_logs=args.with_logs
-            )
-        
-        elif args.command == "any-llm-result":
-            result = client.any_llm_result(request_id=args.request_id)
+        if args.command in ("serve", "batch") and args.metrics_port:
+            from fal_metrics import MetricsServer
+            
+            metrics_server = MetricsServer(
+                client.metrics,
+                host=args.metrics_host,
+                port=args.metrics_port
+            ).start()
+            print(f"Metrics on {metrics_server.url}", file=sys.stderr)
         
-        elif args.command == "background":
-            result = client.background_replace(
-                image_url=args.image_url,
-                prompt=args.prompt,
-                remove_bg=args.remove_bg,
-                timeout=args.timeout
-            )
+        if args.command == "serve":
+            daemon = WorkerDaemon(client, max_workers=args.max_workers, lane=args.lane)
+            if args.socket:
+                daemon.serve_socket(args.socket)
+            else:
+                daemon.serve_stdio()
+            sys.exit(0)
         
-        elif args.command == "analyze-product":
-            result = client.analyze_product_image(
-                image_url=args.image_url,
-                model=args.model,
-                temperature=args.temperature
-            )
-        
-        elif args.command == "generate-bg-prompt":
-            # Parse categories JSON
-            categories = json.loads(args.categories)
-            result = client.generate_background_prompt(
-                categories=categories,
-                style_type=args.style_type,
-                model=args.model
+        if args.command == "batch":
+            # Batch jobs are bulk work unless told otherwise
+            daemon = WorkerDaemon(client, max_workers=args.concurrency, lane=args.lane or "bulk")
+            summary = run_batch(
+                daemon,
+                args.input,
+                args.output,
+                concurrency=args.concurrency,
+                resume=args.resume,
+                metrics_file=args.metrics_file
             )
+            print(f"Batch finished: {json.dumps(summary)}", file=sys.stderr)
+            sys.exit(0)
         
-        elif args.command == "generate-multiple-bg":
-            # Parse categories JSON
-            categories = json.loads(args.categories)
-            # Parse styles JSON if provided
-            styles = None
-            if args.styles:
-                styles = json.loads(args.styles)
-            result = client.generate_multiple_backgrounds(
-                image_url=args.image_url,
-                categories=categories,
-                styles=styles
-            )
+        if args.command == "any-llm-stream":
+            # One NDJSON record per delta, then the terminal "done" record
+            emit = _make_line_writer(sys.stdout)
+            try:
+                emit(run_command(client, args, emit))
+            except Exception as e:
+                emit({"type": "error", "error": str(e), "trace": traceback.format_exc()})
+                sys.exit(1)
+            sys.exit(0)
         
-        elif args.command == "upload-file":
-            # Upload local file to FAL CDN
-            url = client.upload_file(args.file_path)
-            result = {
-                "url": url,
-                "error": None
-            }
+        result = run_command(client, args)
         
         # Output JSON result to stdout
         if result is not None:
@@ -461,4 +1907,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The services are plain modules next to fal_worker.py, not a package
+SERVICES_DIR = Path(__file__).resolve().parent.parent / "src" / "services"
+sys.path.insert(0, str(SERVICES_DIR))
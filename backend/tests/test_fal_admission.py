@@ -0,0 +1,214 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from fal_admission import AdmissionController, AdmissionRejected, admission_lane
+
+
+ENDPOINT = "fal-ai/nano-banana/edit"
+
+
+def make_controller(tmp_path, *, rate=None, burst=None, max_concurrent=1, lanes=None):
+    return AdmissionController(
+        str(tmp_path / "admission.sqlite3"),
+        limits={ENDPOINT: {"rate": rate, "burst": burst, "max_concurrent": max_concurrent}},
+        lanes=lanes,
+        poll_interval=0.01
+    )
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
+
+
+def queued(controller, lane):
+    return controller._snapshot(ENDPOINT)["queued"][lane]
+
+
+def start_waiter(controller, lane, admitted, errors):
+    def run():
+        try:
+            ticket = controller.acquire(ENDPOINT, lane)
+            admitted.append(lane)
+            ticket.release()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_endpoints_without_limits_are_not_tracked(tmp_path):
+    controller = make_controller(tmp_path)
+
+    assert controller.acquire("fal-ai/other") is None
+
+
+def test_interactive_lane_goes_before_earlier_bulk_calls(tmp_path):
+    controller = make_controller(tmp_path)
+    held = controller.acquire(ENDPOINT)
+    admitted, errors = [], []
+
+    threads = [start_waiter(controller, "bulk", admitted, errors)]
+    wait_for(lambda: queued(controller, "bulk") == 1)
+    threads.append(start_waiter(controller, "bulk", admitted, errors))
+    wait_for(lambda: queued(controller, "bulk") == 2)
+    threads.append(start_waiter(controller, "interactive", admitted, errors))
+    wait_for(lambda: queued(controller, "interactive") == 1)
+    held.release()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert errors == []
+    assert admitted == ["interactive", "bulk", "bulk"]
+    assert controller._snapshot(ENDPOINT) == {"in_flight": 0, "queued": {"interactive": 0, "bulk": 0}}
+
+
+def test_context_lane_is_used_by_default(tmp_path):
+    controller = make_controller(tmp_path)
+
+    with admission_lane("bulk"):
+        with controller.admit(ENDPOINT) as ticket:
+            assert ticket.lane == "bulk"
+    with controller.admit(ENDPOINT) as ticket:
+        assert ticket.lane == "interactive"
+
+
+def test_full_queue_sheds_instead_of_waiting(tmp_path):
+    controller = make_controller(tmp_path, lanes={"bulk": {"max_queue": 1, "max_wait": 10.0}})
+    held = controller.acquire(ENDPOINT)
+    admitted, errors = [], []
+    thread = start_waiter(controller, "bulk", admitted, errors)
+    wait_for(lambda: queued(controller, "bulk") == 1)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(ENDPOINT, "bulk")
+    assert time.monotonic() - started < 1.0
+    assert rejected.value.reason == "queue_full"
+    assert rejected.value.lane == "bulk"
+
+    # The other lane has its own queue
+    interactive = start_waiter(controller, "interactive", admitted, errors)
+    wait_for(lambda: queued(controller, "interactive") == 1)
+    held.release()
+    thread.join(timeout=5)
+    interactive.join(timeout=5)
+
+    assert errors == []
+    assert admitted == ["interactive", "bulk"]
+    lanes = controller.stats()["endpoints"][ENDPOINT]["lanes"]
+    assert lanes["bulk"]["shed"] == {"queue_full": 1, "timeout": 0}
+    assert lanes["bulk"]["admitted"] == 1
+
+
+def test_wait_beyond_max_wait_is_shed(tmp_path):
+    controller = make_controller(tmp_path, lanes={"interactive": {"max_queue": 10, "max_wait": 0.2}})
+    held = controller.acquire(ENDPOINT)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire(ENDPOINT)
+    elapsed = time.monotonic() - started
+
+    assert rejected.value.reason == "timeout"
+    assert 0.2 <= elapsed < 2.0
+    assert queued(controller, "interactive") == 0
+    held.release()
+    lanes = controller.stats()["endpoints"][ENDPOINT]["lanes"]
+    assert lanes["interactive"]["shed"] == {"queue_full": 0, "timeout": 1}
+    with controller.admit(ENDPOINT) as ticket:
+        assert ticket is not None
+
+
+def test_token_bucket_allows_a_burst_then_the_rate(tmp_path):
+    controller = make_controller(
+        tmp_path, rate=5.0, burst=2, max_concurrent=None,
+        lanes={"interactive": {"max_queue": 10, "max_wait": 5.0}}
+    )
+
+    started = time.monotonic()
+    for _ in range(3):
+        controller.acquire(ENDPOINT).release()
+    elapsed = time.monotonic() - started
+
+    # Two tokens right away, the third after 1 / rate seconds
+    assert 0.15 <= elapsed < 1.5
+
+
+def test_max_concurrent_counts_held_slots(tmp_path):
+    controller = make_controller(
+        tmp_path, max_concurrent=2, lanes={"interactive": {"max_queue": 10, "max_wait": 0.1}}
+    )
+    first = controller.acquire(ENDPOINT)
+    second = controller.acquire(ENDPOINT)
+
+    with pytest.raises(AdmissionRejected):
+        controller.acquire(ENDPOINT)
+    first.release()
+    first.release()  # releasing twice frees one slot
+    third = controller.acquire(ENDPOINT)
+
+    assert controller._snapshot(ENDPOINT)["in_flight"] == 2
+    second.release()
+    third.release()
+    assert controller._snapshot(ENDPOINT)["in_flight"] == 0
+
+
+def test_slots_of_dead_processes_are_reclaimed(tmp_path):
+    controller = make_controller(tmp_path, lanes={"interactive": {"max_queue": 10, "max_wait": 2.0}})
+    crashed = subprocess.Popen([sys.executable, "-c", "pass"])
+    crashed.wait()
+    # A slot its process never released
+    with controller._write() as conn:
+        conn.execute(
+            "INSERT INTO admission_slots (endpoint, lane, host, pid, acquired) VALUES (?, ?, ?, ?, ?)",
+            (ENDPOINT, "bulk", controller._host, crashed.pid, time.time())
+        )
+
+    with controller.admit(ENDPOINT) as ticket:
+        assert ticket is not None
+    assert controller._snapshot(ENDPOINT)["in_flight"] == 0
+
+
+def test_async_lane_ordering_and_cancelled_waiters(tmp_path):
+    controller = make_controller(tmp_path)
+
+    async def scenario():
+        held = await controller.acquire_async(ENDPOINT)
+        admitted = []
+
+        async def wait(lane):
+            async with controller.admit_async(ENDPOINT, lane):
+                admitted.append(lane)
+
+        async def queued_count(lane, count):
+            while await asyncio.to_thread(queued, controller, lane) != count:
+                await asyncio.sleep(0.01)
+
+        bulk = asyncio.ensure_future(wait("bulk"))
+        await queued_count("bulk", 1)
+        abandoned = asyncio.ensure_future(wait("interactive"))
+        await queued_count("interactive", 1)
+        abandoned.cancel()
+        await asyncio.gather(abandoned, return_exceptions=True)
+        # Cancelled while queued: its queue entry is gone
+        assert queued(controller, "interactive") == 0
+
+        interactive = asyncio.ensure_future(wait("interactive"))
+        await queued_count("interactive", 1)
+        await asyncio.to_thread(held.release)
+        await asyncio.gather(bulk, interactive)
+        return admitted
+
+    assert asyncio.run(scenario()) == ["interactive", "bulk"]
+    assert controller._snapshot(ENDPOINT) == {"in_flight": 0, "queued": {"interactive": 0, "bulk": 0}}
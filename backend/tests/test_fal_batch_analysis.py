@@ -0,0 +1,171 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+import fal_service
+from fal_service import ANALYSIS_REQUIRED_KEYS, _parse_batch_analysis_output
+
+
+def categories(name: str) -> dict:
+    return {key: f"{name} {key}" for key in ANALYSIS_REQUIRED_KEYS}
+
+
+def entry(index, name: str) -> dict:
+    return {"index": index, **categories(name)}
+
+
+# _parse_batch_analysis_output
+
+def test_batch_output_is_demultiplexed_by_index():
+    output = "Here you go:\n" + json.dumps([entry(2, "second"), entry(1, "first")]) + "\nDone."
+
+    assert _parse_batch_analysis_output(output, 2) == {0: categories("first"), 1: categories("second")}
+
+
+def test_batch_output_drops_bad_entries():
+    incomplete = entry(3, "third")
+    incomplete["vibe"] = "  "
+    output = json.dumps([
+        entry(1, "first"),
+        entry(2, "second"),
+        entry(2, "second again"),
+        incomplete,
+        entry(9, "out of range"),
+        entry(True, "boolean index"),
+        "not an object",
+        entry("4", "string index"),
+    ])
+
+    assert _parse_batch_analysis_output(output, 5) == {0: categories("first"), 3: categories("string index")}
+
+
+def test_batch_output_without_index_matches_by_position():
+    data = [categories("first"), categories("second")]
+
+    assert _parse_batch_analysis_output(data, 2) == {0: categories("first"), 1: categories("second")}
+    assert _parse_batch_analysis_output({"results": data}, 2) == {0: categories("first"), 1: categories("second")}
+
+
+@pytest.mark.parametrize("output", ["", "no JSON here", "[1, 2,", '{"results": "none"}'])
+def test_batch_output_without_array_raises(output):
+    with pytest.raises(RuntimeError):
+        _parse_batch_analysis_output(output, 2)
+
+
+# FalClient._analyze_batch re-splitting
+
+class BatchClient:
+    """Stands in for FalClient around _analyze_batch, answering batches with `respond`."""
+
+    _analyze_batch = fal_service.FalClient._analyze_batch
+    _batch_entries = fal_service.FalClient._batch_entries
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.batches = []
+        self.single = []
+        self.stored = []
+
+    def any_llm_enterprise(self, prompt, **kwargs):
+        urls = re.findall(r"^Image \d+ URL: (\S+)$", prompt, re.MULTILINE)
+        self.batches.append(urls)
+        return {"output": self.respond(urls), "error": None}
+
+    def _analyze_product_image(self, url, **kwargs):
+        self.single.append(url)
+        return {"categories": categories(url), "error": None, "cached": False}
+
+    def _analysis_cache_store(self, key, analysis, url):
+        self.stored.append(url)
+
+
+def analyze(client, urls):
+    return client._analyze_batch(
+        urls, {}, model="google/gemini-2.5-flash", temperature=0.3, use_cache=True
+    )
+
+
+def test_bad_entries_are_resplit():
+    urls = [f"https://example.com/{i}.jpg" for i in range(1, 7)]
+
+    def respond(batch):
+        if len(batch) < 6:
+            return json.dumps([entry(i, url) for i, url in enumerate(batch, 1)])
+        # Image 2 is missing, 4 is incomplete, 5 is claimed twice
+        broken = entry(4, batch[3])
+        del broken["vibe"]
+        return json.dumps([
+            entry(1, batch[0]), entry(3, batch[2]), broken,
+            entry(5, batch[4]), entry(5, batch[5]), entry(6, batch[5])
+        ])
+
+    client = BatchClient(respond)
+    results, stats = analyze(client, urls)
+
+    # [2, 4, 5] is split into [2] (single call) and [4, 5] (batch call)
+    assert client.batches == [urls, [urls[3], urls[4]]]
+    assert client.single == [urls[1]]
+    assert stats == {"calls": 2, "resplits": 1, "single": 1}
+    assert {url: results[url]["categories"] for url in urls} == {url: categories(url) for url in urls}
+    assert [results[url]["batch_size"] for url in urls] == [6, 1, 6, 2, 2, 6]
+    assert all(results[url]["error"] is None for url in urls)
+    assert sorted(client.stored) == sorted(set(urls) - {urls[1]})
+
+
+def test_malformed_response_resplits_every_image():
+    urls = [f"https://example.com/{i}.jpg" for i in range(1, 5)]
+
+    def respond(batch):
+        if len(batch) == 4:
+            return "I cannot help with that."
+        return json.dumps([entry(i, url) for i, url in enumerate(batch, 1)])
+
+    client = BatchClient(respond)
+    results, stats = analyze(client, urls)
+
+    assert client.batches == [urls, urls[:2], urls[2:]]
+    assert stats == {"calls": 3, "resplits": 1, "single": 0}
+    assert [results[url]["batch_size"] for url in urls] == [2, 2, 2, 2]
+
+
+def test_failed_call_is_not_resplit():
+    urls = ["https://example.com/1.jpg", "https://example.com/2.jpg"]
+    client = BatchClient(lambda batch: "")
+    client.any_llm_enterprise = lambda prompt, **kwargs: {"output": "", "error": "HTTP 500"}
+
+    results, stats = analyze(client, urls)
+
+    assert stats == {"calls": 1, "resplits": 0, "single": 0}
+    assert [results[url]["error"] for url in urls] == ["HTTP 500", "HTTP 500"]
+
+
+class AsyncBatchClient(BatchClient):
+    """BatchClient around AsyncFalClient._analyze_batch."""
+
+    _analyze_batch = fal_service.AsyncFalClient._analyze_batch
+
+    async def any_llm_enterprise(self, prompt, **kwargs):
+        return BatchClient.any_llm_enterprise(self, prompt, **kwargs)
+
+    async def _analyze_product_image(self, url, **kwargs):
+        return BatchClient._analyze_product_image(self, url, **kwargs)
+
+
+def test_async_client_resplits_like_the_sync_one():
+    urls = [f"https://example.com/{i}.jpg" for i in range(1, 6)]
+
+    def respond(batch):
+        # The first image of every multi-image batch is missing
+        return json.dumps([entry(i, url) for i, url in enumerate(batch, 1) if i > 1])
+
+    sync_client, async_client = BatchClient(respond), AsyncBatchClient(respond)
+    expected = analyze(sync_client, urls)
+    results = asyncio.run(async_client._analyze_batch(
+        urls, {}, model="google/gemini-2.5-flash", temperature=0.3, use_cache=True, timeout=None
+    ))
+
+    assert results == expected
+    assert sorted(async_client.batches) == sorted(sync_client.batches)
+    assert async_client.single == sync_client.single
@@ -0,0 +1,55 @@
+import pytest
+
+from fal_service import _JsonObjectScanner
+
+
+def feed(scanner: _JsonObjectScanner, text: str, step: int) -> list:
+    """Feed `text` cumulatively in chunks of `step` characters; results per update."""
+    return [scanner.update(text[:end]) for end in range(step, len(text) + step, step)]
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 7, 1000])
+def test_scanner_finds_object_across_chunks(step):
+    text = 'Sure! Here {is} the {"note": "a } in a string"} answer: {"a": "x{\\"}", "b": [1, {"c": 2}]} done'
+    scanner = _JsonObjectScanner(["a", "b"])
+
+    results = feed(scanner, text, step)
+
+    expected = {"a": 'x{"}', "b": [1, {"c": 2}]}
+    assert results[-1] == expected
+    assert text[:scanner.end].endswith('{"c": 2}]}')
+    # Nothing is returned before the object's closing brace has arrived
+    first = next(i for i, result in enumerate(results) if result is not None)
+    assert (first + 1) * step >= scanner.end
+
+
+def test_scanner_can_stop_at_the_closing_brace():
+    scanner = _JsonObjectScanner(["a"])
+
+    assert scanner.update('{"a": 1') is None
+    assert scanner.update('{"a": 1}') == {"a": 1}
+    assert scanner.end == len('{"a": 1}')
+    # Later output (if the stream is not stopped) does not change the result
+    assert scanner.update('{"a": 1} {"a": 2}') == {"a": 1}
+    assert scanner.update("anything") == {"a": 1}
+
+
+def test_scanner_skips_objects_without_required_keys():
+    scanner = _JsonObjectScanner(["a"])
+
+    assert scanner.update('{"b": 1} {not json} ') is None
+    assert scanner.update('{"b": 1} {not json} {"a": {"b": 1}}') == {"a": {"b": 1}}
+
+
+def test_scanner_restarts_when_output_is_rewritten():
+    scanner = _JsonObjectScanner(["a"])
+
+    assert scanner.update('{"a": "unterminated') is None
+    assert scanner.update('{"b": 0} {"a": 3}') == {"a": 3}
+
+
+def test_scanner_escaped_backslash_ends_string():
+    scanner = _JsonObjectScanner(["a"])
+    text = '{"a": "C:\\\\"}'
+
+    assert feed(scanner, text, 1)[-1] == {"a": "C:\\"}
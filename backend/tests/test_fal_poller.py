@@ -0,0 +1,236 @@
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from fal_poller import QueuePoller
+
+
+ENDPOINT = "fal-ai/nano-banana/edit"
+
+
+class Queued:
+    def __init__(self, position):
+        self.position = position
+
+
+class InProgress:
+    logs = []
+
+
+class Completed:
+    pass
+
+
+class FakeQueue:
+    """Stands in for fal_client's queue API; each job runs for `run_seconds` once first polled."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.status_calls = []
+        self.cancelled = []
+        self.slow_results = {}
+
+    def add(self, request_id, run_seconds, result=None, queued_polls=0):
+        self.jobs[request_id] = {
+            "run_seconds": run_seconds,
+            "result": result if result is not None else {"request_id": request_id},
+            "queued_polls": queued_polls,
+            "started": None,
+        }
+
+    def status(self, endpoint, request_id, with_logs=False):
+        with self.lock:
+            self.status_calls.append((request_id, time.monotonic()))
+            job = self.jobs[request_id]
+            if job["queued_polls"]:
+                job["queued_polls"] -= 1
+                return Queued(job["queued_polls"])
+            if job["started"] is None:
+                job["started"] = time.monotonic()
+            if time.monotonic() - job["started"] < job["run_seconds"]:
+                return InProgress()
+            return Completed()
+
+    def result(self, endpoint, request_id):
+        delay = self.slow_results.get(request_id)
+        if delay:
+            time.sleep(delay)
+        return self.jobs[request_id]["result"]
+
+    def cancel(self, endpoint, request_id):
+        self.cancelled.append(request_id)
+
+    def polls(self, request_id):
+        return [at for polled, at in self.status_calls if polled == request_id]
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    fake = FakeQueue()
+    module = types.ModuleType("fal_client")
+    module.Queued, module.InProgress = Queued, InProgress
+    module.status, module.result, module.cancel = fake.status, fake.result, fake.cancel
+    monkeypatch.setitem(sys.modules, "fal_client", module)
+    return fake
+
+
+@pytest.fixture
+def poller():
+    poller = QueuePoller()
+    yield poller
+    poller.close()
+
+
+def test_result_is_delivered_through_future_and_callback(queue, poller):
+    queue.add("a", 0.05, result={"images": [{"url": "https://cdn/a.jpg"}]})
+    delivered = []
+
+    future = poller.track(
+        ENDPOINT, "a",
+        transform=lambda raw: {**raw, "shaped": True},
+        callback=lambda done: delivered.append(done.result())
+    )
+
+    assert future.result(timeout=5) == {"images": [{"url": "https://cdn/a.jpg"}], "shaped": True}
+    assert delivered == [future.result()]
+    assert poller.stats()["outstanding"] == 0
+    assert poller.stats()["completed"] == 1
+
+
+def test_short_job_is_picked_up_quickly(queue, poller):
+    queue.add("a", 0.05)
+
+    started = time.monotonic()
+    poller.track(ENDPOINT, "a").result(timeout=5)
+
+    # First poll right away, then 0.1s after the job started running
+    assert time.monotonic() - started < 0.4
+
+
+def test_running_job_polls_back_off(queue):
+    poller = QueuePoller(in_progress_interval=0.02, in_progress_backoff=2.0, in_progress_max=0.16)
+    queue.add("a", 0.6)
+    try:
+        poller.track(ENDPOINT, "a").result(timeout=5)
+    finally:
+        poller.close()
+
+    polls = queue.polls("a")
+    gaps = [later - earlier for earlier, later in zip(polls, polls[1:])]
+    assert gaps[0] < gaps[2] < gaps[-2] + 0.05
+    assert max(gaps) < 0.16 + 0.1
+    assert len(polls) < 12
+
+
+def test_fixed_poll_interval_for_blocking_callers(queue):
+    poller = QueuePoller(in_progress_interval=0.02, in_progress_backoff=4.0, in_progress_max=1.0)
+    queue.add("a", 0.5)
+    try:
+        started = time.monotonic()
+        poller.track(ENDPOINT, "a", poll_interval=0.05).result(timeout=5)
+        elapsed = time.monotonic() - started
+    finally:
+        poller.close()
+
+    assert elapsed < 0.5 + 0.2
+    assert len(queue.polls("a")) >= 8
+
+
+def test_queued_jobs_are_polled_by_position(queue):
+    poller = QueuePoller(queued_base=0.01, queued_per_position=0.05)
+    queue.add("a", 0.0, queued_polls=4)
+    try:
+        poller.track(ENDPOINT, "a").result(timeout=5)
+    finally:
+        poller.close()
+
+    polls = queue.polls("a")
+    gaps = [later - earlier for earlier, later in zip(polls, polls[1:])]
+    # Positions 3, 2, 1, 0: the wait shrinks as the job moves up
+    assert gaps[0] > gaps[3]
+
+
+def test_slow_result_fetch_does_not_stall_other_jobs(queue, poller):
+    queue.add("slow", 0.0)
+    queue.slow_results["slow"] = 1.0
+    queue.add("fast", 0.05)
+
+    slow = poller.track(ENDPOINT, "slow")
+    time.sleep(0.05)
+    started = time.monotonic()
+    fast = poller.track(ENDPOINT, "fast")
+
+    fast.result(timeout=5)
+    assert time.monotonic() - started < 0.5
+    assert not slow.done()
+    slow.result(timeout=5)
+
+
+def test_timeout_cancels_the_queue_request(queue, poller):
+    queue.add("a", 10.0)
+
+    future = poller.track(ENDPOINT, "a", timeout=0.2)
+
+    with pytest.raises(TimeoutError):
+        future.result(timeout=5)
+    assert queue.cancelled == ["a"]
+    assert poller.stats()["timed_out"] == 1
+
+
+def test_cancelled_future_cancels_the_queue_request(queue, poller):
+    queue.add("a", 10.0)
+
+    future = poller.track(ENDPOINT, "a")
+    time.sleep(0.05)
+    assert future.cancel()
+
+    deadline = time.monotonic() + 5
+    while queue.cancelled != ["a"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.cancelled == ["a"]
+    assert poller.stats()["outstanding"] == 0
+
+
+def test_status_errors_fail_the_job_after_max_errors(queue):
+    poller = QueuePoller(queued_base=0.01, max_errors=3)
+
+    def broken(endpoint, request_id, with_logs=False):
+        queue.status_calls.append((request_id, time.monotonic()))
+        raise ConnectionError("connection reset")
+
+    sys.modules["fal_client"].status = broken
+    try:
+        future = poller.track(ENDPOINT, "a")
+        with pytest.raises(ConnectionError):
+            future.result(timeout=5)
+    finally:
+        poller.close()
+    assert len(queue.polls("a")) == 3
+
+
+def test_transform_errors_fail_the_job(queue, poller):
+    queue.add("a", 0.0)
+
+    def transform(raw):
+        raise RuntimeError("No image generated")
+
+    with pytest.raises(RuntimeError, match="No image generated"):
+        poller.track(ENDPOINT, "a", transform=transform).result(timeout=5)
+    assert poller.stats()["failed"] == 1
+
+
+def test_close_fails_outstanding_jobs(queue):
+    poller = QueuePoller()
+    queue.add("a", 10.0)
+    future = poller.track(ENDPOINT, "a")
+
+    poller.close()
+
+    with pytest.raises(RuntimeError, match="Poller closed"):
+        future.result(timeout=5)
+    with pytest.raises(RuntimeError):
+        poller.track(ENDPOINT, "b")
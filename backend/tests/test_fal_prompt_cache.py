@@ -0,0 +1,94 @@
+import pytest
+
+from fal_prompt_cache import PromptCache, jaccard, normalize_prompt, prompt_scope, shingles
+
+
+PROMPT = (
+    "Write a product description for this backpack. Features: red color, waterproof fabric, "
+    "padded laptop sleeve, two side pockets. Tone: friendly and upbeat."
+)
+# One word changed: similar (~0.85) but not identical
+VARIANT = PROMPT.replace("friendly", "formal")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PromptCache(str(tmp_path / "cache.sqlite3"), threshold=0.9)
+
+
+@pytest.fixture
+def scope():
+    return prompt_scope(None, "google/gemini-2.5-flash-lite", 0.7, None)
+
+
+def similarity(a: str, b: str) -> float:
+    return jaccard(shingles(normalize_prompt(a)), shingles(normalize_prompt(b)))
+
+
+def test_reworded_prompt_hits(cache, scope):
+    cache.store("description", scope, PROMPT, {"output": "A red backpack."})
+    reordered = (
+        "write a product description for this backpack.\n"
+        "Features:\n- two side pockets\n- padded laptop sleeve\n- waterproof fabric\n- red color\n"
+        "Tone:  friendly and upbeat"
+    )
+
+    hit = cache.lookup("description", scope, reordered)
+
+    assert hit is not None
+    assert hit["value"] == {"output": "A red backpack."}
+    assert hit["similarity"] == 1.0
+
+
+def test_threshold_decides_near_duplicates(cache, scope):
+    expected = similarity(PROMPT, VARIANT)
+    assert 0.75 < expected < 0.9
+    cache.store("description", scope, PROMPT, {"output": "A red backpack."})
+
+    assert cache.lookup("description", scope, VARIANT) is None
+    assert cache.lookup("description", scope, VARIANT, threshold=expected + 0.01) is None
+    hit = cache.lookup("description", scope, VARIANT, threshold=expected)
+    assert hit is not None
+    assert hit["similarity"] == round(expected, 4)
+
+
+def test_cache_threshold_applies_by_default(tmp_path, scope):
+    cache = PromptCache(str(tmp_path / "cache.sqlite3"), threshold=0.8)
+    cache.store("description", scope, PROMPT, {"output": "A red backpack."})
+
+    assert cache.lookup("description", scope, VARIANT) is not None
+
+
+@pytest.mark.parametrize("threshold", [0.0001, 0.5, 1.0])
+def test_different_numbers_never_match(cache, scope, threshold):
+    cache.store("description", scope, PROMPT + " Capacity: 20 liters, price $49.99.", {"output": "20 l"})
+
+    for other in (
+        PROMPT + " Capacity: 30 liters, price $49.99.",
+        PROMPT + " Capacity: 20 liters, price $59.99.",
+        PROMPT + " Capacity: 20 liters.",
+    ):
+        assert cache.lookup("description", scope, other, threshold=threshold) is None
+    assert cache.lookup("description", scope, PROMPT + " capacity: 20 liters, price $49.99", threshold=threshold)
+
+
+def test_same_numbers_still_need_similarity(cache, scope):
+    cache.store("description", scope, "Sale: 20% off backpacks until 31.12", {"output": "sale"})
+
+    assert cache.lookup("description", scope, "Write a poem about 20 cats and 31.12 dogs") is None
+
+
+def test_namespace_and_scope_isolate_entries(cache, scope):
+    cache.store("description", scope, PROMPT, {"output": "A red backpack."})
+    other_scope = prompt_scope(None, "google/gemini-2.5-flash-lite", 0.2, None)
+
+    assert cache.lookup("marketing-kit", scope, PROMPT) is None
+    assert cache.lookup("description", other_scope, PROMPT) is None
+    assert cache.lookup("description", scope, PROMPT) is not None
+
+
+def test_threshold_must_be_a_fraction(tmp_path):
+    with pytest.raises(ValueError):
+        PromptCache(str(tmp_path / "cache.sqlite3"), threshold=0)
+    with pytest.raises(ValueError):
+        PromptCache(str(tmp_path / "cache.sqlite3"), threshold=1.5)
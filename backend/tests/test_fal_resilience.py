@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from fal_resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, ResilienceLayer
+
+
+ENDPOINT = "fal-ai/any-llm"
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+def make_layer(**kwargs):
+    return ResilienceLayer(
+        policy=RetryPolicy(max_attempts=1),
+        failure_threshold=kwargs.pop("failure_threshold", 2),
+        reset_timeout=kwargs.pop("reset_timeout", 0.05),
+        **kwargs
+    )
+
+
+def fail():
+    raise Unavailable("503 Service Unavailable")
+
+
+def trip(layer):
+    for _ in range(layer.failure_threshold):
+        with pytest.raises(Unavailable):
+            layer.call(ENDPOINT, fail)
+    assert layer.breaker(ENDPOINT).state == CircuitBreaker.OPEN
+
+
+def wait_half_open(layer):
+    breaker = layer.breaker(ENDPOINT)
+    # Let reset_timeout pass without taking the probe
+    breaker.opened_at -= layer.reset_timeout
+
+
+def test_breaker_opens_and_rejects_until_reset_timeout():
+    layer = make_layer(reset_timeout=30.0)
+    trip(layer)
+
+    with pytest.raises(CircuitOpenError) as rejected:
+        layer.call(ENDPOINT, lambda: "ok")
+    assert 0 < rejected.value.retry_in <= 30.0
+
+
+def test_half_open_probe_closes_on_success():
+    layer = make_layer()
+    trip(layer)
+    wait_half_open(layer)
+
+    assert layer.call(ENDPOINT, lambda: "ok") == "ok"
+    assert layer.breaker(ENDPOINT).snapshot()["state"] == CircuitBreaker.CLOSED
+    assert layer.breaker(ENDPOINT).consecutive_failures == 0
+
+
+def test_half_open_probe_failure_reopens():
+    layer = make_layer()
+    trip(layer)
+    wait_half_open(layer)
+
+    with pytest.raises(Unavailable):
+        layer.call(ENDPOINT, fail)
+    assert layer.breaker(ENDPOINT).state == CircuitBreaker.OPEN
+
+
+def test_half_open_lets_one_probe_through():
+    layer = make_layer()
+    trip(layer)
+    wait_half_open(layer)
+    breaker = layer.breaker(ENDPOINT)
+
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.release_probe()
+    assert breaker.before_call() is True
+
+
+def test_bad_request_probe_does_not_wedge_the_breaker():
+    layer = make_layer()
+    trip(layer)
+    wait_half_open(layer)
+
+    with pytest.raises(ValueError):
+        layer.call(ENDPOINT, lambda: (_ for _ in ()).throw(ValueError("bad prompt")))
+    assert layer.call(ENDPOINT, lambda: "ok") == "ok"
+
+
+def test_cancelled_async_probe_does_not_wedge_the_breaker():
+    layer = make_layer()
+    trip(layer)
+    wait_half_open(layer)
+
+    async def scenario():
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def ok():
+            return "ok"
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.acall(ENDPOINT, hang), 0.05)
+        assert layer.breaker(ENDPOINT).state == CircuitBreaker.HALF_OPEN
+        return await layer.acall(ENDPOINT, ok)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert layer.breaker(ENDPOINT).state == CircuitBreaker.CLOSED
+
+
+def test_interrupted_sync_probe_does_not_wedge_the_breaker():
+    layer = make_layer()
+    trip(layer)
+    wait_half_open(layer)
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        layer.call(ENDPOINT, interrupt)
+    assert layer.call(ENDPOINT, lambda: "ok") == "ok"
+
+
+def test_retryable_errors_are_retried_within_policy():
+    layer = ResilienceLayer(policy=RetryPolicy(max_attempts=3, base_delay=0, max_delay=0))
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            fail()
+        return "ok"
+
+    assert layer.call(ENDPOINT, flaky) == "ok"
+    assert len(attempts) == 3
@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from fal_singleflight import SingleFlight
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+def run_coalesced(flights, fn, joiners=3):
+    """Start a leader and `joiners` callers of the same key; returns their results in start order."""
+    results = [None] * (joiners + 1)
+    errors = []
+
+    def call(position):
+        try:
+            results[position] = flights.do("key", fn)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(0,))]
+    threads[0].start()
+    wait_for(lambda: flights.stats()["in_flight"] == 1)
+    for position in range(1, joiners + 1):
+        threads.append(threading.Thread(target=call, args=(position,)))
+        threads[-1].start()
+    wait_for(lambda: flights.stats()["joined"] == joiners)
+    return threads, results, errors
+
+
+def test_concurrent_calls_run_once_and_get_their_own_result():
+    flights = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait(5)
+        return {"url": "https://cdn/x.jpg", "tags": ["a"]}
+
+    threads, results, errors = run_coalesced(flights, fn)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == []
+    assert len(runs) == 1
+    assert all(result == {"url": "https://cdn/x.jpg", "tags": ["a"]} for result in results)
+    assert len({id(result) for result in results}) == len(results)
+    assert len({id(result["tags"]) for result in results}) == len(results)
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "joined": 3}
+
+
+def test_leader_changes_do_not_reach_joiners():
+    flights = SingleFlight()
+    release = threading.Event()
+    leader_result = {}
+
+    def fn():
+        release.wait(5)
+        return {"url": "https://cdn/x.jpg", "downloads": {}}
+
+    def leader_then_modify():
+        result = flights.do("key", fn)
+        leader_result["value"] = result
+        # What _attach_downloads and the callers do with their result
+        for i in range(2000):
+            result["downloads"][f"path{i}"] = i
+            result[f"extra{i}"] = i
+
+    leader = threading.Thread(target=leader_then_modify)
+    leader.start()
+    wait_for(lambda: flights.stats()["in_flight"] == 1)
+    joined = []
+    joiners = [threading.Thread(target=lambda: joined.append(flights.do("key", fn))) for _ in range(8)]
+    for thread in joiners:
+        thread.start()
+    wait_for(lambda: flights.stats()["joined"] == 8)
+    release.set()
+    leader.join(5)
+    for thread in joiners:
+        thread.join(5)
+
+    assert len(joined) == 8
+    assert all(result == {"url": "https://cdn/x.jpg", "downloads": {}} for result in joined)
+    assert len(leader_result["value"]["downloads"]) == 2000
+
+
+def test_errors_are_shared_and_nothing_is_kept():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise RuntimeError("upload failed")
+
+    threads, results, errors = run_coalesced(flights, fn, joiners=2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert [str(e) for e in errors] == ["upload failed"] * 3
+    assert flights.stats()["in_flight"] == 0
+    # Not a cache: the next call runs again
+    assert flights.do("key", lambda: "second") == "second"
+
+
+def test_single_caller_gets_the_result_itself():
+    flights = SingleFlight()
+    value = {"a": 1}
+
+    assert flights.do("key", lambda: value) is value
+
+
+def test_async_calls_run_once_and_get_their_own_result():
+    flights = SingleFlight()
+    runs = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def work():
+            runs.append(1)
+            await release.wait()
+            return {"tags": ["a"]}
+
+        callers = [asyncio.ensure_future(flights.ado("key", work)) for _ in range(4)]
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*callers)
+
+    results = asyncio.run(scenario())
+
+    assert len(runs) == 1
+    assert all(result == {"tags": ["a"]} for result in results)
+    assert len({id(result) for result in results}) == 4
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "joined": 3}
+
+
+def test_async_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def work():
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+            return "done"
+
+        leader = asyncio.ensure_future(flights.ado("key", work))
+        joiner = asyncio.ensure_future(flights.ado("key", work))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(leader, 0.01)
+        release.set()
+        return await joiner
+
+    assert asyncio.run(scenario()) == "done"
+    assert cancelled == []
+
+
+def test_async_work_is_cancelled_once_every_caller_is_gone():
+    flights = SingleFlight()
+    cancelled = []
+
+    async def scenario():
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        callers = [asyncio.ensure_future(flights.ado("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+    assert cancelled == [1]
+    assert flights.stats()["in_flight"] == 0
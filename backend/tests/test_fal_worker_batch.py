@@ -0,0 +1,39 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from fal_worker import run_batch
+
+
+class BatchDaemon:
+    """Stands in for WorkerDaemon in run_batch, answering each command from `responses`."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def handle_request(self, request, defer=False):
+        result, error = self.responses[request["command"]]
+        return {"id": request["id"], "result": result, "error": error}
+
+
+def test_summary_counts_error_results_as_failed(tmp_path):
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text("\n".join([
+        json.dumps({"id": 1, "command": "analyze-product", "args": {}}),
+        json.dumps({"id": 2, "command": "generate-bg-prompt", "args": {}}),
+        json.dumps({"id": 3, "command": "upload", "args": {}}),
+        json.dumps({"id": 4, "command": "unknown", "args": {}}),
+        "{not json",
+    ]) + "\n")
+    daemon = BatchDaemon({
+        "analyze-product": ({"categories": {}, "error": "No JSON found in response"}, None),
+        "generate-bg-prompt": ({"prompt": None, "error": "HTTP 500"}, None),
+        "upload": ({"url": "https://cdn/x.jpg"}, None),
+        "unknown": (None, "Unsupported command in serve/batch mode: unknown"),
+    })
+
+    summary = run_batch(daemon, str(jobs), str(tmp_path / "results.jsonl"), concurrency=2)
+
+    assert summary == {"submitted": 4, "skipped": 0, "succeeded": 1, "failed": 4}
+    lines = (tmp_path / "results.jsonl").read_text().splitlines()
+    assert len(lines) == 5